@@ -0,0 +1,355 @@
+"""Almanac: rise, transit and set times of the sun, moon and planets, day by day.
+
+Running pyEphem's rising, transit and setting searches for every body on every
+day of a year would mean thousands of searches, each computing the body's
+position over and over. Instead, for a place and a range of local dates:
+
+* each body's geocentric position is computed at nodes (a day or two
+  apart, or half a day for the moon) and interpolated between them with
+  cubics (see BodyPath)
+* every body's topocentric altitude and hour angle are sampled every
+  SAMPLE_MINUTES over the whole range at once, with the vectorized sidereal
+  time (see skies.get_body_alt_az)
+* each sample where the altitude crosses the horizon (or the hour angle
+  crosses the meridian) brackets an event, and every bracket is narrowed
+  down by bisection at once
+
+Rising and setting are for the upper limb on the horizon, with refraction
+(as pyEphem). Times agree with pyEphem's searches to within a few seconds
+(up to half a minute far north or south, where bodies rise at a shallow
+angle); a body that rises and sets again within a sample (only possible when
+it barely grazes the horizon) is missed.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, time, timedelta
+import numpy as np
+import ephem
+
+from time_functions import to_utc
+from chebyshev import get_ra_dec
+from conjunctions import get_positions
+from sidereal_time import get_local_sidereal_time
+from riseset import SIDEREAL_DEG_PER_DAY, ALWAYS_UP, NEVER_UP
+from skies import PLANETS, get_observer_offsets, get_body_alt_az
+from atmosphere import unrefract
+
+# bodies in the almanac
+BODY_CLASSES = [ephem.Sun, ephem.Moon] + PLANETS
+
+# days between each body's position nodes. Between nodes, positions are
+# interpolated with a cubic through the two nodes either side, which is
+# good to under an arcsecond with nodes half a day apart for the moon, a day
+# for Mercury and two days for the others. Computing the positions at the
+# nodes is most of an almanac's work, so the nodes are as far apart as that
+# allows.
+NODE_DAYS = {'Moon': 0.5, 'Mercury': 1}
+DEFAULT_NODE_DAYS = 2
+
+# minutes between altitude samples
+SAMPLE_MINUTES = 20
+
+# bisection steps narrowing each event: each halves the bracket, so the
+# sample's 20 minutes go down to under a second
+REFINE_STEPS = 11
+
+# radii of the bodies with a disk worth counting at the horizon, in km
+RADII_KM = {'Sun': 695700, 'Moon': 1737.4}
+
+# km in an AU
+AU_KM = 149597870.7
+
+# most days in an almanac
+MAX_ALMANAC_DAYS = 366
+
+# pressure (mbar) and temperature (C) for refraction (pyEphem's defaults)
+PRESSURE = 1010
+TEMPERATURE = 15
+
+RISE = 'rise'
+TRANSIT = 'transit'
+SET = 'set'
+
+
+class BodyPath(object):
+    """A body's geocentric positions over a date range, interpolated.
+
+    Attributes:
+
+    * name: the body's name
+    * node_dates: array of the ephem dates of the nodes
+    * xyz: 3 x N array of the body's geocentric xyz at the nodes, in AU (see
+      conjunctions.get_positions)
+    """
+
+    def __init__(self, body_class, start, end):
+        """Compute the body's positions at nodes from start to end.
+
+        start and end are ephem dates; there are two nodes either side of
+        them, for the cubics.
+        """
+
+        self.name = body_class.__name__
+        step = NODE_DAYS.get(self.name, DEFAULT_NODE_DAYS)
+
+        self.node_dates = np.arange(start - 2 * step, end + 3 * step, step)
+        self.xyz = get_positions(body_class, self.node_dates)
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '<BodyPath {} nodes={}>'.format(self.name, len(self.node_dates))
+
+    def get_position(self, ephem_dates):
+        """Return dict of arrays of geocentric 'ra', 'dec' and 'earth_distance'.
+
+        As positions.get_interpolated_position, for an array of ephem dates:
+        ra and dec in radians, earth_distance in AU.
+        """
+
+        ras, decs, distances = get_ra_dec(
+            interpolate_cubic(ephem_dates, self.node_dates, self.xyz))
+
+        return {'ra': ras, 'dec': decs, 'earth_distance': distances}
+
+    def get_horizon(self, distances):
+        """Return array of the true altitude (degrees) of rising and setting.
+
+        That's the altitude of the body's center when its upper limb appears
+        on the horizon. As in pyEphem, the refraction is for the center's
+        apparent altitude (the body's radius below the horizon), a few
+        minutes of arc more than at the horizon itself. distances are in AU.
+        """
+
+        radii = np.arcsin(RADII_KM.get(self.name, 0) / (distances * AU_KM))
+
+        return np.degrees(unrefract(-radii, PRESSURE, TEMPERATURE))
+
+    def get_events(self, ephem_dates, lat, lsts, offsets):
+        """Return tuple of arrays (height, hour angle) at ephem_dates.
+
+        * height is the altitude above the rising and setting altitude, in
+          degrees (the body is up when it's positive)
+        * hour angle is in degrees, from -180 to 180 (0 on the meridian,
+          negative to the east)
+
+        lsts are the local sidereal times at the dates (degrees); offsets
+        are skies.get_observer_offsets for lat.
+        """
+
+        position = self.get_position(ephem_dates)
+        alts, _ = get_body_alt_az(position, lat, np.radians(lsts), offsets, 0,
+                                  TEMPERATURE)
+
+        hour_angles = (lsts - np.degrees(position['ra']) + 180) % 360 - 180
+
+        return alts - self.get_horizon(position['earth_distance']), hour_angles
+
+
+def interpolate_cubic(ephem_dates, node_dates, values):
+    """Return array of values interpolated at ephem_dates, from evenly spaced nodes.
+
+    values is an array with a column per node (node_dates); each date is
+    interpolated with the Lagrange cubic through the two nodes before it and
+    the two after.
+    """
+
+    step = node_dates[1] - node_dates[0]
+    positions = (np.asarray(ephem_dates, dtype=float) - node_dates[0]) / step
+
+    # the second of the four nodes, and how far past it each date is
+    indexes = np.clip(np.floor(positions).astype(int), 1, len(node_dates) - 3)
+    t = positions - indexes
+
+    weights = [-t * (t - 1) * (t - 2) / 6,
+               (t + 1) * (t - 1) * (t - 2) / 2,
+               -(t + 1) * t * (t - 2) / 2,
+               (t + 1) * t * (t - 1) / 6]
+
+    return sum(weight * values[..., indexes + offset]
+               for offset, weight in zip(range(-1, 3), weights))
+
+
+def get_midnights(start_date, num_days, timezone):
+    """Return array of the ephem dates of local midnights.
+
+    There are num_days + 1: from the start of start_date (a datetime.date) to
+    the end of the last day. timezone is a pytz timezone.
+    """
+
+    return np.array([float(ephem.Date(to_utc(
+        timezone, datetime.combine(start_date + timedelta(days=day), time(0)))))
+        for day in range(num_days + 1)])
+
+
+def find_brackets(values, rising):
+    """Return array of indexes of samples just before values cross zero.
+
+    rising picks crossings from negative to positive (True) or positive to
+    negative (False).
+    """
+
+    up = values >= 0
+
+    if rising:
+        return np.flatnonzero(~up[:-1] & up[1:])
+
+    return np.flatnonzero(up[:-1] & ~up[1:])
+
+
+def refine_crossings(get_values, starts, ends, rising):
+    """Return array of ephem dates where get_values crosses zero.
+
+    get_values returns an array of values at an array of ephem dates (one per
+    bracket); starts and ends bracket each crossing. rising is as for
+    find_brackets.
+    """
+
+    for _ in range(REFINE_STEPS):
+        middles = (starts + ends) / 2
+        past = (get_values(middles) >= 0) == rising
+
+        ends = np.where(past, middles, ends)
+        starts = np.where(past, starts, middles)
+
+    return (starts + ends) / 2
+
+
+def get_body_events(path, lat, sample_dates, sample_lsts, offsets):
+    """Return tuple of (events, heights) for a body over the sample dates.
+
+    events is a dict of arrays of ephem dates, keyed by RISE, TRANSIT and
+    SET; heights is the array of the body's height above the horizon (see
+    BodyPath.get_events) at each sample.
+    """
+
+    heights, hour_angles = path.get_events(sample_dates, lat, sample_lsts,
+                                           offsets)
+
+    def get_lsts(ephem_dates, indexes):
+        """Return array of local sidereal times, from the samples before."""
+
+        return sample_lsts[indexes] + SIDEREAL_DEG_PER_DAY * \
+            (ephem_dates - sample_dates[indexes])
+
+    events = {}
+
+    for event, rising in ((RISE, True), (SET, False)):
+        indexes = find_brackets(heights, rising)
+        events[event] = refine_crossings(
+            lambda ephem_dates: path.get_events(
+                ephem_dates, lat, get_lsts(ephem_dates, indexes), offsets)[0],
+            sample_dates[indexes], sample_dates[indexes + 1], rising)
+
+    # crossing the upper meridian: the hour angle goes from negative to
+    # positive (but not by wrapping around through 180 degrees)
+    indexes = find_brackets(hour_angles, True)
+    indexes = indexes[np.abs(hour_angles[indexes]) < 90]
+
+    events[TRANSIT] = refine_crossings(
+        lambda ephem_dates: path.get_events(
+            ephem_dates, lat, get_lsts(ephem_dates, indexes), offsets)[1],
+        sample_dates[indexes], sample_dates[indexes + 1], True)
+
+    return events, heights
+
+
+def get_almanac(lat, lng, start_date, num_days, timezone):
+    """Return the rise, transit and set times of each body on each local day.
+
+    * lat and lng are in degrees
+    * start_date is the first local date (a datetime.date); there are
+      num_days (at most MAX_ALMANAC_DAYS) of them
+    * timezone is the place's pytz timezone
+
+    Returns a dict of parallel lists, one item per day:
+
+    {'dates': [datetime.date for each day],
+     'bodies': {'Sun': {'rise': [...],
+                        'transit': [...],
+                        'set': [...],
+                        'transitAlt': [...]},
+                ...}}
+
+    Each rise, transit or set is the ephem date of the first of that event on
+    the day. If there isn't one, it's ALWAYS_UP or NEVER_UP (for rises and
+    sets) if the body was up or down the whole day, and None otherwise (as
+    when the moon rises just before midnight one day and just after the
+    next). transitAlt is the body's altitude at transit, in degrees, with
+    refraction (None without a transit).
+    """
+
+    num_days = max(1, min(num_days, MAX_ALMANAC_DAYS))
+    midnights = get_midnights(start_date, num_days, timezone)
+
+    step = SAMPLE_MINUTES * ephem.minute
+    sample_dates = np.arange(midnights[0], midnights[-1] + step, step)
+    sample_lsts = get_local_sidereal_time(sample_dates, lng)
+    offsets = get_observer_offsets(lat)
+
+    # the first sample of each day
+    day_starts = np.searchsorted(sample_dates, midnights[:-1])
+
+    almanac = {'dates': [start_date + timedelta(days=day)
+                         for day in range(num_days)],
+               'bodies': {}}
+
+    for body_class in BODY_CLASSES:
+        path = BodyPath(body_class, midnights[0], midnights[-1])
+        events, heights = get_body_events(path, lat, sample_dates, sample_lsts,
+                                          offsets)
+
+        # up or down the whole day
+        lowest = np.minimum.reduceat(heights, day_starts)
+        highest = np.maximum.reduceat(heights, day_starts)
+
+        body_days = {'transitAlt': [None] * num_days}
+
+        for event in (RISE, TRANSIT, SET):
+            days = np.searchsorted(midnights, events[event], side='right') - 1
+            body_days[event] = [None] * num_days
+
+            # the first event each day
+            for day, event_date in reversed(list(zip(days, events[event]))):
+                if 0 <= day < num_days:
+                    body_days[event][day] = ephem.Date(event_date)
+
+            if event != TRANSIT:
+                for day in range(num_days):
+                    if body_days[event][day] is None:
+                        if lowest[day] > 0:
+                            body_days[event][day] = ALWAYS_UP
+                        elif highest[day] < 0:
+                            body_days[event][day] = NEVER_UP
+
+        transits = [(day, transit) for day, transit in
+                    enumerate(body_days[TRANSIT]) if transit is not None]
+        if transits:
+            transit_dates = np.array([float(transit) for _, transit in transits])
+            alts, _ = get_body_alt_az(
+                path.get_position(transit_dates), lat,
+                np.radians(get_local_sidereal_time(transit_dates, lng)),
+                offsets, PRESSURE, TEMPERATURE)
+
+            for (day, _), alt in zip(transits, alts):
+                body_days['transitAlt'][day] = round(float(alt), 2)
+
+        almanac['bodies'][path.name] = body_days
+
+    return almanac
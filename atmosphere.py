@@ -0,0 +1,191 @@
+"""Refraction, airmass and extinction for whole catalogs at once.
+
+Near the horizon, light comes through much more air than from overhead. That
+lifts stars (refraction) and dims them (extinction): a star that's easy to see
+overhead can be lost in the murk a few degrees up. These functions work on
+arrays of altitudes and magnitudes, so every star in the catalog (and every
+planet) can be corrected in one numpy pass per request:
+
+* refract / unrefract: the same refraction as positions.refract and
+  positions.unrefract (pyEphem's formulas), for arrays. Altitudes in radians.
+* get_airmass: how much air the light comes through, relative to overhead
+  (Kasten and Young's formula, which holds all the way down to the horizon)
+* get_extinction: how much dimmer that makes things than overhead
+* get_limiting_magnitude: the dimmest star visible overhead, for a sky
+  brightness (as measured by a sky quality meter)
+
+Magnitudes are dimmed relative to the zenith, so a star overhead keeps its
+catalog magnitude, and a limiting magnitude means the same thing as it does to
+observers: the dimmest star they can see overhead.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from positions import LOW_REFRACTION_LIMIT, HIGH_REFRACTION_LIMIT, \
+    MAX_REFRACTION_ERROR
+
+# most secant steps when refracting an array of altitudes (pyEphem's
+# refraction converges in three or four)
+MAX_REFRACTION_STEPS = 20
+
+# magnitudes of dimming per airmass, for visual magnitudes at a low, fairly
+# clear site
+EXTINCTION_COEFFICIENT = 0.25
+
+# Kasten and Young's airmass formula (altitudes in degrees)
+AIRMASS_A = 0.50572
+AIRMASS_B = 6.07995
+AIRMASS_C = 1.6364
+
+# naked eye limiting magnitude for a sky brightness (mag / arcsec^2), as
+# LIMIT_BASE - 5 log(10^(LIMIT_OFFSET - brightness / 5) + 1)
+LIMIT_BASE = 7.93
+LIMIT_OFFSET = 4.316
+
+
+def unrefract(apparent_alts, pressure, temperature):
+    """Return array of true altitudes for an array of apparent altitudes.
+
+    Array version of positions.unrefract: altitudes in radians, pressure in
+    millibars and temperature in degrees C.
+    """
+
+    apparent_alts = np.asarray(apparent_alts, dtype=float)
+    alt_degs = np.degrees(apparent_alts)
+
+    # low altitudes (no refraction where the formula goes negative)
+    numerator = ((2e-5 * alt_degs + 1.96e-2) * alt_degs + 1.594e-1) * pressure
+    denominator = (273 + temperature) * \
+        ((8.45e-2 * alt_degs + 5.05e-1) * alt_degs + 1)
+    low_refraction = np.radians(numerator / denominator)
+    low_refraction[(apparent_alts < 0) & (low_refraction < 0)] = 0
+
+    blend = np.clip((alt_degs - LOW_REFRACTION_LIMIT) /
+                    (HIGH_REFRACTION_LIMIT - LOW_REFRACTION_LIMIT), 0, 1)
+
+    # high altitudes (only used above LOW_REFRACTION_LIMIT; ignore the infinite
+    # refraction worked out for the horizon)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        high_refraction = 7.888888e-5 * pressure / \
+            ((273 + temperature) * np.tan(apparent_alts))
+
+        refraction = np.where(blend > 0,
+                              low_refraction + blend * (high_refraction -
+                                                        low_refraction),
+                              low_refraction)
+
+    return apparent_alts - refraction
+
+
+def refract(true_alts, pressure, temperature):
+    """Return array of apparent (refracted) altitudes for true altitudes.
+
+    Array version of positions.refract: solves unrefract backwards with the
+    secant method, for every altitude at once.
+    """
+
+    true_alts = np.asarray(true_alts, dtype=float)
+
+    if pressure == 0:
+        return true_alts
+
+    last_trues = unrefract(true_alts, pressure, temperature)
+    steps = 0.8 * (true_alts - last_trues)
+    apparent_alts = true_alts.copy()
+
+    for _ in range(MAX_REFRACTION_STEPS):
+        apparent_alts += steps
+        these_trues = unrefract(apparent_alts, pressure, temperature)
+
+        errors = true_alts - these_trues
+        converged = np.abs(errors) <= MAX_REFRACTION_ERROR
+        if converged.all():
+            break
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            steps = np.where(converged, 0,
+                             -steps * errors / (last_trues - these_trues))
+        last_trues = these_trues
+
+    return apparent_alts
+
+
+def get_airmass(alts):
+    """Return array of airmasses for an array of apparent altitudes (degrees).
+
+    Airmass is 1 overhead, and about 38 at the horizon. Below the horizon
+    it's infinite.
+    """
+
+    alts = np.asarray(alts, dtype=float)
+    above = np.maximum(alts, 0)
+
+    airmasses = 1 / (np.sin(np.radians(above)) +
+                     AIRMASS_A * (above + AIRMASS_B) ** -AIRMASS_C)
+
+    return np.where(alts < 0, np.inf, airmasses)
+
+
+def get_extinction(alts, coefficient=EXTINCTION_COEFFICIENT):
+    """Return array of magnitudes of dimming, relative to overhead.
+
+    alts are apparent altitudes in degrees; coefficient is in magnitudes per
+    airmass.
+    """
+
+    return coefficient * (get_airmass(alts) - 1)
+
+
+def get_limiting_magnitude(sky_brightness):
+    """Return the naked eye limiting magnitude overhead, for a sky brightness.
+
+    sky_brightness is in magnitudes per square arcsec (as read by a sky
+    quality meter): about 22 under the darkest skies, 18 in a city.
+    """
+
+    return LIMIT_BASE - 5 * np.log10(10 ** (LIMIT_OFFSET - sky_brightness / 5.0) + 1)
+
+
+def get_apparent_sky(alts, magnitudes, limiting_mag, pressure=1010, temperature=15,
+                     coefficient=EXTINCTION_COEFFICIENT):
+    """Return a dict of arrays of how positions look through the atmosphere.
+
+    * alts are true (airless) altitudes, and magnitudes catalog magnitudes,
+      for each position
+    * limiting_mag is the dimmest magnitude the observer can see overhead
+    * pressure (millibars) and temperature (degrees C) are for refraction;
+      coefficient is the extinction, in magnitudes per airmass
+
+    Keys:
+        'alt': refracted altitude, in degrees
+        'airmass': airmass (infinite below the horizon)
+        'magnitude': magnitude after extinction (infinite below the horizon)
+        'visible': boolean mask of positions above the horizon and no dimmer
+            than limiting_mag after extinction
+    """
+
+    apparent_alts = np.degrees(refract(np.radians(alts), pressure, temperature))
+    airmasses = get_airmass(apparent_alts)
+    extincted = np.asarray(magnitudes, dtype=float) + coefficient * (airmasses - 1)
+
+    return {'alt': apparent_alts,
+            'airmass': airmasses,
+            'magnitude': extincted,
+            'visible': (apparent_alts > 0) & (extincted <= limiting_mag)}
@@ -0,0 +1,272 @@
+"""Chebyshev polynomial ephemeris for fast sun, moon and planet positions.
+
+pyEphem works out each position from scratch, one body and instant at a time.
+For a star chart, it's much cheaper to fit polynomials to pyEphem's positions
+once, ahead of time, and evaluate the polynomials instead: for any number of
+instants at once, with numpy.
+
+Each body's geocentric position (apparent equatorial x, y, z of date, in AU)
+is split into segments of SEGMENT_DAYS days, and each segment is fit with a
+Chebyshev polynomial of degree DEGREE. Fits are saved to a compressed numpy
+(.npz) file; to make one, run this file with a start and end year:
+
+    python chebyshev.py 2000 2050
+
+Tolerance: positions agree with pyEphem's to within about 0.05 arcsec for the
+sun, moon and inner planets, and 1 arcsec for the outer planets (where
+pyEphem's own positions are a little noisy). Outside the fitted years,
+positions come from pyEphem.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import sys
+from datetime import date
+import numpy as np
+from numpy.polynomial import chebyshev
+import ephem
+
+# to be able to distinguish between data dir for testing
+DATADIR = 'seed_data'
+
+EPHEMERIS_FILENAME = 'ephemeris.npz'
+
+# the bodies to fit
+BODY_CLASSES = [ephem.Sun, ephem.Moon, ephem.Mercury, ephem.Venus, ephem.Mars,
+                ephem.Jupiter, ephem.Saturn, ephem.Uranus, ephem.Neptune]
+
+# length of the fitted segments, in days. Fast movers need shorter segments.
+SEGMENT_DAYS = {'Moon': 4, 'Mercury': 8}
+DEFAULT_SEGMENT_DAYS = 16
+
+# degree of the polynomial for each segment
+DEGREE = 12
+
+# the ephemeris, loaded on first use (see get_ephemeris)
+EPHEMERIS = None
+
+
+def get_geocentric_xyz(body_class, ephem_date):
+    """Return list of pyEphem's apparent geocentric [x, y, z] for the body, in AU.
+
+    x points to ra 0h on the equator of date, y to ra 6h and z to the north
+    pole.
+    """
+
+    body = body_class(ephem.Date(ephem_date))
+    cos_dec = np.cos(body.dec)
+
+    return [body.earth_distance * cos_dec * np.cos(body.ra),
+            body.earth_distance * cos_dec * np.sin(body.ra),
+            body.earth_distance * np.sin(body.dec)]
+
+
+def get_ra_dec(xyz):
+    """Return tuple of arrays (ra, dec, distance) for a 3 x N array of xyz.
+
+    ra and dec are in radians (ra from 0 to 2 pi), distance in AU.
+    """
+
+    x, y, z = xyz
+    distance = np.sqrt(x * x + y * y + z * z)
+
+    return np.arctan2(y, x) % (2 * np.pi), np.arcsin(z / distance), distance
+
+
+def fit_segment(body_class, segment_start, segment_days):
+    """Return a 3 x (DEGREE + 1) array of Chebyshev coefficients for a segment.
+
+    Fits pyEphem's positions at the Chebyshev nodes of the segment, which
+    keeps the error spread evenly over the segment.
+    """
+
+    num_nodes = DEGREE + 1
+    nodes = np.cos(np.pi * (np.arange(num_nodes) + 0.5) / num_nodes)
+    node_dates = segment_start + (nodes + 1) / 2 * segment_days
+
+    positions = np.array([get_geocentric_xyz(body_class, node_date)
+                          for node_date in node_dates])
+
+    return chebyshev.chebfit(nodes, positions, DEGREE).T
+
+
+class ChebyshevEphemeris(object):
+    """Fitted positions for the sun, moon and planets over a range of dates.
+
+    * start and end are ephem dates (floats)
+    * coefficients is a dict of arrays, keyed by body name. Each array has a
+      3 x (DEGREE + 1) block of coefficients per segment.
+    """
+
+    def __init__(self, start, end, coefficients):
+        """Store the fitted coefficients."""
+
+        self.start = float(start)
+        self.end = float(end)
+        self.coefficients = coefficients
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< ChebyshevEphemeris start={} end={} bodies={} >'.format(
+            ephem.Date(self.start), ephem.Date(self.end), len(self.coefficients))
+
+    def covers(self, ephem_dates):
+        """Return boolean array: True for each ephem date in the fitted range."""
+
+        ephem_dates = np.asarray(ephem_dates, dtype=float)
+
+        return (ephem_dates >= self.start) & (ephem_dates < self.end)
+
+    def get_segments(self, name, ephem_dates):
+        """Return tuple of (segment indexes, x in segment from -1 to 1)."""
+
+        segment_days = SEGMENT_DAYS.get(name, DEFAULT_SEGMENT_DAYS)
+        offsets = (np.asarray(ephem_dates, dtype=float) - self.start) / segment_days
+
+        num_segments = len(self.coefficients[name])
+        indexes = np.clip(np.floor(offsets).astype(int), 0, num_segments - 1)
+
+        return indexes, 2 * (offsets - indexes) - 1
+
+    def evaluate(self, coefficients, x):
+        """Return 3 x N array of polynomials evaluated at x (Clenshaw's method).
+
+        coefficients is an N x 3 x (degree + 1) array, one block per x.
+        """
+
+        b1 = np.zeros(coefficients.shape[:2])
+        b2 = np.zeros(coefficients.shape[:2])
+        two_x = 2 * x[:, np.newaxis]
+
+        for k in range(coefficients.shape[2] - 1, 0, -1):
+            b1, b2 = coefficients[:, :, k] + two_x * b1 - b2, b1
+
+        return (coefficients[:, :, 0] + x[:, np.newaxis] * b1 - b2).T
+
+    def get_positions(self, body_class, ephem_dates):
+        """Return 3 x N array of geocentric xyz (AU) for an array of ephem dates.
+
+        Dates outside the fitted range are computed with pyEphem.
+        """
+
+        ephem_dates = np.atleast_1d(np.asarray(ephem_dates, dtype=float))
+        name = body_class.__name__
+
+        positions = np.empty((3, len(ephem_dates)))
+        inside = self.covers(ephem_dates)
+
+        indexes, x = self.get_segments(name, ephem_dates[inside])
+        positions[:, inside] = self.evaluate(self.coefficients[name][indexes], x)
+
+        for i in np.flatnonzero(~inside):
+            positions[:, i] = get_geocentric_xyz(body_class, ephem_dates[i])
+
+        return positions
+
+    def get_velocities(self, body_class, ephem_dates):
+        """Return 3 x N array of geocentric velocities, in AU per day.
+
+        Dates outside the fitted range get velocities from pyEphem positions an
+        hour either side.
+        """
+
+        ephem_dates = np.atleast_1d(np.asarray(ephem_dates, dtype=float))
+        name = body_class.__name__
+        segment_days = SEGMENT_DAYS.get(name, DEFAULT_SEGMENT_DAYS)
+
+        velocities = np.empty((3, len(ephem_dates)))
+        inside = self.covers(ephem_dates)
+
+        # d/dt = d/dx * dx/dt, and x covers 2 units per segment
+        indexes, x = self.get_segments(name, ephem_dates[inside])
+        derivatives = chebyshev.chebder(self.coefficients[name][indexes], axis=2)
+        velocities[:, inside] = self.evaluate(derivatives, x) * 2 / segment_days
+
+        for i in np.flatnonzero(~inside):
+            before = get_geocentric_xyz(body_class, ephem_dates[i] - ephem.hour)
+            after = get_geocentric_xyz(body_class, ephem_dates[i] + ephem.hour)
+            velocities[:, i] = (np.array(after) - np.array(before)) / \
+                (2 * ephem.hour)
+
+        return velocities
+
+    def save(self, filepath):
+        """Save the ephemeris to a compressed numpy (.npz) file."""
+
+        np.savez_compressed(filepath, start=self.start, end=self.end,
+                            **self.coefficients)
+
+
+def fit_ephemeris(start_year, end_year, body_classes=BODY_CLASSES):
+    """Return a ChebyshevEphemeris covering start_year through end_year."""
+
+    start = float(ephem.Date(date(start_year, 1, 1)))
+    end = float(ephem.Date(date(end_year + 1, 1, 1)))
+
+    coefficients = {}
+
+    for body_class in body_classes:
+        name = body_class.__name__
+        segment_days = SEGMENT_DAYS.get(name, DEFAULT_SEGMENT_DAYS)
+        num_segments = int(np.ceil((end - start) / segment_days))
+
+        coefficients[name] = np.array([
+            fit_segment(body_class, start + i * segment_days, segment_days)
+            for i in range(num_segments)])
+
+    return ChebyshevEphemeris(start, end, coefficients)
+
+
+def load_ephemeris(filepath):
+    """Return the ChebyshevEphemeris saved in the file at filepath."""
+
+    with np.load(filepath) as data:
+        coefficients = dict((name, data[name]) for name in data.files
+                            if name not in ('start', 'end'))
+
+        return ChebyshevEphemeris(data['start'], data['end'], coefficients)
+
+
+def get_ephemeris(datadir=DATADIR):
+    """Return the ephemeris, loading it the first time it's needed.
+
+    Returns None if there's no ephemeris file; callers should use pyEphem.
+    """
+
+    global EPHEMERIS
+
+    filepath = os.path.join(datadir, EPHEMERIS_FILENAME)
+
+    if EPHEMERIS is None and os.path.exists(filepath):
+        EPHEMERIS = load_ephemeris(filepath)
+
+    return EPHEMERIS
+
+
+if __name__ == '__main__':
+
+    start_year, end_year = int(sys.argv[1]), int(sys.argv[2])
+
+    print('fitting {} through {}...'.format(start_year, end_year))
+    ephemeris = fit_ephemeris(start_year, end_year)
+
+    filepath = os.path.join(DATADIR, EPHEMERIS_FILENAME)
+    ephemeris.save(filepath)
+    print('saved {}'.format(filepath))
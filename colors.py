@@ -64,4 +64,12 @@ PLANET_COLORS_BY_NAME = {
     'Neptune': '#f8f8ff',
     'Sun': '#f0e68c',
     'Moon': '#f5f5f5'
-}
\ No newline at end of file
+}
+
+
+MINOR_BODY_COLORS = {
+    'asteroid': '#e0e0d0',
+    'comet': '#d8f0ff'
+}
+
+SATELLITE_COLOR = '#ffffff'
@@ -0,0 +1,211 @@
+"""Find conjunctions: when two of the moon and planets come close in the sky.
+
+Stepping pyEphem minute by minute through years of dates would take hours.
+Instead, for a date range:
+
+* every body's geocentric position is sampled once per SAMPLE_DAYS (from the
+  Chebyshev ephemeris, if there is one; see chebyshev.py), and the
+  separation of each pair worked out at every sample at once with numpy
+* each sample where a pair's separation stops shrinking and starts growing
+  brackets a closest approach. A parabola through the squared separations at
+  the three samples estimates how close the pair gets; brackets whose
+  estimate isn't within PRUNE_MARGIN of the separation asked for are dropped.
+* the moment of closest approach in each bracket is where the separation's
+  rate of change crosses zero: found by bisection, for every bracket at once
+
+Separations are between apparent geocentric positions, in degrees; times of
+closest approach are good to a few seconds.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from itertools import combinations
+import numpy as np
+import ephem
+
+from chebyshev import get_ephemeris, get_geocentric_xyz
+from kdtree import chord_to_angle
+from skies import PLANETS
+
+# bodies to search (the sun is left out: nothing near it can be seen)
+BODY_CLASSES = [ephem.Moon] + PLANETS
+
+# days between samples. The moon goes round the sky in a month, so the
+# separation from it is smooth over a day.
+SAMPLE_DAYS = 1
+
+# bisection steps refining each closest approach: the bracket is two samples
+# wide, and each step halves it
+REFINE_STEPS = 16
+
+# how far off (degrees) the parabola's closest approach can be from the real
+# one. The moon's curving path makes it worst for the moon: off by up to 1.3
+# degrees over 2017-2026 (every other pair is within 0.1).
+PRUNE_MARGIN = 2
+
+# most days to search (a little over ten years)
+MAX_SEARCH_DAYS = 3660
+
+# half the time between the positions used for a separation's rate of change
+RATE_STEP = ephem.minute / 2
+
+
+def get_positions(body_class, ephem_dates):
+    """Return 3 x N array of the body's geocentric xyz (AU) at ephem_dates.
+
+    Positions come from the Chebyshev ephemeris if there is one, and from
+    pyEphem if not.
+    """
+
+    ephem_dates = np.atleast_1d(np.asarray(ephem_dates, dtype=float))
+    ephemeris = get_ephemeris()
+
+    if ephemeris is not None:
+        return ephemeris.get_positions(body_class, ephem_dates)
+
+    return np.array([get_geocentric_xyz(body_class, ephem_date)
+                     for ephem_date in ephem_dates]).reshape(-1, 3).T
+
+
+def get_unit_vectors(body_class, ephem_dates):
+    """Return 3 x N array of the body's geocentric directions at ephem_dates.
+
+    See get_positions.
+    """
+
+    positions = get_positions(body_class, ephem_dates)
+
+    return positions / np.linalg.norm(positions, axis=0)
+
+
+def get_separations(vectors1, vectors2):
+    """Return array of angles (degrees) between two 3 x N arrays of unit vectors."""
+
+    return chord_to_angle(np.linalg.norm(vectors1 - vectors2, axis=0))
+
+
+def get_separation_rates(body_class1, body_class2, ephem_dates):
+    """Return array of the rate of change of the bodies' separation.
+
+    (In degrees per RATE_STEP days: only the sign matters for bisection.)
+    """
+
+    before = ephem_dates - RATE_STEP
+    after = ephem_dates + RATE_STEP
+
+    return get_separations(get_unit_vectors(body_class1, after),
+                           get_unit_vectors(body_class2, after)) - \
+        get_separations(get_unit_vectors(body_class1, before),
+                        get_unit_vectors(body_class2, before))
+
+
+def estimate_closest(separations, middles):
+    """Return array of estimated closest approaches (degrees) around samples.
+
+    middles are indexes into separations of samples closer than both
+    neighbors. For bodies moving in straight lines at steady speeds, the
+    squared separation is a parabola in time; the estimate is its minimum.
+    """
+
+    before = separations[middles - 1] ** 2
+    middle = separations[middles] ** 2
+    after = separations[middles + 1] ** 2
+
+    curvatures = (before + after) / 2 - middle
+    slopes = (after - before) / 2
+
+    return np.sqrt(np.maximum(middle - slopes ** 2 / (4 * curvatures), 0))
+
+
+def refine_approaches(body_class1, body_class2, starts, ends):
+    """Return tuple of arrays (dates, separations) of closest approaches.
+
+    starts and ends are arrays of ephem dates bracketing each approach: the
+    separation is shrinking at the start and growing at the end.
+    """
+
+    starts = np.array(starts, dtype=float)
+    ends = np.array(ends, dtype=float)
+
+    for _ in range(REFINE_STEPS):
+        middles = (starts + ends) / 2
+        growing = get_separation_rates(body_class1, body_class2, middles) > 0
+
+        ends = np.where(growing, middles, ends)
+        starts = np.where(growing, starts, middles)
+
+    dates = (starts + ends) / 2
+    separations = get_separations(get_unit_vectors(body_class1, dates),
+                                  get_unit_vectors(body_class2, dates))
+
+    return dates, separations
+
+
+def find_conjunctions(start, end, max_separation=1, body_classes=BODY_CLASSES):
+    """Return list of close approaches between pairs of bodies, soonest first.
+
+    * start and end are the date range (ephem dates, or anything ephem.Date
+      takes); end is capped at MAX_SEARCH_DAYS after start
+    * approaches closer than max_separation degrees are returned
+    * body_classes are the bodies to pair up (all of BODY_CLASSES by default)
+
+    Each approach is a dict:
+
+    {'bodies': ('Moon', 'Venus'),   # in body_classes order
+     'date': ephem date of closest approach,
+     'separation': 0.42}            # degrees, at closest approach
+    """
+
+    start = float(ephem.Date(start))
+    end = min(float(ephem.Date(end)), start + MAX_SEARCH_DAYS)
+
+    # a sample either side of the range, to bracket approaches at its ends
+    sample_dates = np.arange(start - SAMPLE_DAYS, end + 2 * SAMPLE_DAYS,
+                             SAMPLE_DAYS)
+    vectors = dict((body_class, get_unit_vectors(body_class, sample_dates))
+                   for body_class in body_classes)
+
+    approaches = []
+
+    for body_class1, body_class2 in combinations(body_classes, 2):
+        separations = get_separations(vectors[body_class1], vectors[body_class2])
+
+        # samples closer than both neighbors
+        middles = np.flatnonzero((separations[1:-1] <= separations[:-2]) &
+                                 (separations[1:-1] < separations[2:])) + 1
+
+        middles = middles[estimate_closest(separations, middles) <
+                          max_separation + PRUNE_MARGIN]
+
+        if not len(middles):
+            continue
+
+        dates, min_separations = refine_approaches(
+            body_class1, body_class2, sample_dates[middles - 1],
+            sample_dates[middles + 1])
+
+        for approach_date, separation in zip(dates, min_separations):
+            if separation < max_separation and start <= approach_date <= end:
+                approaches.append({'bodies': (body_class1.__name__,
+                                              body_class2.__name__),
+                                   'date': ephem.Date(approach_date),
+                                   'separation': float(separation)})
+
+    approaches.sort(key=lambda approach: approach['date'])
+
+    return approaches
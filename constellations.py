@@ -0,0 +1,387 @@
+"""Find the constellation for any point in the sky, from the boundary table.
+
+The constellation boundaries (Delporte's, as seeded into the BoundVertex and
+ConstBoundVertex tables) are drawn for the equinox of 1875, and every edge
+runs along a meridian (constant ra) or a parallel (constant dec). So the sky
+splits into bands between the declinations of the boundary vertices, and
+within each band the constellation only changes at a fixed list of ras.
+
+ConstellationLocator keeps every band's list of ras in one sorted array, so a
+lookup is two binary searches (numpy's searchsorted), for one point or for
+arrays of points at once. Points are precessed to 1875 first.
+
+Serpens is two separate areas in the boundary table: points in them are
+found as Serpens Caput (SE1) or Serpens Cauda (SE2), as with pyEphem.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import csv
+import math
+from bisect import bisect_right
+import numpy as np
+import ephem
+
+from coords import get_unit_vectors
+
+# to be able to distinguish between data dir for testing
+DATADIR = 'seed_data'
+
+# same files as seed.py loads into the db
+BOUNDARIES_FILENAME = 'constellation_boundaries.txt'
+NAMES_FILENAME = 'const_abbrevs.csv'
+
+# equinox of the boundaries. (pyEphem uses the start of 1875; B1875.0 is a few
+# hours earlier, which makes no difference.)
+BOUNDARY_EPOCH = ephem.Date('1875/1/1')
+
+# J2000.0, as an ephem date
+J2000 = float(ephem.J2000)
+
+# spacing (in degrees, at the equator) of the grid of points used to find the
+# constellations' centroids
+CENTROID_GRID_STEP = 1
+
+# the locator, loaded on first use (see get_locator)
+LOCATOR = None
+
+
+def get_precession_angles(from_epoch, to_epoch):
+    """Return tuple of precession angles (zeta, z, theta) in radians.
+
+    Epochs are ephem dates. These are the IAU 1976 angles (Lieske), as in
+    Meeus, Astronomical Algorithms, ch. 21.
+    """
+
+    # julian centuries from J2000 to the starting epoch, and from there on
+    big_t = (float(from_epoch) - J2000) / 36525
+    t = (float(to_epoch) - float(from_epoch)) / 36525
+
+    rate = 2306.2181 + 1.39656 * big_t - 0.000139 * big_t ** 2
+    zeta = rate * t + (0.30188 - 0.000344 * big_t) * t ** 2 + 0.017998 * t ** 3
+    z = rate * t + (1.09468 + 0.000066 * big_t) * t ** 2 + 0.018203 * t ** 3
+    theta = (2004.3109 - 0.85330 * big_t - 0.000217 * big_t ** 2) * t - \
+        (0.42665 + 0.000217 * big_t) * t ** 2 - 0.041833 * t ** 3
+
+    return tuple(math.radians(angle / 3600) for angle in (zeta, z, theta))
+
+
+def precess(ra, dec, from_epoch, to_epoch):
+    """Return tuple of arrays (ra, dec) precessed from one epoch to another.
+
+    ra and dec are in degrees (scalars or arrays); epochs are ephem dates.
+    """
+
+    zeta, z, theta = get_precession_angles(from_epoch, to_epoch)
+
+    ra = np.radians(np.asarray(ra, dtype=float)) + zeta
+    dec = np.radians(np.asarray(dec, dtype=float))
+
+    a = np.cos(dec) * np.sin(ra)
+    b = np.cos(theta) * np.cos(dec) * np.cos(ra) - math.sin(theta) * np.sin(dec)
+    c = math.sin(theta) * np.cos(dec) * np.cos(ra) + math.cos(theta) * np.sin(dec)
+
+    new_ra = np.degrees(np.arctan2(a, b) + z) % 360
+    new_dec = np.degrees(np.arcsin(np.clip(c, -1, 1)))
+
+    return new_ra, new_dec
+
+
+def get_precession_matrix(from_epoch, to_epoch):
+    """Return the 3x3 rotation precessing unit vectors from one epoch to another.
+
+    The same precession as precess, for vectors (see coords.get_unit_vectors).
+    """
+
+    zeta, z, theta = get_precession_angles(from_epoch, to_epoch)
+
+    return get_z_rotation(z).dot(np.array([[math.cos(theta), 0, -math.sin(theta)],
+                                           [0, 1, 0],
+                                           [math.sin(theta), 0, math.cos(theta)]])
+                                 ).dot(get_z_rotation(zeta))
+
+
+def get_z_rotation(angle):
+    """Return the 3x3 rotation of vectors by angle (radians) about the z axis."""
+
+    return np.array([[math.cos(angle), -math.sin(angle), 0],
+                     [math.sin(angle), math.cos(angle), 0],
+                     [0, 0, 1]])
+
+
+def precess_one(ra, dec, from_epoch, to_epoch):
+    """Return tuple of (ra, dec) for one point; same as precess.
+
+    In plain math, as numpy has too much overhead for one point at a time.
+    """
+
+    zeta, z, theta = get_precession_angles(from_epoch, to_epoch)
+
+    ra = math.radians(ra) + zeta
+    dec = math.radians(dec)
+
+    a = math.cos(dec) * math.sin(ra)
+    b = math.cos(theta) * math.cos(dec) * math.cos(ra) - \
+        math.sin(theta) * math.sin(dec)
+    c = math.sin(theta) * math.cos(dec) * math.cos(ra) + \
+        math.cos(theta) * math.sin(dec)
+
+    return (math.degrees(math.atan2(a, b) + z) % 360,
+            math.degrees(math.asin(max(-1, min(1, c)))))
+
+
+def get_winding(vertices):
+    """Return tuple of (unwrapped ras, total change in ra) around a boundary.
+
+    Each edge is taken the short way around (boundaries don't have edges
+    longer than 12 hours). The total change is 0 for most boundaries, and
+    +/- 360 for a boundary around a pole (rounded, to drop floating point
+    error).
+    """
+
+    ras = [vertex[0] for vertex in vertices]
+    unwrapped = [ras[0]]
+
+    for i in range(1, len(ras) + 1):
+        step = (ras[i % len(ras)] - ras[i - 1] + 180) % 360 - 180
+        unwrapped.append(unwrapped[-1] + step)
+
+    return unwrapped[:-1], round((unwrapped[-1] - unwrapped[0]) / 360) * 360
+
+
+def is_counterclockwise(vertices):
+    """Return True if the boundary runs counterclockwise on an ra / dec chart.
+
+    (That is, with ra increasing to the right and dec increasing up; the
+    inside of the boundary is on the left of each edge.) A boundary around a
+    pole is closed along the pole.
+    """
+
+    ras, total = get_winding(vertices)
+    points = list(zip(ras, [vertex[1] for vertex in vertices]))
+
+    if total:
+        pole = 90 if points[0][1] > 0 else -90
+        points.extend([(ras[0] + total, pole), (ras[0], pole)])
+
+    area = 0
+    for (x1, y1), (x2, y2) in zip(points, points[1:] + points[:1]):
+        area += x1 * y2 - x2 * y1
+
+    return area > 0
+
+
+class ConstellationLocator(object):
+    """Index of the constellation boundaries, for point lookups.
+
+    * boundaries is a dict of lists of (ra, dec) vertices in degrees, at
+      BOUNDARY_EPOCH, keyed by constellation code
+    * names is a dict of constellation names, keyed by code
+
+    Attributes:
+    * band_decs: array of the declinations at the bottom of each band
+    * keys: sorted array of band index * 360 + ra, for each ra in each band
+      where the constellation changes (and ra 0 in each band)
+    * codes: array of the constellation code east of each key
+    * centroids: see get_centroids (found on first use)
+    """
+
+    def __init__(self, boundaries, names):
+        """Build the index from the boundaries."""
+
+        self.names = names
+
+        decs = set([-90.0, 90.0])
+        for vertices in boundaries.values():
+            decs.update(dec for _, dec in vertices)
+        self.band_decs = np.array(sorted(decs)[:-1])
+
+        # the constellations around the poles, for bands with no edges
+        caps = {}
+
+        # (band index, ra, code) wherever the constellation to the east starts
+        cuts = []
+
+        for code, vertices in boundaries.items():
+            if get_winding(vertices)[1]:
+                caps[vertices[0][1] > 0] = code
+
+            counterclockwise = is_counterclockwise(vertices)
+
+            for (ra1, dec1), (ra2, dec2) in zip(vertices, vertices[1:] + vertices[:1]):
+                if dec1 == dec2:
+                    continue
+
+                if ra1 != ra2:
+                    raise ValueError('{} has an edge off the meridians and parallels'
+                                     .format(code))
+
+                # the inside is on the left of the edge: to the east if it's
+                # headed south on a counterclockwise boundary
+                if (dec2 < dec1) != counterclockwise:
+                    continue
+
+                first_band = np.searchsorted(self.band_decs, min(dec1, dec2))
+                last_band = np.searchsorted(self.band_decs, max(dec1, dec2))
+                for band in range(first_band, last_band):
+                    cuts.append((band, ra1 % 360, code))
+
+        cuts.sort()
+
+        keys = []
+        codes = []
+
+        for band, band_dec in enumerate(self.band_decs):
+            band_cuts = [(ra, code) for b, ra, code in cuts if b == band]
+
+            # ra 0 is in the constellation east of the band's last cut
+            if not band_cuts:
+                start_code = caps[band_dec > 0]
+            else:
+                start_code = band_cuts[-1][1]
+
+            if not band_cuts or band_cuts[0][0] > 0:
+                band_cuts.insert(0, (0, start_code))
+
+            for ra, code in band_cuts:
+                keys.append(band * 360 + ra)
+                codes.append(code)
+
+        self.keys = np.array(keys)
+        self.codes = np.array(codes)
+
+        # lists too, for bisect in single point lookups
+        self.band_dec_list = list(self.band_decs)
+        self.key_list = keys
+        self.code_list = codes
+
+        self.centroids = None
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< ConstellationLocator bands={} cuts={} >'.format(
+            len(self.band_decs), len(self.keys))
+
+    def find(self, ra, dec, epoch=ephem.J2000):
+        """Return array of constellation codes for arrays of points.
+
+        ra and dec are arrays in degrees, for the equinox of epoch (an ephem
+        date).
+        """
+
+        ra, dec = precess(ra, dec, epoch, BOUNDARY_EPOCH)
+
+        bands = np.clip(np.searchsorted(self.band_decs, dec, side='right') - 1,
+                        0, len(self.band_decs) - 1)
+        indexes = np.searchsorted(self.keys, bands * 360 + ra, side='right') - 1
+
+        return self.codes[indexes]
+
+    def find_one(self, ra, dec, epoch=ephem.J2000):
+        """Return the constellation code for one point; same as find."""
+
+        ra, dec = precess_one(ra, dec, epoch, BOUNDARY_EPOCH)
+
+        band = min(max(bisect_right(self.band_dec_list, dec) - 1, 0),
+                   len(self.band_dec_list) - 1)
+
+        return self.code_list[bisect_right(self.key_list, band * 360 + ra) - 1]
+
+    def get_name(self, code):
+        """Return the name of the constellation with the code."""
+
+        return self.names[code]
+
+    def get_centroids(self):
+        """Return dict of (ra, dec) centroids (J2000 degrees), keyed by code.
+
+        A centroid is the direction of the average unit vector over the
+        constellation's area. The area is sampled by an equal-area grid of
+        points (evenly spaced in ra and in sine of dec), each looked up with
+        find; Serpens has a centroid for each of its parts.
+        """
+
+        if self.centroids is None:
+            num_rows = int(round(180 / CENTROID_GRID_STEP))
+            num_columns = int(round(360 / CENTROID_GRID_STEP))
+
+            sin_decs = (np.arange(num_rows) + 0.5) / num_rows * 2 - 1
+            ras = (np.arange(num_columns) + 0.5) * CENTROID_GRID_STEP
+            ra_grid, dec_grid = np.meshgrid(ras, np.degrees(np.arcsin(sin_decs)))
+
+            codes = self.find(ra_grid.ravel(), dec_grid.ravel())
+            vectors = get_unit_vectors(ra_grid.ravel(), dec_grid.ravel())
+
+            self.centroids = {}
+            for code in np.unique(codes):
+                x, y, z = vectors[:, codes == code].sum(axis=1)
+                self.centroids[str(code)] = (
+                    math.degrees(math.atan2(y, x)) % 360,
+                    math.degrees(math.atan2(z, math.hypot(x, y))))
+
+        return self.centroids
+
+    def get_constellation(self, ra, dec, epoch=ephem.J2000):
+        """Return tuple of (code, name) for one point (as ephem.constellation).
+
+        ra and dec are in degrees, for the equinox of epoch (an ephem date).
+        """
+
+        code = self.find_one(ra, dec, epoch)
+
+        return code, self.get_name(code)
+
+
+def load_boundaries(filepath):
+    """Return dict of lists of (ra, dec) boundary vertices from the file.
+
+    Keyed by constellation code; ra and dec are in degrees. (The file has ra
+    in hours, not inverted for d3.)
+    """
+
+    boundaries = {}
+
+    with open(filepath) as boundfile:
+        for boundline in boundfile:
+            ra_in_hrs, dec, const = boundline.strip().split()
+            boundaries.setdefault(const, []).append((float(ra_in_hrs) * 15,
+                                                     float(dec)))
+
+    return boundaries
+
+
+def load_names(filepath):
+    """Return dict of constellation names from the file, keyed by code."""
+
+    with open(filepath) as csvfile:
+        return dict((row['Abbrev'], row['Name']) for row in csv.DictReader(csvfile))
+
+
+def get_locator(datadir=DATADIR):
+    """Return the locator, building it the first time it's needed."""
+
+    global LOCATOR
+
+    if LOCATOR is None:
+        LOCATOR = ConstellationLocator(
+            load_boundaries(os.path.join(datadir, BOUNDARIES_FILENAME)),
+            load_names(os.path.join(datadir, NAMES_FILENAME)))
+
+    return LOCATOR
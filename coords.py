@@ -0,0 +1,218 @@
+"""Vectorized equatorial to horizontal coordinates for whole star catalogs.
+
+Transforming one star at a time (the way pyEphem does) is too slow to do for
+every star in the catalog on every request. Instead, each star's position is
+stored once as a unit vector, and a single 3x3 rotation (which depends only on
+the observer's latitude and local sidereal time) turns every vector into
+east / north / up components at once.
+
+Angles going in and coming out are in degrees. Right ascensions are *true*
+right ascensions, not the inverted ones stored in the db for d3. Azimuth is
+measured from north through east, as in pyEphem. No refraction is applied, so
+altitudes match pyEphem's with the observer's pressure set to 0.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+from kdtree import KDTree, angle_to_chord, chord_to_angle
+
+
+def get_unit_vectors(ra, dec):
+    """Return a 3 x N array of unit vectors for arrays of ra and dec (degrees).
+
+    x points to ra 0h on the equator, y to ra 6h and z to the north pole.
+    """
+
+    ra_rad = np.radians(np.asarray(ra, dtype=float))
+    dec_rad = np.radians(np.asarray(dec, dtype=float))
+    cos_dec = np.cos(dec_rad)
+
+    return np.array([cos_dec * np.cos(ra_rad),
+                     cos_dec * np.sin(ra_rad),
+                     np.sin(dec_rad)])
+
+
+def get_horizon_matrix(lat, lst):
+    """Return the 3x3 rotation from equatorial vectors to east / north / up.
+
+    lat is the observer's latitude and lst the local sidereal time, both in
+    degrees.
+    """
+
+    phi = np.radians(lat)
+    theta = np.radians(lst)
+
+    sin_phi, cos_phi = np.sin(phi), np.cos(phi)
+    sin_theta, cos_theta = np.sin(theta), np.cos(theta)
+
+    return np.array([[-sin_theta, cos_theta, 0.0],
+                     [-sin_phi * cos_theta, -sin_phi * sin_theta, cos_phi],
+                     [cos_phi * cos_theta, cos_phi * sin_theta, sin_phi]])
+
+
+def get_hour_angle(ra, lst):
+    """Return hour angle(s) in degrees, from -180 to 180 (positive = west)."""
+
+    hour_angle = lst - np.asarray(ra, dtype=float)
+
+    # lst and ra are both 0 - 360, so one step of wrapping is enough
+    hour_angle -= 360 * (hour_angle >= 180)
+    hour_angle += 360 * (hour_angle < -180)
+
+    return hour_angle
+
+
+def get_azimuth(east, north):
+    """Return azimuth(s) in degrees from 0 to 360, from east / north components.
+
+    Same as arctan2(east, north), but several times faster for big arrays:
+    numpy's arctan is vectorized with SIMD instructions and its arctan2 isn't.
+    """
+
+    east = np.asarray(east, dtype=float)
+    north = np.asarray(north, dtype=float)
+
+    # north == 0 gives +/- infinity, which arctan handles (due east or west).
+    # Straight up, where both are 0, azimuth is undefined; call it north.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        az = np.degrees(np.arctan(east / north))
+    az = np.nan_to_num(az, copy=False)
+
+    # arctan only gives -90 to 90: turn around for the southern half, then wrap
+    az += 180 * (north < 0)
+    az += 360 * (az < 0)
+
+    return az
+
+
+def equatorial_to_horizontal(ra, dec, lat, lst):
+    """Return tuple of (alt, az) in degrees for ra and dec (scalars or arrays).
+
+    Handy for a few positions; for a whole catalog, use an EquatorialCatalog so
+    the unit vectors are only computed once.
+    """
+
+    east, north, up = get_horizon_matrix(lat, lst).dot(get_unit_vectors(ra, dec))
+
+    alt = np.degrees(np.arcsin(np.clip(up, -1, 1)))
+
+    return alt, get_azimuth(east, north)
+
+
+class EquatorialCatalog(object):
+    """Fixed ra / dec positions, ready for fast horizontal transforms.
+
+    * ra and dec are sequences of true right ascension and declination, in
+      degrees
+    * ids, if given, is a parallel sequence identifying each position (for
+      example, star ids), kept as an array for indexing with masks
+    * magnitudes, if given, is a parallel sequence of magnitudes (for
+      atmosphere.get_apparent_sky)
+    * epoch, if given, is the ephem date of the positions' equator and
+      equinox (such as J2000 for catalog stars); they need moving to the date
+      before a horizontal transform (see StarField.get_horizontal). None means
+      they're already apparent positions of date (such as planets').
+    """
+
+    def __init__(self, ra, dec, ids=None, magnitudes=None, epoch=None):
+        """Store the positions and their unit vectors."""
+
+        self.ra = np.asarray(ra, dtype=float)
+        self.dec = np.asarray(dec, dtype=float)
+        self.ids = np.asarray(ids) if ids is not None else None
+        self.magnitudes = np.asarray(magnitudes, dtype=float) \
+            if magnitudes is not None else None
+        self.epoch = epoch
+
+        self.vectors = get_unit_vectors(self.ra, self.dec)
+
+        # KD-tree of the vectors, built on the first nearest-position search
+        self.tree = None
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< EquatorialCatalog size={} >'.format(len(self))
+
+    def __len__(self):
+        """Return the number of positions in the catalog."""
+
+        return len(self.ra)
+
+    def get_up(self, lat, lst, vectors=None):
+        """Return array of the up components (sine of altitude) of each vector.
+
+        vectors are as for get_horizontal.
+        """
+
+        up_row = get_horizon_matrix(lat, lst)[2]
+
+        return up_row.dot(self.vectors if vectors is None else vectors)
+
+    def get_above_horizon(self, lat, lst, min_alt=0, vectors=None):
+        """Return boolean mask of positions above min_alt (degrees).
+
+        Cheaper than get_horizontal: it only needs one row of the rotation, and
+        compares sines instead of taking arcsines.
+        """
+
+        return self.get_up(lat, lst, vectors) > np.sin(np.radians(min_alt))
+
+    def get_horizontal(self, lat, lst, vectors=None):
+        """Return dict of arrays for every position in the catalog.
+
+        vectors, if given, are the catalog's positions moved to the date (see
+        epochs.get_apparent_vectors), to use instead of its own.
+
+        Keys:
+            'alt': altitude, in degrees
+            'az': azimuth (north through east), in degrees
+            'hourAngle': hour angle, in degrees from -180 to 180
+            'aboveHorizon': boolean mask of positions with alt > 0
+        """
+
+        if vectors is None:
+            vectors = self.vectors
+            ra = self.ra
+        else:
+            ra = np.degrees(np.arctan2(vectors[1], vectors[0])) % 360
+
+        east, north, up = get_horizon_matrix(lat, lst).dot(vectors)
+
+        return {'alt': np.degrees(np.arcsin(np.clip(up, -1, 1))),
+                'az': get_azimuth(east, north),
+                'hourAngle': get_hour_angle(ra, lst),
+                'aboveHorizon': up > 0}
+
+    def get_nearest(self, ra, dec, k=1, radius=180):
+        """Return tuple of arrays (indexes, separations) of the nearest positions.
+
+        Finds up to k catalog positions within radius degrees of ra / dec (true
+        right ascension and declination, in degrees), nearest first.
+        Separations are in degrees.
+        """
+
+        if self.tree is None:
+            self.tree = KDTree(self.vectors.T)
+
+        point = get_unit_vectors(ra, dec)
+        distances, indexes = self.tree.query(point, k, angle_to_chord(radius))
+
+        return indexes, chord_to_angle(distances)
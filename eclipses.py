@@ -0,0 +1,482 @@
+"""Solar and lunar eclipses, and how they look from a place.
+
+Eclipses only happen at new moon (solar) or full moon (lunar), so rather than
+stepping through time, the search takes its candidates from the lunation
+tables (see lunations.py):
+
+* at each new and full moon in the range, the moon's ecliptic latitude rules
+  out the ones where it passes too far north or south of the sun (or of the
+  earth's shadow) for an eclipse: about four in five of them
+* for the rest, the separation of the moon from the sun (as seen from the
+  place, for solar eclipses) or from the middle of the earth's shadow (for
+  lunar ones) is sampled every SAMPLE_MINUTES around the new or full moon
+* the closest sample is refined to the moment of maximum eclipse, and each
+  contact (where the separation crosses the sum or difference of the radii)
+  found by regula falsi between the maximum and the samples either side
+
+Lunar eclipses look the same from everywhere the moon is up, so their
+contacts are worked out once and shared by every place. Solar eclipses
+depend on where you are: unless asked for an exact place, they're worked out
+for the middle of the place's location cell (see riseset.get_cell), and
+cached by cell. Within a cell, contact times can differ from the place's own
+by up to about 20 seconds.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+from lunations import get_lunation_table, NEW_MOON, FULL_MOON
+from positions import EARTH_RADIUS_AU
+from riseset import get_cell, CELL_SIZE
+
+SOLAR = 'solar'
+LUNAR = 'lunar'
+
+# kinds of eclipse
+PARTIAL = 'partial'
+ANNULAR = 'annular'
+TOTAL = 'total'
+PENUMBRAL = 'penumbral'
+
+# farthest the moon can be from the ecliptic at new or full moon, in degrees,
+# for there to be an eclipse (about 1.6 degrees, for either kind; plus margin)
+ECLIPSE_LATITUDE_LIMIT = 1.7
+
+# the earth's atmosphere makes its shadow bigger: by Danjon's rule, as if the
+# moon's parallax were this much bigger (this agrees with published contact
+# times to a few seconds; Chauvenet's older 2 percent makes eclipses too long)
+PARALLAX_ENLARGEMENT = 1.01
+
+# how far either side of the new or full moon to look for contacts, in days
+# (no eclipse lasts more than about six hours)
+SEARCH_WINDOW = 4 * ephem.hour
+
+# minutes between samples of the separation
+SAMPLE_MINUTES = 30
+
+# most the separation can drop between the closest sample and the real
+# closest approach, in degrees (the moon moves about 0.6 degrees an hour
+# against the sun or the shadow)
+SAMPLE_MARGIN = 0.25
+
+# half the time between the separations used for their rate of change
+RATE_STEP = ephem.second
+
+# contacts and maxima are found to within this many days
+TIME_TOLERANCE = ephem.second
+
+# most regula falsi steps for one contact (it usually takes four or five)
+MAX_ROOT_STEPS = 30
+
+# most years to search
+MAX_SEARCH_YEARS = 100
+
+# lunar eclipse circumstances, keyed by ephem date of full moon (None for
+# full moons without an eclipse)
+LUNAR_CACHE = {}
+
+# eclipses seen from location cells, keyed by (ephem date of new or full
+# moon, cell); None when there's no eclipse there
+ECLIPSE_CACHE = {}
+
+# most eclipses to keep in ECLIPSE_CACHE; it's emptied when it gets bigger
+MAX_CACHED_ECLIPSES = 100000
+
+
+def get_lunar_geometry(ephem_date):
+    """Return the moon and the earth's shadow at ephem_date.
+
+    Returns tuple (separation, limits, radius): the separation of the moon
+    from the middle of the shadow; the separations at the penumbral, umbral
+    and total contacts, in that order; and the moon's radius. All are in
+    degrees.
+    """
+
+    moon = ephem.Moon(ephem_date)
+    sun = ephem.Sun(ephem_date)
+
+    parallaxes = \
+        PARALLAX_ENLARGEMENT * math.asin(EARTH_RADIUS_AU / moon.earth_distance) + \
+        math.asin(EARTH_RADIUS_AU / sun.earth_distance)
+
+    penumbra = parallaxes + sun.radius
+    umbra = parallaxes - sun.radius
+
+    separation = ephem.separation((moon.g_ra, moon.g_dec),
+                                  (sun.g_ra + math.pi, -sun.g_dec))
+
+    limits = [penumbra + moon.radius, umbra + moon.radius, umbra - moon.radius]
+
+    return (math.degrees(separation), [math.degrees(limit) for limit in limits],
+            math.degrees(moon.radius))
+
+
+def get_solar_geometry(observer):
+    """Return a function of ephem date for the moon and the sun seen by observer.
+
+    The function returns tuple (separation, limits, radius): the separation
+    of the moon from the sun; the separations at the partial and central
+    (total or annular) contacts; and the sun's radius. All are in degrees.
+    observer's date is changed by the function.
+    """
+
+    moon = ephem.Moon()
+    sun = ephem.Sun()
+
+    def get_geometry(ephem_date):
+        """Return (separation, limits, radius) at ephem_date."""
+
+        observer.date = ephem_date
+        moon.compute(observer)
+        sun.compute(observer)
+
+        limits = [moon.radius + sun.radius, abs(moon.radius - sun.radius)]
+
+        return (math.degrees(ephem.separation(moon, sun)),
+                [math.degrees(limit) for limit in limits],
+                math.degrees(sun.radius))
+
+    return get_geometry
+
+
+def find_root(function, start, end):
+    """Return ephem date between start and end where function crosses zero.
+
+    function(start) and function(end) must have opposite signs. Uses the
+    Illinois version of regula falsi, which for smooth functions like these
+    closes in faster than bisection.
+    """
+
+    start_value = function(start)
+    end_value = function(end)
+
+    date = start
+    side = 0
+
+    for _ in range(MAX_ROOT_STEPS):
+        previous = date
+        date = (start * end_value - end * start_value) / (end_value - start_value)
+        value = function(date)
+
+        if value * end_value > 0:
+            end, end_value = date, value
+            if side == -1:
+                start_value /= 2
+            side = -1
+        else:
+            start, start_value = date, value
+            if side == 1:
+                end_value /= 2
+            side = 1
+
+        if abs(date - previous) < TIME_TOLERANCE:
+            break
+
+    return date
+
+
+def find_contacts(get_geometry, center):
+    """Return the maximum and contacts of an eclipse near center.
+
+    center is an ephem date (such as a new or full moon); contacts are looked
+    for within SEARCH_WINDOW of it. get_geometry is a function of ephem date
+    returning (separation, limits, radius), as get_lunar_geometry does.
+    Returns None if there's no eclipse; otherwise a dict:
+
+    {'maximum': ephem date of the smallest separation,
+     'separation': the smallest separation (degrees),
+     'limits': the limits at maximum,
+     'radius': the eclipsed body's radius at maximum (degrees),
+     'contacts': list of (start, end) ephem dates, one pair for each limit
+        crossed, outermost first}
+    """
+
+    step = SAMPLE_MINUTES * ephem.minute
+    dates = [center - SEARCH_WINDOW + i * step
+             for i in range(int(round(2 * SEARCH_WINDOW / step)) + 1)]
+    samples = [get_geometry(ephem_date) for ephem_date in dates]
+
+    closest = min(range(len(dates)), key=lambda i: samples[i][0])
+    separation, limits, _ = samples[closest]
+
+    if separation - limits[0] > SAMPLE_MARGIN or \
+            closest in (0, len(dates) - 1):
+        return None
+
+    def get_rate(ephem_date):
+        """Return the rate of change of the separation (per 2 RATE_STEPs)."""
+
+        return get_geometry(ephem_date + RATE_STEP)[0] - \
+            get_geometry(ephem_date - RATE_STEP)[0]
+
+    maximum = find_root(get_rate, dates[closest - 1], dates[closest + 1])
+    separation, limits, radius = get_geometry(maximum)
+
+    contacts = []
+
+    for i, limit in enumerate(limits):
+        if separation >= limit:
+            break
+
+        def get_overlap(ephem_date):
+            """Return how far the separation is outside this limit."""
+
+            geometry = get_geometry(ephem_date)
+            return geometry[0] - geometry[1][i]
+
+        # the samples where the separation is last and next outside the limit
+        before = [date for date, sample in zip(dates, samples)
+                  if date < maximum and sample[0] > sample[1][i]]
+        after = [date for date, sample in zip(dates, samples)
+                 if date > maximum and sample[0] > sample[1][i]]
+
+        if not before or not after:
+            return None
+
+        contacts.append((ephem.Date(find_root(get_overlap, before[-1], maximum)),
+                         ephem.Date(find_root(get_overlap, maximum, after[0]))))
+
+    # close, but no eclipse
+    if not contacts:
+        return None
+
+    return {'maximum': ephem.Date(maximum),
+            'separation': separation,
+            'limits': limits,
+            'radius': radius,
+            'contacts': contacts}
+
+
+def get_lunar_contacts(full_moon):
+    """Return the (cached) contacts of the lunar eclipse at full_moon, or None.
+
+    See find_contacts for the format.
+    """
+
+    key = float(full_moon)
+
+    if key not in LUNAR_CACHE:
+        LUNAR_CACHE[key] = find_contacts(get_lunar_geometry, key)
+
+    return LUNAR_CACHE[key]
+
+
+def get_observer(lat, lng):
+    """Return a pyEphem observer at lat and lng (degrees), without refraction."""
+
+    observer = ephem.Observer()
+    observer.lat = str(lat)
+    observer.lon = str(lng)
+    observer.pressure = 0
+
+    return observer
+
+
+def get_altitudes(body, observer, dates):
+    """Return list of body's altitudes (degrees) from observer at dates."""
+
+    altitudes = []
+
+    for ephem_date in dates:
+        observer.date = ephem_date
+        body.compute(observer)
+        altitudes.append(math.degrees(body.alt))
+
+    return altitudes
+
+
+def make_eclipse(eclipse_type, circumstances, body, observer):
+    """Return an eclipse dict for the circumstances, or None if it can't be seen.
+
+    circumstances is from find_contacts; body is a pyEphem sun (solar) or
+    moon (lunar). The eclipse can be seen if body is above observer's horizon
+    at some time between the first and last contacts. See get_eclipses for
+    the format.
+    """
+
+    separation = circumstances['separation']
+    limits = circumstances['limits']
+    radius = circumstances['radius']
+    contacts = circumstances['contacts']
+
+    start, end = contacts[0]
+    maximum = circumstances['maximum']
+
+    if eclipse_type == SOLAR:
+        partial = contacts[0]
+        central = contacts[1] if len(contacts) > 1 else (None, None)
+        magnitude = (limits[0] - separation) / (2 * radius)
+
+        if central[0] is None:
+            kind = PARTIAL
+        elif limits[0] - radius > radius:
+            # the moon looks bigger than the sun
+            kind = TOTAL
+        else:
+            kind = ANNULAR
+
+    else:
+        partial = contacts[1] if len(contacts) > 1 else (None, None)
+        central = contacts[2] if len(contacts) > 2 else (None, None)
+
+        if partial[0] is None:
+            kind = PENUMBRAL
+            magnitude = (limits[0] - separation) / (2 * radius)
+        else:
+            kind = TOTAL if central[0] is not None else PARTIAL
+            magnitude = (limits[1] - separation) / (2 * radius)
+
+    # dates the body might rise or set between
+    step = SAMPLE_MINUTES * ephem.minute
+    dates = [start + i * step for i in range(int((end - start) / step) + 1)]
+    altitudes = get_altitudes(body, observer, dates + [end, maximum])
+
+    if max(altitudes) <= 0:
+        return None
+
+    return {'type': eclipse_type,
+            'kind': kind,
+            'start': start,
+            'partialStart': partial[0],
+            'centralStart': central[0],
+            'maximum': maximum,
+            'centralEnd': central[1],
+            'partialEnd': partial[1],
+            'end': end,
+            'magnitude': magnitude,
+            'altitude': altitudes[-1]}
+
+
+def get_syzygies(start, end):
+    """Return list of (eclipse type, ephem date) for new and full moons.
+
+    Only the new moons (SOLAR) and full moons (LUNAR) between start and end
+    with the moon close enough to the ecliptic for an eclipse are returned.
+    """
+
+    syzygies = []
+    table_start = start
+
+    while table_start < end:
+        table = get_lunation_table(table_start)
+
+        for phase, instant in table.get_phases_between(table_start,
+                                                       min(end, table.end)):
+            if phase not in (NEW_MOON, FULL_MOON):
+                continue
+
+            moon_lat = ephem.Ecliptic(ephem.Moon(instant)).lat
+            if abs(math.degrees(moon_lat)) < ECLIPSE_LATITUDE_LIMIT:
+                syzygies.append((SOLAR if phase == NEW_MOON else LUNAR, instant))
+
+        table_start = table.end
+
+    return syzygies
+
+
+def find_eclipse(eclipse_type, syzygy, lat, lng):
+    """Return eclipse dict for the eclipse at syzygy seen from lat / lng.
+
+    Returns None if there's no eclipse, or it can't be seen from there.
+    """
+
+    observer = get_observer(lat, lng)
+
+    if eclipse_type == SOLAR:
+        circumstances = find_contacts(get_solar_geometry(observer), syzygy)
+        body = ephem.Sun()
+    else:
+        circumstances = get_lunar_contacts(syzygy)
+        body = ephem.Moon()
+
+    if circumstances is None:
+        return None
+
+    return make_eclipse(eclipse_type, circumstances, body, observer)
+
+
+def get_cell_eclipse(eclipse_type, syzygy, lat, lng):
+    """Return the (cached) eclipse at syzygy from the middle of lat / lng's cell.
+
+    See find_eclipse.
+    """
+
+    cell = get_cell(lat, lng)
+    key = (float(syzygy), cell)
+
+    if key not in ECLIPSE_CACHE:
+        if len(ECLIPSE_CACHE) >= MAX_CACHED_ECLIPSES:
+            ECLIPSE_CACHE.clear()
+
+        ECLIPSE_CACHE[key] = find_eclipse(eclipse_type, syzygy,
+                                          (cell[0] + 0.5) * CELL_SIZE,
+                                          (cell[1] + 0.5) * CELL_SIZE)
+
+    return ECLIPSE_CACHE[key]
+
+
+def get_eclipses(lat, lng, start, end, exact=False):
+    """Return list of eclipses seen from lat / lng between start and end.
+
+    * lat and lng are in degrees
+    * start and end are ephem dates; end is capped at MAX_SEARCH_YEARS after
+      start
+    * exact, if True, works out solar eclipses for lat / lng itself, rather
+      than the middle of its location cell, and skips the cache
+
+    Eclipses are in order, and only ones with the sun (or moon) above the
+    horizon for some of the eclipse are returned. Example eclipse dict:
+
+    {'type': 'solar',               # or 'lunar'
+     'kind': 'total',               # or 'partial', 'annular', 'penumbral'
+     'start': ephem date of the first contact,
+     'partialStart': start of the partial phase (the umbral phase, for lunar
+        eclipses; None for penumbral ones),
+     'centralStart': start of totality or annularity (None if there isn't
+        any),
+     'maximum': ephem date of maximum eclipse,
+     'centralEnd': ...,
+     'partialEnd': ...,
+     'end': ephem date of the last contact,
+     'magnitude': 1.02,             # fraction of the sun's (or moon's)
+                                    # diameter covered at maximum (by the
+                                    # umbra, for partial and total lunar
+                                    # eclipses)
+     'altitude': 41.3}              # of the sun (or moon) at maximum, degrees
+    """
+
+    start = ephem.Date(start)
+    end = ephem.Date(min(end, start + MAX_SEARCH_YEARS * 365.25))
+
+    eclipses = []
+
+    # eclipses around the ends of the range have their syzygies outside it
+    for eclipse_type, syzygy in get_syzygies(start - SEARCH_WINDOW,
+                                             end + SEARCH_WINDOW):
+        if exact:
+            eclipse = find_eclipse(eclipse_type, syzygy, lat, lng)
+        else:
+            eclipse = get_cell_eclipse(eclipse_type, syzygy, lat, lng)
+
+        if eclipse and start <= eclipse['maximum'] <= end:
+            # a copy, so the cached eclipse isn't changed
+            eclipses.append(dict(eclipse))
+
+    return eclipses
@@ -0,0 +1,223 @@
+"""Moving star positions from the catalog's epoch to another, all at once.
+
+The catalog (and so the db) has star positions for J2000. Planets are
+computed for any date, so for skies far in the past or future the stars
+need moving too:
+
+* proper motion: each star's own drift across the sky, where the catalog
+  has it. It's applied as a straight-line motion of the star's direction
+  (fine for centuries; over many thousands of years, the change in a star's
+  distance would start to matter).
+* precession: the slow wobble of the earth's axis, which moves the equator
+  and equinox the positions are measured from (see
+  constellations.precess)
+
+Both are numpy operations on arrays of positions. Epochs are rounded to
+buckets of EPOCH_BUCKET_YEARS, so one set of moved positions serves every
+date in a bucket; dates within NEAR_EPOCH_YEARS of the catalog's epoch use
+the catalog's positions as they are.
+
+For alt / az, positions need to be where they appear at the instant, on the
+true equator of date (the one the apparent sidereal time is measured on):
+get_apparent_vectors adds nutation and annual aberration to precession, and
+agrees with pyEphem's positions for fixed stars to about an arcsecond.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+from constellations import precess, get_precession_matrix, get_z_rotation
+from coords import get_unit_vectors
+from sidereal_time import get_nutation_in_longitude, get_nutation_in_obliquity, \
+    get_mean_obliquity
+
+# the catalog's epoch (for both its equinox and its proper motions), and its
+# year
+CATALOG_EPOCH = ephem.J2000
+CATALOG_YEAR = 2000
+
+# days in a julian year
+DAYS_PER_YEAR = 365.25
+
+# years per epoch bucket. Precession moves stars about 50 arcseconds a year,
+# so positions in a bucket are off by at most about a hundredth of a degree.
+EPOCH_BUCKET_YEARS = 1
+
+# skies within this many years of the catalog's epoch use the catalog's
+# positions (stars have moved less than a third of a degree)
+NEAR_EPOCH_YEARS = 20
+
+# milliarcseconds in a degree (the catalog's proper motions are in mas/year)
+MAS_PER_DEGREE = 3600 * 1000
+
+# constant of aberration: how far the earth's motion shifts a star at most, in
+# arcsec
+ABERRATION_CONSTANT = 20.49552
+
+
+def get_epoch_bucket(year):
+    """Return the year of the epoch bucket for year, or None if it's near.
+
+    year may be fractional. Returns None if year is within NEAR_EPOCH_YEARS
+    of the catalog's, when the catalog's positions can be used as they are.
+    """
+
+    if abs(year - CATALOG_YEAR) <= NEAR_EPOCH_YEARS:
+        return None
+
+    return int(round(float(year) / EPOCH_BUCKET_YEARS)) * EPOCH_BUCKET_YEARS
+
+
+def get_bucket_epoch(bucket):
+    """Return the ephem date of an epoch bucket's year."""
+
+    return ephem.Date(CATALOG_EPOCH + (bucket - CATALOG_YEAR) * DAYS_PER_YEAR)
+
+
+def apply_proper_motion(ra, dec, pm_ra, pm_dec, years):
+    """Return tuple of arrays (ra, dec) after years of proper motion.
+
+    * ra and dec are arrays in degrees
+    * pm_ra and pm_dec are arrays of proper motions in milliarcseconds per
+      year (pm_ra is the motion on the sky, eastward: it already includes
+      the cos(dec) factor). nan (no proper motion in the catalog) counts as
+      none.
+
+    Each star's direction is moved in a straight line along the sky, then
+    normalized: there's no trouble near the poles, as there would be adding
+    to ra.
+    """
+
+    ra = np.asarray(ra, dtype=float)
+    dec = np.asarray(dec, dtype=float)
+
+    east_rate = np.radians(np.nan_to_num(np.asarray(pm_ra, dtype=float)) /
+                           MAS_PER_DEGREE)
+    north_rate = np.radians(np.nan_to_num(np.asarray(pm_dec, dtype=float)) /
+                            MAS_PER_DEGREE)
+
+    ra_rad = np.radians(ra)
+    dec_rad = np.radians(dec)
+
+    # unit vectors toward east and north at each star
+    east = np.array([-np.sin(ra_rad), np.cos(ra_rad), np.zeros(len(ra_rad))])
+    north = np.array([-np.sin(dec_rad) * np.cos(ra_rad),
+                      -np.sin(dec_rad) * np.sin(ra_rad),
+                      np.cos(dec_rad)])
+
+    x, y, z = get_unit_vectors(ra, dec) + \
+        (east * east_rate + north * north_rate) * years
+
+    return (np.degrees(np.arctan2(y, x)) % 360,
+            np.degrees(np.arctan2(z, np.hypot(x, y))))
+
+
+def move_to_epoch(ra, dec, pm_ra, pm_dec, bucket):
+    """Return tuple of arrays (ra, dec) of catalog positions at a bucket's epoch.
+
+    ra and dec are the catalog's positions in degrees (true ra, not inverted
+    for d3); pm_ra and pm_dec are as for apply_proper_motion. The positions
+    are for the equator and equinox of the epoch, as pyEphem's planet
+    positions for dates in it are.
+    """
+
+    ra, dec = apply_proper_motion(ra, dec, pm_ra, pm_dec, bucket - CATALOG_YEAR)
+
+    return precess(ra, dec, CATALOG_EPOCH, get_bucket_epoch(bucket))
+
+
+def get_x_rotation(angle):
+    """Return the 3x3 rotation of vectors by angle (radians) about the x axis."""
+
+    return np.array([[1, 0, 0],
+                     [0, math.cos(angle), -math.sin(angle)],
+                     [0, math.sin(angle), math.cos(angle)]])
+
+
+def get_nutation_matrix(ephem_date):
+    """Return the 3x3 rotation from the mean equator of date to the true one.
+
+    Vectors go to the ecliptic, have the nutation in longitude added, and come
+    back to the equator with the nutation in obliquity added.
+    """
+
+    obliquity = math.radians(float(get_mean_obliquity(ephem_date)))
+    longitude = math.radians(float(get_nutation_in_longitude(ephem_date)) / 3600)
+    true_obliquity = obliquity + \
+        math.radians(float(get_nutation_in_obliquity(ephem_date)) / 3600)
+
+    return get_x_rotation(true_obliquity).dot(get_z_rotation(longitude)).dot(
+        get_x_rotation(-obliquity))
+
+
+def get_aberration(ephem_date):
+    """Return the vector (3 items) of the earth's motion, for annual aberration.
+
+    It points where the earth is heading (90 degrees behind the sun on the
+    ecliptic), on the mean equator of date, and is as long as the constant of
+    aberration (in radians). Adding it to a unit vector, and normalizing,
+    moves the vector to where the star appears. (The earth's orbit is taken
+    as a circle, which leaves out less than half an arcsec.)
+    """
+
+    # the earth's heliocentric longitude is the sun's geocentric one + 180
+    sun_longitude = ephem.Sun(ephem.Date(ephem_date)).hlon - math.pi
+    obliquity = math.radians(float(get_mean_obliquity(ephem_date)))
+
+    return math.radians(ABERRATION_CONSTANT / 3600) * np.array(
+        [math.sin(sun_longitude),
+         -math.cos(sun_longitude) * math.cos(obliquity),
+         -math.cos(sun_longitude) * math.sin(obliquity)])
+
+
+def get_apparent_vectors(vectors, epoch, ephem_date):
+    """Return 3 x N array of unit vectors at their apparent places at ephem_date.
+
+    vectors are unit vectors (see coords.get_unit_vectors) on the mean
+    equator and equinox of epoch (an ephem date, such as CATALOG_EPOCH). They
+    are precessed to ephem_date, shifted by annual aberration, and moved to
+    the true equator of date by nutation. Proper motion isn't applied (see
+    move_to_epoch for that).
+    """
+
+    vectors = get_precession_matrix(epoch, ephem_date).dot(vectors)
+    vectors = vectors + get_aberration(ephem_date)[:, np.newaxis]
+    vectors = vectors / np.linalg.norm(vectors, axis=0)
+
+    return get_nutation_matrix(ephem_date).dot(vectors)
+
+
+def get_catalog_positions(ra, dec, epoch, ephem_date):
+    """Return tuple of arrays (ra, dec) of apparent places moved back to epoch.
+
+    The reverse of get_apparent_vectors: ra and dec (degrees) are apparent
+    positions at ephem_date, such as a planet's; the returned positions are on
+    the mean equator and equinox of epoch, where they can be compared with
+    catalog positions.
+    """
+
+    vectors = get_nutation_matrix(ephem_date).T.dot(get_unit_vectors(ra, dec))
+    vectors = vectors - get_aberration(ephem_date)[:, np.newaxis]
+    vectors = vectors / np.linalg.norm(vectors, axis=0)
+
+    x, y, z = get_precession_matrix(epoch, ephem_date).T.dot(vectors)
+
+    return np.degrees(np.arctan2(y, x)) % 360, np.degrees(np.arcsin(z))
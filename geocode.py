@@ -0,0 +1,335 @@
+"""Offline geocoding from a local gazetteer of cities.
+
+Data comes from the GeoNames cities files (see seed_data/sources.txt), which
+are tab-separated with one city per line.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import re
+import math
+import unicodedata
+import numpy as np
+
+# to be able to distinguish between data dir for testing
+DATADIR = 'seed_data'
+
+# GeoNames file with all cities of population 15000 or more
+GAZETTEER_FILENAME = 'cities15000.txt'
+
+# how many autocomplete suggestions each prefix keeps
+MAX_SUGGESTIONS = 10
+
+# size (in degrees) of the grid cells for reverse lookups
+CELL_SIZE = 1.0
+
+# rings of grid cells a reverse lookup searches before checking every place
+# instead (far from any city, or near the poles, where the grid's rings of
+# longitude cells don't narrow the search down)
+MAX_RINGS = 8
+
+# mean earth radius, in km
+EARTH_RADIUS = 6371.0
+
+# for squashing punctuation out of names
+NON_ALNUM_RE = re.compile(r'[^a-z0-9 ]+')
+
+# column indexes in the GeoNames file
+GN_NAME = 1
+GN_ASCIINAME = 2
+GN_LAT = 4
+GN_LNG = 5
+GN_COUNTRY = 8
+GN_ADMIN1 = 10
+GN_POPULATION = 14
+GN_TIMEZONE = 17
+
+# the gazetteer, loaded on first use (see get_gazetteer)
+GAZETTEER = None
+
+# the remote geocoder, constructed on first use (see get_remote_geocoder)
+REMOTE_GEOCODER = None
+
+
+def normalize_name(name):
+    """Return a lowercase, accent-free version of name for prefix matching.
+
+    For example, 'Reykjavík' becomes 'reykjavik' and 'St. John's' becomes
+    'st johns'
+    """
+
+    decomposed = unicodedata.normalize('NFKD', name)
+    ascii_name = decomposed.encode('ascii', 'ignore').decode('ascii')
+    squashed = NON_ALNUM_RE.sub('', ascii_name.lower())
+
+    return ' '.join(squashed.split())
+
+
+def get_distance(lat1, lng1, lat2, lng2):
+    """Return great circle distance in km between two lat/lngs (in degrees)."""
+
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lng2 - lng1)
+
+    hav = math.sin(dphi / 2) ** 2 + \
+        math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+
+    return 2 * EARTH_RADIUS * math.asin(min(1, math.sqrt(hav)))
+
+
+class TrieNode(object):
+    """One node of the autocomplete prefix tree.
+
+    top holds the indexes of the most populous places whose names start with
+    the prefix leading to this node, most populous first.
+    """
+
+    __slots__ = ['children', 'top']
+
+    def __init__(self):
+        """Initialize an empty node."""
+
+        self.children = {}
+        self.top = []
+
+
+class Gazetteer(object):
+    """Local index of cities for autocomplete and reverse geocoding."""
+
+    def __init__(self, filepath):
+        """Load the cities in the GeoNames file at filepath and index them."""
+
+        self.places = []
+        self.trie = TrieNode()
+        self.cells = {}
+
+        self.load_places(filepath)
+
+        # every place's lat / lng, in radians, for reverse lookups that check
+        # every place
+        self.lats = np.radians([place['lat'] for place in self.places])
+        self.lngs = np.radians([place['lng'] for place in self.places])
+
+        # insert most populous first, so each node's top list fills in order
+        by_population = sorted(range(len(self.places)),
+                               key=lambda i: -self.places[i]['population'])
+
+        for place_index in by_population:
+            self.index_place(place_index)
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< Gazetteer places={} >'.format(len(self.places))
+
+    def load_places(self, filepath):
+        """Read place dicts from the GeoNames file into self.places.
+
+        If there's no such file, there are no places: suggestions and reverse
+        lookups come back empty.
+        """
+
+        if not os.path.exists(filepath):
+            return
+
+        with open(filepath) as gnfile:
+            for line in gnfile:
+                tokens = line.rstrip('\n').split('\t')
+
+                # skip blank or malformed lines
+                if len(tokens) <= GN_TIMEZONE:
+                    continue
+
+                population = tokens[GN_POPULATION]
+
+                self.places.append({
+                    'name': tokens[GN_NAME],
+                    'asciiName': tokens[GN_ASCIINAME],
+                    'lat': float(tokens[GN_LAT]),
+                    'lng': float(tokens[GN_LNG]),
+                    'country': tokens[GN_COUNTRY],
+                    'admin1': tokens[GN_ADMIN1],
+                    'population': int(population) if population else 0,
+                    'timezone': tokens[GN_TIMEZONE]})
+
+    def get_cell(self, lat, lng):
+        """Return the reverse-lookup grid cell (a tuple) for the lat/lng."""
+
+        return (int(math.floor(lat / CELL_SIZE)),
+                int(math.floor((lng % 360) / CELL_SIZE)))
+
+    def index_place(self, place_index):
+        """Add the place to the prefix tree and the reverse-lookup grid."""
+
+        place = self.places[place_index]
+
+        # the same key may come from both the name and the ascii name
+        keys = set([normalize_name(place['name']),
+                    normalize_name(place['asciiName'])])
+
+        for key in keys:
+            node = self.trie
+
+            for char in key:
+                node = node.children.setdefault(char, TrieNode())
+                if len(node.top) < MAX_SUGGESTIONS and \
+                        place_index not in node.top:
+                    node.top.append(place_index)
+
+        cell = self.get_cell(place['lat'], place['lng'])
+        self.cells.setdefault(cell, []).append(place_index)
+
+    def autocomplete(self, prefix, limit=MAX_SUGGESTIONS):
+        """Return list of place dicts whose names start with prefix.
+
+        Places are ordered from most to least populous.
+        """
+
+        key = normalize_name(prefix)
+
+        # a trailing space means the word is finished ('san ' != 'santa')
+        if key and prefix[-1:].isspace():
+            key += ' '
+
+        node = self.trie
+
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return []
+
+        # an empty prefix matches everything; not a useful suggestion
+        if node is self.trie:
+            return []
+
+        return [self.places[i] for i in node.top[:limit]]
+
+    def reverse(self, lat, lng):
+        """Return the place dict closest to lat/lng (or None if no places).
+
+        Searches rings of grid cells outward from the lat/lng until no unsearched
+        cell could hold anything closer. If that takes more than MAX_RINGS
+        rings, checks every place instead.
+        """
+
+        if not self.places:
+            return None
+
+        center_row, center_col = self.get_cell(lat, lng)
+        num_cols = int(round(360 / CELL_SIZE))
+
+        best_place = None
+        best_distance = float('inf')
+
+        # anything outside a ring is the ring's width of latitude or longitude
+        # away. Toward the poles, a width of longitude is less distance (none
+        # at the pole), hence the cosine.
+        lng_factor = math.cos(math.radians(lat))
+
+        for ring in range(MAX_RINGS):
+
+            for row, col in self.get_ring_cells(center_row, center_col, ring):
+                for place_index in self.cells.get((row, col % num_cols), []):
+                    place = self.places[place_index]
+                    distance = get_distance(lat, lng, place['lat'], place['lng'])
+                    if distance < best_distance:
+                        best_place = place
+                        best_distance = distance
+
+            ring_width = math.radians(min(90, ring * CELL_SIZE))
+            min_radians = math.asin(lng_factor * math.sin(ring_width))
+            if best_distance <= min_radians * EARTH_RADIUS:
+                return best_place
+
+        return self.get_closest_place(lat, lng)
+
+    def get_closest_place(self, lat, lng):
+        """Return the place dict closest to lat/lng, checking every place."""
+
+        phi = math.radians(lat)
+        lambda_ = math.radians(lng)
+
+        hav = np.sin((self.lats - phi) / 2) ** 2 + \
+            math.cos(phi) * np.cos(self.lats) * \
+            np.sin((self.lngs - lambda_) / 2) ** 2
+
+        return self.places[int(np.argmin(hav))]
+
+    def get_ring_cells(self, center_row, center_col, ring):
+        """Return list of (row, col) cells exactly ring cells from the center."""
+
+        if ring == 0:
+            return [(center_row, center_col)]
+
+        cells = []
+        for row in range(center_row - ring, center_row + ring + 1):
+            if row == center_row - ring or row == center_row + ring:
+                cols = range(center_col - ring, center_col + ring + 1)
+            else:
+                cols = [center_col - ring, center_col + ring]
+
+            cells.extend((row, col) for col in cols)
+
+        return cells
+
+
+def get_gazetteer(datadir=DATADIR):
+    """Return the gazetteer, loading it the first time it's needed.
+
+    The gazetteer is empty if there's no GeoNames file in datadir (see
+    seed_data/sources.txt for where to get it).
+    """
+
+    global GAZETTEER
+
+    if GAZETTEER is None:
+        GAZETTEER = Gazetteer(os.path.join(datadir, GAZETTEER_FILENAME))
+
+    return GAZETTEER
+
+
+def get_remote_geocoder():
+    """Return a geopy GoogleV3 geocoder, or None if there's no api key.
+
+    The client is only constructed the first time it's asked for, so the app
+    can start (and geocode locally) without the GOOGLE_PLACES_APIKEY env var.
+    """
+
+    global REMOTE_GEOCODER
+
+    api_key = os.environ.get('GOOGLE_PLACES_APIKEY')
+
+    if REMOTE_GEOCODER is None and api_key:
+        from geopy import geocoders
+        REMOTE_GEOCODER = geocoders.GoogleV3(api_key=api_key)
+
+    return REMOTE_GEOCODER
+
+
+def get_place_data(place):
+    """Return a dict of place data, for sending to the front end."""
+
+    return {'name': place['name'],
+            'country': place['country'],
+            'admin1': place['admin1'],
+            'lat': place['lat'],
+            'lng': place['lng'],
+            'timezone': place['timezone']}
@@ -0,0 +1,161 @@
+"""KD-tree for nearest neighbor searches of points on the celestial sphere.
+
+Sky positions are stored as 3d unit vectors (see coords.get_unit_vectors), so
+the straight-line (chord) distance between two vectors goes up with the angle
+between the positions, and the nearest vectors are the nearest positions. The
+tree splits the points in half along their widest axis at each level, down to
+leaves of up to LEAF_SIZE points; a search only looks at the leaves that
+could hold something closer than what it has found so far.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import heapq
+import numpy as np
+
+# most points in a leaf: checking a small leaf all at once with numpy is
+# cheaper than splitting it further
+LEAF_SIZE = 16
+
+# split_axis for leaf nodes
+LEAF = -1
+
+
+def angle_to_chord(angle):
+    """Return the chord length between unit vectors angle (degrees) apart."""
+
+    return 2 * np.sin(np.radians(np.minimum(angle, 180)) / 2)
+
+
+def chord_to_angle(chord):
+    """Return the angle (degrees) between unit vectors chord apart."""
+
+    return np.degrees(2 * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1)))
+
+
+class KDTree(object):
+    """KD-tree over an N x 3 array of points.
+
+    Attributes:
+    * points: the N x 3 array
+    * order: array of point indexes, arranged so each node's points are
+      order[start:end]
+    * nodes: list of (split_axis, split_value, left, right, start, end) tuples.
+      The root is nodes[0]; left and right are node indexes. Points in the left
+      child are <= split_value on split_axis, and points in the right child
+      are >= it. Leaves have split_axis LEAF.
+    """
+
+    def __init__(self, points, leaf_size=LEAF_SIZE):
+        """Build the tree."""
+
+        self.points = np.asarray(points, dtype=float)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.points))
+        self.nodes = []
+
+        self.build_node(0, len(self.points))
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< KDTree points={} nodes={} >'.format(len(self.points),
+                                                     len(self.nodes))
+
+    def build_node(self, start, end):
+        """Add the node for order[start:end] (and its children); return its index."""
+
+        node_index = len(self.nodes)
+        self.nodes.append(None)
+
+        if end - start <= self.leaf_size:
+            self.nodes[node_index] = (LEAF, 0, None, None, start, end)
+            return node_index
+
+        # split in half along the widest axis
+        node_points = self.points[self.order[start:end]]
+        split_axis = int(np.argmax(node_points.max(axis=0) -
+                                   node_points.min(axis=0)))
+
+        by_axis = np.argsort(node_points[:, split_axis], kind='mergesort')
+        self.order[start:end] = self.order[start:end][by_axis]
+
+        middle = (start + end) // 2
+        split_value = self.points[self.order[middle], split_axis]
+
+        left = self.build_node(start, middle)
+        right = self.build_node(middle, end)
+        self.nodes[node_index] = (split_axis, split_value, left, right, start, end)
+
+        return node_index
+
+    def query(self, point, k=1, max_distance=np.inf):
+        """Return tuple of arrays (distances, indexes) of the nearest points.
+
+        Finds up to k points no further than max_distance from point (a
+        sequence of 3 coordinates), nearest first. indexes are row numbers in
+        self.points.
+        """
+
+        point = np.asarray(point, dtype=float)
+
+        # max heap of the nearest points so far, as (-distance, index)
+        nearest = []
+
+        if len(self.points) and k > 0:
+            self.search_node(0, point, k, max_distance, nearest)
+
+        nearest.sort(reverse=True)
+
+        return (np.array([-distance for distance, _ in nearest]),
+                np.array([index for _, index in nearest], dtype=int))
+
+    def search_node(self, node_index, point, k, max_distance, nearest):
+        """Add points from the node that beat those in nearest (see query)."""
+
+        split_axis, split_value, left, right, start, end = self.nodes[node_index]
+
+        if split_axis == LEAF:
+            indexes = self.order[start:end]
+            distances = np.sqrt(((self.points[indexes] - point) ** 2).sum(axis=1))
+
+            for i in np.flatnonzero(distances <= max_distance):
+                if len(nearest) < k:
+                    heapq.heappush(nearest, (-distances[i], indexes[i]))
+                elif distances[i] < -nearest[0][0]:
+                    heapq.heapreplace(nearest, (-distances[i], indexes[i]))
+
+            return
+
+        offset = point[split_axis] - split_value
+        if offset <= 0:
+            near, far = left, right
+        else:
+            near, far = right, left
+
+        self.search_node(near, point, k, max_distance, nearest)
+
+        # the far side can only help if the splitting plane is closer than
+        # the worst point we'd keep
+        if len(nearest) < k:
+            bound = max_distance
+        else:
+            bound = min(max_distance, -nearest[0][0])
+
+        if abs(offset) <= bound:
+            self.search_node(far, point, k, max_distance, nearest)
@@ -0,0 +1,227 @@
+"""Lunation table for quick moon phase lookups, and a moon phase calendar."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from bisect import bisect_right
+from calendar import monthrange
+from datetime import date, timedelta, MINYEAR, MAXYEAR
+import ephem
+
+# tables cover this many years each, starting at a multiple of this number
+YEARS_PER_TABLE = 10
+
+# the tolerance (in percent illuminated) for exact moon phases new, full, quarter
+PHASE_TOLERANCE = 0.05
+
+# the principal phases, in order, with the pyEphem search for each
+NEW_MOON = 'new moon'
+FIRST_QUARTER = 'first quarter'
+FULL_MOON = 'full moon'
+THIRD_QUARTER = 'third quarter'
+
+PHASE_SEARCHES = [(NEW_MOON, ephem.next_new_moon),
+                  (FIRST_QUARTER, ephem.next_first_quarter_moon),
+                  (FULL_MOON, ephem.next_full_moon),
+                  (THIRD_QUARTER, ephem.next_last_quarter_moon)]
+
+# after these principal phases, the moon is waxing
+WAXING_AFTER = set([NEW_MOON, FIRST_QUARTER])
+
+# lunation tables already built, keyed by (start_year, end_year)
+LUNATION_TABLES = {}
+
+
+class LunationTable(object):
+    """Instants of every new, quarter and full moon over a range of years.
+
+    Instants are stored as sorted ephem dates (floats), so finding the principal
+    phases around any instant is a binary search.
+    """
+
+    def __init__(self, start_year, end_year):
+        """Find all the principal phases from start_year through end_year.
+
+        The table starts a little before start_year and ends a little after
+        end_year, so every instant in the range has a phase on either side.
+        """
+
+        self.start_year = start_year
+        self.end_year = end_year
+
+        self.start = ephem.Date(date(start_year, 1, 1))
+        self.end = ephem.Date(ephem.Date(date(end_year, 12, 31)) + 1)
+
+        self.instants = []
+        self.phases = []
+
+        # back up far enough to catch the phase just before the range
+        search_date = ephem.Date(self.start - 30)
+
+        while search_date <= self.end + 30:
+            for phase, search in PHASE_SEARCHES:
+                search_date = search(search_date)
+                self.instants.append(float(search_date))
+                self.phases.append(phase)
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< LunationTable years={}-{} phases={} >'.format(self.start_year,
+                                                                self.end_year,
+                                                                len(self.phases))
+
+    def covers(self, ephem_date):
+        """Return True if ephem_date is in this table's range of years."""
+
+        return self.start <= ephem_date < self.end
+
+    def get_previous_phase(self, ephem_date):
+        """Return tuple of (phase, ephem date) for the last principal phase.
+
+        phase is one of NEW_MOON, FIRST_QUARTER, FULL_MOON, THIRD_QUARTER.
+        """
+
+        i = bisect_right(self.instants, float(ephem_date)) - 1
+
+        return self.phases[i], ephem.Date(self.instants[i])
+
+    def get_growth(self, ephem_date):
+        """Return 'waxing' or 'waning' for the moon at ephem_date."""
+
+        phase, _ = self.get_previous_phase(ephem_date)
+
+        return 'waxing' if phase in WAXING_AFTER else 'waning'
+
+    def get_phases_between(self, start_date, end_date):
+        """Return list of (phase, ephem date) tuples from start_date to end_date."""
+
+        start_i = bisect_right(self.instants, float(start_date))
+        end_i = bisect_right(self.instants, float(end_date))
+
+        return [(self.phases[i], ephem.Date(self.instants[i]))
+                for i in range(start_i, end_i)]
+
+
+def get_lunation_table(ephem_date):
+    """Return the lunation table covering ephem_date.
+
+    Tables are built the first time a date in their range is needed, then
+    shared by all later requests.
+    """
+
+    year = ephem.Date(ephem_date).datetime().year
+    start_year = year - year % YEARS_PER_TABLE
+    end_year = start_year + YEARS_PER_TABLE - 1
+
+    # python dates run from year 1 through 9999
+    start_year = max(MINYEAR, start_year)
+    end_year = min(MAXYEAR, end_year)
+
+    key = (start_year, end_year)
+    if key not in LUNATION_TABLES:
+        LUNATION_TABLES[key] = LunationTable(start_year, end_year)
+
+    return LUNATION_TABLES[key]
+
+
+def get_moon_phase_phrase(moon, ephem_date):
+    """Get a phrase (e.g. waxing crescent) to describe the moon phase.
+
+    * moon is an ephem.Moon computed for ephem_date
+
+    Returns a tuple (waxwan, full_phrase) -- both strings.
+
+    waxwan is simply the first word in the phrase, for use in determing
+    rotation.
+    """
+
+    # take care of new and full
+    if moon.phase < PHASE_TOLERANCE:
+        return '', NEW_MOON
+
+    if 100 - moon.phase < PHASE_TOLERANCE:
+        return '', FULL_MOON
+
+    # otherwise it's in between
+    growth = get_lunation_table(ephem_date).get_growth(ephem_date)
+
+    # is it a quarter?
+    if abs(moon.phase - 50) < PHASE_TOLERANCE:
+        if growth == 'waxing':
+            return growth, FIRST_QUARTER
+
+        # otherwise it's waning: third quarter
+        return growth, THIRD_QUARTER
+
+    # most likely: an in between state
+    if moon.phase < 50:
+        phase = 'crescent'
+    else:
+        phase = 'gibbous'
+
+    full_phrase = '{} {}: {:.1f}'.format(growth, phase, moon.phase)
+
+    return growth, full_phrase
+
+
+def get_moon_calendar(year, month=None):
+    """Return a list of moon phase dicts, one per day of the month or year.
+
+    If month is None, the calendar covers the whole year. Phases are for noon
+    utc of each day.
+
+    Example day dict:
+    {'date': '2017-03-05',
+     'illumination': 54.9,  # percent of the disk lit
+     'phase': 'waxing gibbous: 54.9',
+     'event': 'first quarter',  # principal phase during the utc day, or None
+     'eventTime': '2017/3/5 11:32:05'}  # utc, or None
+    """
+
+    if month:
+        first_day = date(year, month, 1)
+        last_day = date(year, month, monthrange(year, month)[1])
+    else:
+        first_day = date(year, 1, 1)
+        last_day = date(year, 12, 31)
+
+    moon = ephem.Moon()
+    calendar = []
+
+    # count days rather than stepping past last_day (there's no day after
+    # December 31, 9999)
+    for day_number in range((last_day - first_day).days + 1):
+        day = first_day + timedelta(days=day_number)
+        day_start = ephem.Date(day)
+        noon = ephem.Date(day_start + 0.5)
+        moon.compute(noon)
+
+        waxwan, phrase = get_moon_phase_phrase(moon, noon)
+
+        events = get_lunation_table(noon).get_phases_between(day_start,
+                                                             day_start + 1)
+        event, event_time = events[0] if events else (None, None)
+
+        # isoformat pads years before 1000 (strftime's %Y doesn't)
+        calendar.append({'date': day.isoformat(),
+                         'illumination': round(moon.phase, 1),
+                         'phase': phrase,
+                         'event': event,
+                         'eventTime': str(event_time) if event_time else None})
+
+    return calendar
@@ -0,0 +1,541 @@
+"""Asteroids and comets from Minor Planet Center orbital elements.
+
+Elements come from the MPC's one-line export files (see seed_data/sources.txt):
+
+* MPCORB.DAT for asteroids (epoch, mean anomaly, a, e and angles)
+* CometEls.txt for comets (time of perihelion, q, e and angles)
+
+Bodies that can never get brighter than LOAD_MAX_MAG (from where their orbits
+come to the earth) are skipped as the files are read, so only the few
+thousand that could ever be seen with binoculars are kept.
+
+Positions for every body at once come from a vectorized Kepler solver:
+elliptic, parabolic and hyperbolic orbits are each solved for all bodies of
+that kind with numpy, then rotated to geocentric equatorial J2000 and
+corrected for light time. They agree with pyEphem's astrometric positions for
+the same elements to within a few arcsec. (There's no parallax: that matters
+only for the rare asteroid passing very close to the earth.)
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import math
+import numpy as np
+import ephem
+
+# to be able to distinguish between data dir for testing
+DATADIR = 'seed_data'
+
+ASTEROIDS_FILENAME = 'MPCORB.DAT'
+COMETS_FILENAME = 'CometEls.txt'
+
+# bodies that can't get brighter than this magnitude aren't loaded
+LOAD_MAX_MAG = 10
+
+# gaussian gravitational constant (radians per day), and the speed of light
+# in AU per day
+GAUSS_K = 0.01720209895
+LIGHT_AU_PER_DAY = 173.1446327
+
+# obliquity of the ecliptic at J2000, in radians
+J2000_OBLIQUITY = math.radians(23.4392911)
+
+# Kepler's equation is solved to this many radians, in at most this many steps
+KEPLER_TOLERANCE = 1e-12
+MAX_KEPLER_STEPS = 50
+
+# packed MPC dates: letters for centuries, and for months / days over 9
+PACKED_CENTURIES = {'I': 1800, 'J': 1900, 'K': 2000}
+PACKED_DIGITS = '0123456789ABCDEFGHIJKLMNOPQRSTUV'
+
+# the catalog, loaded on first use (see get_catalog)
+CATALOG = None
+
+
+def unpack_epoch(packed):
+    """Return the ephem date for a packed MPC epoch (such as 'K1794')."""
+
+    year = PACKED_CENTURIES[packed[0]] + int(packed[1:3])
+    month = PACKED_DIGITS.index(packed[3])
+    day = PACKED_DIGITS.index(packed[4])
+
+    # MPC epochs are at 0h TT
+    return ephem.Date((year, month, day))
+
+
+def parse_asteroid_line(line):
+    """Return dict of elements from an MPCORB.DAT line, or None if it isn't one.
+
+    Angles are in degrees, a in AU and the epoch an ephem date. Keys: 'name',
+    'kind', 'H', 'G', 'epoch', 'M', 'peri', 'node', 'incl', 'e', 'a'.
+    """
+
+    try:
+        elements = {'H': float(line[8:13]),
+                    'G': float(line[14:19] or 0.15),
+                    'epoch': unpack_epoch(line[20:25]),
+                    'M': float(line[26:35]),
+                    'peri': float(line[37:46]),
+                    'node': float(line[48:57]),
+                    'incl': float(line[59:68]),
+                    'e': float(line[70:79]),
+                    'a': float(line[92:103])}
+
+    except (ValueError, KeyError, IndexError):
+        return None
+
+    elements['name'] = line[166:194].strip() or line[0:7].strip()
+    elements['kind'] = 'asteroid'
+
+    return elements
+
+
+def parse_comet_line(line):
+    """Return dict of elements from a CometEls.txt line, or None if it isn't one.
+
+    Angles are in degrees, q in AU and the time of perihelion an ephem date.
+    Keys: 'name', 'kind', 'H', 'K' (the magnitude slope), 'perihelion', 'q',
+    'e', 'peri', 'node', 'incl'.
+    """
+
+    try:
+        day = float(line[22:29])
+        perihelion = ephem.Date((int(line[14:18]), int(line[19:21]), 1)) + day - 1
+
+        elements = {'perihelion': perihelion,
+                    'q': float(line[30:39]),
+                    'e': float(line[41:49]),
+                    'peri': float(line[51:59]),
+                    'node': float(line[61:69]),
+                    'incl': float(line[71:79]),
+                    'H': float(line[91:95]),
+                    'K': float(line[96:100])}
+
+    except (ValueError, IndexError):
+        return None
+
+    elements['name'] = line[102:158].strip()
+    elements['kind'] = 'comet'
+
+    return elements
+
+
+def get_brightest_possible(elements):
+    """Return the brightest magnitude the body could have, seen from earth.
+
+    Without knowing where the earth is, this is the magnitude at perihelion
+    with the earth as close as it can be. Bodies that come inside the earth's
+    orbit could be anywhere, so they get -infinity.
+    """
+
+    if elements['kind'] == 'asteroid':
+        q = elements['a'] * (1 - elements['e'])
+    else:
+        q = elements['q']
+
+    if q <= 1:
+        return -np.inf
+
+    brightest = elements['H'] + 5 * math.log10(q - 1)
+
+    if elements['kind'] == 'asteroid':
+        return brightest + 5 * math.log10(q)
+
+    return brightest + 2.5 * min(elements['K'], 0) * math.log10(q)
+
+
+def get_edb_date(ephem_date):
+    """Return the date as a pyEphem database date (month/day/year)."""
+
+    year, month, day = ephem.Date(ephem_date).triple()
+
+    return '{}/{!r}/{}'.format(month, day, year)
+
+
+def get_edb_line(elements):
+    """Return the elements as a pyEphem database line (for ephem.readdb)."""
+
+    name = elements['name'].replace(',', ' ')
+
+    if elements['kind'] == 'asteroid':
+        a = elements['a']
+        return '{},e,{},{},{},{},{},{},{},{},2000,H{},{}'.format(
+            name, elements['incl'], elements['node'], elements['peri'], a,
+            math.degrees(GAUSS_K / a ** 1.5), elements['e'], elements['M'],
+            get_edb_date(elements['epoch']), elements['H'], elements['G'])
+
+    perihelion = get_edb_date(elements['perihelion'])
+
+    if elements['e'] < 1:
+        a = elements['q'] / (1 - elements['e'])
+        return '{},e,{},{},{},{},{},{},0,{},2000,g{},{}'.format(
+            name, elements['incl'], elements['node'], elements['peri'], a,
+            math.degrees(GAUSS_K / a ** 1.5), elements['e'], perihelion,
+            elements['H'], elements['K'])
+
+    if elements['e'] > 1:
+        return '{},h,{},{},{},{},{},{},2000,{},{}'.format(
+            name, perihelion, elements['incl'], elements['node'],
+            elements['peri'], elements['e'], elements['q'], elements['H'],
+            elements['K'])
+
+    return '{},p,{},{},{},{},{},2000,{},{}'.format(
+        name, perihelion, elements['incl'], elements['peri'], elements['q'],
+        elements['node'], elements['H'], elements['K'])
+
+
+def solve_elliptic(mean_anomalies, e):
+    """Return array of eccentric anomalies (radians) for elliptic orbits.
+
+    Solves Kepler's equation, M = E - e sin E, with Newton's method for every
+    orbit at once.
+    """
+
+    # (Danby's starting guess, which converges for any eccentricity; mean
+    # anomalies are between -pi and pi)
+    anomalies = mean_anomalies + 0.85 * e * np.sign(mean_anomalies)
+
+    for _ in range(MAX_KEPLER_STEPS):
+        steps = (anomalies - e * np.sin(anomalies) - mean_anomalies) / \
+            (1 - e * np.cos(anomalies))
+        anomalies -= steps
+
+        if np.all(np.abs(steps) < KEPLER_TOLERANCE):
+            break
+
+    return anomalies
+
+
+def solve_hyperbolic(mean_anomalies, e):
+    """Return array of hyperbolic anomalies for hyperbolic orbits.
+
+    Solves M = e sinh H - H with Newton's method for every orbit at once.
+    """
+
+    anomalies = np.arcsinh(mean_anomalies / e)
+
+    for _ in range(MAX_KEPLER_STEPS):
+        steps = (e * np.sinh(anomalies) - anomalies - mean_anomalies) / \
+            (e * np.cosh(anomalies) - 1)
+        anomalies -= steps
+
+        if np.all(np.abs(steps) < KEPLER_TOLERANCE):
+            break
+
+    return anomalies
+
+
+def get_orbit_plane_positions(q, e, days_from_perihelion):
+    """Return tuple of arrays (x, y) of positions in each orbit's plane, in AU.
+
+    x points to perihelion. Elliptic, parabolic (e exactly 1) and hyperbolic
+    orbits are each solved together.
+    """
+
+    x = np.empty(len(q))
+    y = np.empty(len(q))
+
+    elliptic = e < 1
+    if elliptic.any():
+        ell_e = e[elliptic]
+        a = q[elliptic] / (1 - ell_e)
+        mean_anomalies = GAUSS_K / a ** 1.5 * days_from_perihelion[elliptic]
+        mean_anomalies = (mean_anomalies + np.pi) % (2 * np.pi) - np.pi
+
+        anomalies = solve_elliptic(mean_anomalies, ell_e)
+        x[elliptic] = a * (np.cos(anomalies) - ell_e)
+        y[elliptic] = a * np.sqrt(1 - ell_e ** 2) * np.sin(anomalies)
+
+    hyperbolic = e > 1
+    if hyperbolic.any():
+        hyp_e = e[hyperbolic]
+        a = q[hyperbolic] / (hyp_e - 1)
+        mean_anomalies = GAUSS_K / a ** 1.5 * days_from_perihelion[hyperbolic]
+
+        anomalies = solve_hyperbolic(mean_anomalies, hyp_e)
+        x[hyperbolic] = a * (hyp_e - np.cosh(anomalies))
+        y[hyperbolic] = a * np.sqrt(hyp_e ** 2 - 1) * np.sinh(anomalies)
+
+    parabolic = e == 1
+    if parabolic.any():
+        par_q = q[parabolic]
+
+        # Barker's equation, s^3 + 3s = w, solved directly
+        w = 3 * GAUSS_K / np.sqrt(2 * par_q ** 3) * days_from_perihelion[parabolic]
+        root = np.cbrt(w / 2 + np.sqrt(w ** 2 / 4 + 1))
+        s = root - 1 / root
+
+        x[parabolic] = par_q * (1 - s ** 2)
+        y[parabolic] = 2 * par_q * s
+
+    return x, y
+
+
+def get_earth_position(ephem_date):
+    """Return array of the earth's equatorial J2000 position around the sun, in AU.
+
+    The earth's position around the sun is opposite the sun's around it.
+    """
+
+    sun = ephem.Sun(ephem.Date(ephem_date))
+
+    return -sun.earth_distance * np.array([math.cos(sun.a_dec) * math.cos(sun.a_ra),
+                                           math.cos(sun.a_dec) * math.sin(sun.a_ra),
+                                           math.sin(sun.a_dec)])
+
+
+def get_earth_positions(ephem_dates):
+    """Return 3 x N array of the earth's positions at an array of dates, in AU.
+
+    Interpolated between its positions at the start of each day, which is good
+    to about 1e-4 AU: plenty for rise and set times, if not for positions.
+    """
+
+    days = np.arange(math.floor(ephem_dates.min()), math.floor(ephem_dates.max()) + 2)
+    day_positions = np.array([get_earth_position(day) for day in days])
+
+    return np.array([np.interp(ephem_dates, days, day_positions[:, axis])
+                     for axis in range(3)])
+
+
+class MinorBodyCatalog(object):
+    """Orbital elements for asteroids and comets, for positions of all at once.
+
+    Built from a list of element dicts (see parse_asteroid_line and
+    parse_comet_line). Attributes are parallel arrays, one item per body:
+
+    * names, kinds ('asteroid' or 'comet'), edb_lines (for ephem.readdb)
+    * q (perihelion distance, AU), e, perihelion (ephem date)
+    * h, g: magnitude parameters (H and G for asteroids, H and K for comets)
+    * orientation: 3 x 2 x N array rotating each orbit's plane into
+      equatorial J2000
+    """
+
+    def __init__(self, elements_list):
+        """Convert the elements to arrays."""
+
+        self.names = np.array([elements['name'] for elements in elements_list])
+        self.kinds = np.array([elements['kind'] for elements in elements_list])
+        self.edb_lines = [get_edb_line(elements) for elements in elements_list]
+
+        self.e = np.array([elements['e'] for elements in elements_list], dtype=float)
+        self.h = np.array([elements['H'] for elements in elements_list], dtype=float)
+        self.g = np.array([elements.get('G', elements.get('K'))
+                           for elements in elements_list], dtype=float)
+
+        self.q = np.empty(len(elements_list))
+        self.perihelion = np.empty(len(elements_list))
+
+        for i, elements in enumerate(elements_list):
+            if elements['kind'] == 'asteroid':
+                a = elements['a']
+                self.q[i] = a * (1 - elements['e'])
+
+                # the mean anomaly is 0 at perihelion
+                mean_anomaly = (elements['M'] + 180) % 360 - 180
+                self.perihelion[i] = elements['epoch'] - \
+                    math.radians(mean_anomaly) / (GAUSS_K / a ** 1.5)
+
+            else:
+                self.q[i] = elements['q']
+                self.perihelion[i] = elements['perihelion']
+
+        self.orientation = self.get_orientation(elements_list)
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< MinorBodyCatalog bodies={} >'.format(len(self))
+
+    def __len__(self):
+        """Return the number of bodies in the catalog."""
+
+        return len(self.names)
+
+    def get_orientation(self, elements_list):
+        """Return 3 x 2 x N array of each orbit plane's axes in equatorial J2000."""
+
+        peri, node, incl = [np.radians([elements[key] for elements in elements_list])
+                            for key in ('peri', 'node', 'incl')]
+
+        # perihelion and 90 degrees on from it, in ecliptic coordinates
+        ecliptic = np.array([
+            [np.cos(node) * np.cos(peri) - np.sin(node) * np.sin(peri) * np.cos(incl),
+             -np.cos(node) * np.sin(peri) - np.sin(node) * np.cos(peri) * np.cos(incl)],
+            [np.sin(node) * np.cos(peri) + np.cos(node) * np.sin(peri) * np.cos(incl),
+             -np.sin(node) * np.sin(peri) + np.cos(node) * np.cos(peri) * np.cos(incl)],
+            [np.sin(peri) * np.sin(incl), np.cos(peri) * np.sin(incl)]])
+
+        if not elements_list:
+            ecliptic = np.zeros((3, 2, 0))
+
+        cos_obl = math.cos(J2000_OBLIQUITY)
+        sin_obl = math.sin(J2000_OBLIQUITY)
+
+        return np.array([ecliptic[0],
+                         cos_obl * ecliptic[1] - sin_obl * ecliptic[2],
+                         sin_obl * ecliptic[1] + cos_obl * ecliptic[2]])
+
+    def get_heliocentric(self, ephem_dates, indexes=None):
+        """Return 3 x N array of equatorial J2000 positions around the sun, in AU.
+
+        ephem_dates is a scalar, or an array with a date for each body.
+        indexes picks the bodies (all of them by default).
+        """
+
+        if indexes is None:
+            indexes = slice(None)
+
+        x, y = get_orbit_plane_positions(self.q[indexes], self.e[indexes],
+                                         ephem_dates - self.perihelion[indexes])
+
+        return self.orientation[:, 0, indexes] * x + \
+            self.orientation[:, 1, indexes] * y
+
+    def get_geocentric(self, ephem_dates, earth, indexes=None):
+        """Return tuple of 3 x N arrays (heliocentric, geocentric), in AU.
+
+        earth is the earth's position (a 3 x 1 or 3 x N array) at ephem_dates.
+        Each body is where it was when its light left.
+        """
+
+        heliocentric = self.get_heliocentric(ephem_dates, indexes)
+        geocentric = heliocentric - earth
+
+        light_days = np.linalg.norm(geocentric, axis=0) / LIGHT_AU_PER_DAY
+        heliocentric = self.get_heliocentric(ephem_dates - light_days, indexes)
+
+        return heliocentric, heliocentric - earth
+
+    def get_positions(self, ephem_date):
+        """Return a dict of arrays of every body's position at ephem_date.
+
+        Keys:
+            'ra', 'dec': astrometric (J2000) position, in degrees
+            'earth_distance', 'sun_distance': in AU
+            'mag': magnitude
+        """
+
+        ephem_date = float(ephem_date)
+
+        earth = get_earth_position(ephem_date)
+        heliocentric, geocentric = self.get_geocentric(ephem_date,
+                                                       earth[:, np.newaxis])
+
+        r = np.linalg.norm(heliocentric, axis=0)
+        delta = np.linalg.norm(geocentric, axis=0)
+
+        return {'ra': np.degrees(np.arctan2(geocentric[1], geocentric[0])) % 360,
+                'dec': np.degrees(np.arcsin(geocentric[2] / delta)),
+                'earth_distance': delta,
+                'sun_distance': r,
+                'mag': self.get_magnitudes(r, delta, np.linalg.norm(earth))}
+
+    def get_ra_decs(self, ephem_dates, indexes):
+        """Return tuple of arrays (ra, dec) of some bodies, each at its own date.
+
+        For the bodies at indexes, at ephem_dates (a scalar, or an array with a
+        date for each of them). Astrometric (J2000), in degrees, like
+        get_positions, but the earth's position comes from get_earth_positions.
+        """
+
+        ephem_dates = np.broadcast_to(np.asarray(ephem_dates, dtype=float),
+                                      (len(indexes),))
+
+        _, geocentric = self.get_geocentric(ephem_dates,
+                                            get_earth_positions(ephem_dates),
+                                            indexes)
+
+        return (np.degrees(np.arctan2(geocentric[1], geocentric[0])) % 360,
+                np.degrees(np.arcsin(geocentric[2] /
+                                     np.linalg.norm(geocentric, axis=0))))
+
+    def get_magnitudes(self, r, delta, sun_distance):
+        """Return array of magnitudes, for distances from the sun and earth.
+
+        Asteroids use the IAU H, G system; comets m = H + 5 log(delta) +
+        2.5 K log(r) (the same models as pyEphem).
+        """
+
+        magnitudes = self.h + 5 * np.log10(delta)
+
+        comets = self.kinds == 'comet'
+        magnitudes[comets] += 2.5 * self.g[comets] * np.log10(r[comets])
+
+        asteroids = ~comets
+        r, delta = r[asteroids], delta[asteroids]
+        g = self.g[asteroids]
+
+        cos_phase = np.clip((r ** 2 + delta ** 2 - sun_distance ** 2) /
+                            (2 * r * delta), -1, 1)
+        tan_half_phase = np.tan(np.arccos(cos_phase) / 2)
+        phi_1 = np.exp(-3.33 * tan_half_phase ** 0.63)
+        phi_2 = np.exp(-1.87 * tan_half_phase ** 1.22)
+
+        magnitudes[asteroids] += 5 * np.log10(r) - \
+            2.5 * np.log10((1 - g) * phi_1 + g * phi_2)
+
+        return magnitudes
+
+    def get_body(self, index):
+        """Return a pyEphem body for the body at index (for rise / set times)."""
+
+        return ephem.readdb(self.edb_lines[index])
+
+
+def load_elements(filepath, parse_line, max_mag=LOAD_MAX_MAG):
+    """Return list of element dicts from the file, skipping bodies too dim.
+
+    parse_line is parse_asteroid_line or parse_comet_line. Returns an empty
+    list if there's no such file.
+    """
+
+    if not os.path.exists(filepath):
+        return []
+
+    elements_list = []
+
+    with open(filepath) as elements_file:
+        for line in elements_file:
+            elements = parse_line(line.rstrip('\n'))
+
+            if elements and get_brightest_possible(elements) <= max_mag:
+                elements_list.append(elements)
+
+    return elements_list
+
+
+def get_catalog(datadir=DATADIR):
+    """Return the minor body catalog, loading it the first time it's needed.
+
+    Returns None if there are no elements files; then there are no minor
+    bodies to show.
+    """
+
+    global CATALOG
+
+    if CATALOG is None:
+        elements_list = load_elements(os.path.join(datadir, ASTEROIDS_FILENAME),
+                                      parse_asteroid_line) + \
+            load_elements(os.path.join(datadir, COMETS_FILENAME), parse_comet_line)
+
+        if elements_list:
+            CATALOG = MinorBodyCatalog(elements_list)
+
+    return CATALOG
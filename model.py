@@ -70,6 +70,11 @@ class Star(db.Model):
     color_index = db.Column(db.Numeric(4, 3), nullable=True)
     color = db.Column(db.String(7), nullable=False)
 
+    # proper motion, in milliarcseconds per year (pm_ra includes cos(dec)).
+    # null if the catalog doesn't have it
+    pm_ra = db.Column(db.Numeric(9, 2), nullable=True)
+    pm_dec = db.Column(db.Numeric(9, 2), nullable=True)
+
     constellation = db.relationship("Constellation")
 
     def __repr__(self):
@@ -0,0 +1,269 @@
+"""Lunar occultations: the moon passing in front of stars and planets.
+
+Testing every catalog star against the moon at every minute of a month
+would take hours. Instead:
+
+* the moon's path across the sky, as seen from the place, is sampled every
+  SAMPLE_MINUTES
+* at each sample, the catalog's KD-tree (see coords.EquatorialCatalog)
+  finds the few stars close enough to the moon that it might cover them
+  before the next sample
+* planets move too, so their candidates are the moon's conjunctions with
+  them (see conjunctions.py), close enough for parallax to bring them
+  together
+* each candidate's disappearance and reappearance are found as contacts,
+  the same way as eclipse contacts (see eclipses.find_contacts), using
+  pyEphem's topocentric positions of the moon and the star or planet
+
+Times are for the star (or the planet's center) crossing the moon's mean
+limb; the moon's mountains and valleys can move them by a second or two.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+from eclipses import find_contacts, get_observer
+from conjunctions import find_conjunctions
+from skies import PLANETS
+
+# minutes between samples of the moon's path
+SAMPLE_MINUTES = 20
+
+# stars within this many degrees of a sample of the moon's path are
+# candidates: the moon's radius (at most 0.28 degrees, seen from the earth's
+# surface), plus how far it moves against the stars in half a sample (at
+# most about 0.13 degrees), plus margin for aberration and nutation
+SEARCH_RADIUS = 0.5
+
+# planets whose geocentric conjunction with the moon is within this many
+# degrees are candidates: the moon's radius, plus its parallax (at most
+# about 1 degree), plus margin
+PLANET_SEARCH_SEPARATION = 1.5
+
+# most days to search
+MAX_SEARCH_DAYS = 31
+
+STAR = 'star'
+PLANET = 'planet'
+
+
+def get_occultation_geometry(observer, body):
+    """Return a function of ephem date for the moon and body seen by observer.
+
+    The function returns a tuple (separation, limits, radius) as
+    eclipses.get_lunar_geometry does: the separation of body from the moon,
+    and [the moon's radius] as the one limit (body is covered when the
+    separation is less than it). All are in degrees. observer's date is
+    changed by the function.
+    """
+
+    moon = ephem.Moon()
+
+    def get_geometry(ephem_date):
+        """Return (separation, limits, radius) at ephem_date."""
+
+        observer.date = ephem_date
+        moon.compute(observer)
+        body.compute(observer)
+
+        radius = math.degrees(moon.radius)
+
+        return math.degrees(ephem.separation(moon, body)), [radius], radius
+
+    return get_geometry
+
+
+def get_star_body(ra, dec):
+    """Return a pyEphem fixed body at ra / dec (J2000 degrees)."""
+
+    star = ephem.FixedBody()
+    star._ra = math.radians(ra)
+    star._dec = math.radians(dec)
+    star._epoch = ephem.J2000
+
+    return star
+
+
+def get_path_position(moon):
+    """Return tuple of (ra, dec) in degrees of the moon seen from the place.
+
+    moon is computed for an observer. Its ra and dec are for the equinox of
+    date; the catalog's are J2000. The place's view is the moon's J2000
+    (astrometric) position, moved by the parallax: the difference between
+    the moon's topocentric and geocentric positions.
+    """
+
+    ra_parallax = (moon.ra - moon.g_ra + math.pi) % (2 * math.pi) - math.pi
+
+    return (math.degrees(moon.a_ra + ra_parallax),
+            math.degrees(moon.a_dec + moon.dec - moon.g_dec))
+
+
+def get_star_candidates(catalog, observer, start, end):
+    """Return list of (catalog index, ephem date) of stars the moon may cover.
+
+    Each date is the sample of the moon's path closest to the star, on one
+    pass of the moon by it.
+    """
+
+    moon = ephem.Moon()
+    step = SAMPLE_MINUTES * ephem.minute
+
+    # for each star: [index of the last sample it was close to, closest
+    # sample's date, closest separation]
+    passes = {}
+    candidates = []
+
+    for i in range(int((end - start) / step) + 1):
+        observer.date = start + i * step
+        moon.compute(observer)
+
+        ra, dec = get_path_position(moon)
+        indexes, separations = catalog.get_nearest(ra, dec, len(catalog),
+                                                   SEARCH_RADIUS)
+
+        for index, separation in zip(indexes, separations):
+            index = int(index)
+            star_pass = passes.get(index)
+
+            # the same pass, if the star was close at the last sample too
+            if star_pass and star_pass[0] == i - 1:
+                star_pass[0] = i
+                if separation < star_pass[2]:
+                    star_pass[1:] = [float(observer.date), separation]
+            else:
+                star_pass = [i, float(observer.date), separation]
+                passes[index] = star_pass
+                candidates.append((index, star_pass))
+
+    return [(index, star_pass[1]) for index, star_pass in candidates]
+
+
+def get_planet_candidates(start, end):
+    """Return list of (planet class, ephem date) of planets the moon may cover."""
+
+    planets_by_name = dict((planet.__name__, planet) for planet in PLANETS)
+
+    return [(planets_by_name[approach['bodies'][1]], approach['date'])
+            for approach in find_conjunctions(start, end,
+                                              PLANET_SEARCH_SEPARATION,
+                                              [ephem.Moon] + PLANETS)
+            if approach['bodies'][0] == 'Moon']
+
+
+def find_occultation(observer, body, center):
+    """Return tuple of (disappearance, reappearance, moon altitudes) near center.
+
+    The altitudes (degrees) are a list, at disappearance and reappearance.
+    Returns None if the moon doesn't cover body, or the moon is below
+    observer's horizon at both.
+    """
+
+    circumstances = find_contacts(get_occultation_geometry(observer, body),
+                                  center)
+    if circumstances is None:
+        return None
+
+    disappearance, reappearance = circumstances['contacts'][0]
+
+    moon = ephem.Moon()
+    altitudes = []
+    for ephem_date in (disappearance, reappearance):
+        observer.date = ephem_date
+        moon.compute(observer)
+        altitudes.append(math.degrees(moon.alt))
+
+    if max(altitudes) <= 0:
+        return None
+
+    return disappearance, reappearance, altitudes
+
+
+def find_occultations(catalog, lat, lng, start, end, planets=True):
+    """Return list of occultations seen from lat / lng, soonest first.
+
+    * catalog is an EquatorialCatalog of stars (J2000 positions), with ids
+      and magnitudes
+    * lat and lng are in degrees
+    * start and end are ephem dates; end is capped at MAX_SEARCH_DAYS after
+      start
+    * planets, if True, includes occultations of planets
+
+    Only occultations with the moon above the horizon at the disappearance
+    or the reappearance are returned. Example occultation dict:
+
+    {'celestialType': 'star',       # or 'planet'
+     'id': 1234,                    # catalog id (None for planets)
+     'name': None,                  # planet name (None for stars)
+     'magnitude': 0.87,
+     'disappearance': ephem date,
+     'reappearance': ephem date,
+     'disappearanceAlt': 31.4,      # the moon's altitude, degrees
+     'reappearanceAlt': 38.2}
+    """
+
+    start = ephem.Date(start)
+    end = ephem.Date(min(end, start + MAX_SEARCH_DAYS))
+
+    observer = get_observer(lat, lng)
+    occultations = []
+
+    for index, center in get_star_candidates(catalog, observer, start, end):
+        star = get_star_body(catalog.ra[index], catalog.dec[index])
+        occultation = find_occultation(observer, star, center)
+
+        if occultation:
+            star_id = catalog.ids[index].item() \
+                if catalog.ids is not None else index
+            magnitude = catalog.magnitudes[index] \
+                if catalog.magnitudes is not None else None
+
+            occultations.append(make_occultation(STAR, star_id, None, magnitude,
+                                                 occultation))
+
+    if planets:
+        for planet_class, center in get_planet_candidates(start, end):
+            planet = planet_class()
+            occultation = find_occultation(observer, planet, center)
+
+            if occultation:
+                occultations.append(make_occultation(
+                    PLANET, None, planet.name, planet.mag, occultation))
+
+    occultations = [occultation for occultation in occultations
+                    if start <= occultation['disappearance'] <= end]
+    occultations.sort(key=lambda occultation: occultation['disappearance'])
+
+    return occultations
+
+
+def make_occultation(celestial_type, star_id, name, magnitude, occultation):
+    """Return an occultation dict (see find_occultations)."""
+
+    disappearance, reappearance, altitudes = occultation
+
+    return {'celestialType': celestial_type,
+            'id': star_id,
+            'name': name,
+            'magnitude': float(magnitude) if magnitude is not None else None,
+            'disappearance': disappearance,
+            'reappearance': reappearance,
+            'disappearanceAlt': altitudes[0],
+            'reappearanceAlt': altitudes[1]}
@@ -0,0 +1,267 @@
+"""Yearly visibility planner: the best months and hours to see each constellation
+and planet from a place.
+
+Making a StarField for every few minutes of a year would mean tens of
+thousands of them. Instead, every night of the year is sampled every
+SAMPLE_MINUTES, from local mean noon to the next, as one array of dates:
+
+* local sidereal times for the whole array come from sidereal_time.py, and
+  give the direction of the zenith at every sample
+* the sun's and planets' directions are computed once a day (see
+  conjunctions.get_unit_vectors) and interpolated to every sample
+* constellations are represented by their centroids (see
+  ConstellationLocator.get_centroids), precessed to the middle of the year
+
+so every altitude is one dot product with the zenith, done for all samples at
+once with numpy. An object can be seen at a sample if the sun is below the
+twilight altitude and the object above the minimum altitude.
+
+Plans are for the middle of the place's location cell (see riseset.get_cell),
+cached by cell, year and altitudes.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import date
+import numpy as np
+import ephem
+
+from constellations import get_locator, precess
+from conjunctions import get_unit_vectors
+from coords import get_unit_vectors as get_catalog_vectors
+from sidereal_time import get_local_sidereal_time
+from riseset import get_cell, CELL_SIZE
+from skies import PLANETS
+
+# minutes between samples of each night
+SAMPLE_MINUTES = 10
+
+# the sky is dark enough once the sun is this far below the horizon, in
+# degrees (nautical twilight: the brighter stars of every constellation are
+# out)
+TWILIGHT_ALT = -12
+
+# objects lower than this, in degrees, are too dimmed and too often blocked to
+# plan for
+MIN_ALT = 20
+
+# day of each month whose night gives the month's typical window
+WINDOW_DAY = 15
+
+# plans already made, keyed by (cell, year, min_alt, twilight_alt)
+PLAN_CACHE = {}
+
+# most plans to keep; the cache is emptied when it gets bigger than this
+MAX_CACHED_PLANS = 1000
+
+
+def get_night_dates(lng, year):
+    """Return tuple (dates, nights) for sampling the nights of year at lng.
+
+    dates is a nights x samples array of ephem dates: each row goes from
+    local mean noon on one day of the year to just before the next. nights
+    is the list of the datetime.date of each row.
+    """
+
+    first = date(year, 1, 1)
+    nights = [date.fromordinal(ordinal) for ordinal in
+              range(first.toordinal(), date(year + 1, 1, 1).toordinal())]
+
+    # local mean noon is earlier in utc to the east
+    noon = float(ephem.Date(first)) + 0.5 - lng / 360.0
+    samples_per_night = int(24 * 60 / SAMPLE_MINUTES)
+
+    dates = noon + np.arange(len(nights))[:, np.newaxis] + \
+        np.arange(samples_per_night) * SAMPLE_MINUTES * ephem.minute
+
+    return dates, nights
+
+
+def get_zeniths(lat, lsts):
+    """Return 3 x N array of the zenith's unit vectors at the sidereal times.
+
+    lat and lsts are in degrees; the vectors are equatorial, of date.
+    """
+
+    return get_catalog_vectors(lsts, np.full(np.shape(lsts), lat, dtype=float))
+
+
+def get_moving_vectors(body_class, dates):
+    """Return 3 x N array of body's directions at an array of ephem dates.
+
+    Directions are computed once a day (and one day either side) and
+    interpolated; plenty for the sun and planets, which move a degree a day
+    or less.
+    """
+
+    days = np.arange(np.floor(dates.min()) - 1, np.ceil(dates.max()) + 2)
+    daily = get_unit_vectors(body_class, days)
+
+    vectors = np.array([np.interp(dates, days, component) for component in daily])
+
+    return vectors / np.linalg.norm(vectors, axis=0)
+
+
+def summarize(visible, months, dark_dates, window_nights, num_nights):
+    """Return dict of hours, best month and windows for each object.
+
+    * visible is an objects x dark samples boolean array
+    * months is the array of the month (0 - 11) of each dark sample
+    * dark_dates is the array of the ephem date of each dark sample
+    * window_nights is the array of which window night (0 - 11) each dark
+      sample is in, or -1
+    * num_nights is the array of the number of nights in each month
+
+    See make_plan for the keys; each value is a list (one per object).
+    """
+
+    sample_hours = SAMPLE_MINUTES / 60.0
+
+    # hours per night, for each object in each month
+    month_matrix = np.zeros((len(months), 12))
+    month_matrix[np.arange(len(months)), months] = 1
+    hours = visible.dot(month_matrix) * sample_hours / num_nights
+
+    windows = []
+    for object_visible in visible:
+        object_windows = []
+
+        for month in range(12):
+            window_dates = dark_dates[object_visible & (window_nights == month)]
+            if len(window_dates):
+                object_windows.append((ephem.Date(window_dates[0]),
+                                       ephem.Date(window_dates[-1])))
+            else:
+                object_windows.append(None)
+
+        windows.append(object_windows)
+
+    best_months = [int(np.argmax(object_hours)) + 1 if object_hours.max() else None
+                   for object_hours in hours]
+
+    return {'hours': [[round(float(hour), 2) for hour in object_hours]
+                      for object_hours in hours],
+            'bestMonth': best_months,
+            'windows': windows}
+
+
+def make_plan(lat, lng, year, min_alt=MIN_ALT, twilight_alt=TWILIGHT_ALT):
+    """Return the year's visibility plan for a place.
+
+    lat and lng are in degrees. Returns a dict:
+
+    {'nightHours': [hours of darkness per night, for each month],
+     'constellations': [{'code': 'ORI',
+                         'name': 'Orion',
+                         'hours': [hours per night it can be seen, for each
+                                   month],
+                         'bestMonth': 1,  # the month with the most hours
+                                          # (1 - 12), None if never seen
+                         'windows': [(first, last) ephem dates it can be seen
+                                     on the WINDOW_DAY night of each month,
+                                     or None]},
+                        ...],
+     'planets': [{'name': 'Mars', 'hours': ..., 'bestMonth': ...,
+                  'windows': ...},
+                 ...]}
+    """
+
+    dates, nights = get_night_dates(lng, year)
+    zeniths = get_zeniths(lat, get_local_sidereal_time(dates.ravel(), lng))
+
+    sun_up = (get_moving_vectors(ephem.Sun, dates.ravel()) * zeniths).sum(axis=0)
+    dark = sun_up < np.sin(np.radians(twilight_alt))
+
+    dark_dates = dates.ravel()[dark]
+    dark_zeniths = zeniths[:, dark]
+    samples_per_night = dates.shape[1]
+
+    night_months = np.array([night.month - 1 for night in nights])
+    months = np.repeat(night_months, samples_per_night)[dark]
+
+    window_night_index = np.full(len(nights), -1)
+    for i, night in enumerate(nights):
+        if night.day == WINDOW_DAY:
+            window_night_index[i] = night.month - 1
+    window_nights = np.repeat(window_night_index, samples_per_night)[dark]
+
+    num_nights = np.bincount(night_months, minlength=12)
+    min_up = np.sin(np.radians(min_alt))
+
+    locator = get_locator()
+    centroids = locator.get_centroids()
+    codes = sorted(centroids)
+
+    middle = ephem.Date(date(year, 7, 2))
+    ras, decs = precess([centroids[code][0] for code in codes],
+                        [centroids[code][1] for code in codes],
+                        ephem.J2000, middle)
+
+    visible = get_catalog_vectors(ras, decs).T.dot(dark_zeniths) > min_up
+    summary = summarize(visible, months, dark_dates, window_nights, num_nights)
+
+    plan = {'nightHours': [round(float(hours), 2) for hours in
+                           np.bincount(months, minlength=12) * SAMPLE_MINUTES /
+                           60.0 / num_nights],
+            'constellations': [],
+            'planets': []}
+
+    for i, code in enumerate(codes):
+        plan['constellations'].append({'code': code,
+                                       'name': locator.get_name(code),
+                                       'hours': summary['hours'][i],
+                                       'bestMonth': summary['bestMonth'][i],
+                                       'windows': summary['windows'][i]})
+
+    visible = np.array([(get_moving_vectors(planet, dark_dates) *
+                         dark_zeniths).sum(axis=0) > min_up
+                        for planet in PLANETS])
+    summary = summarize(visible, months, dark_dates, window_nights, num_nights)
+
+    for i, planet in enumerate(PLANETS):
+        plan['planets'].append({'name': planet.__name__,
+                                'hours': summary['hours'][i],
+                                'bestMonth': summary['bestMonth'][i],
+                                'windows': summary['windows'][i]})
+
+    return plan
+
+
+def get_plan(lat, lng, year, min_alt=MIN_ALT, twilight_alt=TWILIGHT_ALT,
+             exact=False):
+    """Return the (cached) plan for the middle of lat / lng's location cell.
+
+    If exact, the plan is made for lat / lng itself, and not cached. See
+    make_plan for the format. Cached plans are shared: don't change them.
+    """
+
+    if exact:
+        return make_plan(lat, lng, year, min_alt, twilight_alt)
+
+    cell = get_cell(lat, lng)
+    key = (cell, year, min_alt, twilight_alt)
+
+    if key not in PLAN_CACHE:
+        if len(PLAN_CACHE) >= MAX_CACHED_PLANS:
+            PLAN_CACHE.clear()
+
+        PLAN_CACHE[key] = make_plan((cell[0] + 0.5) * CELL_SIZE,
+                                    (cell[1] + 0.5) * CELL_SIZE,
+                                    year, min_alt, twilight_alt)
+
+    return PLAN_CACHE[key]
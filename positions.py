@@ -0,0 +1,335 @@
+"""Geocentric sun, moon and planet positions, shared by every observer.
+
+Computing a body with pyEphem is the expensive part of a place-time request,
+but almost all of it (the body's position, distance, magnitude, phase) doesn't
+depend on where the observer is. So bodies are computed geocentrically, once
+per body and instant, and each starfield applies only the cheap observer-
+dependent parts: parallax (large for the moon, tiny but not negligible for
+the others), alt / az and rise / set times.
+
+Instants are quantized to POSITION_QUANTUM, and positions in between are
+interpolated linearly from the instants on either side. All requests in the
+same quantum (for example, every "now" request in the same minute) share the
+same two computations per body.
+
+Tolerance: topocentric ra / dec agree with pyEphem's own to about 0.01 arcsec
+(the moon) or better (everything else). Altitudes include atmospheric
+refraction, worked out the same way as pyEphem's.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+from constellations import get_locator
+
+# positions are computed at whole multiples of this many days
+POSITION_QUANTUM = ephem.minute
+
+# earth's equatorial radius in AU, and its flattening
+EARTH_RADIUS_AU = 6378.137 / 149597870.7
+EARTH_FLATTENING = 1 / 298.257
+
+# cached geocentric positions, keyed by (body name, instant in quanta). Each
+# value is a dict; see get_geocentric_position.
+POSITION_CACHE = {}
+
+# most positions to keep; the cache is emptied when it gets bigger than this
+MAX_CACHED_POSITIONS = 100000
+
+# number of times a body has been computed for the cache (to check it works)
+COMPUTE_COUNT = 0
+
+# refraction formulas (from pyEphem's libastro) switch over between these
+# altitudes, in degrees, and are blended in between
+LOW_REFRACTION_LIMIT = 14.5
+HIGH_REFRACTION_LIMIT = 15.5
+
+# how closely refract matches the true altitude, in radians (0.1 arcsec)
+MAX_REFRACTION_ERROR = math.radians(0.1 / 3600)
+
+
+class BodyPosition(object):
+    """Observer-dependent position and appearance of a sun, moon or planet.
+
+    Attributes have the same names and units as pyEphem's body attributes
+    (angles in radians, earth_distance in AU, size in arcsec), so a
+    BodyPosition can stand in for a computed ephem body:
+
+    * name, mag, size, phase, earth_distance
+    * ra, dec: apparent topocentric position
+    * alt, az: horizontal position
+    * colong: selenographic colongitude of the sun (moon only, else None)
+    * constellation: tuple of (code, name), as from
+      ConstellationLocator.get_constellation
+
+    body is an ephem body of the same kind, for rise / set searches (which
+    recompute it for the times they need).
+    """
+
+    def __init__(self, body, **attributes):
+        """Store the body and attributes."""
+
+        self.body = body
+        self.name = body.name
+
+        for attribute, value in attributes.items():
+            setattr(self, attribute, value)
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< BodyPosition name={} ra={} dec={} >'.format(self.name,
+                                                             self.ra, self.dec)
+
+
+def get_geocentric_position(body_class, quantum_index):
+    """Return dict of the geocentric position of the body at an instant.
+
+    The instant is quantum_index * POSITION_QUANTUM, as an ephem date. Values
+    are computed the first time they're needed, then cached.
+
+    Keys are 'body' (the computed ephem body), and 'ra', 'dec', 'a_ra',
+    'a_dec', 'earth_distance', 'mag', 'size', 'phase', 'colong' (None, except
+    for the moon) as floats, in pyEphem's units.
+    """
+
+    global COMPUTE_COUNT
+
+    key = (body_class.__name__, quantum_index)
+
+    if key not in POSITION_CACHE:
+        if len(POSITION_CACHE) >= MAX_CACHED_POSITIONS:
+            POSITION_CACHE.clear()
+
+        body = body_class(ephem.Date(quantum_index * POSITION_QUANTUM))
+        COMPUTE_COUNT += 1
+
+        position = {'body': body,
+                    'colong': float(body.colong) if body_class is ephem.Moon
+                              else None}
+
+        for attribute in ['ra', 'dec', 'a_ra', 'a_dec', 'earth_distance', 'mag',
+                          'size', 'phase']:
+            position[attribute] = float(getattr(body, attribute))
+
+        POSITION_CACHE[key] = position
+
+    return POSITION_CACHE[key]
+
+
+def interpolate_angle(before, after, fraction):
+    """Return angle (radians) fraction of the way from before to after.
+
+    Goes the short way around, for angles that wrap (such as ra).
+    """
+
+    difference = (after - before + math.pi) % (2 * math.pi) - math.pi
+
+    return (before + fraction * difference) % (2 * math.pi)
+
+
+def get_interpolated_position(body_class, ephem_date):
+    """Return dict of the geocentric position of the body at ephem_date.
+
+    See get_geocentric_position for the keys; 'body' is the body at the start
+    of ephem_date's quantum.
+    """
+
+    # round off floating point error, so times on a quantum boundary (such as
+    # whole minutes) don't need the next quantum too
+    quanta = round(float(ephem_date) / POSITION_QUANTUM, 6)
+    quantum_index = int(math.floor(quanta))
+    fraction = quanta - quantum_index
+
+    before = get_geocentric_position(body_class, quantum_index)
+    if fraction == 0:
+        return before
+
+    after = get_geocentric_position(body_class, quantum_index + 1)
+
+    position = {'body': before['body']}
+
+    for attribute in ['ra', 'a_ra', 'colong']:
+        if before[attribute] is None:
+            position[attribute] = None
+        else:
+            position[attribute] = interpolate_angle(before[attribute],
+                                                    after[attribute], fraction)
+
+    for attribute in ['dec', 'a_dec', 'earth_distance', 'mag', 'size', 'phase']:
+        position[attribute] = before[attribute] + \
+            fraction * (after[attribute] - before[attribute])
+
+    return position
+
+
+def get_topocentric(ra, dec, earth_distance, lat, lst):
+    """Return tuple of (ra, dec, distance ratio) seen from the observer.
+
+    * ra and dec are the geocentric position, in radians
+    * earth_distance is the body's distance from the center of the earth, in AU
+    * lat is the observer's latitude, in degrees
+    * lst is the local sidereal time, in radians
+
+    The distance ratio is the body's distance from the observer, divided by
+    its distance from the center of the earth.
+
+    Uses the rigorous parallax formulas from Meeus, Astronomical Algorithms,
+    ch. 40, for an observer at sea level.
+    """
+
+    # the observer's position relative to the earth's center, in earth radii
+    u = math.atan((1 - EARTH_FLATTENING) * math.tan(math.radians(lat)))
+    rho_sin_phi = (1 - EARTH_FLATTENING) * math.sin(u)
+    rho_cos_phi = math.cos(u)
+
+    sin_parallax = EARTH_RADIUS_AU / earth_distance
+    hour_angle = lst - ra
+
+    # the body's position relative to the observer, in units of its distance
+    # from the earth's center
+    x = math.cos(dec) * math.cos(hour_angle) - rho_cos_phi * sin_parallax
+    y = math.cos(dec) * math.sin(hour_angle)
+    z = math.sin(dec) - rho_sin_phi * sin_parallax
+
+    topo_ra = (lst - math.atan2(y, x)) % (2 * math.pi)
+    topo_dec = math.atan2(z, math.hypot(x, y))
+
+    return topo_ra, topo_dec, math.sqrt(x * x + y * y + z * z)
+
+
+def get_alt_az(ra, dec, lat, lst):
+    """Return tuple of (alt, az) in radians, without refraction.
+
+    ra, dec and lst are in radians, lat in degrees. The same transform as
+    coords.equatorial_to_horizontal, in plain math for a single position (numpy
+    has too much overhead for one position at a time).
+    """
+
+    phi = math.radians(lat)
+    hour_angle = lst - ra
+
+    east = -math.cos(dec) * math.sin(hour_angle)
+    north = math.cos(phi) * math.sin(dec) - \
+        math.sin(phi) * math.cos(dec) * math.cos(hour_angle)
+    up = math.sin(phi) * math.sin(dec) + \
+        math.cos(phi) * math.cos(dec) * math.cos(hour_angle)
+
+    return (math.asin(max(-1, min(1, up))),
+            math.atan2(east, north) % (2 * math.pi))
+
+
+def unrefract(apparent_alt, pressure, temperature):
+    """Return the true altitude for an apparent (refracted) altitude.
+
+    Altitudes are in radians, pressure in millibars and temperature in degrees
+    C. These are the formulas pyEphem uses: one below 14.5 degrees, another
+    above 15.5 degrees, blended in between.
+    """
+
+    alt_deg = math.degrees(apparent_alt)
+
+    # low altitudes. (The formula goes negative below about -5 degrees; then
+    # there's no refraction.)
+    numerator = ((2e-5 * alt_deg + 1.96e-2) * alt_deg + 1.594e-1) * pressure
+    denominator = (273 + temperature) * \
+        ((8.45e-2 * alt_deg + 5.05e-1) * alt_deg + 1)
+    low_refraction = math.radians(numerator / denominator)
+    if apparent_alt < 0 and low_refraction < 0:
+        low_refraction = 0
+
+    if alt_deg < LOW_REFRACTION_LIMIT:
+        return apparent_alt - low_refraction
+
+    # high altitudes
+    high_refraction = 7.888888e-5 * pressure / \
+        ((273 + temperature) * math.tan(apparent_alt))
+    if alt_deg >= HIGH_REFRACTION_LIMIT:
+        return apparent_alt - high_refraction
+
+    blend = (alt_deg - LOW_REFRACTION_LIMIT) / \
+        (HIGH_REFRACTION_LIMIT - LOW_REFRACTION_LIMIT)
+
+    return apparent_alt - low_refraction - \
+        blend * (high_refraction - low_refraction)
+
+
+def refract(true_alt, pressure, temperature):
+    """Return the apparent (refracted) altitude for a true altitude.
+
+    Same units as unrefract. Like pyEphem, solves unrefract backwards with the
+    secant method.
+    """
+
+    if pressure == 0:
+        return true_alt
+
+    # refraction at the true altitude is a first guess at the correction
+    step = 0.8 * (true_alt - unrefract(true_alt, pressure, temperature))
+    last_true = unrefract(true_alt, pressure, temperature)
+    apparent_alt = true_alt
+
+    while True:
+        apparent_alt += step
+        this_true = unrefract(apparent_alt, pressure, temperature)
+        if abs(true_alt - this_true) <= MAX_REFRACTION_ERROR:
+            return apparent_alt
+
+        step *= -(true_alt - this_true) / (last_true - this_true)
+        last_true = this_true
+
+
+def get_body_position(body_class, ephem_date, lat, lst, pressure=1010,
+                      temperature=15):
+    """Return a BodyPosition for the body, seen from lat at ephem_date.
+
+    * lat is the observer's latitude, in degrees
+    * lst is the local (apparent) sidereal time, in radians
+    * pressure (millibars) and temperature (degrees C) are for refraction, as
+      for a pyEphem observer (0 pressure for no refraction)
+
+    The geocentric part comes from the shared cache; the rest is worked out
+    here for this observer.
+    """
+
+    position = get_interpolated_position(body_class, ephem_date)
+
+    ra, dec, distance_ratio = get_topocentric(position['ra'], position['dec'],
+                                              position['earth_distance'], lat,
+                                              lst)
+
+    alt, az = get_alt_az(ra, dec, lat, lst)
+
+    # constellations come from the geocentric astrometric position (as with
+    # pyEphem's)
+    constellation = get_locator().get_constellation(
+        math.degrees(position['a_ra']), math.degrees(position['a_dec']))
+
+    return BodyPosition(position['body'],
+                        ra=ra,
+                        dec=dec,
+                        alt=refract(alt, pressure, temperature),
+                        az=az,
+                        mag=position['mag'],
+                        size=position['size'] / distance_ratio,
+                        phase=position['phase'],
+                        earth_distance=position['earth_distance'] * distance_ratio,
+                        colong=position['colong'],
+                        constellation=constellation)
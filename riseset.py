@@ -0,0 +1,439 @@
+"""Cached rise and set times, shared by nearby starfields on the same day.
+
+Rise and set times for a body change only slowly with location, and each body
+rises and sets about once a day. So instead of running pyEphem's rise/set
+searches for every starfield, the searches run once per body, local date and
+location cell (CELL_SIZE degrees on a side), and every starfield in that cell
+on that day picks its rise/set times out of the cached results.
+
+A cell's searches cover three days at three latitudes, which is much more work
+than one place's own searches, so they only pay off for cells that are asked
+for again. They're run lazily (see get_cached_rise_set): a cell's first
+starfield on a date searches for its own place, and later ones fill in the
+cell's events one latitude at a time.
+
+Tolerance: the cached times are corrected for the observer's longitude within
+the cell (the sky turns at a known rate). With interpolate=True (the default),
+they're also interpolated between the cell's south and north edges. Times
+usually change smoothly enough with latitude for that to be within a fraction
+of a second of pyEphem's own searches, but not always: far north and south,
+and for bodies that barely clear the horizon, a straight line between the
+edges can be off by minutes. So the interpolation is checked against the
+search at the middle of the cell, and where they're more than
+MAX_MIDDLE_DIFFERENCE apart, the cache doesn't answer (and pyEphem's searches
+run for the place itself). Interpolated times are then within about a second.
+Without interpolation, times are for the middle of the cell, and the
+observer's latitude offset can move them by up to about 15 seconds (much more
+at high latitudes).
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from datetime import datetime, time
+import ephem
+import numpy as np
+
+from time_functions import to_utc
+from sidereal_time import get_local_sidereal_time
+
+# size of the location cells, in degrees of latitude and longitude
+CELL_SIZE = 0.1
+
+# how fast the stars turn overhead, in degrees per day
+SIDEREAL_DEG_PER_DAY = 360.98564736629
+
+# events more than this far apart (in days) at the south and north edges of a
+# cell aren't the same rising or setting
+MAX_EDGE_DIFFERENCE = 1 / 12.0
+
+# most an interpolated event (halfway between the edges) can be from the one
+# found at the middle of the cell, in days (one second)
+MAX_MIDDLE_DIFFERENCE = 1 / 86400.0
+
+# rise / set events already found, keyed by (body name, local date, latitude in
+# half cells, cell lng). Each value is a dict of 'rises' and 'sets' (lists of ephem dates
+# as floats) and 'ra_rate' (the body's motion in right ascension, deg/day).
+RISE_SET_CACHE = {}
+
+# most cells' events to keep; the cache is emptied when it gets bigger than
+# this
+MAX_CACHED_EVENTS = 100000
+
+# times each body's cell has been asked for on a local date, while its events
+# aren't all cached yet, keyed by (body name, local date, cell lat, cell lng).
+# Emptied along with RISE_SET_CACHE.
+CELL_REQUESTS = {}
+
+# number of times the rise / set searches have run (to check the cache works)
+SEARCH_COUNT = 0
+
+# what to show instead of rise / set times for bodies that don't rise or set
+ALWAYS_UP = 'always up'
+NEVER_UP = 'never up'
+
+# how far refraction lifts a body at the horizon, in degrees (for pyEphem's
+# default pressure and temperature)
+HORIZON_REFRACTION = 34.5 / 60
+
+# leeway for the circumpolar check, in degrees: covers the moon's parallax and
+# the change in declination between samples
+CIRCUMPOLAR_MARGIN = 2.0
+
+# times get_hour_angle_events corrects its events for the bodies' motion
+HOUR_ANGLE_STEPS = 3
+
+
+def get_cell(lat, lng):
+    """Return tuple of (south edge, west edge) of the cell holding lat/lng.
+
+    Edges are in whole multiples of CELL_SIZE, as ints, to make good dict keys.
+    """
+
+    return (int(math.floor(lat / CELL_SIZE)), int(math.floor(lng / CELL_SIZE)))
+
+
+def get_circumpolar_status(body, lat, ephem_date):
+    """Return ALWAYS_UP or NEVER_UP if body can't rise or set around ephem_date.
+
+    Returns None if the body might rise or set within a day of ephem_date, in
+    which case a search is needed to find out when.
+
+    This is a quick check using the altitudes of the body at its upper and
+    lower culminations (90 - |lat - dec| and |lat + dec| - 90), for the range of
+    declinations the body has over the day before through the day after.
+    """
+
+    body = body.copy()
+    decs = []
+
+    for offset in [-1, 0, 1]:
+        body.compute(ephem.Date(ephem_date + offset))
+        decs.append(math.degrees(body.dec))
+
+    min_dec = min(decs) - CIRCUMPOLAR_MARGIN
+    max_dec = max(decs) + CIRCUMPOLAR_MARGIN
+
+    # the altitude of the body's center when its upper limb touches the horizon
+    horizon = -HORIZON_REFRACTION - math.degrees(body.radius)
+
+    # highest the body gets: 90 degrees if lat is in the declination range,
+    # otherwise at the declination closest to lat
+    closest_dec = min(max(lat, min_dec), max_dec)
+    highest = 90 - abs(lat - closest_dec)
+
+    if highest < horizon:
+        return NEVER_UP
+
+    # lowest the body gets: -90 degrees if -lat is in the declination range,
+    # otherwise at the declination closest to -lat
+    closest_dec = min(max(-lat, min_dec), max_dec)
+    lowest = abs(lat + closest_dec) - 90
+
+    if lowest > horizon:
+        return ALWAYS_UP
+
+    return None
+
+
+def get_ra_rate(body, ephem_date):
+    """Return how fast body moves in right ascension, in degrees per day."""
+
+    body = body.copy()
+
+    body.compute(ephem.Date(ephem_date - 0.5))
+    ra_before = body.ra
+    body.compute(ephem.Date(ephem_date + 0.5))
+
+    ra_change = math.degrees(body.ra - ra_before)
+
+    # wrap around 0h
+    return (ra_change + 180) % 360 - 180
+
+
+def get_horizon_hour_angles(decs, lat, horizon):
+    """Return tuple of arrays (hour angles, cosines) at rising and setting.
+
+    The hour angles (in degrees, 0 to 180) are where bodies at decs reach the
+    altitude horizon (degrees) seen from lat; they're 0 or 180 for bodies that
+    don't, whose cosines are more than 1 (never up) or less than -1 (always
+    up).
+    """
+
+    decs = np.radians(decs)
+    lat = math.radians(lat)
+    horizon = math.radians(horizon)
+
+    cosines = (math.sin(horizon) - math.sin(lat) * np.sin(decs)) / \
+        (math.cos(lat) * np.cos(decs))
+
+    return np.degrees(np.arccos(np.clip(cosines, -1, 1))), cosines
+
+
+def correct_hour_angle_events(get_ra_decs, event_dates, lat, lng, horizon, sign):
+    """Return array of event dates, corrected for the bodies' motion since.
+
+    sign is -1 for risings (east of the meridian) or 1 for settings.
+    """
+
+    ras, decs = get_ra_decs(event_dates)
+    horizon_hour_angles, _ = get_horizon_hour_angles(decs, lat, horizon)
+
+    hour_angles = get_local_sidereal_time(event_dates, lng) - ras
+    errors = (hour_angles - sign * horizon_hour_angles + 180) % 360 - 180
+
+    return event_dates - errors / SIDEREAL_DEG_PER_DAY
+
+
+def get_hour_angle_events(get_ra_decs, ephem_date, lat, lng, horizon):
+    """Return tuple of (previous risings, next settings, statuses) for many bodies.
+
+    A vectorized version of the rise / set searches, for point-like bodies
+    (no parallax or radius) with positions for many at once:
+    get_ra_decs(ephem_dates) returns a tuple of arrays (ra, dec), of the
+    equinox of date and in degrees, for each body at its own date (ephem_dates
+    is a scalar, or an array with a date for each body). horizon is the true
+    altitude (degrees) at which the bodies rise and set: minus the refraction
+    at the horizon, for pyEphem's rise / set times.
+
+    Each body's rising and setting come straight from its hour angle at the
+    horizon, then are corrected HOUR_ANGLE_STEPS times for where the body is
+    at those times. Risings and settings are arrays of ephem dates (as floats),
+    and statuses a list of None, or ALWAYS_UP or NEVER_UP for bodies that don't
+    rise or set (for the declination at ephem_date).
+    """
+
+    ras, decs = get_ra_decs(ephem_date)
+    horizon_hour_angles, cosines = get_horizon_hour_angles(decs, lat, horizon)
+
+    hour_angles = get_local_sidereal_time(ephem_date, lng) - ras
+    risings = ephem_date - (hour_angles + horizon_hour_angles) % 360 / \
+        SIDEREAL_DEG_PER_DAY
+    settings = ephem_date + (horizon_hour_angles - hour_angles) % 360 / \
+        SIDEREAL_DEG_PER_DAY
+
+    for _ in range(HOUR_ANGLE_STEPS):
+        risings = correct_hour_angle_events(get_ra_decs, risings, lat, lng,
+                                            horizon, -1)
+        settings = correct_hour_angle_events(get_ra_decs, settings, lat, lng,
+                                             horizon, 1)
+
+    statuses = [NEVER_UP if cosine > 1 else ALWAYS_UP if cosine < -1 else None
+                for cosine in cosines]
+
+    return risings, settings, statuses
+
+
+def find_events(body, lat, lng, start, end):
+    """Return dict of 'rises' and 'sets' for body between start and end.
+
+    lat and lng are in degrees; start and end are ephem dates. Returns None if
+    the body doesn't rise and set there (always or never up).
+    """
+
+    global SEARCH_COUNT
+
+    observer = ephem.Observer()
+    observer.lat = str(lat)
+    observer.lon = str(lng)
+
+    events = {'rises': [], 'sets': []}
+    searches = [('rises', observer.next_rising), ('sets', observer.next_setting)]
+
+    try:
+        for event_type, search in searches:
+            observer.date = start
+
+            while True:
+                SEARCH_COUNT += 1
+                event = search(body.copy())
+                if event > end:
+                    break
+
+                events[event_type].append(float(event))
+
+                # move past this event to look for the next one
+                observer.date = ephem.Date(event + ephem.minute)
+
+    except ephem.CircumpolarError:
+        return None
+
+    return events
+
+
+def get_cell_events(body, local_date, timezone, half_cell_lat, cell_lng):
+    """Return the (cached) events for the body in a cell on a local date.
+
+    half_cell_lat is the latitude to search at, in half cells (so even numbers
+    are cell edges and odd numbers are cell middles). cell_lng is the cell's
+    west edge, as returned by get_cell; the search is at the middle of the cell.
+    Returns None if the body doesn't rise and set there.
+
+    Events cover the day before through the day after local_date, so any time
+    on local_date has a previous rising and a next setting.
+    """
+
+    key = (body.name, local_date, half_cell_lat, cell_lng)
+
+    if key not in RISE_SET_CACHE:
+        midnight = to_utc(timezone, datetime.combine(local_date, time()))
+        start = ephem.Date(ephem.Date(midnight) - 1)
+        end = ephem.Date(start + 3)
+
+        lat = half_cell_lat * CELL_SIZE / 2
+        lng = (cell_lng + 0.5) * CELL_SIZE
+
+        events = find_events(body, lat, lng, start, end)
+        if events is not None:
+            events['ra_rate'] = get_ra_rate(body, start + 1.5)
+
+        if len(RISE_SET_CACHE) >= MAX_CACHED_EVENTS:
+            RISE_SET_CACHE.clear()
+            CELL_REQUESTS.clear()
+
+        RISE_SET_CACHE[key] = events
+
+    return RISE_SET_CACHE[key]
+
+
+def interpolate_events(south_events, north_events, fraction):
+    """Return list of event times interpolated between the edges of a cell.
+
+    fraction is how far from the south edge to the north edge the observer is.
+    Returns None if the events on the two edges don't pair up.
+    """
+
+    if len(south_events) != len(north_events):
+        return None
+
+    interpolated = []
+    for south, north in zip(south_events, north_events):
+        if abs(north - south) > MAX_EDGE_DIFFERENCE:
+            return None
+        interpolated.append(south + fraction * (north - south))
+
+    return interpolated
+
+
+def is_linear(south_events, middle_events, north_events):
+    """Return whether events at a cell's middle are halfway between the edges.
+
+    That is, whether interpolating between the edges (see interpolate_events)
+    gives the middle's events to within MAX_MIDDLE_DIFFERENCE.
+    """
+
+    halfway = interpolate_events(south_events, north_events, 0.5)
+
+    if halfway is None or len(halfway) != len(middle_events):
+        return False
+
+    return all(abs(interpolated - middle) <= MAX_MIDDLE_DIFFERENCE
+               for interpolated, middle in zip(halfway, middle_events))
+
+
+def get_cached_rise_set(body, ephem_date, lat, lng, local_date, timezone,
+                        interpolate=True):
+    """Return tuple of (previous rising, next setting) as ephem dates.
+
+    * body is a computed ephem body
+    * ephem_date is the time to find the previous rising and next setting for
+    * lat and lng are in degrees
+    * local_date is the date at lat / lng, in timezone
+
+    Returns None if the cached events can't answer (for example, the body is
+    always or never up in the cell, or the events change too unevenly across
+    it to interpolate); use pyEphem's searches in that case.
+
+    With interpolate, finding a cell's events takes three 3-day searches (at
+    the south and north edges and the middle), several times the work of
+    searching for one place's previous rising and next setting. So they're
+    filled in lazily: a cell's first request returns None (and searches its
+    own place), and each later one finds one more set of the cell's events,
+    until all three are cached. Cells asked for only once cost no more than
+    an exact starfield.
+    """
+
+    cell_lat, cell_lng = get_cell(lat, lng)
+
+    if interpolate:
+        missing = [half_cell_lat
+                   for half_cell_lat in (2 * cell_lat + 1, 2 * cell_lat,
+                                         2 * cell_lat + 2)
+                   if (body.name, local_date, half_cell_lat, cell_lng)
+                   not in RISE_SET_CACHE]
+
+        if 2 * cell_lat + 1 not in missing and get_cell_events(
+                body, local_date, timezone, 2 * cell_lat + 1, cell_lng) is None:
+            return None
+
+        if missing:
+            key = (body.name, local_date, cell_lat, cell_lng)
+
+            if len(CELL_REQUESTS) >= MAX_CACHED_EVENTS:
+                CELL_REQUESTS.clear()
+
+            CELL_REQUESTS[key] = CELL_REQUESTS.get(key, 0) + 1
+            if CELL_REQUESTS[key] == 1:
+                return None
+
+            # find one more set of events (the middle first, so cells where
+            # the body doesn't rise and set stop there), and answer once
+            # they're all there
+            events = get_cell_events(body, local_date, timezone, missing[0],
+                                     cell_lng)
+            if events is None or len(missing) > 1:
+                return None
+
+        south = get_cell_events(body, local_date, timezone, 2 * cell_lat, cell_lng)
+        north = get_cell_events(body, local_date, timezone, 2 * cell_lat + 2,
+                                cell_lng)
+        middle = get_cell_events(body, local_date, timezone, 2 * cell_lat + 1,
+                                 cell_lng)
+        if south is None or north is None or middle is None:
+            return None
+
+        for event_type in ['rises', 'sets']:
+            if not is_linear(south[event_type], middle[event_type],
+                             north[event_type]):
+                return None
+
+        fraction = lat / CELL_SIZE - cell_lat
+        rises = interpolate_events(south['rises'], north['rises'], fraction)
+        sets = interpolate_events(south['sets'], north['sets'], fraction)
+
+    else:
+        south = get_cell_events(body, local_date, timezone, 2 * cell_lat + 1,
+                                cell_lng)
+        if south is None:
+            return None
+
+        rises = south['rises']
+        sets = south['sets']
+
+    # the events were found for the middle of the cell. East of there, the body
+    # crosses the horizon earlier, by the time the sky takes to turn that far.
+    lng_offset = lng - (cell_lng + 0.5) * CELL_SIZE
+    time_offset = lng_offset / (SIDEREAL_DEG_PER_DAY - south['ra_rate'])
+
+    prev_rises = [r - time_offset for r in rises if r - time_offset <= ephem_date]
+    next_sets = [s - time_offset for s in sets if s - time_offset > ephem_date]
+
+    if not prev_rises or not next_sets:
+        return None
+
+    return ephem.Date(prev_rises[-1]), ephem.Date(next_sets[0])
@@ -90,10 +90,37 @@ if __name__ == '__main__':
         SeedConstellationTests, SeedStarTests, SeedConstLineTests
     from tests.starfield_tests import StarFieldTestsWithoutDb
     from tests.star_const_tests import StarDataTests, ConstellationDataTests, \
-        SerpensConstellationDataTests
+        SerpensConstellationDataTests, StarCatalogMagTests
     from tests.model_tests import ModelReprTests
     from tests.flask_tests import FlaskHTMLTests, FlaskDefinitionTests, \
-        FlaskStarDataTests, FlaskPlacetimeDataTests
+        FlaskStarDataTests, FlaskPlacetimeDataTests, FlaskTimelineTests, \
+        FlaskMoonCalendarTests, FlaskGeocodeTests, FlaskPlacetimePoolTests, \
+        FlaskConstellationTests, FlaskNearestTests, FlaskSatellitePassesTests, \
+        FlaskVisibleStarsTests, FlaskConjunctionsTests, FlaskEclipsesTests, \
+        FlaskOccultationsTests, FlaskVisibilityPlanTests, FlaskTwilightTests, \
+        FlaskAlmanacTests, FlaskPrecisionTests
+    from tests.geocode_tests import GeocodeHelperTests, GazetteerTests
+    from tests.lunations_tests import LunationTableTests, MoonCalendarTests
+    from tests.riseset_tests import RiseSetCacheTests, CircumpolarTests
+    from tests.coords_tests import CoordsTests
+    from tests.workers_tests import WorkerPoolTests
+    from tests.positions_tests import PositionCacheTests
+    from tests.chebyshev_tests import ChebyshevEphemerisTests
+    from tests.sidereal_time_tests import SiderealTimeTests
+    from tests.skies_tests import SkiesTests
+    from tests.constellations_tests import ConstellationLocatorTests
+    from tests.kdtree_tests import KDTreeTests
+    from tests.minor_bodies_tests import MinorBodyTests
+    from tests.satellites_tests import SatelliteTests
+    from tests.atmosphere_tests import AtmosphereTests
+    from tests.conjunctions_tests import ConjunctionTests
+    from tests.eclipses_tests import EclipseTests
+    from tests.occultations_tests import OccultationTests
+    from tests.planner_tests import PlannerTests
+    from tests.twilight_tests import TwilightTests
+    from tests.almanac_tests import AlmanacTests
+    from tests.epochs_tests import EpochTests
+    from tests.precision_tests import PrecisionTests
 
     # run the tests
     unittest.main()
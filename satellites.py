@@ -0,0 +1,285 @@
+"""Earth satellites (such as the ISS) from a local file of two-line elements.
+
+The TLE file (see seed_data/sources.txt) lists a few hundred to a few
+thousand satellites. For a place and time, only the ones above the horizon
+and lit by the sun are wanted, and that's usually only a handful:
+
+* Every satellite is propagated (by pyEphem's SGP4) once per instant, for
+  its subpoint, height and whether it's in the earth's shadow. These are kept
+  in arrays, cached by instant, so every place asking about the same instant
+  shares them.
+* A numpy pass over the arrays finds the sunlit satellites close enough to
+  the place to be above its horizon (the horizon is farther away for higher
+  satellites).
+* Only those few are computed by pyEphem for the place itself.
+
+Upcoming passes for a place come from pyEphem's next_pass, one satellite at a
+time.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import numpy as np
+import ephem
+
+# to be able to distinguish between data dir for testing
+DATADIR = 'seed_data'
+
+TLE_FILENAME = 'visual.txt'
+
+# earth's mean radius, in meters (pyEphem's satellite elevations are above it)
+EARTH_RADIUS_M = 6371000.0
+
+# extra angle around each satellite's horizon circle, in degrees, so the
+# quick check doesn't miss satellites right at the horizon (the earth isn't
+# quite round, and refraction lifts them a little)
+HORIZON_MARGIN = 2
+
+# passes that don't get this high, in degrees, aren't worth going out for
+MIN_PASS_ALT = 10
+
+# most days of passes to search for
+MAX_PASS_DAYS = 10
+
+# most instants to keep subpoints for; the cache is emptied when it gets
+# bigger than this
+MAX_CACHED_INSTANTS = 1000
+
+# the catalog, loaded on first use (see get_catalog)
+CATALOG = None
+
+
+class SatelliteCatalog(object):
+    """Satellites from two-line elements, for finding which are in the sky.
+
+    * tles is a list of (name, line1, line2) tuples
+
+    Attributes:
+    * tles: the tles, and names: list of satellite names
+    * bodies: list of pyEphem satellites, in the same order
+    * subpoints: cache of get_subpoints results, keyed by instant
+    """
+
+    def __init__(self, tles):
+        """Read the elements into pyEphem satellites."""
+
+        self.tles = tles
+        self.names = [name for name, _, _ in tles]
+        self.bodies = [ephem.readtle(*tle) for tle in tles]
+        self.subpoints = {}
+
+    def __repr__(self):
+        """Helpful representation when printed."""
+
+        return '< SatelliteCatalog satellites={} >'.format(len(self))
+
+    def __len__(self):
+        """Return the number of satellites in the catalog."""
+
+        return len(self.bodies)
+
+    def get_subpoints(self, ephem_date):
+        """Return a dict of arrays of every satellite's subpoint at an instant.
+
+        Keys:
+            'lat', 'lng': the point on the earth below, in radians
+            'elevation': height above the earth, in meters
+            'sunlit': False for satellites in the earth's shadow (or ones whose
+                elements can't be propagated to ephem_date)
+        """
+
+        key = float(ephem_date)
+
+        if key not in self.subpoints:
+            if len(self.subpoints) >= MAX_CACHED_INSTANTS:
+                self.subpoints.clear()
+
+            subpoints = {'lat': np.zeros(len(self)),
+                         'lng': np.zeros(len(self)),
+                         'elevation': np.zeros(len(self)),
+                         'sunlit': np.zeros(len(self), dtype=bool)}
+
+            for i, body in enumerate(self.bodies):
+                try:
+                    body.compute(ephem.Date(ephem_date))
+                except RuntimeError:
+                    continue
+
+                subpoints['lat'][i] = body.sublat
+                subpoints['lng'][i] = body.sublong
+                subpoints['elevation'][i] = body.elevation
+                subpoints['sunlit'][i] = not body.eclipsed
+
+            self.subpoints[key] = subpoints
+
+        return self.subpoints[key]
+
+    def get_body(self, index):
+        """Return a new pyEphem satellite for the satellite at index.
+
+        (A new one, rather than a copy of the one in bodies: pyEphem can crash
+        freeing copies of satellites.)
+        """
+
+        return ephem.readtle(*self.tles[index])
+
+    def get_candidates(self, lat, lng, ephem_date):
+        """Return array of indexes of sunlit satellites that may be up at a place.
+
+        lat and lng are in degrees. A satellite can only be above the horizon
+        if the place is inside the circle on the earth it can see.
+        """
+
+        subpoints = self.get_subpoints(ephem_date)
+        lat = np.radians(lat)
+
+        cos_distances = np.sin(lat) * np.sin(subpoints['lat']) + \
+            np.cos(lat) * np.cos(subpoints['lat']) * \
+            np.cos(subpoints['lng'] - np.radians(lng))
+        distances = np.arccos(np.clip(cos_distances, -1, 1))
+
+        horizons = np.arccos(EARTH_RADIUS_M /
+                             (EARTH_RADIUS_M + np.maximum(subpoints['elevation'], 0)))
+
+        return np.flatnonzero(subpoints['sunlit'] &
+                              (distances < horizons + np.radians(HORIZON_MARGIN)))
+
+    def get_visible(self, observer):
+        """Return list of computed pyEphem satellites up and sunlit for observer.
+
+        observer is a pyEphem observer (with lat, lon and date set). The
+        satellites are new ones (see get_body), so the catalog's own bodies
+        aren't changed.
+        """
+
+        visible = []
+
+        for index in self.get_candidates(np.degrees(observer.lat),
+                                         np.degrees(observer.lon),
+                                         observer.date):
+            body = self.get_body(index)
+            body.compute(observer)
+
+            if body.alt > 0 and not body.eclipsed:
+                visible.append(body)
+
+        return visible
+
+    def get_passes(self, observer, days=1, names=None, min_alt=MIN_PASS_ALT):
+        """Return list of passes over observer in the next days, soonest first.
+
+        * observer is a pyEphem observer; passes start from its date
+        * days is capped at MAX_PASS_DAYS
+        * names, if given, is a list of the satellites to search for (all of
+          them, otherwise)
+        * passes whose highest altitude is under min_alt degrees are left out
+
+        Each pass is a dict with ephem dates 'rise', 'culmination' and 'set',
+        'riseAz' and 'setAz' (degrees), 'maxAlt' (degrees) and 'name'.
+        """
+
+        start = observer.date
+        end = ephem.Date(start + min(days, MAX_PASS_DAYS))
+
+        passes = []
+
+        for index, name in enumerate(self.names):
+            if names is not None and name not in names:
+                continue
+
+            searcher = ephem.Observer()
+            searcher.lat = observer.lat
+            searcher.lon = observer.lon
+            searcher.elevation = observer.elevation
+            searcher.date = start
+
+            body = self.get_body(index)
+
+            while searcher.date < end:
+                try:
+                    rise, rise_az, culmination, max_alt, set_time, set_az = \
+                        searcher.next_pass(body)
+
+                # satellites that never rise or set here (such as geostationary
+                # ones), or whose elements don't propagate this far
+                except (ValueError, RuntimeError):
+                    break
+
+                if None in (rise, culmination, set_time) or rise > end:
+                    break
+
+                if np.degrees(max_alt) >= min_alt:
+                    passes.append({'name': name,
+                                   'rise': ephem.Date(rise),
+                                   'riseAz': float(np.degrees(rise_az)),
+                                   'culmination': ephem.Date(culmination),
+                                   'maxAlt': float(np.degrees(max_alt)),
+                                   'set': ephem.Date(set_time),
+                                   'setAz': float(np.degrees(set_az))})
+
+                searcher.date = ephem.Date(set_time + ephem.minute)
+
+        passes.sort(key=lambda satellite_pass: satellite_pass['rise'])
+
+        return passes
+
+
+def load_tles(filepath):
+    """Return list of (name, line1, line2) tuples from a three-line TLE file.
+
+    Satellites whose elements pyEphem can't read are skipped. Returns an empty
+    list if there's no such file.
+    """
+
+    if not os.path.exists(filepath):
+        return []
+
+    with open(filepath) as tle_file:
+        lines = [line.rstrip() for line in tle_file if line.strip()]
+
+    tles = []
+
+    for i in range(0, len(lines) - 2, 3):
+        tle = (lines[i].strip(), lines[i + 1], lines[i + 2])
+
+        try:
+            ephem.readtle(*tle)
+        except ValueError:
+            continue
+
+        tles.append(tle)
+
+    return tles
+
+
+def get_catalog(datadir=DATADIR):
+    """Return the satellite catalog, loading it the first time it's needed.
+
+    Returns None if there's no TLE file; then there are no satellites to show.
+    """
+
+    global CATALOG
+
+    if CATALOG is None:
+        tles = load_tles(os.path.join(datadir, TLE_FILENAME))
+
+        if tles:
+            CATALOG = SatelliteCatalog(tles)
+
+    return CATALOG
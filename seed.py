@@ -138,6 +138,21 @@ def get_name_and_constellation(star_info):
     return name, constellation
 
 
+def get_proper_motion(star_info):
+    """Return tuple of (pm_ra, pm_dec) from a line in the STARDATA file.
+
+    Both are in milliarcseconds per year, as strings; None if the file has no
+    proper motion columns (older HYG files don't), or they're blank.
+    """
+
+    proper_motion = []
+    for column in ('PMRA', 'PMDec'):
+        value = (star_info.get(column) or '').strip()
+        proper_motion.append(value or None)
+
+    return tuple(proper_motion)
+
+
 def load_constellations(datadir):
     """Load constellation names and abbreviations from csv into db."""
 
@@ -259,6 +274,9 @@ def load_stars(datadir):
             # get name from the best available column
             name, const = get_name_and_constellation(starline)
 
+            # kept for moving stars to other epochs (see epochs.py)
+            pm_ra, pm_dec = get_proper_motion(starline)
+
             star = Star(
                 name=name,
                 const_code=const,
@@ -269,7 +287,9 @@ def load_stars(datadir):
                 absolute_magnitude=starline['AbsMag'],
                 spectrum=spectrum,
                 color_index=color_index,
-                color=color)
+                color=color,
+                pm_ra=pm_ra,
+                pm_dec=pm_dec)
 
             db.session.add(star)
 
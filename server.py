@@ -18,16 +18,31 @@
     # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
 
 import os
+from datetime import datetime, MINYEAR, MAXYEAR
+from multiprocessing import TimeoutError
+import numpy as np
 from flask import Flask, request, render_template, jsonify
 
 from model import connect_to_db, Constellation
-from starfield import StarField
-from stars import get_stars, get_constellations
+from starfield import StarField, PRECISIONS, DEFAULT_PRECISION
+from stars import get_stars, get_constellations, get_nearest_stars, \
+    get_star_catalog, get_star_names
 from definitions import DEFINITIONS
+from geocode import get_gazetteer, get_place_data
+from lunations import get_moon_calendar
+from workers import PlaceTimeRequest, get_place_time, start_pool
+from constellations import get_locator
+from conjunctions import find_conjunctions
+from planner import MIN_ALT, TWILIGHT_ALT
+from twilight import SAMPLE_MINUTES as TWILIGHT_SAMPLE_MINUTES
 
 # display radius
 STARFIELD_RADIUS = 400
 
+# how dates come in to, and go out of, the conjunctions route
+CONJUNCTION_DATE_FORMAT = '%Y-%m-%d'
+ISO_DTIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
 app = Flask(__name__)
 
 
@@ -50,36 +65,463 @@ def return_terms():
 @app.route('/stars.json')
 def return_stars():
     """return a json of star and constellation info
+
+    The optional 'year' arg moves the stars, lines and boundaries to that
+    year's epoch, for skies far in the past or future (see epochs.py).
     """
 
     max_magnitude = 4.5  # dimmest stars to show
+    year = request.args.get('year', type=float)
+
+    return jsonify({'constellations': get_constellations(year),
+                    'stars': get_stars(max_magnitude, year)})
+
+
+@app.route('/constellation.json')
+def return_constellation():
+    """Return json of the constellation at a point in the sky.
+
+    The 'ra' and 'dec' args are in degrees, in the same (d3) coordinates as
+    stars.json: ra is inverted, and the equinox is J2000.
+    """
+
+    ra = request.args.get('ra', type=float)
+    dec = request.args.get('dec', type=float)
+
+    if ra is None or dec is None or not 0 <= ra <= 360 or \
+            not -90 <= dec <= 90:
+        return jsonify({'error': 'ra and dec (in degrees) are required'}), 400
+
+    code, name = get_locator().get_constellation(360 - ra, dec)
+
+    return jsonify({'code': code, 'name': name})
+
+
+@app.route('/nearest.json')
+def return_nearest_objects():
+    """Return json of the objects nearest a point in the sky, nearest first.
+
+    Args:
+        'ra', 'dec': the point, in degrees, in d3 coordinates (as in stars.json)
+        'k': most objects to return (default 5)
+        'radius': furthest to look, in degrees (default 1)
+        'maxMag': dimmest objects to return (default 4.5, as in stars.json;
+            rounded to a half magnitude for stars, see stars.get_catalog_mag)
+        'lat', 'lng', 'datetime': optional place and local time; with these,
+            the sun, moon and planets are included too
+
+    Each object is a star or planet dict, with an extra 'separation' key (in
+    degrees).
+    """
+
+    ra = request.args.get('ra', type=float)
+    dec = request.args.get('dec', type=float)
+    k = request.args.get('k', 5, type=int)
+    radius = request.args.get('radius', 1, type=float)
+    max_magnitude = request.args.get('maxMag', 4.5, type=float)
+
+    if ra is None or dec is None or not -90 <= dec <= 90:
+        return jsonify({'error': 'ra and dec (in degrees) are required'}), 400
 
-    return jsonify({'constellations': get_constellations(),
-                    'stars': get_stars(max_magnitude)})
+    objects = get_nearest_stars(ra, dec, max_magnitude, k, radius)
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    localtime_string = request.args.get('datetime')
+
+    if lat is not None and lng is not None and localtime_string:
+        stf = StarField(lat=lat,
+                        lng=lng,
+                        localtime_string=localtime_string,
+                        max_mag=max_magnitude)
+        objects.extend(stf.get_nearest_bodies(ra, dec, k, radius))
+        objects.sort(key=lambda obj: obj['separation'])
+
+    return jsonify({'objects': objects[:k]})
+
+
+@app.route('/visible-stars.json')
+def return_visible_stars():
+    """Return json of the stars seen through the atmosphere at a place and time.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time (default now)
+        'maxMag': dimmest catalog stars to consider (default 6.5; rounded to
+            a half magnitude, see stars.get_catalog_mag)
+        'skyBrightness': optional sky brightness, in magnitudes per square
+            arcsec; sets the limiting magnitude (default: maxMag)
+
+    Each star has 'ra' and 'dec' (d3 coordinates, as in stars.json), 'alt' and
+    'az' (refracted), 'airmass', and 'magnitude' (after extinction).
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    max_magnitude = request.args.get('maxMag', 6.5, type=float)
+    sky_brightness = request.args.get('skyBrightness', type=float)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'),
+                    max_mag=max_magnitude,
+                    sky_brightness=sky_brightness)
+
+    catalog = get_star_catalog(max_magnitude)
+    apparent = stf.get_apparent_sky(catalog)
+
+    stars = []
+    for i in np.flatnonzero(apparent['visible']):
+        stars.append({'ra': 360 - float(catalog.ra[i]),
+                      'dec': float(catalog.dec[i]),
+                      'alt': float(apparent['alt'][i]),
+                      'az': float(apparent['az'][i]),
+                      'airmass': float(apparent['airmass'][i]),
+                      'magnitude': float(apparent['magnitude'][i])})
+
+    return jsonify({'limitingMagnitude': stf.get_limiting_magnitude(),
+                    'stars': stars})
 
 
 @app.route('/place-time-data.json', methods=['POST'])
 def return_place_time_data():
-    """Return json of sky rotation, planet, sun and moon info.
+    """Return json of sky rotation, and planet, sun, moon, minor body and
+    satellite info.
 
-    Returned data is based on location and time from POST data.
+    Returned data is based on location and time from POST data. The
+    calculations run in the worker pool, if it's started (see workers.py).
+
+    An optional 'precision' in the POST data picks the starfield's precision
+    tier (see starfield.PRECISIONS); it's starfield.DEFAULT_PRECISION if not
+    given.
     """
 
     lat = request.form.get('lat')
     lng = request.form.get('lng')
     localtime_string = request.form.get('datetime')
+    precision = request.form.get('precision', DEFAULT_PRECISION)
     max_magnitude = 5  # dimmest planets to show
 
-    stf = StarField(lat=float(lat),
-                    lng=float(lng),
-                    max_mag=max_magnitude,
-                    localtime_string=localtime_string)
+    if precision not in PRECISIONS:
+        return jsonify({'error': 'unknown precision: {}'.format(precision)}), 400
+
+    place_time_request = PlaceTimeRequest(lat=float(lat),
+                                          lng=float(lng),
+                                          localtime_string=localtime_string,
+                                          max_mag=max_magnitude,
+                                          precision=precision)
+
+    try:
+        place_time = get_place_time(place_time_request)
+    except TimeoutError:
+        return jsonify({'error': 'calculations timed out'}), 503
+
+    # note: 'sundata', since sun is a reserved word in js!
+    return jsonify(place_time._asdict())
+
+
+@app.route('/timeline.json', methods=['POST'])
+def return_timeline_data():
+    """Return json of sky rotation and sun, moon and planet positions over time.
+
+    Frames go from the 'start' to the 'end' local datetimes in the POST data,
+    every 'step' minutes (see StarField.get_timeline for the format).
+    """
+
+    lat = request.form.get('lat', type=float)
+    lng = request.form.get('lng', type=float)
+    start_string = request.form.get('start')
+    end_string = request.form.get('end')
+    step_string = request.form.get('step', '5')
+
+    if lat is None or lng is None or not end_string:
+        return jsonify({'error': 'lat, lng and end are required'}), 400
+
+    if not step_string.isdigit() or int(step_string) <= 0:
+        return jsonify({'error': 'step must be a positive number of minutes'}), 400
+
+    step_minutes = int(step_string)
+
+    try:
+        stf = StarField(lat=lat, lng=lng, localtime_string=start_string)
+    except ValueError:
+        return jsonify({'error': 'start must be a YYYY-MM-DDTHH:MM local time'}), 400
+
+    try:
+        timeline = stf.get_timeline(end_string, step_minutes)
+    except ValueError:
+        return jsonify({'error': 'end must be a YYYY-MM-DDTHH:MM local time'}), 400
+
+    return jsonify({'dateloc': stf.get_specs(), 'timeline': timeline})
+
+
+@app.route('/twilight.json')
+def return_twilight():
+    """Return json of the sun's altitude and twilight times through a night.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time in the night (default now)
+        'step': minutes between samples (default twilight.SAMPLE_MINUTES)
+
+    See StarField.get_twilight_timeline for the format.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    step_minutes = request.args.get('step', TWILIGHT_SAMPLE_MINUTES, type=int)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
+
+    return jsonify({'dateloc': stf.get_specs(),
+                    'twilight': stf.get_twilight_timeline(step_minutes)})
+
+
+@app.route('/almanac.json')
+def return_almanac():
+    """Return json of rise, transit and set times for each day in a range.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time on the first day (default now)
+        'days': how many days (default 30; at most almanac.MAX_ALMANAC_DAYS)
+
+    See StarField.get_almanac for the format.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    days = request.args.get('days', 30, type=int)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
+
+    return jsonify({'dateloc': stf.get_specs(),
+                    'almanac': stf.get_almanac(days)})
+
+
+@app.route('/satellite-passes.json')
+def return_satellite_passes():
+    """Return json of upcoming satellite passes for a place, soonest first.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time to start from (default now)
+        'days': how many days to look ahead (default 1)
+        'name': optional satellite name; may be given more than once
+
+    See StarField.get_satellite_passes for the format of each pass.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    days = request.args.get('days', 1, type=float)
+    names = request.args.getlist('name') or None
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
+
+    return jsonify({'dateloc': stf.get_specs(),
+                    'passes': stf.get_satellite_passes(days, names)})
+
+
+@app.route('/conjunctions.json')
+def return_conjunctions():
+    """Return json of close approaches between the moon and planets, soonest first.
+
+    Args:
+        'start', 'end': the UTC date range, as YYYY-MM-DD (at most about ten
+            years apart; see conjunctions.MAX_SEARCH_DAYS)
+        'maxSep': widest separation to return, in degrees (default 1)
+
+    Each conjunction has 'bodies' (a pair of names), 'date' (UTC, in ISO
+    format) and 'separation' (degrees, at closest approach).
+    """
+
+    max_separation = request.args.get('maxSep', 1, type=float)
+
+    try:
+        start = datetime.strptime(request.args.get('start', ''),
+                                  CONJUNCTION_DATE_FORMAT)
+        end = datetime.strptime(request.args.get('end', ''),
+                                CONJUNCTION_DATE_FORMAT)
+    except ValueError:
+        return jsonify({'error': 'start and end (YYYY-MM-DD) are required'}), 400
+
+    conjunctions = []
+    for approach in find_conjunctions(start, end, max_separation):
+        conjunctions.append({
+            'bodies': approach['bodies'],
+            'date': approach['date'].datetime().strftime(ISO_DTIME_FORMAT),
+            'separation': approach['separation']})
+
+    return jsonify({'conjunctions': conjunctions})
+
+
+@app.route('/eclipses.json')
+def return_eclipses():
+    """Return json of upcoming eclipses seen from a place, soonest first.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time to start from (default now)
+        'years': how many years to look ahead (default 1; at most
+            eclipses.MAX_SEARCH_YEARS)
+
+    See StarField.get_eclipses for the format of each eclipse.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    years = request.args.get('years', 1, type=float)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
+
+    return jsonify({'dateloc': stf.get_specs(),
+                    'eclipses': stf.get_eclipses(years)})
+
+
+@app.route('/occultations.json')
+def return_occultations():
+    """Return json of upcoming occultations seen from a place, soonest first.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time to start from (default now)
+        'days': how many days to look ahead (default 30; at most
+            occultations.MAX_SEARCH_DAYS)
+        'maxMag': dimmest stars to look for (default 7; rounded to a half
+            magnitude, see stars.get_catalog_mag)
+
+    See StarField.get_occultations for the format of each occultation; stars
+    have their names filled in.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    days = request.args.get('days', 30, type=float)
+    max_magnitude = request.args.get('maxMag', 7, type=float)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
+
+    occultations = stf.get_occultations(get_star_catalog(max_magnitude), days)
+
+    star_names = get_star_names([occultation['id']
+                                 for occultation in occultations
+                                 if occultation['id'] is not None])
+    for occultation in occultations:
+        if occultation['id'] is not None:
+            occultation['name'] = star_names.get(occultation['id'])
+
+    return jsonify({'dateloc': stf.get_specs(),
+                    'occultations': occultations})
+
+
+@app.route('/visibility-plan.json')
+def return_visibility_plan():
+    """Return json of when each constellation and planet can be seen in a year.
+
+    Args:
+        'lat', 'lng': the place, in degrees
+        'datetime': optional local time in the year to plan (default now)
+        'minAlt': lowest altitude worth looking at, in degrees (default
+            planner.MIN_ALT)
+        'twilightAlt': the sun's altitude when the sky is dark enough, in
+            degrees (default planner.TWILIGHT_ALT)
+
+    See StarField.get_visibility_plan for the format.
+    """
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+    min_alt = request.args.get('minAlt', MIN_ALT, type=float)
+    twilight_alt = request.args.get('twilightAlt', TWILIGHT_ALT, type=float)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    stf = StarField(lat=lat,
+                    lng=lng,
+                    localtime_string=request.args.get('datetime'))
 
     return jsonify({'dateloc': stf.get_specs(),
-                    'rotation': stf.get_sky_rotation(),
-                    'planets': stf.get_planets(),
-                    'sundata': stf.get_sun(), # sun is a reserved word in js!
-                    'moon': stf.get_moon()})
+                    'plan': stf.get_visibility_plan(min_alt, twilight_alt)})
+
+
+@app.route('/moon-calendar.json')
+def return_moon_calendar():
+    """Return json of moon phase data for every day of a month or year.
+
+    Uses the 'year' and (optional) 'month' args. See get_moon_calendar for the
+    format of each day.
+    """
+
+    year = request.args.get('year', type=int)
+    month = request.args.get('month', type=int)
+
+    if year is None or not MINYEAR <= year <= MAXYEAR:
+        return jsonify({'error': 'year is required'}), 400
+
+    if 'month' in request.args and (month is None or not 1 <= month <= 12):
+        return jsonify({'error': 'month must be from 1 to 12'}), 400
+
+    return jsonify({'days': get_moon_calendar(year, month)})
+
+
+@app.route('/geocode.json')
+def return_geocode_suggestions():
+    """Return json of places whose names start with the 'q' query string.
+
+    Places come from the local gazetteer, most populous first.
+    """
+
+    prefix = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+
+    places = get_gazetteer().autocomplete(prefix, limit)
+
+    return jsonify({'places': [get_place_data(place) for place in places]})
+
+
+@app.route('/reverse-geocode.json')
+def return_reverse_geocode():
+    """Return json of the gazetteer place closest to the 'lat' and 'lng' args."""
+
+    lat = request.args.get('lat', type=float)
+    lng = request.args.get('lng', type=float)
+
+    if lat is None or lng is None:
+        return jsonify({'error': 'lat and lng (in degrees) are required'}), 400
+
+    place = get_gazetteer().reverse(lat, lng)
+
+    return jsonify({'place': get_place_data(place) if place else None})
 
 
 if __name__ == '__main__':
@@ -88,6 +530,9 @@ if __name__ == '__main__':
 
     connect_to_db(app)
 
+    # fork the workers (if STARFIELD_WORKERS is set) before the server starts
+    start_pool()
+
     # Use the DebugToolbar
     # DebugToolbarExtension(app)
 
@@ -0,0 +1,279 @@
+"""Vectorized sidereal time, for sky rotations at many instants and places.
+
+pyEphem only gives the sidereal time for one observer at one instant. These
+functions take arrays of instants (as ephem dates, which are days since noon
+on December 31, 1899) and longitudes, and work out sidereal times for all of
+them at once, with the same formulas pyEphem uses:
+
+* Greenwich mean sidereal time from the IAU 1982 expression
+* plus the equation of the equinoxes, from the IAU 1980 nutation series
+
+Like pyEphem, times are treated as UT (there's no correction for the
+difference between UTC and UT1). Over 1600 - 2400, results agree with
+pyEphem's to about a millisecond of time.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+# J2000.0, as an ephem date
+J2000 = 36525.0
+
+DAYS_PER_CENTURY = 36525.0
+
+ARCSEC_PER_CIRCLE = 360 * 3600.0
+
+# sidereal days are shorter than solar days by this ratio
+SIDEREAL_RATIO = 0.9972695677
+
+# Delaunay arguments (moon's mean anomaly, sun's mean anomaly, moon's argument
+# of latitude, moon's elongation from the sun, moon's ascending node), as
+# polynomial coefficients in arcsec for julian centuries since J2000
+DELAUNAY = np.array([
+    [485866.733, 1717915922.633, 31.310, 0.064],
+    [1287099.804, 129596581.224, -0.577, -0.012],
+    [335778.877, 1739527263.137, -13.257, 0.011],
+    [1072261.307, 1602961601.328, -6.891, 0.019],
+    [450160.280, -6962890.539, 7.455, 0.008]])
+
+# IAU 1980 nutation in longitude: multipliers of the five Delaunay arguments,
+# then the amplitude of the sine term, in 0.0001 arcsec, and its change per
+# ten julian centuries
+NUTATION_TERMS = np.array([
+    ( 0,  0,  0,  0,  1, -171996, -1742),
+    ( 0,  0,  2, -2,  2,  -13187,   -16),
+    ( 0,  0,  2,  0,  2,   -2274,    -2),
+    ( 0,  0,  0,  0,  2,    2062,     2),
+    ( 0,  1,  0,  0,  0,    1426,   -34),
+    ( 1,  0,  0,  0,  0,     712,     1),
+    ( 0,  1,  2, -2,  2,    -517,    12),
+    ( 0,  0,  2,  0,  1,    -386,    -4),
+    ( 1,  0,  2,  0,  2,    -301,     0),
+    ( 0, -1,  2, -2,  2,     217,    -5),
+    ( 1,  0,  0, -2,  0,    -158,     0),
+    ( 0,  0,  2, -2,  1,     129,     1),
+    (-1,  0,  2,  0,  2,     123,     0),
+    ( 0,  0,  0,  2,  0,      63,     0),
+    ( 1,  0,  0,  0,  1,      63,     1),
+    (-1,  0,  2,  2,  2,     -59,     0),
+    (-1,  0,  0,  0,  1,     -58,    -1),
+    ( 1,  0,  2,  0,  1,     -51,     0),
+    ( 2,  0,  0, -2,  0,      48,     0),
+    (-2,  0,  2,  0,  1,      46,     0),
+    ( 0,  0,  2,  2,  2,     -38,     0),
+    ( 2,  0,  2,  0,  2,     -31,     0),
+    ( 2,  0,  0,  0,  0,      29,     0),
+    ( 1,  0,  2, -2,  2,      29,     0),
+    ( 0,  0,  2,  0,  0,      26,     0),
+    ( 0,  0,  2, -2,  0,     -22,     0),
+    (-1,  0,  2,  0,  1,      21,     0),
+    ( 0,  2,  0,  0,  0,      17,    -1),
+    ( 0,  2,  2, -2,  2,     -16,     1),
+    (-1,  0,  0,  2,  1,      16,     0),
+    ( 0,  1,  0,  0,  1,     -15,     0),
+    ( 1,  0,  0, -2,  1,     -13,     0),
+    ( 0, -1,  0,  0,  1,     -12,     0),
+    ( 2,  0, -2,  0,  0,      11,     0),
+    (-1,  0,  2,  2,  1,     -10,     0),
+    ( 1,  0,  2,  2,  2,      -8,     0),
+    ( 1,  1,  0, -2,  0,      -7,     0),
+    ( 0,  1,  2,  0,  2,       7,     0),
+    ( 0, -1,  2,  0,  2,      -7,     0),
+    ( 0,  0,  2,  2,  1,      -7,     0),
+    (-2,  0,  0,  2,  1,      -6,     0),
+    ( 1,  0,  0,  2,  0,       6,     0),
+    ( 2,  0,  2, -2,  2,       6,     0),
+    ( 0,  0,  0,  2,  1,      -6,     0),
+    ( 1,  0,  2, -2,  1,       6,     0),
+    ( 0, -1,  2, -2,  1,      -5,     0),
+    ( 0,  0,  0, -2,  1,      -5,     0),
+    ( 1, -1,  0,  0,  0,       5,     0),
+    ( 2,  0,  2,  0,  1,      -5,     0),
+    ( 2,  0,  0, -2,  1,       4,     0),
+    ( 0,  1,  2, -2,  1,       4,     0),
+    ( 1,  0,  0, -1,  0,      -4,     0),
+    ( 0,  1,  0, -2,  0,      -4,     0),
+    ( 1,  0, -2,  0,  0,       4,     0),
+    ( 0,  0,  0,  1,  0,      -4,     0),
+    (-2,  0,  2,  0,  2,      -3,     0),
+    ( 1, -1,  0, -1,  0,      -3,     0),
+    ( 1,  1,  0,  0,  0,      -3,     0),
+    ( 1,  0,  2,  0,  0,       3,     0),
+    ( 1, -1,  2,  0,  2,      -3,     0),
+    (-1, -1,  2,  2,  2,      -3,     0),
+    ( 3,  0,  2,  0,  2,      -3,     0),
+    ( 0, -1,  2,  2,  2,      -3,     0),
+    ( 0, -2,  2, -2,  1,      -2,     0),
+    (-2,  0,  0,  0,  1,      -2,     0),
+    ( 1,  1,  2,  0,  2,       2,     0),
+    (-1,  0,  2, -2,  1,      -2,     0),
+    ( 2,  0,  0,  0,  1,       2,     0),
+    ( 1,  0,  0,  0,  2,      -2,     0),
+    ( 3,  0,  0,  0,  0,       2,     0),
+    ( 0,  0,  2,  1,  2,       2,     0),
+    (-1,  0,  2,  4,  2,      -2,     0),
+    ( 2,  0, -2,  0,  1,       1,     0),
+    ( 2,  1,  0, -2,  0,       1,     0),
+    ( 0,  0, -2,  2,  1,       1,     0),
+    ( 0,  1, -2,  2,  0,      -1,     0),
+    ( 0,  1,  0,  0,  2,       1,     0),
+    (-1,  0,  0,  1,  1,       1,     0),
+    ( 0,  1,  2, -2,  0,      -1,     0),
+    (-1,  0,  0,  0,  2,       1,     0),
+    ( 1,  0,  0, -4,  0,      -1,     0),
+    (-2,  0,  2,  2,  2,       1,     0),
+    ( 2,  0,  0, -4,  0,      -1,     0),
+    ( 1,  1,  2, -2,  2,       1,     0),
+    ( 1,  0,  2,  2,  1,      -1,     0),
+    (-2,  0,  2,  4,  2,      -1,     0),
+    (-1,  0,  4,  0,  2,       1,     0),
+    ( 1, -1,  0, -2,  0,       1,     0),
+    ( 2,  0,  2, -2,  1,       1,     0),
+    ( 2,  0,  2,  2,  2,      -1,     0),
+    ( 1,  0,  0,  2,  1,      -1,     0),
+    ( 0,  0,  4, -2,  2,       1,     0),
+    ( 3,  0,  2, -2,  2,       1,     0),
+    ( 1,  0,  2, -2,  0,      -1,     0),
+    ( 0,  1,  2,  0,  1,       1,     0),
+    (-1, -1,  0,  2,  1,       1,     0),
+    ( 0,  0, -2,  0,  1,      -1,     0),
+    ( 0,  0,  2, -1,  2,      -1,     0),
+    ( 0,  1,  0,  2,  0,      -1,     0),
+    ( 1,  0, -2, -2,  0,      -1,     0),
+    ( 0, -1,  2,  0,  1,      -1,     0),
+    ( 1,  1,  0, -2,  1,      -1,     0),
+    ( 1,  0, -2,  2,  0,      -1,     0),
+    ( 2,  0,  0,  2,  0,       1,     0),
+    ( 0,  0,  2,  4,  2,      -1,     0),
+    ( 0,  1,  0,  1,  0,       1,     0),
+])
+
+NUTATION_MULTIPLIERS = NUTATION_TERMS[:, :5]
+NUTATION_AMPLITUDES = NUTATION_TERMS[:, 5]
+NUTATION_AMPLITUDE_RATES = NUTATION_TERMS[:, 6]
+
+
+def get_centuries(ephem_dates):
+    """Return array of julian centuries since J2000 for the ephem dates."""
+
+    return (np.asarray(ephem_dates, dtype=float) - J2000) / DAYS_PER_CENTURY
+
+
+def get_mean_sidereal_time(ephem_dates):
+    """Return array of Greenwich mean sidereal times, in degrees."""
+
+    ephem_dates = np.asarray(ephem_dates, dtype=float)
+
+    # ephem dates start at noon: find 0h UT of each date, and the hours since
+    midnights = np.floor(ephem_dates - 0.5) + 0.5
+    hours = (ephem_dates - midnights) * 24
+
+    # sidereal time at 0h UT, in seconds
+    t = get_centuries(midnights)
+    midnight_seconds = 24110.54841 + \
+        (8640184.812866 + (0.093104 - 6.2e-6 * t) * t) * t
+
+    sidereal_hours = midnight_seconds / 3600 + hours / SIDEREAL_RATIO
+
+    return (sidereal_hours * 15) % 360
+
+
+def get_nutation_in_longitude(ephem_dates):
+    """Return array of nutation in longitude, in arcsec."""
+
+    t = get_centuries(ephem_dates)[..., np.newaxis]
+
+    # each Delaunay argument, in radians, for each date
+    arguments = DELAUNAY[:, 0] + t * (DELAUNAY[:, 1] + t * (DELAUNAY[:, 2] +
+                                                            t * DELAUNAY[:, 3]))
+    arguments = (arguments % ARCSEC_PER_CIRCLE) / ARCSEC_PER_CIRCLE * 2 * np.pi
+
+    term_arguments = arguments.dot(NUTATION_MULTIPLIERS.T)
+    amplitudes = NUTATION_AMPLITUDES + NUTATION_AMPLITUDE_RATES * t / 10
+
+    return (amplitudes * np.sin(term_arguments)).sum(axis=-1) / 10000
+
+
+def get_nutation_in_obliquity(ephem_dates):
+    """Return array of nutation in obliquity, in arcsec.
+
+    From the four largest terms (Meeus, Astronomical Algorithms, ch. 22),
+    good to about 0.1 arcsec.
+    """
+
+    t = get_centuries(ephem_dates)
+
+    node = np.radians(125.04452 - 1934.136261 * t)
+    sun_longitude = np.radians(280.4665 + 36000.7698 * t)
+    moon_longitude = np.radians(218.3165 + 481267.8813 * t)
+
+    return 9.20 * np.cos(node) + 0.57 * np.cos(2 * sun_longitude) + \
+        0.10 * np.cos(2 * moon_longitude) - 0.09 * np.cos(2 * node)
+
+
+def get_mean_obliquity(ephem_dates):
+    """Return array of the mean obliquity of the ecliptic, in degrees."""
+
+    t = get_centuries(ephem_dates)
+
+    return 23.4392911 + t * (-46.8150 + t * (-0.00059 + t * 0.001813)) / 3600
+
+
+def get_equation_of_equinoxes(ephem_dates):
+    """Return array of apparent minus mean sidereal time, in degrees.
+
+    (The nutation in obliquity is left out of the cosine: it changes the
+    result by less than a thousandth of an arcsec.)
+    """
+
+    obliquity = np.radians(get_mean_obliquity(ephem_dates))
+
+    return get_nutation_in_longitude(ephem_dates) * np.cos(obliquity) / 3600
+
+
+def get_sidereal_time(ephem_dates):
+    """Return array of Greenwich apparent sidereal times, in degrees."""
+
+    return (get_mean_sidereal_time(ephem_dates) +
+            get_equation_of_equinoxes(ephem_dates)) % 360
+
+
+def get_local_sidereal_time(ephem_dates, lngs):
+    """Return array of local apparent sidereal times, in degrees.
+
+    ephem_dates and lngs (in degrees, east positive) are arrays (or scalars)
+    that broadcast together with numpy: for example, dates as a column and
+    longitudes as a row give a table of every date at every longitude.
+    """
+
+    return (get_sidereal_time(ephem_dates) + np.asarray(lngs, dtype=float)) % 360
+
+
+def get_sky_rotations(ephem_dates, lats, lngs):
+    """Return dict of d3 sky rotations, in degrees, for each date and place.
+
+    Arrays broadcast as in get_local_sidereal_time. Keys:
+        'lambda': the local sidereal time
+        'phi': minus the latitude
+    """
+
+    lambdas = get_local_sidereal_time(ephem_dates, lngs)
+    phis = -1 * np.asarray(lats, dtype=float)
+
+    return {'lambda': lambdas, 'phi': np.broadcast_to(phis, lambdas.shape)}
@@ -0,0 +1,68 @@
+"""Time rise / set calculations at worst-case (high) latitudes.
+
+For each latitude and date, times get_rise_set_times for the sun, moon and
+planets on an exact starfield (no rise / set cache), and reports the slowest
+body and how many bodies were always / never up.
+
+Run from the repo root (colors.py opens seed_data with a relative path):
+    python sketches/riseset_benchmark.py
+"""
+
+import time
+import ephem
+
+# be able to import from the repo root
+import sys
+sys.path.append('.')
+
+from starfield import StarField, PLANETS
+from riseset import ALWAYS_UP, NEVER_UP
+
+# longitude of Tromso; the latitude is what matters here
+LNG = 18.96
+
+LATS = [60, 64, 66, 66.5, 67, 69.65, 75, 80, 85, 89.9,
+        -60, -66.5, -70, -77.85, -89.9]
+
+# solstices, an equinox, and the days the polar day starts / ends in Tromso
+DATES = ['2017-03-20T12:00', '2017-05-19T12:00', '2017-06-21T12:00',
+         '2017-07-25T12:00', '2017-12-21T12:00']
+
+BODIES = [ephem.Sun, ephem.Moon] + PLANETS
+
+# header
+print(','.join(['lat', 'date', 'totalMs', 'slowestBody', 'slowestMs',
+                'alwaysUp', 'neverUp']))
+
+worst_ms = 0
+
+for lat in LATS:
+    for date in DATES:
+
+        stf = StarField(lat, LNG, date, exact=True)
+
+        total = 0
+        slowest = (None, 0)
+        always_up = never_up = 0
+
+        for body in BODIES:
+            obj = stf.get_body(body)
+
+            start = time.time()
+            prev_rise, next_set = stf.get_rise_set_times(obj)
+            elapsed = (time.time() - start) * 1000
+
+            total += elapsed
+            if elapsed > slowest[1]:
+                slowest = (obj.name, elapsed)
+
+            always_up += ALWAYS_UP in (prev_rise, next_set)
+            never_up += NEVER_UP in (prev_rise, next_set)
+
+        worst_ms = max(worst_ms, total)
+
+        print(','.join([str(lat), date, '{:.2f}'.format(total), slowest[0],
+                        '{:.2f}'.format(slowest[1]), str(always_up),
+                        str(never_up)]))
+
+print('worst total: {:.2f} ms'.format(worst_ms))
@@ -0,0 +1,178 @@
+"""Time the vectorized engines against the budgets they were written for.
+
+Wall-clock times depend on the machine (and on what else it's doing), so they
+aren't unit tests: this runs each engine on a realistic load, once for the
+first call and then REPEATS more times, and reports the fastest run
+next to its budget.
+
+Run from the repo root (the catalogs come from tests/test_data):
+    python sketches/speed_benchmark.py
+"""
+
+import os
+import time
+from datetime import date
+import numpy as np
+import pytz
+import ephem
+
+# be able to import from the repo root
+import sys
+sys.path.append('.')
+
+import almanac
+import atmosphere
+import conjunctions
+import coords
+import eclipses
+import epochs
+import geocode
+import minor_bodies
+import occultations
+import planner
+import satellites
+import skies
+import twilight
+from run_tests import TESTDATA_DIR
+
+# san francisco, on the evening of March 1, 2017
+LAT = 37.7749
+LNG = -122.4194
+EPHEM_DATE = ephem.Date('2017/3/2 05:00')
+LOCAL_DATE = date(2017, 3, 1)
+TIMEZONE = pytz.timezone('America/Los_Angeles')
+
+# number of stars in the magnitude 7 catalog, roughly
+NUM_STARS = 16000
+
+# times to run each engine after the first call
+REPEATS = 5
+
+
+def get_random_catalog(size):
+    """Return an EquatorialCatalog of size stars spread evenly over the sky."""
+
+    rand = np.random.RandomState(0)
+
+    return coords.EquatorialCatalog(
+        ra=rand.uniform(0, 360, size),
+        dec=np.degrees(np.arcsin(rand.uniform(-1, 1, size))),
+        ids=np.arange(size),
+        magnitudes=rand.uniform(0, 7, size))
+
+
+def get_minor_body_catalog(size):
+    """Return a MinorBodyCatalog of size random asteroids."""
+
+    rand = np.random.RandomState(0)
+
+    return minor_bodies.MinorBodyCatalog(
+        [{'name': str(i), 'kind': 'asteroid', 'H': 8, 'G': 0.15,
+          'epoch': ephem.Date('2017/9/4'), 'M': rand.uniform(0, 360),
+          'peri': rand.uniform(0, 360), 'node': rand.uniform(0, 360),
+          'incl': rand.uniform(0, 30), 'e': rand.uniform(0, 0.9),
+          'a': rand.uniform(1.5, 5)}
+         for i in range(size)])
+
+
+def get_satellite_observer():
+    """Return a pyEphem observer for satellite passes."""
+
+    observer = ephem.Observer()
+    observer.lat = str(LAT)
+    observer.lon = str(LNG)
+    observer.date = EPHEM_DATE
+
+    return observer
+
+
+def get_benchmarks():
+    """Return list of (name, budget in seconds, function to time)."""
+
+    rand = np.random.RandomState(0)
+
+    catalog = get_random_catalog(NUM_STARS)
+    alts = rand.uniform(-90, 90, NUM_STARS)
+    magnitudes = rand.uniform(-1, 6.5, NUM_STARS)
+    pm_ras = rand.normal(0, 50, NUM_STARS)
+    pm_decs = rand.normal(0, 50, NUM_STARS)
+
+    place_lats = rand.uniform(-90, 90, 1000)
+    place_lngs = rand.uniform(-180, 180, 1000)
+
+    minor_body_catalog = get_minor_body_catalog(5000)
+
+    satellite_catalog = satellites.get_catalog(TESTDATA_DIR)
+    many_satellites = satellites.SatelliteCatalog(
+        satellite_catalog.tles * (3000 // len(satellite_catalog)))
+
+    gazetteer = geocode.Gazetteer(os.path.join(TESTDATA_DIR,
+                                               geocode.GAZETTEER_FILENAME))
+
+    return [
+        ('horizontal transform ({} stars)'.format(NUM_STARS), 0.001,
+         lambda: catalog.get_horizontal(37.7, 100)),
+        ('above horizon mask ({} stars)'.format(NUM_STARS), 0.001,
+         lambda: catalog.get_above_horizon(37.7, 100)),
+        ('apparent sky ({} stars)'.format(NUM_STARS), 0.05,
+         lambda: atmosphere.get_apparent_sky(alts, magnitudes, 6)),
+        ('proper motion to 1000 AD ({} stars)'.format(NUM_STARS), 0.05,
+         lambda: epochs.move_to_epoch(catalog.ra, catalog.dec, pm_ras, pm_decs,
+                                      1000)),
+        ('skies (1000 places)', 0.05,
+         lambda: skies.get_skies(place_lats, place_lngs, EPHEM_DATE)),
+        ('minor body positions (5000 bodies)', 0.1,
+         lambda: minor_body_catalog.get_positions(EPHEM_DATE)),
+        ('visible satellites (3000 satellites)', 0.5,
+         lambda: many_satellites.get_visible(get_satellite_observer())),
+        ('autocomplete', 0.001, lambda: gazetteer.autocomplete('san f')),
+        ('reverse geocode', 0.001, lambda: gazetteer.reverse(37.78, -122.41)),
+        ('reverse geocode far from cities', 0.005,
+         lambda: gazetteer.reverse(-89, 0)),
+        ('twilight timeline (one-minute steps)', 0.05,
+         lambda: twilight.make_twilight(LAT, LNG, LOCAL_DATE, TIMEZONE, 1)),
+        ('year plan', 1, lambda: planner.make_plan(-33.87, 151.21, 2017)),
+        ('almanac (a year)', 1,
+         lambda: almanac.get_almanac(LAT, LNG, date(2017, 1, 1), 365, TIMEZONE)),
+        ('occultations (a month)', 3,
+         lambda: occultations.find_occultations(catalog, LAT, LNG,
+                                                ephem.Date('2017/3/1'),
+                                                ephem.Date('2017/3/31'))),
+        ('eclipses (a century)', 5,
+         lambda: eclipses.get_eclipses(-1, 1, ephem.Date('2000/1/1'),
+                                       ephem.Date('2100/1/1'))),
+        ('conjunctions (ten years)', 10,
+         lambda: conjunctions.find_conjunctions('2017/1/1', '2027/1/1')),
+    ]
+
+
+def get_seconds(function):
+    """Return tuple of (first call, fastest repeat) seconds for function."""
+
+    start = time.time()
+    function()
+    first = time.time() - start
+
+    fastest = first
+    for _ in range(REPEATS):
+        start = time.time()
+        function()
+        fastest = min(fastest, time.time() - start)
+
+    return first, fastest
+
+
+# header
+print(','.join(['benchmark', 'firstMs', 'fastestMs', 'budgetMs', 'overBudget']))
+
+over_budget = 0
+
+for name, budget, function in get_benchmarks():
+    first, fastest = get_seconds(function)
+    over_budget += fastest > budget
+
+    print(','.join([name, '{:.2f}'.format(first * 1000),
+                    '{:.2f}'.format(fastest * 1000),
+                    '{:.2f}'.format(budget * 1000), str(fastest > budget)]))
+
+print('over budget: {}'.format(over_budget))
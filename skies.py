@@ -0,0 +1,165 @@
+"""Sky summaries for many places at one instant, all at once.
+
+A StarField does everything for one place: pyEphem bodies, rise and set times,
+moon images and so on. For pages that list tonight's sky for hundreds of
+cities, that's a lot of repeated work. These functions take arrays of
+latitudes and longitudes and work out, for every place in one numpy pass:
+
+* the d3 sky rotation
+* the sun's and moon's altitude and azimuth
+* each planet's altitude, azimuth and whether it's visible (above the horizon
+  and no dimmer than max_mag)
+
+Geocentric positions come from the shared position cache (see positions.py),
+so the sun, moon and planets are computed once per instant, not once per
+place. Parallax and refraction (see atmosphere.py) are worked out the same
+way as in positions.get_body_position, so altitudes agree with a StarField's.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+import ephem
+
+from positions import get_interpolated_position, EARTH_RADIUS_AU, \
+    EARTH_FLATTENING
+from sidereal_time import get_sky_rotations
+from atmosphere import refract
+
+# same planets as starfield.PLANETS (importing starfield would mean importing
+# pytz and tzwhere just for this list)
+PLANETS = [ephem.Mercury, ephem.Venus, ephem.Mars, ephem.Jupiter, ephem.Saturn,
+           ephem.Neptune, ephem.Uranus]
+
+
+def get_observer_offsets(lats):
+    """Return tuple of arrays (rho sin phi', rho cos phi') for the latitudes.
+
+    These are the observers' positions relative to the earth's center, in
+    earth radii (see positions.get_topocentric).
+    """
+
+    u = np.arctan((1 - EARTH_FLATTENING) * np.tan(np.radians(lats)))
+
+    return (1 - EARTH_FLATTENING) * np.sin(u), np.cos(u)
+
+
+def get_topocentric_vectors(position, lsts, offsets):
+    """Return tuple of arrays (x, west, z) of a body relative to each place.
+
+    The body's position is in the frame of the meridian, west and the north
+    pole, in units of its distance from the earth's center, as in
+    positions.get_topocentric. Arguments are as for get_body_alt_az.
+    """
+
+    rho_sin_phi, rho_cos_phi = offsets
+    sin_parallax = EARTH_RADIUS_AU / position['earth_distance']
+    hour_angles = lsts - position['ra']
+    cos_dec = np.cos(position['dec'])
+
+    x = cos_dec * np.cos(hour_angles) - rho_cos_phi * sin_parallax
+    west = cos_dec * np.sin(hour_angles)
+    z = np.sin(position['dec']) - rho_sin_phi * sin_parallax
+
+    return x, west, z
+
+
+def get_body_ra_dec(position, lsts, offsets):
+    """Return tuple of arrays (ra, dec) in radians of a body seen from each place.
+
+    These are the topocentric (parallax-corrected) ra and dec, as a
+    StarField's. Arguments are as for get_body_alt_az.
+    """
+
+    x, west, z = get_topocentric_vectors(position, lsts, offsets)
+
+    return ((lsts - np.arctan2(west, x)) % (2 * np.pi),
+            np.arctan2(z, np.hypot(x, west)))
+
+
+def get_body_alt_az(position, lats, lsts, offsets, pressure, temperature):
+    """Return tuple of arrays (alt, az) in degrees of a body for each place.
+
+    * position is a dict of the body's geocentric position (see
+      positions.get_interpolated_position)
+    * lats are in degrees, and lsts (local sidereal times) in radians
+    * offsets are from get_observer_offsets for the lats
+
+    Altitudes are refracted for the pressure and temperature.
+    """
+
+    x, west, z = get_topocentric_vectors(position, lsts, offsets)
+
+    # rotate into each observer's horizon
+    phis = np.radians(lats)
+    up = np.cos(phis) * x + np.sin(phis) * z
+    north = np.cos(phis) * z - np.sin(phis) * x
+
+    alts = np.arctan2(up, np.hypot(west, north))
+    azs = np.arctan2(-west, north) % (2 * np.pi)
+
+    return np.degrees(refract(alts, pressure, temperature)), np.degrees(azs)
+
+
+def get_skies(lats, lngs, ephem_date, max_mag=5, pressure=1010, temperature=15):
+    """Return a dict of sky summaries for arrays of places at one instant.
+
+    * lats and lngs are arrays (or lists) of the places, in degrees
+    * ephem_date is the instant: an ephem date, or anything ephem.Date takes
+      (such as a utc datetime)
+    * max_mag is the dimmest planet magnitude that counts as visible
+    * pressure and temperature are for refraction, as in positions.py
+
+    Return value is a dict of numpy arrays, with one item per place:
+
+    { 'rotation': {'lambda': [lambdas], 'phi': [phis]},
+      'sun': {'alt': [altitudes], 'az': [azimuths]},
+      'moon': {'alt': [...], 'az': [...]},
+      'planets': { 'Mars': {'alt': [...], 'az': [...], 'visible': [booleans]},
+                   ... } }
+
+    Angles are in degrees.
+    """
+
+    ephem_date = ephem.Date(ephem_date)
+    lats = np.asarray(lats, dtype=float)
+    lngs = np.asarray(lngs, dtype=float)
+
+    skies = {'rotation': get_sky_rotations(ephem_date, lats, lngs),
+             'planets': {}}
+
+    lsts = np.radians(skies['rotation']['lambda'])
+    offsets = get_observer_offsets(lats)
+
+    for key, body_class in [('sun', ephem.Sun), ('moon', ephem.Moon)]:
+        position = get_interpolated_position(body_class, ephem_date)
+        alts, azs = get_body_alt_az(position, lats, lsts, offsets, pressure,
+                                    temperature)
+        skies[key] = {'alt': alts, 'az': azs}
+
+    for planet in PLANETS:
+        position = get_interpolated_position(planet, ephem_date)
+        alts, azs = get_body_alt_az(position, lats, lsts, offsets, pressure,
+                                    temperature)
+
+        skies['planets'][planet.__name__] = {
+            'alt': alts,
+            'az': azs,
+            'visible': (alts > 0) & (position['mag'] <= max_mag)}
+
+    return skies
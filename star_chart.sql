@@ -214,7 +214,9 @@ CREATE TABLE stars (
     absolute_magnitude numeric(5,3),
     spectrum character varying(16) NOT NULL,
     color_index numeric(4,3),
-    color character varying(7) NOT NULL
+    color character varying(7) NOT NULL,
+    pm_ra numeric(9,2),
+    pm_dec numeric(9,2)
 );
 
 
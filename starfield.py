@@ -17,24 +17,40 @@
     # You should have received a copy of the GNU Affero General Public License
     # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
 
-import os
 import math
-from datetime import datetime
+from datetime import datetime, timedelta
 # from sidereal import sidereal
 import pytz
 from tzwhere import tzwhere
-from geopy import geocoders
 import ephem
+import numpy as np
 
 from time_functions import to_utc
-from colors import PLANET_COLORS_BY_NAME
+from colors import PLANET_COLORS_BY_NAME, MINOR_BODY_COLORS, SATELLITE_COLOR
+from lunations import get_moon_phase_phrase
+from riseset import get_cached_rise_set, get_circumpolar_status, \
+                    get_hour_angle_events, ALWAYS_UP, NEVER_UP
+from positions import BodyPosition, get_body_position
+from sidereal_time import get_local_sidereal_time, get_sky_rotations
+from constellations import get_locator, precess
+from minor_bodies import get_catalog
+import satellites
+from coords import EquatorialCatalog
+from epochs import get_apparent_vectors, get_catalog_positions, CATALOG_EPOCH
+from eclipses import get_eclipses
+from occultations import find_occultations
+from planner import get_plan, MIN_ALT, TWILIGHT_ALT
+from twilight import get_twilight, SAMPLE_MINUTES as TWILIGHT_SAMPLE_MINUTES
+from almanac import get_almanac
+from conjunctions import get_positions
+from chebyshev import get_ra_dec
+from skies import get_observer_offsets, get_body_ra_dec, get_body_alt_az
+from atmosphere import get_apparent_sky, get_airmass, get_extinction, \
+    get_limiting_magnitude, unrefract
 
 # it takes some time to initialize this, so do it once when the file loads
 TZW = tzwhere.tzwhere()
 
-# for getting timezone from lat/lng
-GEOCODER = geocoders.GoogleV3(api_key=os.environ['GOOGLE_PLACES_APIKEY'])
-
 # to determine which non-star objects to find
 PLANETS = [ephem.Mercury, ephem.Venus, ephem.Mars,
            ephem.Jupiter, ephem.Saturn, ephem.Neptune, ephem.Uranus]
@@ -57,6 +73,43 @@ GOOGLE_TZ_URL = 'https://maps.googleapis.com/maps/api/timezone/json'
 # optional debugging output
 DEBUG = False
 
+# most frames a timeline will return (a day at one-minute steps)
+MAX_TIMELINE_FRAMES = 24 * 60 + 1
+
+# minutes between the timeline's geocentric positions (unless frames are
+# further apart); frames in between are interpolated (cutting the corner of
+# the moon's path by under a thousandth of a degree)
+TIMELINE_NODE_MINUTES = 60
+
+# days between the timeline's magnitudes, which change slowly
+TIMELINE_MAGNITUDE_DAYS = 1
+
+# ISO 8601 format for utc times sent to the front end
+ISO_DTIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+# precision tiers for starfield calculations:
+#
+# * FAST: sun, moon and planet positions are interpolated from the shared
+#   geocentric position cache (see positions.py): ra / dec within about 0.01
+#   arcsec of pyEphem's (0.02 for the moon). Rise and set times come from the
+#   shared cell cache (see riseset.py), within about a second of pyEphem's
+#   searches: cells where interpolating between the cell's edges isn't that
+#   good fall back to the searches.
+#   Solar eclipses, visibility plans and twilight timelines are for the middle
+#   of the location cell, which moves their times by up to about 20 seconds.
+#   Cost (sun, moon and planets with rise / set times, on a laptop): a cell's
+#   first starfield on a date searches its own place, about as long as the
+#   exact tier (4 ms); the next three each find a third of the cell's events
+#   too (about 12 ms); after that, about 1 ms. Twenty starfields in one cell
+#   on a date take about a third less time than the exact tier's.
+# * EXACT: everything is computed by pyEphem for this starfield's exact place
+#   and time, with no shared caches (for pointing telescopes). Costs about
+#   4 ms for every starfield, wherever and whenever it is.
+FAST = 'fast'
+EXACT = 'exact'
+PRECISIONS = [FAST, EXACT]
+DEFAULT_PRECISION = FAST
+
 
 def deg_to_rad(angle):
     """Return angle (in degrees) translated into radians"""
@@ -73,7 +126,8 @@ def rad_to_deg(angle):
 class StarField(object):
     """Class for calculating stars and constellation display"""
 
-    def __init__(self, lat, lng, localtime_string=None, max_mag=5):
+    def __init__(self, lat, lng, localtime_string=None, max_mag=5, exact=False,
+                 sky_brightness=None, precision=None):
         """Initialize Starfield object.
 
         * lat is latitude in degrees (positive / negative)
@@ -82,11 +136,31 @@ class StarField(object):
             If not provided, will default to now
         * max_mag is the maximum magnitude to display for this starfield (to
           eliminate dim stars)
+        * exact, if True, is the same as precision=EXACT
+        * sky_brightness, if provided, is the sky brightness in magnitudes per
+          square arcsec; the limiting magnitude for get_apparent_sky comes from
+          it, rather than from max_mag
+        * precision is one of PRECISIONS (default DEFAULT_PRECISION, or EXACT
+          if exact is True). EXACT skips the shared caches (such as the rise /
+          set cache and the geocentric position cache) and runs every
+          calculation for this starfield's exact place and time; see FAST and
+          EXACT for the error bounds of each.
+
+        Raises ValueError for an unknown precision.
         """
 
+        if precision is None:
+            precision = EXACT if exact else DEFAULT_PRECISION
+
+        if precision not in PRECISIONS:
+            raise ValueError('unknown precision: {}'.format(precision))
+
         self.max_mag = max_mag
         self.lat = lat
         self.lng = lng
+        self.precision = precision
+        self.exact = precision == EXACT
+        self.sky_brightness = sky_brightness
 
         # set the local time zone
         self.set_timezone()
@@ -134,7 +208,11 @@ class StarField(object):
         return specs
 
     def make_ephem(self):
-        """Generate an ephemeris for pyEphem planet positions."""
+        """Generate an ephemeris for pyEphem planet positions.
+
+        Also resets the body cache, since cached bodies were computed for the
+        previous observer state.
+        """
 
         # alert ephem of starfield properties
         self.ephem = ephem.Observer()
@@ -146,6 +224,68 @@ class StarField(object):
         # ephem uses utctime
         self.ephem.date = self.utctime
 
+        # computed bodies, positions and rise/set times, keyed by body name
+        self.bodies = {}
+        self.positions = {}
+        self.rise_set_dates = {}
+
+        # local sidereal time, worked out on first use
+        self.local_sidereal_time = None
+
+        # how many times a body has been computed for this observer state
+        self.body_computations = 0
+
+    def get_body(self, body_class):
+        """Return the computed ephem body for this starfield.
+
+        body_class is an ephem body class, such as ephem.Mars. Each body is only
+        computed once per observer state; after that it comes from the cache.
+        """
+
+        name = body_class.__name__
+
+        if name not in self.bodies:
+            self.bodies[name] = body_class(self.ephem)
+            self.body_computations += 1
+
+        return self.bodies[name]
+
+    def get_position(self, body_class):
+        """Return a positions.BodyPosition of the body for this starfield.
+
+        Unless this is an exact starfield, the position comes from the shared
+        geocentric position cache (see positions.py for its tolerance), with
+        only parallax and alt / az worked out for this starfield. Exact
+        starfields get their positions from pyEphem bodies computed for this
+        observer (see get_body).
+        """
+
+        name = body_class.__name__
+
+        if name not in self.positions:
+            if self.exact:
+                body = self.get_body(body_class)
+                self.positions[name] = BodyPosition(
+                    body,
+                    ra=body.ra,
+                    dec=body.dec,
+                    alt=body.alt,
+                    az=body.az,
+                    mag=body.mag,
+                    size=body.size,
+                    phase=body.phase,
+                    earth_distance=body.earth_distance,
+                    colong=body.colong if body_class is ephem.Moon else None,
+                    constellation=get_locator().get_constellation(
+                        rad_to_deg(body.a_ra), rad_to_deg(body.a_dec)))
+            else:
+                self.positions[name] = get_body_position(
+                    body_class, self.ephem.date, self.lat,
+                    deg_to_rad(self.get_local_sidereal_time()),
+                    self.ephem.pressure, self.ephem.temp)
+
+        return self.positions[name]
+
     def set_timezone(self):
         """return the timezone based on the lat/lng and desired time.
 
@@ -157,7 +297,16 @@ class StarField(object):
         # TODO: make guesses based on longitude: https://en.wikipedia.org/wiki/List_of_tz_database_time_zones
         # TODO: inform user if error
 
-        timezone_str = TZW.tzNameAt(self.lat, self.lng) or 'Etc/UTC'
+        # tzwhere has no data for the far north and south, and raises KeyError.
+        # It also has non-timezone names, such as 'uninhabited' for Antarctica.
+        try:
+            timezone_str = TZW.tzNameAt(self.lat, self.lng) or 'Etc/UTC'
+        except KeyError:
+            timezone_str = 'Etc/UTC'
+
+        if timezone_str not in pytz.all_timezones_set:
+            timezone_str = 'Etc/UTC'
+
         self.timezone = pytz.timezone(timezone_str)        
 
     def set_time(self, localtime_string):
@@ -202,18 +351,79 @@ class StarField(object):
         Since this will only show for objects currently visible, the previous
         rise and the next set will be informative.
 
-        Times will be strings in the format DISPLAY_TIME_FORMAT.
+        Times will be strings in the format DISPLAY_TIME_FORMAT, or ALWAYS_UP /
+        NEVER_UP for bodies that don't rise or set (for example, the summer sun
+        at high latitudes). See get_rise_set_dates.
+        """
+
+        return tuple(event if event in (ALWAYS_UP, NEVER_UP)
+                     else self.get_display_time(event)
+                     for event in self.get_rise_set_dates(obj))
+
+    def get_rise_set_dates(self, obj):
+        """Return tuple of (previous rising, next setting) for the object.
+
+        Each is an ephem date, or ALWAYS_UP / NEVER_UP for bodies that don't
+        rise or set.
+
+        Unless this is an exact starfield, the dates come from the shared rise /
+        set cache (see riseset.py for its tolerance), falling back to pyEphem's
+        searches when the cache can't answer. The cache is tried before the
+        circumpolar check, which computes the body three times: when the cache
+        has a rising and a setting, the body isn't always or never up.
+
+        The searches run on a copy of obj: pyEphem recomputes the body it's
+        given at each step of the search, which would otherwise leave obj's
+        position (and alt/az, phase, etc.) at the rise or set time.
         """
 
-        prev_rise = self.ephem.previous_rising(obj)
-        prev_rise_local = self.get_local_from_ephem(prev_rise)
-        prev_rise_string = prev_rise_local.strftime(DISPLAY_TIME_FORMAT)
+        if obj.name in self.rise_set_dates:
+            return self.rise_set_dates[obj.name]
+
+        rise_set = None
+        if not self.exact:
+            rise_set = get_cached_rise_set(obj, self.ephem.date, self.lat,
+                                           self.lng, self.localtime.date(),
+                                           self.timezone)
+
+        # bodies that can't rise or set here today don't need a search
+        if not rise_set:
+            status = get_circumpolar_status(obj, self.lat, self.ephem.date)
+            if status:
+                self.rise_set_dates[obj.name] = (status, status)
+                return self.rise_set_dates[obj.name]
 
-        next_set = self.ephem.next_setting(obj)
-        next_set_local = self.get_local_from_ephem(next_set)
-        next_set_string = next_set_local.strftime(DISPLAY_TIME_FORMAT)
+        if rise_set:
+            prev_rise, next_set = rise_set
+        else:
+            prev_rise = self.search_rise_or_set(self.ephem.previous_rising, obj)
+            next_set = self.search_rise_or_set(self.ephem.next_setting, obj)
+
+        self.rise_set_dates[obj.name] = (prev_rise, next_set)
+
+        return self.rise_set_dates[obj.name]
+
+    def get_display_time(self, ephem_date):
+        """Return local time string (DISPLAY_TIME_FORMAT) for the ephem date."""
+
+        return self.get_local_from_ephem(ephem_date).strftime(DISPLAY_TIME_FORMAT)
+
+    def search_rise_or_set(self, search, obj):
+        """Return the ephem date found by a pyEphem rise or set search.
+
+        search is one of this starfield's observer methods, such as
+        self.ephem.previous_rising. If the body doesn't cross the horizon in the
+        search, returns ALWAYS_UP or NEVER_UP instead of a date.
+        """
+
+        try:
+            return search(obj.copy())
 
-        return (prev_rise_string, next_set_string)
+        except ephem.AlwaysUpError:
+            return ALWAYS_UP
+
+        except ephem.NeverUpError:
+            return NEVER_UP
 
     def get_planet_data(self, planet):
         """Return a dict of planet data for the ephem object and planet object.
@@ -236,7 +446,7 @@ class StarField(object):
         """
 
         # using the ephemeris way of getting data for a planet for this date
-        pla = planet(self.ephem)
+        pla = self.get_position(planet)
 
         # if it's too dim, don't return it
         if pla.mag > self.max_mag:
@@ -250,6 +460,17 @@ class StarField(object):
         planet_data['dec'] = rad_to_deg(pla.dec)
 
         planet_data['magnitude'] = pla.mag
+
+        # how much air it's seen through, and how bright it looks through it
+        # (None below the horizon)
+        if pla.alt > 0:
+            planet_data['airmass'] = float(get_airmass(rad_to_deg(pla.alt)))
+            planet_data['extinctedMagnitude'] = pla.mag + \
+                float(get_extinction(rad_to_deg(pla.alt)))
+        else:
+            planet_data['airmass'] = None
+            planet_data['extinctedMagnitude'] = None
+
         planet_data['name'] = pla.name
         planet_data['color'] = PLANET_COLORS_BY_NAME[pla.name]
         planet_data['size'] = pla.size
@@ -258,21 +479,14 @@ class StarField(object):
         planet_data['phase'] = '{:.1f}'.format(pla.phase)
         planet_data['celestialType'] = 'planet'
 
-        # ephem.constellation gives a tuple of (abbrev, full name)
-        planet_data['constellation'] = ephem.constellation(pla)[1]
+        # the constellation is a tuple of (code, full name)
+        planet_data['constellation'] = pla.constellation[1]
 
         # get rising and setting times
-        prev_rise, next_set = self.get_rise_set_times(pla)
+        prev_rise, next_set = self.get_rise_set_times(pla.body)
         planet_data['prevRise'] = prev_rise
         planet_data['nextSet'] = next_set
 
-        # set attributes for sun and moon for later use
-        if pla.name == 'Sun':
-            self.sun = pla
-
-        if pla.name == 'Moon':
-            self.moon = pla
-
         return planet_data
 
     def get_planets(self):
@@ -290,60 +504,371 @@ class StarField(object):
 
         return planets
 
-    def get_moon_phase_phrase(self):
-        """Get a phrase (e.g. waxing crescent) to describe the moon phase.
+    def get_minor_bodies(self):
+        """Return a list of asteroid and comet data dicts, transformed for d3.
 
-        Returns a tuple (waxwan, full_phrase) -- both strings.
+        Only bodies no dimmer than max_mag are returned; there are none if
+        there are no minor body elements files (see minor_bodies.py). The
+        dicts have the same keys as planet dicts (see get_planet_data), except
+        for size and phase.
 
-        waxwan is simply the first word in the phrase, for use in determing
-        rotation.
+        Rise and set times come from the same vectorized positions (see
+        riseset.get_hour_angle_events), rather than pyEphem's searches for each
+        body.
+        """
+
+        catalog = get_catalog()
+        if catalog is None:
+            return []
+
+        positions = catalog.get_positions(self.ephem.date)
+        indexes = np.flatnonzero(positions['mag'] <= self.max_mag)
+
+        if not len(indexes):
+            return []
+
+        j2000_ras = positions['ra'][indexes]
+        j2000_decs = positions['dec'][indexes]
+
+        # precess to the equinox of date, like the planets' positions
+        ras, decs = precess(j2000_ras, j2000_decs, ephem.J2000, self.ephem.date)
+        codes = get_locator().find(j2000_ras, j2000_decs)
+
+        def get_ra_decs(ephem_dates):
+            """Return the bodies' positions of date, each at its own date."""
+
+            return precess(*catalog.get_ra_decs(ephem_dates, indexes),
+                           from_epoch=ephem.J2000, to_epoch=self.ephem.date)
+
+        # the bodies rise when refraction lifts them to the horizon
+        horizon = math.degrees(unrefract(np.zeros(1), self.ephem.pressure,
+                                         self.ephem.temp)[0])
+        prev_rises, next_sets, statuses = get_hour_angle_events(
+            get_ra_decs, float(self.ephem.date), self.lat, self.lng, horizon)
 
-        This function is more efficient if self.moon has already been set, but
-        will set it if not.
+        minor_bodies = []
+
+        for i, index in enumerate(indexes):
+            body_data = {}
+            kind = catalog.kinds[index]
+
+            # invert the RA for inside sphere viewing
+            body_data['ra'] = 360 - float(ras[i])
+            body_data['dec'] = float(decs[i])
+
+            body_data['magnitude'] = float(positions['mag'][index])
+            body_data['name'] = str(catalog.names[index])
+            body_data['color'] = MINOR_BODY_COLORS[kind]
+            body_data['distance'] = '{:.3f}'.format(positions['earth_distance'][index])
+            body_data['distanceUnits'] = 'AU'
+            body_data['celestialType'] = kind
+            body_data['constellation'] = get_locator().get_name(codes[i])
+
+            if statuses[i]:
+                body_data['prevRise'] = body_data['nextSet'] = statuses[i]
+            else:
+                body_data['prevRise'] = self.get_display_time(ephem.Date(prev_rises[i]))
+                body_data['nextSet'] = self.get_display_time(ephem.Date(next_sets[i]))
+
+            minor_bodies.append(body_data)
+
+        return minor_bodies
+
+    def get_satellites(self):
+        """Return a list of satellite data dicts, transformed for d3.
+
+        Only satellites above the horizon and lit by the sun are returned;
+        there are none if there's no TLE file (see satellites.py). Example
+        satellite dict:
+
+        {'name': 'ISS (ZARYA)',
+         'ra': 117.34,
+         'dec': 48.13,
+         'alt': 34.5,  # degrees
+         'az': 201.3,
+         'distance': '612',
+         'distanceUnits': 'km',
+         'color': '#ffffff',
+         'celestialType': 'satellite',
+         'constellation': 'Gemini'}
         """
 
-        # the tolerance for exact moon phases new, full, quarter
-        tolerance = 0.05
+        catalog = satellites.get_catalog()
+        if catalog is None:
+            return []
 
-        try:
-            moon = self.moon
-        except AttributeError:
-            moon = ephem.Moon(self.ephem)
-            self.moon = moon
+        satellite_list = []
 
-        # take care of new and full
-        if moon.phase < tolerance:
-            return '', 'new moon'
+        for sat in catalog.get_visible(self.ephem):
+            sat_data = {}
 
-        if 100 - moon.phase < tolerance:
-            return '', 'full moon'
+            # invert the RA for inside sphere viewing
+            sat_data['ra'] = 360 - rad_to_deg(sat.ra)
+            sat_data['dec'] = rad_to_deg(sat.dec)
 
-        # otherwise it's in between
-        next_new = ephem.next_new_moon(self.ephem.date)
-        next_full = ephem.next_full_moon(self.ephem.date)
+            sat_data['alt'] = rad_to_deg(sat.alt)
+            sat_data['az'] = rad_to_deg(sat.az)
+            sat_data['name'] = sat.name
+            sat_data['color'] = SATELLITE_COLOR
+            sat_data['distance'] = '{:.0f}'.format(sat.range / 1000)
+            sat_data['distanceUnits'] = 'km'
+            sat_data['celestialType'] = 'satellite'
+            sat_data['constellation'] = get_locator().get_constellation(
+                rad_to_deg(sat.ra), rad_to_deg(sat.dec), self.ephem.date)[1]
 
-        if next_new < next_full:
-            growth = 'waning'
-        else:
-            growth = 'waxing'
+            satellite_list.append(sat_data)
 
-        # is it a quarter?
-        if abs(moon.phase - 50) < tolerance:
-            if growth == 'waxing':
-                return growth, 'first quarter'
+        return satellite_list
 
-            # otherwise it's waning: third quarter
-            return growth, 'third quarter'
+    def get_satellite_passes(self, days=1, names=None):
+        """Return a list of upcoming satellite pass dicts, soonest first.
 
-        # most likely: an in between state
-        if moon.phase < 50:
-            phase = 'crescent'
-        else:
-            phase = 'gibbous'
+        Passes are over this starfield's place, starting at its time and
+        going for days (see satellites.SatelliteCatalog.get_passes). names,
+        if given, is a list of the satellites to look for. Example pass dict:
+
+        {'name': 'ISS (ZARYA)',
+         'date': 'March 1, 2017',
+         'rise': '9:14 PM',
+         'riseAz': 247.1,
+         'culmination': '9:19 PM',
+         'maxAlt': 64.2,
+         'set': '9:24 PM',
+         'setAz': 61.8}
+        """
+
+        catalog = satellites.get_catalog()
+        if catalog is None:
+            return []
+
+        passes = catalog.get_passes(self.ephem, days, names)
+
+        for satellite_pass in passes:
+            satellite_pass['date'] = datetime.strftime(
+                self.get_local_from_ephem(satellite_pass['rise']),
+                DISPLAY_DATE_FORMAT)
+
+            for key in ('rise', 'culmination', 'set'):
+                satellite_pass[key] = self.get_display_time(satellite_pass[key])
+
+        return passes
+
+    def get_eclipses(self, years=1):
+        """Return a list of eclipse dicts seen from here, soonest first.
+
+        Eclipses are from this starfield's time through the next years (see
+        eclipses.get_eclipses). Unless this is an exact starfield, they're for
+        the middle of its location cell. Times are local display times (None
+        for phases the eclipse doesn't have). Example eclipse dict:
+
+        {'type': 'solar',
+         'kind': 'partial',
+         'date': 'August 21, 2017',
+         'start': '9:01 AM',
+         'partialStart': '9:01 AM',
+         'centralStart': None,
+         'maximum': '10:15 AM',
+         'centralEnd': None,
+         'partialEnd': '11:37 AM',
+         'end': '11:37 AM',
+         'magnitude': 0.80,
+         'altitude': 42.7}
+        """
+
+        start = self.ephem.date
+        eclipses = get_eclipses(self.lat, self.lng, start,
+                                ephem.Date(start + years * 365.25),
+                                exact=self.exact)
+
+        for eclipse in eclipses:
+            eclipse['date'] = datetime.strftime(
+                self.get_local_from_ephem(eclipse['maximum']),
+                DISPLAY_DATE_FORMAT)
+
+            for key in ('start', 'partialStart', 'centralStart', 'maximum',
+                        'centralEnd', 'partialEnd', 'end'):
+                if eclipse[key] is not None:
+                    eclipse[key] = self.get_display_time(eclipse[key])
+
+        return eclipses
+
+    def get_occultations(self, catalog, days=30):
+        """Return a list of occultation dicts seen from here, soonest first.
+
+        * catalog is an EquatorialCatalog of the stars to look for (see
+          stars.get_star_catalog); planets are looked for too
+        * occultations are from this starfield's time through the next days
+          (see occultations.find_occultations)
+
+        Times are local display times. Example occultation dict:
+
+        {'celestialType': 'star',
+         'id': 1234,
+         'name': None,
+         'magnitude': 0.87,
+         'date': 'March 4, 2017',
+         'disappearance': '7:02 PM',
+         'reappearance': '8:16 PM',
+         'disappearanceAlt': 63.8,
+         'reappearanceAlt': 52.4}
+        """
 
-        full_phrase = '{} {}: {:.1f}'.format(growth, phase, moon.phase)
+        start = self.ephem.date
+        occultations = find_occultations(catalog, self.lat, self.lng, start,
+                                         ephem.Date(start + days))
 
-        return growth, full_phrase
+        for occultation in occultations:
+            occultation['date'] = datetime.strftime(
+                self.get_local_from_ephem(occultation['disappearance']),
+                DISPLAY_DATE_FORMAT)
+
+            for key in ('disappearance', 'reappearance'):
+                occultation[key] = self.get_display_time(occultation[key])
+
+        return occultations
+
+    def get_visibility_plan(self, min_alt=MIN_ALT, twilight_alt=TWILIGHT_ALT):
+        """Return the visibility plan for this starfield's year, seen from here.
+
+        See planner.make_plan for the format. Unless this is an exact
+        starfield, the plan is for the middle of its location cell. Windows
+        are local display times, as tuples (first, last). Example:
+
+        {'nightHours': [12.07, 11.23, ...],
+         'constellations': [{'code': 'ORI',
+                             'name': 'Orion',
+                             'hours': [8.23, 5.85, ...],
+                             'bestMonth': 12,
+                             'windows': [('5:25 PM', '1:35 AM'), ...]},
+                            ...],
+         'planets': [...]}
+        """
+
+        year = self.get_local_from_ephem(self.ephem.date).year
+        plan = get_plan(self.lat, self.lng, year, min_alt, twilight_alt,
+                        exact=self.exact)
+
+        def localize(entry):
+            """Return a copy of a plan entry, with its windows' local times."""
+
+            entry = dict(entry)
+            entry['windows'] = [(self.get_display_time(window[0]),
+                                 self.get_display_time(window[1]))
+                                if window else None
+                                for window in entry['windows']]
+
+            return entry
+
+        return {'nightHours': list(plan['nightHours']),
+                'constellations': [localize(entry)
+                                   for entry in plan['constellations']],
+                'planets': [localize(entry) for entry in plan['planets']]}
+
+    def get_twilight_timeline(self, step_minutes=TWILIGHT_SAMPLE_MINUTES):
+        """Return a dict of the sun's altitude and twilight times for tonight.
+
+        The timeline runs from local noon to the next local noon (starting the
+        day before if this starfield's time is before noon, so the timeline
+        holds it), every step_minutes minutes. Unless this is an exact
+        starfield, it's for the middle of the location cell (see
+        twilight.get_twilight). Return value:
+
+        { 'times': [utc times, in ISO_DTIME_FORMAT],
+          'timeStrings': [local times, in DISPLAY_TIME_FORMAT],
+          'sunAlt': [the sun's altitudes, in degrees],
+          'phases': ['day', ..., 'civil', ..., 'night', ...],
+          'events': [{'event': 'sunset',
+                      'time': utc time, in ISO_DTIME_FORMAT,
+                      'timeString': '6:03 PM'},
+                     ...] }
+        """
+
+        local_date = self.localtime.date()
+        if self.localtime.hour < 12:
+            local_date -= timedelta(days=1)
+
+        twilight = get_twilight(self.lat, self.lng, local_date, self.timezone,
+                                step_minutes, exact=self.exact)
+
+        def get_times(ephem_date):
+            """Return tuple of (utc ISO string, local display string)."""
+
+            utctime = ephem.Date(ephem_date).datetime().replace(tzinfo=pytz.UTC)
+
+            return (utctime.strftime(ISO_DTIME_FORMAT),
+                    utctime.astimezone(self.timezone).strftime(DISPLAY_TIME_FORMAT))
+
+        times = [get_times(ephem_date) for ephem_date in twilight['dates']]
+
+        events = []
+        for event in twilight['events']:
+            utc_string, local_string = get_times(event['date'])
+            events.append({'event': event['event'],
+                           'time': utc_string,
+                           'timeString': local_string})
+
+        return {'times': [utc_string for utc_string, _ in times],
+                'timeStrings': [local_string for _, local_string in times],
+                'sunAlt': np.round(twilight['alts'], 3).tolist(),
+                'phases': list(twilight['phases']),
+                'events': events}
+
+    def get_almanac(self, days=30):
+        """Return a dict of daily rise, transit and set times seen from here.
+
+        Days run from this starfield's local date (see almanac.get_almanac).
+        Return value is a dict of parallel lists, one item per day:
+
+        { 'dates': ['March 1, 2017', ...],
+          'bodies': { 'Sun': {'rise': ['6:43 AM', ...],
+                              'transit': ['12:24 PM', ...],
+                              'set': ['6:03 PM', ...],
+                              'transitAlt': [43.0, ...]},
+                      ... } }
+
+        Times are local display times; rises and sets are ALWAYS_UP or
+        NEVER_UP for days the body doesn't cross the horizon, and any time is
+        None if it's on the day before or after instead.
+        """
+
+        almanac = get_almanac(self.lat, self.lng, self.localtime.date(), days,
+                              self.timezone)
+
+        def get_display(event_date):
+            """Return display string for an event (or the event, if not a date)."""
+
+            if isinstance(event_date, float):
+                return self.get_display_time(event_date)
+
+            return event_date
+
+        bodies = {}
+        for name, body_days in almanac['bodies'].items():
+            bodies[name] = {'transitAlt': body_days['transitAlt']}
+
+            for event in ('rise', 'transit', 'set'):
+                bodies[name][event] = [get_display(event_date)
+                                       for event_date in body_days[event]]
+
+        return {'dates': [day.strftime(DISPLAY_DATE_FORMAT)
+                          for day in almanac['dates']],
+                'bodies': bodies}
+
+    def get_moon_phase_phrase(self):
+        """Get a phrase (e.g. waxing crescent) to describe the moon phase.
+
+        Returns a tuple (waxwan, full_phrase) -- both strings.
+
+        waxwan is simply the first word in the phrase, for use in determing
+        rotation.
+
+        Waxing / waning comes from the shared lunation table, rather than
+        searching for the next new and full moons for every starfield.
+        """
+
+        moon = self.get_position(ephem.Moon)
+
+        return get_moon_phase_phrase(moon, self.ephem.date)
 
     def calculate_moon_angle(self, waxwan):
         """Calculate the rotation angle of the phased moon for displaying in d3.
@@ -364,13 +889,12 @@ class StarField(object):
 
         """
 
-        # alt/az does not work (MUCH to my consternation) if I try to save the
-        # calculated sun and moon as attributes when they're processed in
-        # get_planet_data. Why? I'm not sure. For now, just recalculating, as it
-        # works. Will possibly try to understand later.
-
-        sun = ephem.Sun(self.ephem)
-        moon = ephem.Moon(self.ephem)
+        # these come from the position cache. (They used to be recalculated
+        # here, because the rise/set searches in get_rise_set_times left the
+        # cached bodies at their rise/set positions; those searches now use
+        # copies.)
+        sun = self.get_position(ephem.Sun)
+        moon = self.get_position(ephem.Moon)
 
         # the position angle of the mid- point of the moon's bright limb,
         #     measured from the horizontal point of the disk (using alt / az)
@@ -406,11 +930,13 @@ class StarField(object):
         moon_data = self.get_planet_data(ephem.Moon)
         moon_data['celestialType'] = 'moon'
 
+        moon = self.get_position(ephem.Moon)
+
         # more digits for the moon, because the number's small
-        moon_data['distance'] = '{:.5f}'.format(self.moon.earth_distance)
+        moon_data['distance'] = '{:.5f}'.format(moon.earth_distance)
 
         # translate colong into degrees
-        moon_data['colong'] = rad_to_deg(self.moon.colong)
+        moon_data['colong'] = rad_to_deg(moon.colong)
 
         # moon gets descriptive phase info
         waxwan, full_phrase = self.get_moon_phase_phrase()
@@ -454,11 +980,189 @@ class StarField(object):
         # ha_in_degrees = rad_to_deg(ha_in_rad)
 
         # sidereal is no longer available, and the pyc files I was using were for python2
-        # Using ephem instead for hour angle
-        # reference: https://stackoverflow.com/questions/13664935/is-this-how-to-compute-greenwich-hour-angle-with-pyephem-under-python-3
-        ha_in_degrees = ephem.degrees(self.ephem.sidereal_time())
+        # Using the sidereal_time module instead (same formulas as pyEphem).
+        #
+        # in degrees, for d3
+        ha_in_degrees = self.get_local_sidereal_time()
 
         # the phi rotation is dependent solely on the latitude
         phi = -1 * self.lat
 
         return {'lambda': ha_in_degrees, 'phi': phi}
+
+    def get_local_sidereal_time(self):
+        """Return the local (apparent) sidereal time, in degrees."""
+
+        if self.local_sidereal_time is None:
+            self.local_sidereal_time = float(get_local_sidereal_time(
+                self.ephem.date, self.lng))
+
+        return self.local_sidereal_time
+
+    def get_horizontal(self, catalog):
+        """Return dict of alt / az arrays for a coords.EquatorialCatalog.
+
+        See EquatorialCatalog.get_horizontal for the keys. The catalog is
+        transformed for this starfield's latitude and local sidereal time, all
+        at once. Catalogs with an epoch (such as J2000 star catalogs) are
+        first moved to their apparent places at this starfield's time (see
+        epochs.get_apparent_vectors).
+        """
+
+        vectors = None
+        if catalog.epoch is not None:
+            vectors = get_apparent_vectors(catalog.vectors, catalog.epoch,
+                                           self.ephem.date)
+
+        return catalog.get_horizontal(self.lat, self.get_local_sidereal_time(),
+                                      vectors)
+
+    def get_limiting_magnitude(self):
+        """Return the dimmest magnitude visible overhead for this starfield.
+
+        From the sky brightness, if there is one; max_mag otherwise.
+        """
+
+        if self.sky_brightness is None:
+            return self.max_mag
+
+        return float(get_limiting_magnitude(self.sky_brightness))
+
+    def get_apparent_sky(self, catalog):
+        """Return dict of arrays of how a catalog looks through the atmosphere.
+
+        catalog is a coords.EquatorialCatalog with magnitudes. Keys are as
+        atmosphere.get_apparent_sky ('alt', 'airmass', 'magnitude' and
+        'visible', for the limiting magnitude), plus 'az'. Everything in the
+        catalog is refracted and dimmed at once.
+        """
+
+        horizontal = self.get_horizontal(catalog)
+
+        apparent = get_apparent_sky(horizontal['alt'], catalog.magnitudes,
+                                    self.get_limiting_magnitude(),
+                                    self.ephem.pressure, self.ephem.temp)
+        apparent['az'] = horizontal['az']
+
+        return apparent
+
+    def get_nearest_bodies(self, ra, dec, k=1, radius=1):
+        """Return list of sun, moon and planet dicts nearest a point, nearest first.
+
+        ra and dec are in degrees, in the same coordinates as the star dicts
+        (ra inverted for d3, and the catalog's J2000 equinox), so stars and
+        bodies can be compared. Returns up to k bodies within radius degrees;
+        planets dimmer than max_mag are left out (see get_planets). Each dict
+        has an extra 'separation' key: its distance from the point, in
+        degrees.
+
+        The bodies' dicts have their apparent positions of date, as from
+        get_planets; they're moved back to the catalog's equinox (see
+        epochs.get_catalog_positions) just for the separations.
+        """
+
+        bodies = [self.get_sun(), self.get_moon()] + self.get_planets()
+        catalog_ras, catalog_decs = get_catalog_positions(
+            [360 - body['ra'] for body in bodies],
+            [body['dec'] for body in bodies], CATALOG_EPOCH, self.ephem.date)
+        catalog = EquatorialCatalog(ra=catalog_ras, dec=catalog_decs)
+
+        indexes, separations = catalog.get_nearest(360 - ra, dec, k, radius)
+
+        nearest_bodies = []
+        for index, separation in zip(indexes, separations):
+            body_data = bodies[index]
+            body_data['separation'] = float(separation)
+            nearest_bodies.append(body_data)
+
+        return nearest_bodies
+
+    def get_timeline(self, end_localtime_string, step_minutes):
+        """Return a dict of sky rotations and body positions for each frame.
+
+        Frames run from this starfield's time to end_localtime_string (a string
+        in BOOTSTRAP_DTIME_FORMAT, in this starfield's time zone), every
+        step_minutes minutes. At most MAX_TIMELINE_FRAMES frames are returned.
+
+        Return value is a dict of parallel lists, one item per frame:
+
+        { 'times': [utc times, in ISO_DTIME_FORMAT],
+          'timeStrings': [local times, in DISPLAY_TIME_FORMAT],
+          'rotation': {'lambda': [lambdas, in degrees], 'phi': phi},
+          'bodies': { 'Mars': {'ra': [...], 'dec': [...], 'alt': [...],
+                               'az': [...], 'magnitude': [...]},
+                      ... } }
+
+        ra and dec are transformed for d3 as in get_planet_data; alt and az are
+        in degrees.
+
+        Positions are worked out for all frames at once: geocentric positions
+        at most every TIMELINE_NODE_MINUTES (see conjunctions.get_positions),
+        interpolated to the frames, then moved to this place with numpy (see
+        skies.py). Magnitudes are interpolated between daily values.
+
+        Raises ValueError if step_minutes isn't positive.
+        """
+
+        if step_minutes <= 0:
+            raise ValueError('step_minutes must be positive')
+
+        end_local = datetime.strptime(end_localtime_string, BOOTSTRAP_DTIME_FORMAT)
+        end_utc = to_utc(self.timezone, end_local)
+
+        step = timedelta(minutes=step_minutes)
+        num_frames = int((end_utc - self.utctime).total_seconds() //
+                         step.total_seconds()) + 1
+        num_frames = max(1, min(num_frames, MAX_TIMELINE_FRAMES))
+
+        # sidereal times for every frame at once
+        frame_dates = self.ephem.date + \
+            np.arange(num_frames) * step_minutes * ephem.minute
+        lambdas = get_sky_rotations(frame_dates, self.lat, self.lng)['lambda']
+        lsts = np.radians(lambdas)
+        offsets = get_observer_offsets(self.lat)
+
+        node_step = max(step_minutes, TIMELINE_NODE_MINUTES) * ephem.minute
+        node_dates = np.arange(frame_dates[0], frame_dates[-1] + node_step,
+                               node_step)
+        magnitude_dates = np.arange(frame_dates[0], frame_dates[-1] +
+                                    TIMELINE_MAGNITUDE_DAYS,
+                                    TIMELINE_MAGNITUDE_DAYS)
+
+        timeline = {'times': [],
+                    'timeStrings': [],
+                    'rotation': {'lambda': lambdas.tolist(), 'phi': -1 * self.lat},
+                    'bodies': {}}
+
+        for i in range(num_frames):
+            utctime = self.utctime + i * step
+
+            timeline['times'].append(utctime.strftime(ISO_DTIME_FORMAT))
+            localtime = utctime.astimezone(self.timezone)
+            timeline['timeStrings'].append(localtime.strftime(DISPLAY_TIME_FORMAT))
+
+        for body_class in [ephem.Sun, ephem.Moon] + PLANETS:
+            node_xyz = get_positions(body_class, node_dates)
+            xyz = np.array([np.interp(frame_dates, node_dates, component)
+                            for component in node_xyz])
+
+            ras, decs, distances = get_ra_dec(xyz)
+            position = {'ra': ras, 'dec': decs, 'earth_distance': distances}
+
+            topo_ras, topo_decs = get_body_ra_dec(position, lsts, offsets)
+            alts, azs = get_body_alt_az(position, self.lat, lsts, offsets,
+                                        self.ephem.pressure, self.ephem.temp)
+
+            magnitudes = np.interp(frame_dates, magnitude_dates,
+                                   [body_class(ephem.Date(magnitude_date)).mag
+                                    for magnitude_date in magnitude_dates])
+
+            # invert the RA for inside sphere viewing
+            timeline['bodies'][body_class.__name__] = {
+                'ra': (360 - np.degrees(topo_ras)).tolist(),
+                'dec': np.degrees(topo_decs).tolist(),
+                'alt': alts.tolist(),
+                'az': azs.tolist(),
+                'magnitude': magnitudes.tolist()}
+
+        return timeline
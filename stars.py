@@ -19,11 +19,103 @@
 
 
 from model import db, Star, Constellation
+from coords import EquatorialCatalog
+from constellations import get_locator, precess
+from epochs import get_epoch_bucket, get_bucket_epoch, move_to_epoch, \
+    CATALOG_EPOCH
 
-def get_stars(max_mag):
+# star catalogs for fast horizontal transforms, keyed by max magnitude
+STAR_CATALOGS = {}
+
+# catalogs are built for max magnitudes in steps of this, from
+# MIN_CATALOG_MAG to MAX_CATALOG_MAG (the dimmest stars seeded), so there are
+# only a few of them however many magnitudes are asked for
+CATALOG_MAG_STEP = 0.5
+MIN_CATALOG_MAG = -1.5
+MAX_CATALOG_MAG = 7
+
+# star positions moved to other epochs: dicts of [ra, dec] (d3 coordinates)
+# keyed by star id, keyed by epoch bucket (see epochs.py)
+EPOCH_POSITIONS = {}
+
+# most epoch buckets to keep; the cache is emptied when it gets bigger than
+# this
+MAX_CACHED_EPOCHS = 100
+
+
+def get_epoch_positions(stars, bucket):
+    """Return dict of star positions at an epoch bucket, keyed by star id.
+
+    Positions are [ra, dec] in degrees, in d3 coordinates (ra inverted, as in
+    the db). The positions of all the Stars not already in the bucket's cache
+    are moved at once (see epochs.move_to_epoch).
+    """
+
+    if bucket not in EPOCH_POSITIONS:
+        if len(EPOCH_POSITIONS) >= MAX_CACHED_EPOCHS:
+            EPOCH_POSITIONS.clear()
+
+        EPOCH_POSITIONS[bucket] = {}
+
+    positions = EPOCH_POSITIONS[bucket]
+    new_stars = [star for star in stars if star.star_id not in positions]
+
+    if new_stars:
+        ras, decs = move_to_epoch(
+            [360 - float(star.ra) for star in new_stars],
+            [float(star.dec) for star in new_stars],
+            [float(star.pm_ra) if star.pm_ra is not None else float('nan')
+             for star in new_stars],
+            [float(star.pm_dec) if star.pm_dec is not None else float('nan')
+             for star in new_stars],
+            bucket)
+
+        for star, ra, dec in zip(new_stars, ras, decs):
+            positions[star.star_id] = [360 - float(ra), float(dec)]
+
+    return positions
+
+
+def get_star_data(star, constellation, position=None):
+    """Return a star dict (see get_stars) for a Star, in the named constellation.
+
+    position is the star's [ra, dec] (d3 coordinates) at another epoch, if
+    it's to be moved from the db's (see get_epoch_positions).
+    """
+
+    # names based on the constellation aren't interesting (and often
+    # obscure the traditional names); don't include them
+    name = star.name
+    if star.name and star.const_code and star.name[-3:].lower() == star.const_code.lower():
+        name = None
+
+    # add it to the list in a neat little package
+    #
+    # cast numbers to float, as it comes back as a Decimal obj: bad json
+
+    ra, dec = position or (float(star.ra), float(star.dec))
+
+    return {'ra': ra,
+            'dec': dec,
+            'magnitude': float(star.magnitude),
+            'absMagnitude': '{:.2f}'.format(float(star.absolute_magnitude)),
+            'specClass': star.spectrum,
+            'constellation': constellation,
+            'color': star.color,
+            'name': name,
+            'distance': float(star.distance),
+            'distanceUnits': 'parsecs',
+            'celestialType': 'star'
+            }
+
+
+def get_stars(max_mag, year=None):
     """Return list of star dicts for the given maximum magnitude.
 
-    Returns all stars to populate entire celestial sphere
+    Returns all stars to populate entire celestial sphere. If year is given
+    and far from the catalog's epoch (see epochs.get_epoch_bucket), stars are
+    moved to that year's epoch, with precession and proper motion, to line
+    up with the planets for skies in that year.
 
     star dict keys:
         "ra": right ascension for star, in degrees
@@ -43,39 +135,126 @@ def get_stars(max_mag):
     db_stars = Star.query.filter(Star.magnitude <= max_mag).all()
     star_field = []
 
+    # stars without Bayer / Flamsteed designations have no constellation in
+    # the db: find theirs from the boundaries, all at once (ra is stored
+    # inverted for d3)
+    locator = get_locator()
+    unplaced = [star for star in db_stars if not star.constellation]
+    found_codes = locator.find([360 - float(star.ra) for star in unplaced],
+                               [float(star.dec) for star in unplaced])
+    found_names = dict((star.star_id, locator.get_name(code))
+                       for star, code in zip(unplaced, found_codes))
+
+    bucket = get_epoch_bucket(year) if year is not None else None
+    positions = get_epoch_positions(db_stars, bucket) if bucket else {}
+
     for star in db_stars:
+        if star.constellation:
+            constellation = star.constellation.name
+        else:
+            constellation = found_names[star.star_id]
 
-        # names based on the constellation aren't interesting (and often
-        # obscure the traditional names); don't include them
-        name = star.name
-        if star.name and star.const_code and star.name[-3:].lower() == star.const_code.lower():
-            name = None
-
-        # add it to the list in a neat little package
-        #
-        # cast numbers to float, as it comes back as a Decimal obj: bad json
-
-        star_field.append({'ra': float(star.ra),
-                           'dec': float(star.dec),
-                           'magnitude': float(star.magnitude),
-                           'absMagnitude': '{:.2f}'.format(float(star.absolute_magnitude)),
-                           'specClass': star.spectrum,
-                           'constellation': star.constellation.name if star.constellation else None,
-                           'color': star.color,
-                           'name': name,
-                           'distance': float(star.distance),
-                           'distanceUnits': 'parsecs',
-                           'celestialType': 'star'
-                           })
+        star_field.append(get_star_data(star, constellation,
+                                        positions.get(star.star_id)))
 
     return star_field
 
 
-def get_const_line_groups(const):
+def get_catalog_mag(max_mag):
+    """Return the max magnitude of the catalog to use for max_mag.
+
+    That's max_mag rounded to the nearest CATALOG_MAG_STEP, and kept from
+    MIN_CATALOG_MAG to MAX_CATALOG_MAG (as is anything that isn't a number).
+    """
+
+    if max_mag <= MIN_CATALOG_MAG:
+        return MIN_CATALOG_MAG
+
+    if not max_mag < MAX_CATALOG_MAG:
+        return MAX_CATALOG_MAG
+
+    return round(max_mag / CATALOG_MAG_STEP) * CATALOG_MAG_STEP
+
+
+def get_star_catalog(max_mag):
+    """Return an EquatorialCatalog of the stars with the given maximum magnitude.
+
+    The catalog's ids are star ids, and its ra values are true right
+    ascensions (the db stores them inverted for d3). It has the stars'
+    magnitudes too. max_mag is rounded to a catalog step (see
+    get_catalog_mag); catalogs are built once per step, then shared.
+    """
+
+    max_mag = get_catalog_mag(max_mag)
+
+    if max_mag not in STAR_CATALOGS:
+        rows = db.session.query(Star.star_id, Star.ra, Star.dec, Star.magnitude)\
+                         .filter(Star.magnitude <= max_mag)\
+                         .order_by(Star.star_id).all()
+
+        STAR_CATALOGS[max_mag] = EquatorialCatalog(
+            ra=[360 - float(ra) for _, ra, _, _ in rows],
+            dec=[float(dec) for _, _, dec, _ in rows],
+            ids=[star_id for star_id, _, _, _ in rows],
+            magnitudes=[float(magnitude) for _, _, _, magnitude in rows],
+            epoch=CATALOG_EPOCH)
+
+    return STAR_CATALOGS[max_mag]
+
+
+def get_nearest_stars(ra, dec, max_mag, k=1, radius=1):
+    """Return list of star dicts for the stars nearest a point, nearest first.
+
+    * ra and dec are in degrees, in the same (d3) coordinates as the star
+      dicts: ra is inverted
+    * up to k stars no dimmer than max_mag, within radius degrees
+
+    Each star dict (see get_stars) has an extra 'separation' key: its distance
+    from the point, in degrees. Searches use the KD-tree of the star catalog,
+    so they don't scan every star.
+    """
+
+    catalog = get_star_catalog(max_mag)
+    indexes, separations = catalog.get_nearest(360 - ra, dec, k, radius)
+
+    star_ids = [int(star_id) for star_id in catalog.ids[indexes]]
+    stars_by_id = dict((star.star_id, star) for star in
+                       Star.query.filter(Star.star_id.in_(star_ids)).all())
+
+    locator = get_locator()
+    nearest_stars = []
+
+    for star_id, separation in zip(star_ids, separations):
+        star = stars_by_id[star_id]
+
+        if star.constellation:
+            constellation = star.constellation.name
+        else:
+            constellation = locator.get_constellation(360 - float(star.ra),
+                                                      float(star.dec))[1]
+
+        star_data = get_star_data(star, constellation)
+        star_data['separation'] = float(separation)
+        nearest_stars.append(star_data)
+
+    return nearest_stars
+
+
+def get_star_names(star_ids):
+    """Return dict of star names (None for unnamed stars), keyed by star id."""
+
+    return dict((star.star_id, get_star_data(star, None)['name']) for star in
+                Star.query.filter(Star.star_id.in_(star_ids)).all())
+
+
+def get_const_line_groups(const, bucket=None):
     """Return a list of constellation line group data for input constellation
 
     * const is a Constellation instance
 
+    * bucket is an epoch bucket to move the lines' stars to (see
+      get_epoch_positions), or None to leave them at the db's positions
+
     Returns a list of lists: 
     each sublist contains dicts with 'ra' and 'dec' keys, 
     representing an independent line for this constellation. Coordinates are
@@ -83,18 +262,42 @@ def get_const_line_groups(const):
 
     """
 
+    positions = {}
+    if bucket:
+        positions = get_epoch_positions([vert.star for grp in const.line_groups
+                                         for vert in grp.constline_vertices],
+                                        bucket)
+
     line_groups = []
     for grp in const.line_groups:
         grp_verts = []
         for vert in grp.constline_vertices:
-            grp_verts.append([float(vert.star.ra), float(vert.star.dec)])
+            grp_verts.append(list(positions.get(vert.star.star_id) or
+                                  [float(vert.star.ra), float(vert.star.dec)]))
 
         line_groups.append(grp_verts)
 
     return line_groups
 
 
-def get_const_bound_verts(primary_const, secondary_const=None):
+def precess_vertices(vertices, bucket):
+    """Return list of [ra, dec] vertices precessed to an epoch bucket.
+
+    vertices are [ra, dec] in d3 coordinates (ra inverted). Boundaries are
+    fixed to the sky, so there's no proper motion.
+    """
+
+    if not vertices:
+        return vertices
+
+    ras, decs = precess([360 - vertex[0] for vertex in vertices],
+                        [vertex[1] for vertex in vertices],
+                        CATALOG_EPOCH, get_bucket_epoch(bucket))
+
+    return [[360 - float(ra), float(dec)] for ra, dec in zip(ras, decs)]
+
+
+def get_const_bound_verts(primary_const, secondary_const=None, bucket=None):
     """Return a dictionary of boundary vertex data, formatted for d3 geoPath LineString
 
     * const is a Constellation instance
@@ -102,6 +305,9 @@ def get_const_bound_verts(primary_const, secondary_const=None):
     * secondary_const is also a Constellation instance -- only used in the 
       case of serpens, which has two distinct areas in the sky
 
+    * bucket is an epoch bucket to precess the boundaries to (see
+      epochs.py), or None to leave them at the db's positions
+
     returns a list of lists of coordinates in the form of [ra, dec]
 
     * for all constellations except serpens, the returned list will have only 
@@ -124,6 +330,9 @@ def get_const_bound_verts(primary_const, secondary_const=None):
         for vert in const.bound_vertices:
             coord_list.append([float(vert.ra), float(vert.dec)])
 
+        if bucket:
+            coord_list = precess_vertices(coord_list, bucket)
+
         # add the final boundary point to close the boundary loop
         if coord_list:
             coord_list.append(coord_list[0])
@@ -132,7 +341,7 @@ def get_const_bound_verts(primary_const, secondary_const=None):
     return bounds_list
 
 
-def get_const_data(const, const_data_1=None, const_data_2=None):
+def get_const_data(const, const_data_1=None, const_data_2=None, bucket=None):
     """Return a dictionary of constellation data, transformed for d3
 
     * const is a Constellation instance
@@ -143,6 +352,9 @@ def get_const_data(const, const_data_1=None, const_data_2=None):
       one set of bound verts) and const_data_2 is SER2 (which has the other set
       of bound verts)
 
+    * bucket is an epoch bucket to move the lines and boundaries to (see
+      epochs.py), or None to leave them at the db's positions
+
     Coordinates for boundary vertices and constellation lines are in 
     ra and dec format
 
@@ -167,23 +379,30 @@ def get_const_data(const, const_data_1=None, const_data_2=None):
 
     if const_data_1:
         # oh, serpens
-        c['line_groups'] = get_const_line_groups(const_data_1)
-        c['bound_verts'] = get_const_bound_verts(const_data_1, const_data_2)    
+        c['line_groups'] = get_const_line_groups(const_data_1, bucket)
+        c['bound_verts'] = get_const_bound_verts(const_data_1, const_data_2,
+                                                 bucket)
 
     else: 
-        c['line_groups'] = get_const_line_groups(const)
-        c['bound_verts'] = get_const_bound_verts(const)
+        c['line_groups'] = get_const_line_groups(const, bucket)
+        c['bound_verts'] = get_const_bound_verts(const, bucket=bucket)
 
     return c    
 
 
-def get_constellations():
+def get_constellations(year=None):
     """Return a list of constellation data dicts, transformed for d3.
 
     Returns a list of dicts of constellation data.
     See docstring for get_const_data for details on constellation dicts.
+
+    If year is given and far from the catalog's epoch, the lines and
+    boundaries are moved to that year's epoch, as the stars are in
+    get_stars.
     """
 
+    bucket = get_epoch_bucket(year) if year is not None else None
+
     consts = []
 
     # do joinedloads to make the data collection faster
@@ -209,11 +428,11 @@ def get_constellations():
             # otherwise, we've got the main constellation
             se1_raw = Constellation.query.get('SE1')
             se2_raw = Constellation.query.get('SE2')
-            const_data = get_const_data(const_raw, se1_raw, se2_raw)
+            const_data = get_const_data(const_raw, se1_raw, se2_raw, bucket)
 
         else:
             # for those well-behaved non-serpens constellations
-            const_data = get_const_data(const_raw)
+            const_data = get_const_data(const_raw, bucket=bucket)
 
         consts.append(const_data)
 
@@ -45,6 +45,7 @@
 var sunMoonRadius, planetInfoDiv, svgContainer, svgDefs, skyBackground, skyCircle;
 var skySphere, skyProjection, skyPath, skyObjects, skyTransform, eclipticPath;
 var starData, constData, planetData, sunData, moonData, dateLocData;
+var starYear; // the year of the epoch the stars were drawn for
 var planetHighlights; // for the identifier circles for the planets
 var compassRoseGrp;
 
@@ -293,6 +294,40 @@ var drawSkyAndStars = function(error, starDataResult) {
 
 };
 
+var loadStars = function(year) {
+    // get the stars and constellations moved to the year's epoch (see
+    // /stars.json), unless they're the ones already drawn. The first load
+    // draws the sky; later ones redraw the sky objects in place.
+    //
+    // uses globals starYear, starData, constData
+
+    if (year === starYear) {
+        return;
+    }
+
+    var firstLoad = starYear === undefined;
+    starYear = year;
+
+    d3.json('/stars.json?year=' + year, function(error, starDataResult) {
+
+        if (firstLoad) {
+            drawSkyAndStars(error, starDataResult);
+            return;
+        }
+
+        if (error) {
+            showAjaxError(error);
+            return;
+        }
+
+        constData = starDataResult.constellations;
+        starData = starDataResult.stars;
+
+        redrawSkyObjects();
+    });
+
+};
+
 var drawSkyObjects = function() {
     // draw sky objects either at beginning of page load or after change in data
 
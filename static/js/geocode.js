@@ -1,5 +1,5 @@
 // javascript for getting latitude and longitude of user via Google
-// autocomplete and geocoding
+// autocomplete and geocoding, falling back to the server's local gazetteer
 
     // Copyright (c) 2017 Bonnie Schulkin
 
@@ -24,11 +24,14 @@
 // global var for the autocomplete object
 var autocomplete;
 
+// global var for the name of the chosen place, for the date/location info div
+var placeName;
+
 function initPlaces(error) {
     // this is the callback for the google maps script load
 
     if (error) {
-        errorDiv.html('There was an error loading Google Places for geocoding');
+        // not fatal: getLatLng will use the local gazetteer instead
         console.log(error);
         return;
     }
@@ -42,20 +45,50 @@ function initPlaces(error) {
     });
 }
 
+var getLocalLatLng = function() {
+    // geocode the city input with the server's gazetteer (works offline, and
+    // when Google Places couldn't be loaded)
+
+    // google-style input looks like 'San Francisco, CA, USA'
+    var cityString = $('#city-input').val().split(',')[0];
+
+    $.get('/geocode.json', {q: cityString, limit: 1}, function(result) {
+
+        var city = result.places[0];
+
+        // couldn't get a place? processFormInputs will display an error
+        if (city === undefined) {
+            processFormInputs();
+            return;
+        }
+
+        placeName = city.name;
+        processFormInputs({ lat: city.lat, lng: city.lng });
+    });
+}
+
 // on form 'submit'
 var getLatLng = function() {
 
+    // no google? go local
+    if (autocomplete === undefined) {
+        getLocalLatLng();
+        return;
+    }
+
     // for use later
     var geocoder = new google.maps.Geocoder;
 
     var place = autocomplete.getPlace();
 
-    // couldn't get a place? display an error and bail
+    // couldn't get a place from google? try the local gazetteer
     if (!place || !place.place_id) { 
-        processFormInputs(); 
+        getLocalLatLng();
         return; 
     }
 
+    placeName = place.name;
+
     // otherwise, get the data and return
     geocoder.geocode({'placeId': place.place_id}, function(results, status) {
 
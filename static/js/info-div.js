@@ -31,8 +31,15 @@ var populateInfoDiv = function(d) {
         addCelestialTableRow('Phase', d.phase + '% lit'); }
 
     if (d.celestialType !== 'star' || d.name === 'Sun') {
-        addCelestialTableRow('Rose at', d.prevRise);
-        addCelestialTableRow('Will set at', d.nextSet);
+
+        // bodies that don't rise or set (e.g. at high latitudes) have the
+        // same value ('always up' or 'never up') for both
+        if (d.prevRise === d.nextSet) {
+            addCelestialTableRow('Rise / set', d.prevRise);
+        } else {
+            addCelestialTableRow('Rose at', d.prevRise);
+            addCelestialTableRow('Will set at', d.nextSet);
+        }
     }
 
 };
@@ -98,6 +98,16 @@ var getLocTimeData = function(locTime) {
         data += '&datetime=' + locTime.datetime;
     }
 
+    // move the stars to the epoch of the chosen year (datetime starts with
+    // the year); loadStars is in d3-main.js
+    var year = new Date().getFullYear();
+    if (locTime.datetime !== undefined) {
+        year = parseInt(locTime.datetime.split('-')[0], 10);
+    }
+    if (!isNaN(year)) {
+        loadStars(year);
+    }
+
     // can't do simple d3.json because we need to post data
     d3.request('/place-time-data.json')
         .mimeType("application/json")
@@ -130,7 +140,8 @@ var populateDatelocInfo = function(datelocInfo) {
     // to populate the date/location info div
     // uses global addInfoTableRow from d3-main.js
 
-    var placeString = autocomplete.getPlace().name.split(',')[0];
+    // placeName is set in geocode.js
+    var placeString = placeName.split(',')[0];
     addInfoDivHeader(datelocInfoHeader, placeString);
     var rowString = '<tr>';
     rowString += '<td>' + datelocInfo.dateString + ' at ' + datelocInfo.timeString + '</td>';
@@ -276,8 +287,8 @@ $(document).ready(function() {
         addDefinitionOnclick();
     });
 
-    // load them stars
-    d3.json('/stars.json', drawSkyAndStars);
+    // load them stars, for this year's epoch (loadStars is in d3-main.js)
+    loadStars(new Date().getFullYear());
     
 });
 
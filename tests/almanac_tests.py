@@ -0,0 +1,173 @@
+"""Tests for the almanac."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from datetime import date
+import numpy as np
+import pytz
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+from riseset import ALWAYS_UP, NEVER_UP
+from conjunctions import get_positions
+from chebyshev import get_ra_dec
+import almanac
+
+# san francisco
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_TIMEZONE = pytz.timezone('America/Los_Angeles')
+TEST_DATE = date(2017, 3, 1)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# tromso, norway: the sun doesn't set in midsummer or rise in midwinter
+TROMSO_LAT = 69.65
+TROMSO_LNG = 18.96
+TROMSO_TIMEZONE = pytz.timezone('Europe/Oslo')
+
+# how far (seconds) event times can be from pyEphem's
+MAX_EVENT_SECONDS = 10
+
+# how far (radians) interpolated positions can be from direct ones: two
+# arcsec
+MAX_NODE_ERROR = math.radians(2 / 3600.0)
+
+
+def get_observer(lat, lng, ephem_date):
+    """Return a pyEphem observer at lat / lng, at ephem_date."""
+
+    observer = ephem.Observer()
+    observer.lat = math.radians(lat)
+    observer.lon = math.radians(lng)
+    observer.date = ephem_date
+
+    return observer
+
+
+class AlmanacTests(MarginTestCase):
+    """Test the almanac."""
+
+    def test_events_match_pyephem(self):
+        """Test a month of events for every body against pyEphem's searches."""
+
+        days = almanac.get_almanac(TEST_LAT, TEST_LNG, TEST_DATE, 30,
+                                   TEST_TIMEZONE)
+        midnights = almanac.get_midnights(TEST_DATE, 30, TEST_TIMEZONE)
+
+        for name, body_days in days['bodies'].items():
+            body = getattr(ephem, name)()
+
+            for day in range(30):
+                observer = get_observer(TEST_LAT, TEST_LNG, midnights[day])
+                searches = {almanac.RISE: observer.next_rising,
+                            almanac.TRANSIT: observer.next_transit,
+                            almanac.SET: observer.next_setting}
+
+                for event, search in searches.items():
+                    observer.date = midnights[day]
+                    expected = search(body)
+
+                    if expected < midnights[day + 1]:
+                        self.assertWithinMargin(body_days[event][day], expected,
+                                                MAX_EVENT_SECONDS * ephem.second)
+                    else:
+                        self.assertIsNone(body_days[event][day])
+
+    def test_transit_altitude(self):
+        """Test the sun's altitude at transit against pyEphem."""
+
+        days = almanac.get_almanac(TEST_LAT, TEST_LNG, TEST_DATE, 1,
+                                   TEST_TIMEZONE)
+        sun_days = days['bodies']['Sun']
+
+        sun = ephem.Sun()
+        sun.compute(get_observer(TEST_LAT, TEST_LNG, sun_days['transit'][0]))
+
+        self.assertWithinMargin(sun_days['transitAlt'][0],
+                                math.degrees(sun.alt), 0.01)
+
+    def test_polar_days(self):
+        """Test midnight sun and polar night."""
+
+        summer = almanac.get_almanac(TROMSO_LAT, TROMSO_LNG, date(2017, 6, 21),
+                                     1, TROMSO_TIMEZONE)
+        self.assertEqual(summer['bodies']['Sun']['rise'], [ALWAYS_UP])
+        self.assertEqual(summer['bodies']['Sun']['set'], [ALWAYS_UP])
+
+        winter = almanac.get_almanac(TROMSO_LAT, TROMSO_LNG, date(2017, 12, 21),
+                                     1, TROMSO_TIMEZONE)
+        self.assertEqual(winter['bodies']['Sun']['rise'], [NEVER_UP])
+
+        # the sun still crosses the meridian, below the horizon
+        self.assertTrue(winter['bodies']['Sun']['transitAlt'][0] < 0)
+
+    def test_max_days(self):
+        """Test that almanacs are cut off at MAX_ALMANAC_DAYS."""
+
+        days = almanac.get_almanac(TEST_LAT, TEST_LNG, TEST_DATE, 1000,
+                                   TEST_TIMEZONE)
+
+        self.assertEqual(len(days['dates']), almanac.MAX_ALMANAC_DAYS)
+
+    def test_interpolate_cubic(self):
+        """Test that cubics through the nodes are interpolated exactly."""
+
+        node_dates = np.arange(10, 20, 0.5)
+        values = np.array([node_dates ** 3 - 2 * node_dates, -node_dates ** 2])
+        ephem_dates = np.array([10.1, 12.25, 15, 19.3])
+
+        interpolated = almanac.interpolate_cubic(ephem_dates, node_dates, values)
+
+        self.assertTrue(np.allclose(interpolated,
+                                    [ephem_dates ** 3 - 2 * ephem_dates,
+                                     -ephem_dates ** 2]))
+
+    def test_positions_match_nodes(self):
+        """Test interpolated positions against positions computed directly."""
+
+        start = ephem.Date('2017/1/1')
+        ephem_dates = start + np.linspace(0.1, 30.9, 50)
+
+        for body_class in almanac.BODY_CLASSES:
+            path = almanac.BodyPath(body_class, start, start + 31)
+            position = path.get_position(ephem_dates)
+
+            ras, decs, _ = get_ra_dec(get_positions(body_class, ephem_dates))
+            ra_errors = (position['ra'] - ras + np.pi) % (2 * np.pi) - np.pi
+
+            self.assertTrue(np.abs(ra_errors * np.cos(decs)).max() < MAX_NODE_ERROR)
+            self.assertTrue(np.abs(position['dec'] - decs).max() < MAX_NODE_ERROR)
+
+    def test_starfield_almanac(self):
+        """Test a starfield's almanac, in local times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        days = stf.get_almanac(7)
+
+        self.assertEqual(days['dates'][0], 'March 1, 2017')
+        self.assertEqual(days['bodies']['Sun']['set'][0], '6:03 PM')
+        self.assertEqual(set(days['bodies']), set(body_class.__name__ for
+                                                  body_class in
+                                                  almanac.BODY_CLASSES))
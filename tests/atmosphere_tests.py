@@ -0,0 +1,139 @@
+"""Tests for refraction, airmass and extinction."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+from coords import EquatorialCatalog
+import positions
+import atmosphere
+
+# san francisco, 9pm on March 1, 2017 (local time)
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+
+class AtmosphereTests(MarginTestCase):
+    """Test the atmosphere functions, and their use in StarFields."""
+
+    def test_refract_matches_positions(self):
+        """Test array refraction against the one-altitude version."""
+
+        true_alts = np.radians([-10, -3, -0.5, 0, 5, 14.9, 15, 15.2, 45, 89])
+        apparent_alts = atmosphere.refract(true_alts, 1010, 15)
+
+        for true_alt, apparent_alt in zip(true_alts, apparent_alts):
+            self.assertWithinMargin(apparent_alt,
+                                    positions.refract(true_alt, 1010, 15),
+                                    2 * positions.MAX_REFRACTION_ERROR)
+
+    def test_no_refraction_without_air(self):
+        """Test that zero pressure means no refraction."""
+
+        true_alts = np.array([0.1, 0.2])
+        self.assertTrue(np.array_equal(atmosphere.refract(true_alts, 0, 15),
+                                       true_alts))
+
+    def test_airmass(self):
+        """Test airmass overhead, at 30 degrees, at the horizon and below."""
+
+        airmasses = atmosphere.get_airmass([90, 30, 0, -5])
+
+        self.assertWithinMargin(airmasses[0], 1, 0.001)
+        self.assertWithinMargin(airmasses[1], 2, 0.01)
+        self.assertWithinMargin(airmasses[2], 38, 0.1)
+        self.assertEqual(airmasses[3], np.inf)
+
+    def test_extinction(self):
+        """Test that extinction grows toward the horizon."""
+
+        extinctions = atmosphere.get_extinction([90, 45, 10, 1])
+
+        self.assertWithinMargin(extinctions[0], 0, 0.001)
+        self.assertTrue(np.all(np.diff(extinctions) > 0))
+
+    def test_limiting_magnitude(self):
+        """Test limiting magnitudes for dark and city skies."""
+
+        self.assertWithinMargin(atmosphere.get_limiting_magnitude(22), 6.6, 0.1)
+        self.assertWithinMargin(atmosphere.get_limiting_magnitude(18), 4.0, 0.1)
+
+    def test_apparent_sky(self):
+        """Test that the same star is visible overhead but not near the horizon."""
+
+        apparent = atmosphere.get_apparent_sky([80, 3, -10], [5.5, 5.5, -1], 6)
+
+        self.assertEqual(list(apparent['visible']), [True, False, False])
+        self.assertTrue(apparent['alt'][1] > 3)
+        self.assertTrue(apparent['magnitude'][1] > 6)
+
+    def test_starfield_apparent_sky(self):
+        """Test a starfield's view of a catalog against pyEphem's altitudes."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+
+        rand = np.random.RandomState(0)
+        catalog = EquatorialCatalog(ra=rand.uniform(0, 360, 50),
+                                    dec=rand.uniform(-90, 90, 50),
+                                    magnitudes=rand.uniform(0, 6, 50))
+
+        apparent = stf.get_apparent_sky(catalog)
+
+        for ra, dec, alt in zip(catalog.ra, catalog.dec, apparent['alt']):
+            star = ephem.FixedBody()
+            star._ra = math.radians(ra)
+            star._dec = math.radians(dec)
+            star._epoch = stf.ephem.date
+            star.compute(stf.ephem)
+
+            # pyEphem includes aberration and nutation; the catalog doesn't
+            self.assertWithinMargin(alt, math.degrees(star.alt), 0.02)
+
+    def test_starfield_limiting_magnitude(self):
+        """Test the limiting magnitude with and without a sky brightness."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG, max_mag=4.5,
+                        localtime_string=TEST_DATETIME_STRING)
+        self.assertEqual(stf.get_limiting_magnitude(), 4.5)
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG, max_mag=4.5,
+                        localtime_string=TEST_DATETIME_STRING, sky_brightness=22)
+        self.assertWithinMargin(stf.get_limiting_magnitude(), 6.6, 0.1)
+
+    def test_planet_extinction(self):
+        """Test that planets above the horizon are dimmed, and others aren't."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+
+        for planet in stf.get_planets():
+            if planet['airmass'] is None:
+                self.assertIsNone(planet['extinctedMagnitude'])
+            else:
+                self.assertTrue(planet['airmass'] >= 1)
+                self.assertTrue(planet['extinctedMagnitude'] >= planet['magnitude'])
@@ -0,0 +1,164 @@
+"""Tests for the Chebyshev polynomial ephemeris."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import os
+import shutil
+import tempfile
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+import chebyshev
+
+# fitted year for the tests
+TEST_YEAR = 2017
+
+# number of random instants in the accuracy sweep
+NUM_SWEEP_DATES = 500
+
+# allowed position errors, in arcsec (see the chebyshev module docstring)
+INNER_TOLERANCE = 0.1
+OUTER_TOLERANCE = 1.0
+OUTER_PLANETS = set(['Jupiter', 'Saturn', 'Uranus', 'Neptune'])
+
+
+def get_angle_errors(positions, expected):
+    """Return array of angles (arcsec) between 3 x N arrays of positions."""
+
+    distances = np.linalg.norm(expected, axis=0)
+    differences = np.linalg.norm(positions - expected, axis=0)
+
+    return np.degrees(differences / distances) * 3600
+
+
+class ChebyshevEphemerisTests(TestCase):
+    """Test the fitted ephemeris against pyEphem."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.ephemeris = chebyshev.fit_ephemeris(TEST_YEAR, TEST_YEAR)
+
+        rand = np.random.RandomState(0)
+        cls.dates = rand.uniform(cls.ephemeris.start, cls.ephemeris.end,
+                                 NUM_SWEEP_DATES)
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(self.ephemeris), str)
+
+    def test_accuracy_sweep(self):
+        """Test positions at random instants against pyEphem."""
+
+        for body_class in chebyshev.BODY_CLASSES:
+            positions = self.ephemeris.get_positions(body_class, self.dates)
+            expected = np.array([chebyshev.get_geocentric_xyz(body_class, d)
+                                 for d in self.dates]).T
+
+            if body_class.__name__ in OUTER_PLANETS:
+                tolerance = OUTER_TOLERANCE
+            else:
+                tolerance = INNER_TOLERANCE
+
+            errors = get_angle_errors(positions, expected)
+            self.assertTrue(errors.max() < tolerance)
+
+    def test_segment_edges(self):
+        """Test that positions match on both sides of a segment boundary."""
+
+        edge = self.ephemeris.start + chebyshev.SEGMENT_DAYS['Moon'] * 10
+        positions = self.ephemeris.get_positions(ephem.Moon,
+                                                 [edge - 1e-9, edge])
+
+        errors = get_angle_errors(positions[:, :1], positions[:, 1:])
+        self.assertTrue(errors.max() < INNER_TOLERANCE)
+
+    def test_ra_dec(self):
+        """Test converting positions to ra / dec against pyEphem."""
+
+        moon = ephem.Moon(ephem.Date(self.dates[0]))
+        positions = self.ephemeris.get_positions(ephem.Moon, self.dates[:1])
+        ra, dec, distance = chebyshev.get_ra_dec(positions)
+
+        self.assertTrue(abs(ra[0] - moon.ra) < 1e-6)
+        self.assertTrue(abs(dec[0] - moon.dec) < 1e-6)
+        self.assertTrue(abs(distance[0] - moon.earth_distance) < 1e-8)
+
+    def test_velocities(self):
+        """Test velocities against pyEphem positions an hour either side."""
+
+        dates = self.dates[:20]
+        velocities = self.ephemeris.get_velocities(ephem.Moon, dates)
+
+        before = np.array([chebyshev.get_geocentric_xyz(ephem.Moon, d - ephem.hour)
+                           for d in dates]).T
+        after = np.array([chebyshev.get_geocentric_xyz(ephem.Moon, d + ephem.hour)
+                          for d in dates]).T
+        expected = (after - before) / (2 * ephem.hour)
+
+        relative_errors = np.linalg.norm(velocities - expected, axis=0) / \
+            np.linalg.norm(expected, axis=0)
+        self.assertTrue(relative_errors.max() < 0.001)
+
+    def test_pyephem_fallback(self):
+        """Test that dates outside the fitted range come from pyEphem."""
+
+        outside = ephem.Date('2030/5/5 12:00')
+        self.assertFalse(self.ephemeris.covers([outside])[0])
+
+        positions = self.ephemeris.get_positions(ephem.Mars, [outside])
+        expected = chebyshev.get_geocentric_xyz(ephem.Mars, outside)
+        self.assertEqual(list(positions[:, 0]), expected)
+
+        velocities = self.ephemeris.get_velocities(ephem.Mars, [outside])
+        self.assertEqual(velocities.shape, (3, 1))
+
+    def test_save_and_load(self):
+        """Test that a saved ephemeris loads with the same coefficients."""
+
+        tempdir = tempfile.mkdtemp()
+
+        try:
+            filepath = os.path.join(tempdir, chebyshev.EPHEMERIS_FILENAME)
+            self.ephemeris.save(filepath)
+            loaded = chebyshev.load_ephemeris(filepath)
+
+        finally:
+            shutil.rmtree(tempdir)
+
+        self.assertEqual(loaded.start, self.ephemeris.start)
+        self.assertEqual(loaded.end, self.ephemeris.end)
+        self.assertTrue(np.array_equal(loaded.coefficients['Moon'],
+                                       self.ephemeris.coefficients['Moon']))
+
+    def test_no_ephemeris_file(self):
+        """Test that there's no ephemeris without a file."""
+
+        tempdir = tempfile.mkdtemp()
+
+        try:
+            self.assertIsNone(chebyshev.get_ephemeris(tempdir))
+        finally:
+            shutil.rmtree(tempdir)
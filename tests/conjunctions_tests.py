@@ -0,0 +1,125 @@
+"""Tests for the conjunction finder."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+import conjunctions
+
+# the great conjunction of 2020, to the second, and its separation (degrees)
+GREAT_CONJUNCTION_DATE = ephem.Date('2020/12/21 18:21:04')
+GREAT_CONJUNCTION_SEPARATION = 0.1018
+
+# range for the general tests
+TEST_START = '2020/1/1'
+TEST_END = '2021/1/1'
+
+
+def get_pyephem_separation(name1, name2, ephem_date):
+    """Return separation (degrees) of two bodies at ephem_date, from pyEphem."""
+
+    body1 = getattr(ephem, name1)(ephem_date)
+    body2 = getattr(ephem, name2)(ephem_date)
+
+    return math.degrees(ephem.separation((body1.g_ra, body1.g_dec),
+                                         (body2.g_ra, body2.g_dec)))
+
+
+class ConjunctionTests(MarginTestCase):
+    """Test finding close approaches between the moon and planets."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.approaches = conjunctions.find_conjunctions(TEST_START, TEST_END)
+
+    def test_great_conjunction(self):
+        """Test the 2020 conjunction of Jupiter and Saturn."""
+
+        approaches = [approach for approach in self.approaches
+                      if approach['bodies'] == ('Jupiter', 'Saturn')]
+
+        self.assertEqual(len(approaches), 1)
+        self.assertWithinMargin(approaches[0]['date'], GREAT_CONJUNCTION_DATE,
+                                ephem.minute)
+        self.assertWithinMargin(approaches[0]['separation'],
+                                GREAT_CONJUNCTION_SEPARATION, 0.001)
+
+    def test_order_and_range(self):
+        """Test that approaches are in the range, soonest first, and close."""
+
+        self.assertTrue(self.approaches)
+
+        dates = [approach['date'] for approach in self.approaches]
+        self.assertEqual(dates, sorted(dates))
+
+        for approach in self.approaches:
+            self.assertTrue(ephem.Date(TEST_START) <= approach['date'] <=
+                            ephem.Date(TEST_END))
+            self.assertTrue(approach['separation'] < 1)
+
+    def test_against_pyephem(self):
+        """Test separations, and that they're the closest, against pyEphem."""
+
+        for approach in self.approaches:
+            name1, name2 = approach['bodies']
+            separation = get_pyephem_separation(name1, name2, approach['date'])
+
+            self.assertWithinMargin(approach['separation'], separation, 0.001)
+
+            # an hour either side, they're farther apart
+            for offset in (-ephem.hour, ephem.hour):
+                self.assertTrue(get_pyephem_separation(
+                    name1, name2, approach['date'] + offset) > separation)
+
+    def test_max_separation(self):
+        """Test that a smaller separation finds a subset of the approaches."""
+
+        close = conjunctions.find_conjunctions(TEST_START, TEST_END, 0.5)
+
+        self.assertTrue(close)
+        self.assertTrue(len(close) < len(self.approaches))
+        for approach in close:
+            self.assertTrue(approach['separation'] < 0.5)
+            self.assertIn(approach, self.approaches)
+
+    def test_body_classes(self):
+        """Test searching only some of the bodies."""
+
+        approaches = conjunctions.find_conjunctions(
+            TEST_START, TEST_END, body_classes=[ephem.Mars, ephem.Jupiter])
+
+        self.assertEqual(set(approach['bodies'] for approach in approaches),
+                         set([('Mars', 'Jupiter')]))
+        self.assertEqual(approaches, [approach for approach in self.approaches
+                                      if approach['bodies'] == ('Mars', 'Jupiter')])
+
+    def test_ten_years(self):
+        """Test a ten-year search over all pairs."""
+
+        approaches = conjunctions.find_conjunctions('2017/1/1', '2027/1/1')
+
+        self.assertTrue(len(approaches) > 100)
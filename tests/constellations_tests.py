@@ -0,0 +1,135 @@
+"""Tests for the constellation locator."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+import constellations
+
+# number of random points to check against pyEphem
+NUM_SWEEP_POINTS = 5000
+
+# allowed difference between precessed positions, in degrees (0.1 arcsec)
+PRECESSION_MARGIN = 0.1 / 3600
+
+
+def get_random_points(num_points, seed=0):
+    """Return tuple of arrays (ra, dec) of points spread evenly over the sky."""
+
+    rand = np.random.RandomState(seed)
+    ra = rand.uniform(0, 360, num_points)
+    dec = np.degrees(np.arcsin(rand.uniform(-1, 1, num_points)))
+
+    return ra, dec
+
+
+class ConstellationLocatorTests(MarginTestCase):
+    """Test constellation lookups against pyEphem."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.locator = constellations.get_locator()
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(self.locator), str)
+
+    def test_sweep_matches_pyephem(self):
+        """Test random points all over the sky."""
+
+        ra, dec = get_random_points(NUM_SWEEP_POINTS)
+        codes = self.locator.find(ra, dec)
+
+        for i, code in enumerate(codes):
+            expected = ephem.constellation((math.radians(ra[i]),
+                                            math.radians(dec[i])),
+                                           epoch=ephem.J2000)
+            self.assertEqual(self.locator.get_name(code), expected[1])
+
+    def test_find_one_matches_find(self):
+        """Test that single points give the same codes as arrays."""
+
+        ra, dec = get_random_points(500, seed=1)
+        codes = self.locator.find(ra, dec)
+
+        for i, code in enumerate(codes):
+            self.assertEqual(self.locator.find_one(ra[i], dec[i]), code)
+
+    def test_epoch_of_date(self):
+        """Test points given for an equinox other than J2000."""
+
+        ephem_date = ephem.Date('2017/3/2')
+        ra, dec = get_random_points(500, seed=2)
+
+        for i in range(len(ra)):
+            expected = ephem.constellation((math.radians(ra[i]),
+                                            math.radians(dec[i])),
+                                           epoch=ephem_date)
+            code, name = self.locator.get_constellation(ra[i], dec[i], ephem_date)
+            self.assertEqual(name, expected[1])
+
+    def test_poles(self):
+        """Test the constellations around the poles."""
+
+        self.assertEqual(self.locator.find_one(0, 90), 'UMI')
+        self.assertEqual(self.locator.find_one(200, 89.9), 'UMI')
+        self.assertEqual(self.locator.find_one(0, -90), 'OCT')
+        self.assertEqual(list(self.locator.find([10, 300], [-89.9, -89.9])),
+                         ['OCT', 'OCT'])
+
+    def test_serpens(self):
+        """Test both parts of Serpens."""
+
+        # unukalhai, in serpens caput; eta serpentis, in serpens cauda
+        self.assertEqual(self.locator.get_constellation(236.067, 6.426),
+                         ('SE1', 'Serpens Caput'))
+        self.assertEqual(self.locator.get_constellation(275.327, -2.899),
+                         ('SE2', 'Serpens Cauda'))
+
+    def test_precess_round_trip(self):
+        """Test that precessing there and back gives the point back."""
+
+        ra, dec = get_random_points(100, seed=3)
+        ra_1875, dec_1875 = constellations.precess(ra, dec, ephem.J2000,
+                                                   constellations.BOUNDARY_EPOCH)
+        ra_back, dec_back = constellations.precess(
+            ra_1875, dec_1875, constellations.BOUNDARY_EPOCH, ephem.J2000)
+
+        # skip points right at the poles, where ra is meaningless
+        for i in np.flatnonzero(np.abs(dec) < 89):
+            ra_difference = (ra_back[i] - ra[i] + 180) % 360 - 180
+            self.assertWithinMargin(ra_difference, 0, PRECESSION_MARGIN)
+            self.assertWithinMargin(dec_back[i], dec[i], PRECESSION_MARGIN)
+
+    def test_off_grid_edge(self):
+        """Test that an edge off the meridians and parallels is an error."""
+
+        boundaries = {'ORI': [(0, 0), (10, 10), (0, 10)]}
+
+        with self.assertRaises(ValueError):
+            constellations.ConstellationLocator(boundaries, {'ORI': 'Orion'})
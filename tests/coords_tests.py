@@ -0,0 +1,183 @@
+"""Tests for the vectorized coordinate transforms."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField, PLANETS
+import coords
+
+# 9pm on March 1, 2017 (local time)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# one arcsecond, in degrees
+ARCSEC = 1 / 3600.0
+
+# places to compare with pyEphem: san francisco, sydney, tromso
+TEST_LOCATIONS = [(37.7749, -122.4194), (-33.8688, 151.2093), (69.6492, 18.9553)]
+
+
+def get_random_catalog(size):
+    """Return an EquatorialCatalog of size positions spread over the sky."""
+
+    rand = np.random.RandomState(0)
+    ra = rand.uniform(0, 360, size)
+    dec = np.degrees(np.arcsin(rand.uniform(-1, 1, size)))
+
+    return coords.EquatorialCatalog(ra, dec, ids=np.arange(size))
+
+
+class CoordsTests(MarginTestCase):
+    """Test the horizontal transforms against pyEphem."""
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(get_random_catalog(10)), str)
+
+    def test_matches_pyephem(self):
+        """Test alt / az for the sun, moon and planets against pyEphem."""
+
+        for lat, lng in TEST_LOCATIONS:
+            stf = StarField(lat=lat, lng=lng, localtime_string=TEST_DATETIME_STRING)
+
+            # pyEphem's alt / az without refraction
+            stf.ephem.pressure = 0
+
+            bodies = [body_class(stf.ephem) for body_class in
+                      [ephem.Sun, ephem.Moon] + PLANETS]
+            catalog = coords.EquatorialCatalog(
+                ra=[math.degrees(body.ra) for body in bodies],
+                dec=[math.degrees(body.dec) for body in bodies])
+
+            horizontal = stf.get_horizontal(catalog)
+
+            for i, body in enumerate(bodies):
+                self.assertWithinMargin(horizontal['alt'][i],
+                                        math.degrees(body.alt), ARCSEC)
+
+                # azimuth gets unstable near the zenith; scale by cos(alt)
+                az_diff = (horizontal['az'][i] - math.degrees(body.az) + 180) \
+                    % 360 - 180
+                self.assertWithinMargin(az_diff * math.cos(body.alt), 0, ARCSEC)
+
+    def test_j2000_catalog_matches_pyephem(self):
+        """Test alt / az of a J2000 catalog decades from 2000 against pyEphem."""
+
+        catalog = get_random_catalog(100)
+        catalog.epoch = ephem.J2000
+
+        for lat, lng in TEST_LOCATIONS:
+            stf = StarField(lat=lat, lng=lng, localtime_string='2060-06-01T21:00')
+            stf.ephem.pressure = 0
+
+            horizontal = stf.get_horizontal(catalog)
+
+            for i in range(len(catalog)):
+                star = ephem.FixedBody()
+                star._ra = math.radians(catalog.ra[i])
+                star._dec = math.radians(catalog.dec[i])
+                star._epoch = ephem.J2000
+                star.compute(stf.ephem)
+
+                self.assertWithinMargin(horizontal['alt'][i],
+                                        math.degrees(star.alt), ARCSEC)
+
+                az_diff = (horizontal['az'][i] - math.degrees(star.az) + 180) \
+                    % 360 - 180
+                self.assertWithinMargin(az_diff * math.cos(star.alt), 0, ARCSEC)
+
+                ha_diff = (horizontal['hourAngle'][i] -
+                           math.degrees(stf.ephem.sidereal_time() - star.ra) +
+                           180) % 360 - 180
+                self.assertWithinMargin(ha_diff * math.cos(star.dec), 0,
+                                        2 * ARCSEC)
+
+    def test_scalar_transform(self):
+        """Test that the one-off transform matches the catalog transform."""
+
+        catalog = get_random_catalog(5)
+        horizontal = catalog.get_horizontal(37.7749, 100)
+
+        alt, az = coords.equatorial_to_horizontal(catalog.ra[2], catalog.dec[2],
+                                                  37.7749, 100)
+        self.assertWithinMargin(alt, horizontal['alt'][2], 1e-9)
+        self.assertWithinMargin(az, horizontal['az'][2], 1e-9)
+
+    def test_celestial_pole(self):
+        """Test that the north celestial pole is due north at altitude lat."""
+
+        alt, az = coords.equatorial_to_horizontal(0, 90, 37.7749, 123)
+        self.assertWithinMargin(alt, 37.7749, 1e-9)
+        self.assertWithinMargin((az + 180) % 360 - 180, 0, 1e-9)
+
+    def test_hour_angle(self):
+        """Test hour angles west of, on and east of the meridian."""
+
+        catalog = coords.EquatorialCatalog(ra=[10, 50, 90], dec=[0, 0, 0])
+        hour_angles = catalog.get_horizontal(0, 50)['hourAngle']
+
+        self.assertEqual(list(hour_angles), [40, 0, -40])
+
+    def test_above_horizon(self):
+        """Test the horizon masks against the altitudes."""
+
+        catalog = get_random_catalog(1000)
+        horizontal = catalog.get_horizontal(-33.8688, 200)
+
+        self.assertTrue(np.array_equal(horizontal['aboveHorizon'],
+                                       horizontal['alt'] > 0))
+        self.assertTrue(np.array_equal(catalog.get_above_horizon(-33.8688, 200),
+                                       horizontal['alt'] > 0))
+        self.assertTrue(np.array_equal(
+            catalog.get_above_horizon(-33.8688, 200, min_alt=30),
+            horizontal['alt'] > 30))
+
+        # about half the sky is up
+        self.assertWithinMargin(horizontal['aboveHorizon'].mean(), 0.5, 0.1)
+
+    def test_nearest(self):
+        """Test nearest positions against the separations of every position."""
+
+        catalog = get_random_catalog(1000)
+        indexes, separations = catalog.get_nearest(120, -30, k=4, radius=10)
+
+        point = coords.get_unit_vectors(120, -30)
+        all_separations = np.degrees(np.arccos(np.clip(point.dot(catalog.vectors),
+                                                       -1, 1)))
+        expected_indexes = np.argsort(all_separations)[:4]
+
+        self.assertEqual(list(indexes), list(expected_indexes))
+        for index, separation in zip(indexes, separations):
+            self.assertWithinMargin(separation, all_separations[index], 1e-6)
+
+    def test_nearest_radius(self):
+        """Test that a position just outside the radius is left out."""
+
+        catalog = coords.EquatorialCatalog(ra=[10, 10.5, 12], dec=[0, 0, 0])
+        indexes, separations = catalog.get_nearest(10, 0, k=3, radius=1)
+
+        self.assertEqual(list(indexes), [0, 1])
+        self.assertWithinMargin(separations[1], 0.5, 1e-9)
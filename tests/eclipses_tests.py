@@ -0,0 +1,182 @@
+"""Tests for the eclipse search."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+import eclipses
+
+# san francisco
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# madras, oregon: in the path of totality on August 21, 2017
+TOTALITY_LAT = 44.633
+TOTALITY_LNG = -121.129
+
+# albuquerque: in the path of the annular eclipse of October 14, 2023
+ANNULAR_LAT = 35.0844
+ANNULAR_LNG = -106.6504
+
+# sydney, where the 2017 eclipse couldn't be seen
+SYDNEY_LAT = -33.87
+SYDNEY_LNG = 151.21
+
+# published contacts (UT) and umbral magnitude for the lunar eclipse of July
+# 27, 2018 (penumbral, partial, total)
+LUNAR_CONTACTS = [('2018/7/27 17:14:47', '2018/7/27 23:28:38'),
+                  ('2018/7/27 18:24:27', '2018/7/27 22:19:00'),
+                  ('2018/7/27 19:30:15', '2018/7/27 21:13:12')]
+LUNAR_MAXIMUM = '2018/7/27 20:21:44'
+LUNAR_MAGNITUDE = 1.609
+
+
+def get_eclipses_on(lat, lng, date_string, exact=True):
+    """Return list of eclipses seen from lat / lng on the utc date."""
+
+    start = ephem.Date(date_string)
+
+    return eclipses.get_eclipses(lat, lng, start, ephem.Date(start + 1),
+                                 exact=exact)
+
+
+class EclipseTests(MarginTestCase):
+    """Test finding eclipses, and their local circumstances."""
+
+    def test_lunar_contacts(self):
+        """Test a total lunar eclipse against published contact times."""
+
+        found = get_eclipses_on(-20, 30, '2018/7/27')
+
+        self.assertEqual(len(found), 1)
+        eclipse = found[0]
+
+        self.assertEqual((eclipse['type'], eclipse['kind']),
+                         (eclipses.LUNAR, eclipses.TOTAL))
+        self.assertWithinMargin(eclipse['maximum'], ephem.Date(LUNAR_MAXIMUM),
+                                10 * ephem.second)
+        self.assertWithinMargin(eclipse['magnitude'], LUNAR_MAGNITUDE, 0.005)
+
+        keys = [('start', 'end'), ('partialStart', 'partialEnd'),
+                ('centralStart', 'centralEnd')]
+        for (start_key, end_key), (start, end) in zip(keys, LUNAR_CONTACTS):
+            self.assertWithinMargin(eclipse[start_key], ephem.Date(start),
+                                    10 * ephem.second)
+            self.assertWithinMargin(eclipse[end_key], ephem.Date(end),
+                                    10 * ephem.second)
+
+    def test_partial_solar(self):
+        """Test the 2017 solar eclipse from san francisco."""
+
+        found = get_eclipses_on(TEST_LAT, TEST_LNG, '2017/8/21')
+
+        self.assertEqual(len(found), 1)
+        eclipse = found[0]
+
+        self.assertEqual((eclipse['type'], eclipse['kind']),
+                         (eclipses.SOLAR, eclipses.PARTIAL))
+        self.assertIsNone(eclipse['centralStart'])
+        self.assertEqual(eclipse['start'], eclipse['partialStart'])
+        self.assertWithinMargin(eclipse['start'], ephem.Date('2017/8/21 16:01:26'),
+                                30 * ephem.second)
+        self.assertWithinMargin(eclipse['maximum'],
+                                ephem.Date('2017/8/21 17:15:09'), 30 * ephem.second)
+        self.assertWithinMargin(eclipse['magnitude'], 0.80, 0.01)
+
+    def test_total_solar(self):
+        """Test totality in the path of the 2017 solar eclipse."""
+
+        eclipse = get_eclipses_on(TOTALITY_LAT, TOTALITY_LNG, '2017/8/21')[0]
+
+        self.assertEqual(eclipse['kind'], eclipses.TOTAL)
+        self.assertTrue(eclipse['magnitude'] > 1)
+        self.assertTrue(eclipse['partialStart'] < eclipse['centralStart'] <
+                        eclipse['maximum'] < eclipse['centralEnd'] <
+                        eclipse['partialEnd'])
+        self.assertWithinMargin(eclipse['centralStart'],
+                                ephem.Date('2017/8/21 17:19:36'), 30 * ephem.second)
+
+    def test_annular_solar(self):
+        """Test annularity in the path of the 2023 solar eclipse."""
+
+        eclipse = get_eclipses_on(ANNULAR_LAT, ANNULAR_LNG, '2023/10/14')[0]
+
+        self.assertEqual(eclipse['kind'], eclipses.ANNULAR)
+        self.assertTrue(eclipse['magnitude'] < 1)
+
+    def test_not_seen(self):
+        """Test that an eclipse with the sun down isn't returned."""
+
+        self.assertEqual(get_eclipses_on(SYDNEY_LAT, SYDNEY_LNG, '2017/8/21'), [])
+
+    def test_cell_cache(self):
+        """Test that places in a cell share eclipses, and exact ones don't."""
+
+        found = get_eclipses_on(TEST_LAT, TEST_LNG, '2017/8/21', exact=False)
+        num_cached = len(eclipses.ECLIPSE_CACHE)
+
+        nearby = get_eclipses_on(TEST_LAT + 0.01, TEST_LNG + 0.01, '2017/8/21',
+                                 exact=False)
+        self.assertEqual(len(eclipses.ECLIPSE_CACHE), num_cached)
+        self.assertEqual(nearby, found)
+
+        # the returned eclipses are copies
+        nearby[0]['kind'] = None
+        self.assertEqual(get_eclipses_on(TEST_LAT, TEST_LNG, '2017/8/21',
+                                         exact=False), found)
+
+        exact = get_eclipses_on(TEST_LAT, TEST_LNG, '2017/8/21')
+        self.assertNotEqual(exact[0]['maximum'], found[0]['maximum'])
+        self.assertWithinMargin(exact[0]['maximum'], found[0]['maximum'],
+                                30 * ephem.second)
+
+    def test_century(self):
+        """Test a century of eclipses: ordered and in range."""
+
+        start = ephem.Date('2000/1/1')
+        end = ephem.Date('2100/1/1')
+
+        found = eclipses.get_eclipses(-1, 1, start, end)
+
+        maxima = [eclipse['maximum'] for eclipse in found]
+        self.assertEqual(maxima, sorted(maxima))
+        self.assertTrue(start <= maxima[0] and maxima[-1] <= end)
+
+        # more than a lunar eclipse a year is seen from anywhere
+        types = [eclipse['type'] for eclipse in found]
+        self.assertTrue(types.count(eclipses.LUNAR) > 100)
+        self.assertTrue(types.count(eclipses.SOLAR) > 10)
+
+    def test_starfield_eclipses(self):
+        """Test that starfield eclipses have local display times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        found = stf.get_eclipses()
+
+        self.assertTrue(found)
+        self.assertEqual(found[0]['date'], 'August 21, 2017')
+        self.assertEqual(found[0]['maximum'], '10:15 AM')
+        self.assertIsNone(found[0]['centralStart'])
@@ -0,0 +1,95 @@
+"""Tests for moving star positions to other epochs."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+import epochs
+
+# (name, ra, dec, pm_ra, pm_dec) at J2000: arcturus moves fast, and polaris
+# is near the pole
+TEST_STARS = [('Arcturus', 213.9153, 19.1824, -1093.45, -1999.40),
+              ('Polaris', 37.9546, 89.2641, 44.22, -11.74)]
+
+# years to move them to
+TEST_YEARS = [1000, 2500, 4000]
+
+# how far off (degrees) from pyEphem positions can be
+MAX_POSITION_ERROR = 0.01
+
+
+class EpochTests(MarginTestCase):
+    """Test moving stars to other epochs."""
+
+    def test_matches_pyephem(self):
+        """Test precession and proper motion against pyEphem's fixed bodies."""
+
+        for name, ra, dec, pm_ra, pm_dec in TEST_STARS:
+            for year in TEST_YEARS:
+                ras, decs = epochs.move_to_epoch([ra], [dec], [pm_ra], [pm_dec],
+                                                 year)
+
+                star = ephem.FixedBody()
+                star._ra = math.radians(ra)
+                star._dec = math.radians(dec)
+                star._epoch = ephem.J2000
+                star._pmra = pm_ra
+                star._pmdec = pm_dec
+
+                epoch = epochs.get_bucket_epoch(year)
+                star.compute(epoch, epoch=epoch)
+
+                # compare on the sky (ra differences shrink near the pole)
+                separation = math.degrees(ephem.separation(
+                    (math.radians(ras[0]), math.radians(decs[0])),
+                    (star.a_ra, star.a_dec)))
+                self.assertTrue(separation < MAX_POSITION_ERROR)
+
+    def test_no_proper_motion(self):
+        """Test that stars without proper motions are only precessed."""
+
+        moved = epochs.move_to_epoch([10, 200], [20, -30],
+                                     [float('nan'), 0], [float('nan'), 0], 1000)
+        precessed = epochs.precess([10, 200], [20, -30], ephem.J2000,
+                                   epochs.get_bucket_epoch(1000))
+
+        self.assertTrue(np.allclose(moved, precessed))
+
+    def test_proper_motion_only(self):
+        """Test a century of a star's proper motion, on the equator."""
+
+        ras, decs = epochs.apply_proper_motion([90], [0], [3600], [-7200], 100)
+
+        # the straight line along the sky is a little off the great circle
+        self.assertWithinMargin(ras[0], 90.1, 1e-5)
+        self.assertWithinMargin(decs[0], -0.2, 1e-5)
+
+    def test_buckets(self):
+        """Test that near years have no bucket, and far years are rounded."""
+
+        self.assertIsNone(epochs.get_epoch_bucket(2017))
+        self.assertIsNone(epochs.get_epoch_bucket(1990.5))
+        self.assertEqual(epochs.get_epoch_bucket(1492.3), 1492)
+        self.assertEqual(epochs.get_epoch_bucket(-500), -500)
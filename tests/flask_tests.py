@@ -18,6 +18,7 @@
     # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
 
 from unittest import TestCase
+import os
 import json
 
 # be able to import from parent dir
@@ -25,7 +26,10 @@ import sys
 sys.path.append('..')
 
 from server import app
-from run_tests import DbTestCase
+from run_tests import DbTestCase, TESTDATA_DIR
+import geocode
+import workers
+import satellites
 
 # for posting to stars.json
 TEST_DATETIME_STRING = '2017-03-01T21:00'
@@ -152,6 +156,59 @@ class FlaskStarDataTests(DbTestCase):
                          set(['constellations', 'stars']))
 
 
+class FlaskNearestTests(DbTestCase):
+    """Test Flask nearest objects json route.
+
+    tearDownClass method inherited without change from DbTestCase
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        super(FlaskNearestTests, cls).setUpClass()
+        super(FlaskNearestTests, cls).load_test_data()
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+        stars = json.loads(cls.client.get('/stars.json').data)['stars']
+        cls.example_star = stars[0]
+
+    def test_nearest_star(self):
+        """Test that a star is the nearest object to its own position."""
+
+        response = self.client.get('/nearest.json?ra={}&dec={}&k=1'.format(
+            self.example_star['ra'], self.example_star['dec']))
+        objects = json.loads(response.data)['objects']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(objects), 1)
+        self.assertEqual(objects[0]['ra'], self.example_star['ra'])
+        self.assertWithinMargin(objects[0]['separation'], 0, 1e-6)
+
+    def test_with_planets(self):
+        """Test that the sun, moon and planets are included with a place and time."""
+
+        response = self.client.get('/nearest.json?ra=0&dec=0&k=20&radius=180&'
+                                   'lat=37.7749&lng=-122.4194&'
+                                   'datetime=2017-03-01T21:00')
+        objects = json.loads(response.data)['objects']
+
+        names = set(obj['name'] for obj in objects)
+        self.assertTrue('Sun' in names)
+
+        separations = [obj['separation'] for obj in objects]
+        self.assertEqual(separations, sorted(separations))
+
+    def test_missing_args(self):
+        """Test that a search without coordinates is a bad request."""
+
+        response = self.client.get('/nearest.json?ra=100')
+
+        self.assertEqual(response.status_code, 400)
+
+
 class FlaskPlacetimeDataTests(DbTestCase):
     """Test Flask place / time data json route.
 
@@ -186,5 +243,562 @@ class FlaskPlacetimeDataTests(DbTestCase):
         """Test the value keys of the example item."""
 
         self.assertEqual(set(self.json_dict.keys()), 
-                    set(['dateloc', 'rotation', 'planets', 'sundata', 'moon']))
+                    set(['dateloc', 'rotation', 'planets', 'sundata', 'moon',
+                         'minorBodies', 'satellites']))
+
+
+
+class FlaskTimelineTests(TestCase):
+    """Test Flask timeline json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        client = app.test_client()
+        app.config['TESTING'] = True
+
+        data = {'lat': 0, 'lng': 0, 'start': TEST_DATETIME_STRING,
+                'end': '2017-03-02T21:00', 'step': 5}
+        cls.response = client.post('/timeline.json', data=data)
+        cls.json_dict = json.loads(cls.response.data)
+
+    def test_status(self):
+        """Make sure the status is 200."""
+
+        self.assertEqual(self.response.status_code, 200)
+
+    def test_value_keys(self):
+        """Test the value keys of the response."""
+
+        self.assertEqual(set(self.json_dict.keys()), set(['dateloc', 'timeline']))
+
+    def test_num_frames(self):
+        """Test that every five minutes of the day has a frame."""
+
+        self.assertEqual(len(self.json_dict['timeline']['times']), 289)
+
+    def test_bad_step(self):
+        """Test that a step that isn't a positive number is a bad request."""
+
+        client = app.test_client()
+
+        for step in (0, 'five'):
+            response = client.post('/timeline.json',
+                                   data={'lat': 0, 'lng': 0,
+                                         'end': '2017-03-02T21:00',
+                                         'step': step})
+            self.assertEqual(response.status_code, 400)
+
+    def test_bad_times(self):
+        """Test that a malformed start or end is a bad request."""
+
+        client = app.test_client()
+
+        for start, end in [('yesterday', '2017-03-02T21:00'),
+                           (TEST_DATETIME_STRING, '2017-03-02 21:00')]:
+            response = client.post('/timeline.json',
+                                   data={'lat': 0, 'lng': 0, 'start': start,
+                                         'end': end})
+            self.assertEqual(response.status_code, 400)
+
+    def test_missing_args(self):
+        """Test that a timeline without a place is a bad request."""
+
+        response = app.test_client().post('/timeline.json',
+                                          data={'end': '2017-03-02T21:00'})
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskPlacetimePoolTests(TestCase):
+    """Test Flask place / time data json route with the worker pool running."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        workers.start_pool(1)
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stuff to do once after running all class test methods."""
+
+        workers.stop_pool()
+
+    def test_pool_response(self):
+        """Test that the pool's response has all the place / time data."""
+
+        response = self.client.post('/place-time-data.json',
+                                    data={'lat': 0, 'lng': 0,
+                                          'datetime': TEST_DATETIME_STRING})
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(json_dict.keys()),
+                    set(['dateloc', 'rotation', 'planets', 'sundata', 'moon',
+                         'minorBodies', 'satellites']))
+
+    def test_timeout(self):
+        """Test that a computation that takes too long gives a 503."""
+
+        os.environ[workers.TIMEOUT_ENV_VAR] = '0.000001'
+
+        try:
+            response = self.client.post('/place-time-data.json',
+                                        data={'lat': 0, 'lng': 0})
+        finally:
+            del os.environ[workers.TIMEOUT_ENV_VAR]
+
+        self.assertEqual(response.status_code, 503)
+
+
+class FlaskMoonCalendarTests(TestCase):
+    """Test Flask moon calendar json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        client = app.test_client()
+        app.config['TESTING'] = True
+
+        cls.response = client.get('/moon-calendar.json?year=2017&month=2')
+        cls.json_dict = json.loads(cls.response.data)
+
+    def test_status(self):
+        """Make sure the status is 200."""
+
+        self.assertEqual(self.response.status_code, 200)
+
+    def test_num_days(self):
+        """Test that every day of the month is there."""
+
+        self.assertEqual(len(self.json_dict['days']), 28)
+
+    def test_bad_args(self):
+        """Test that a missing or bad year or month is a bad request."""
+
+        client = app.test_client()
+
+        for query in ('', 'year=twenty', 'year=2017&month=13',
+                      'year=2017&month=feb'):
+            response = client.get('/moon-calendar.json?' + query)
+            self.assertEqual(response.status_code, 400)
+
+    def test_ends_of_range(self):
+        """Test the first and last years python dates can hold."""
+
+        client = app.test_client()
+
+        for query, first_date, last_date in [
+                ('year=1', '0001-01-01', '0001-12-31'),
+                ('year=9', '0009-01-01', '0009-12-31'),
+                ('year=9999&month=12', '9999-12-01', '9999-12-31')]:
+            response = client.get('/moon-calendar.json?' + query)
+            self.assertEqual(response.status_code, 200)
+
+            days = json.loads(response.data)['days']
+            self.assertEqual(days[0]['date'], first_date)
+            self.assertEqual(days[-1]['date'], last_date)
+
+
+class FlaskGeocodeTests(TestCase):
+    """Test Flask geocoding json routes (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        geocode.GAZETTEER = geocode.Gazetteer(
+            os.path.join(TESTDATA_DIR, geocode.GAZETTEER_FILENAME))
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_autocomplete(self):
+        """Test getting suggestions for a prefix."""
+
+        response = self.client.get('/geocode.json?q=san&limit=1')
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json_dict['places']), 1)
+        self.assertEqual(json_dict['places'][0]['name'], 'San Jose')
+
+    def test_place_keys(self):
+        """Test the keys of a returned place."""
+
+        response = self.client.get('/geocode.json?q=paris')
+        place = json.loads(response.data)['places'][0]
+
+        self.assertEqual(set(place.keys()), set(['name', 'country', 'admin1',
+                                                 'lat', 'lng', 'timezone']))
+
+    def test_reverse(self):
+        """Test getting the closest place to a lat/lng."""
+
+        response = self.client.get('/reverse-geocode.json?lat=51.5&lng=-0.1')
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(json_dict['place']['name'], 'London')
+
+    def test_reverse_missing_args(self):
+        """Test that a reverse lookup without a place is a bad request."""
+
+        response = self.client.get('/reverse-geocode.json?lat=51.5')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskConstellationTests(TestCase):
+    """Test Flask constellation lookup json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_lookup(self):
+        """Test looking up Betelgeuse's position (in d3 coordinates)."""
+
+        response = self.client.get('/constellation.json?ra={}&dec={}'.format(
+            360 - 88.793, 7.407))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json_dict, {'code': 'ORI', 'name': 'Orion'})
+
+    def test_missing_args(self):
+        """Test that a lookup without coordinates is a bad request."""
+
+        response = self.client.get('/constellation.json?ra=100')
+
+        self.assertEqual(response.status_code, 400)
+
+    def test_out_of_range(self):
+        """Test that coordinates off the sky are a bad request."""
+
+        for ra, dec in [(400, 0), (-10, 0), (100, 91)]:
+            response = self.client.get(
+                '/constellation.json?ra={}&dec={}'.format(ra, dec))
+            self.assertEqual(response.status_code, 400)
+
+
+class FlaskVisibleStarsTests(DbTestCase):
+    """Test Flask visible stars json route.
+
+    tearDownClass method inherited without change from DbTestCase
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        super(FlaskVisibleStarsTests, cls).setUpClass()
+        super(FlaskVisibleStarsTests, cls).load_test_data()
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_visible_stars(self):
+        """Test that visible stars are up and bright enough."""
+
+        response = self.client.get('/visible-stars.json?lat=37.7749&'
+                                   'lng=-122.4194&datetime={}&maxMag=5'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json_dict['limitingMagnitude'], 5)
+
+        for star in json_dict['stars']:
+            self.assertTrue(star['alt'] > 0)
+            self.assertTrue(star['magnitude'] <= 5)
+
+    def test_darker_sky(self):
+        """Test that a darker sky shows at least as many stars."""
+
+        url = '/visible-stars.json?lat=37.7749&lng=-122.4194&datetime={}&' \
+              'maxMag=7&skyBrightness={}'
+
+        city = json.loads(self.client.get(url.format(TEST_DATETIME_STRING,
+                                                     18)).data)
+        dark = json.loads(self.client.get(url.format(TEST_DATETIME_STRING,
+                                                     22)).data)
+
+        self.assertTrue(len(dark['stars']) >= len(city['stars']))
+
+    def test_missing_args(self):
+        """Test that a request without a place is a bad request."""
+
+        response = self.client.get('/visible-stars.json?lat=37.7749')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskSatellitePassesTests(TestCase):
+    """Test Flask satellite passes json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+        satellites.CATALOG = None
+        satellites.get_catalog(TESTDATA_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stuff to do once after running all class test methods."""
+
+        satellites.CATALOG = None
+
+    def test_passes(self):
+        """Test the passes for one satellite over san francisco."""
+
+        response = self.client.get('/satellite-passes.json?lat=37.7749&'
+                                   'lng=-122.4194&datetime={}&name=HST'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(json_dict['passes'])
+        self.assertEqual(set(satellite_pass['name']
+                             for satellite_pass in json_dict['passes']),
+                         set(['HST']))
+
+    def test_missing_args(self):
+        """Test that passes without a place are a bad request."""
+
+        response = self.client.get('/satellite-passes.json?lat=37.7749')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskConjunctionsTests(TestCase):
+    """Test Flask conjunctions json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_great_conjunction(self):
+        """Test the 2020 conjunction of Jupiter and Saturn."""
+
+        response = self.client.get('/conjunctions.json?start=2020-12-01&'
+                                   'end=2020-12-31&maxSep=0.5')
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json_dict['conjunctions'][0]['bodies'],
+                         ['Jupiter', 'Saturn'])
+        self.assertEqual(json_dict['conjunctions'][0]['date'],
+                         '2020-12-21T18:21:04Z')
+
+    def test_bad_dates(self):
+        """Test that a range without good dates is a bad request."""
+
+        response = self.client.get('/conjunctions.json?start=2020-12-01&'
+                                   'end=December')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskEclipsesTests(TestCase):
+    """Test Flask eclipses json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_eclipses(self):
+        """Test the next year's eclipses from san francisco."""
+
+        response = self.client.get('/eclipses.json?lat=37.7749&lng=-122.4194&'
+                                   'datetime={}'.format(TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json_dict['eclipses'][0]['date'], 'August 21, 2017')
+        self.assertEqual(json_dict['eclipses'][0]['type'], 'solar')
+
+    def test_missing_args(self):
+        """Test that eclipses without a place are a bad request."""
+
+        response = self.client.get('/eclipses.json?lat=37.7749')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskVisibilityPlanTests(TestCase):
+    """Test Flask visibility plan json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_visibility_plan(self):
+        """Test the year's plan from san francisco."""
+
+        response = self.client.get('/visibility-plan.json?lat=37.7749&'
+                                   'lng=-122.4194&datetime={}&minAlt=30'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(json_dict['plan']['nightHours']), 12)
+        self.assertEqual(len(json_dict['plan']['planets']), 7)
+
+    def test_missing_args(self):
+        """Test that a plan without a place is a bad request."""
+
+        response = self.client.get('/visibility-plan.json?lng=-122.4194')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskTwilightTests(TestCase):
+    """Test Flask twilight json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_twilight(self):
+        """Test a night's twilight from san francisco."""
+
+        response = self.client.get('/twilight.json?lat=37.7749&lng=-122.4194&'
+                                   'datetime={}&step=10'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+        twilight = json_dict['twilight']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(twilight['times']), 24 * 6 + 1)
+        self.assertEqual(twilight['events'][0]['event'], 'sunset')
+
+    def test_missing_args(self):
+        """Test that twilight without a place is a bad request."""
+
+        response = self.client.get('/twilight.json?lat=37.7749')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskAlmanacTests(TestCase):
+    """Test Flask almanac json route (no db needed)."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_almanac(self):
+        """Test a week's almanac from san francisco."""
+
+        response = self.client.get('/almanac.json?lat=37.7749&lng=-122.4194&'
+                                   'datetime={}&days=7'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+        almanac = json_dict['almanac']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(almanac['dates'][0], 'March 1, 2017')
+        self.assertEqual(len(almanac['bodies']['Moon']['rise']), 7)
+
+    def test_missing_args(self):
+        """Test that an almanac without a place is a bad request."""
+
+        response = self.client.get('/almanac.json?lng=-122.4194')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskOccultationsTests(DbTestCase):
+    """Test Flask occultations json route.
+
+    tearDownClass method inherited without change from DbTestCase
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        super(FlaskOccultationsTests, cls).setUpClass()
+        super(FlaskOccultationsTests, cls).load_test_data()
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_occultations(self):
+        """Test the next month's occultations from san francisco."""
+
+        response = self.client.get('/occultations.json?lat=37.7749&'
+                                   'lng=-122.4194&datetime={}'.format(
+                                       TEST_DATETIME_STRING))
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        for occultation in json_dict['occultations']:
+            self.assertIn(occultation['celestialType'], ['star', 'planet'])
+
+    def test_missing_args(self):
+        """Test that occultations without a place are a bad request."""
+
+        response = self.client.get('/occultations.json?lat=37.7749')
+
+        self.assertEqual(response.status_code, 400)
+
+
+class FlaskPrecisionTests(TestCase):
+    """Test the precision argument of the place / time data route."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.client = app.test_client()
+        app.config['TESTING'] = True
+
+    def test_exact_precision(self):
+        """Test that an exact place-time has all the place / time data."""
+
+        response = self.client.post('/place-time-data.json',
+                                    data={'lat': 0, 'lng': 0,
+                                          'datetime': TEST_DATETIME_STRING,
+                                          'precision': 'exact'})
+        json_dict = json.loads(response.data)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('planets', json_dict)
+
+    def test_unknown_precision(self):
+        """Test that an unknown precision is a bad request."""
+
+        response = self.client.post('/place-time-data.json',
+                                    data={'lat': 0, 'lng': 0,
+                                          'precision': 'sloppy'})
 
+        self.assertEqual(response.status_code, 400)
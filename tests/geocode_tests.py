@@ -0,0 +1,169 @@
+"""Tests for the local gazetteer geocoding code."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import os
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import TESTDATA_DIR
+import geocode
+
+GAZETTEER = geocode.Gazetteer(os.path.join(TESTDATA_DIR,
+                                           geocode.GAZETTEER_FILENAME))
+
+
+class GeocodeHelperTests(TestCase):
+    """Test the geocoding helper functions."""
+
+    def test_normalize_accents(self):
+        """Test that accents are removed from names."""
+
+        self.assertEqual(geocode.normalize_name(u'Tromsø'), 'troms')
+        self.assertEqual(geocode.normalize_name(u'Reykjavík'), 'reykjavik')
+
+    def test_normalize_punctuation(self):
+        """Test that punctuation and extra spaces are removed from names."""
+
+        self.assertEqual(geocode.normalize_name(" St.  John's "), 'st johns')
+
+    def test_distance_zero(self):
+        """Test distance between a point and itself."""
+
+        self.assertEqual(geocode.get_distance(37.7, -122.4, 37.7, -122.4), 0)
+
+    def test_distance_sf_la(self):
+        """Test distance between San Francisco and Los Angeles (about 559 km)."""
+
+        distance = geocode.get_distance(37.77493, -122.41942, 34.05223, -118.24368)
+        self.assertTrue(abs(distance - 559) < 5)
+
+    def test_no_remote_geocoder_without_key(self):
+        """Test that no remote client is made without an api key."""
+
+        old_key = os.environ.pop('GOOGLE_PLACES_APIKEY', None)
+
+        try:
+            self.assertIsNone(geocode.get_remote_geocoder())
+        finally:
+            if old_key is not None:
+                os.environ['GOOGLE_PLACES_APIKEY'] = old_key
+
+
+class GazetteerTests(TestCase):
+    """Test autocomplete and reverse lookup against the test gazetteer."""
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(GAZETTEER), str)
+
+    def test_num_places(self):
+        """Test that all places in the test file were loaded."""
+
+        self.assertEqual(len(GAZETTEER.places), 24)
+
+    def test_autocomplete_order(self):
+        """Test that matching places come back most populous first."""
+
+        names = [p['name'] for p in GAZETTEER.autocomplete('san')]
+        self.assertEqual(names, ['San Jose', 'San Francisco', 'Santa Cruz'])
+
+    def test_autocomplete_whole_word(self):
+        """Test that a trailing space only matches the finished word."""
+
+        names = [p['name'] for p in GAZETTEER.autocomplete('san ')]
+        self.assertEqual(names, ['San Jose', 'San Francisco'])
+
+    def test_autocomplete_case_and_accents(self):
+        """Test that the prefix match ignores case and accents."""
+
+        places = GAZETTEER.autocomplete('REYKJAV')
+        self.assertEqual(places[0]['name'], u'Reykjavík')
+
+    def test_autocomplete_ascii_name(self):
+        """Test matching a place by its ascii name."""
+
+        places = GAZETTEER.autocomplete('tromso')
+        self.assertEqual(places[0]['name'], u'Tromsø')
+
+    def test_autocomplete_limit(self):
+        """Test limiting the number of suggestions."""
+
+        places = GAZETTEER.autocomplete('s', limit=2)
+        self.assertEqual(len(places), 2)
+
+    def test_autocomplete_no_match(self):
+        """Test a prefix with no matches."""
+
+        self.assertEqual(GAZETTEER.autocomplete('xyzzy'), [])
+
+    def test_autocomplete_empty(self):
+        """Test that an empty prefix gives no suggestions."""
+
+        self.assertEqual(GAZETTEER.autocomplete(''), [])
+
+    def test_reverse_nearby(self):
+        """Test reverse lookup of a point near a city."""
+
+        place = GAZETTEER.reverse(37.78, -122.41)
+        self.assertEqual(place['name'], 'San Francisco')
+
+    def test_reverse_across_cells(self):
+        """Test reverse lookup where the closest city is in another grid cell."""
+
+        place = GAZETTEER.reverse(-26.9, 27.9)
+        self.assertEqual(place['name'], 'Johannesburg')
+
+    def test_reverse_across_dateline(self):
+        """Test reverse lookup across the 180th meridian."""
+
+        place = GAZETTEER.reverse(-36.8, -179.5)
+        self.assertEqual(place['name'], 'Auckland')
+
+    def test_reverse_far_north(self):
+        """Test reverse lookup at high latitude."""
+
+        place = GAZETTEER.reverse(78.2, 15.6)
+        self.assertEqual(place['name'], u'Tromsø')
+
+    def test_reverse_near_pole(self):
+        """Test reverse lookup near the south pole, far from any city."""
+
+        place = GAZETTEER.reverse(-89, 0)
+        self.assertEqual(place['name'], 'Ushuaia')
+
+    def test_reverse_far_from_cities(self):
+        """Test reverse lookups far from any city find the closest one."""
+
+        for lat, lng in [(0, 0), (-60, -150), (-89, 0), (89.9, 170)]:
+            closest = min(GAZETTEER.places,
+                          key=lambda place: geocode.get_distance(
+                              lat, lng, place['lat'], place['lng']))
+            self.assertEqual(GAZETTEER.reverse(lat, lng), closest)
+
+    def test_missing_file(self):
+        """Test that a missing GeoNames file makes an empty gazetteer."""
+
+        gazetteer = geocode.Gazetteer(os.path.join(TESTDATA_DIR, 'nonexistent'))
+
+        self.assertEqual(gazetteer.autocomplete('san'), [])
+        self.assertIsNone(gazetteer.reverse(37.78, -122.41))
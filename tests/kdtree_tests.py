@@ -0,0 +1,122 @@
+"""Tests for the KD-tree nearest neighbor search."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import numpy as np
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+import kdtree
+
+# number of random points in the test tree, and of random queries
+NUM_POINTS = 2000
+NUM_QUERIES = 100
+
+
+def get_random_unit_vectors(size, seed=0):
+    """Return a size x 3 array of unit vectors spread over the sphere."""
+
+    vectors = np.random.RandomState(seed).normal(size=(size, 3))
+
+    return vectors / np.linalg.norm(vectors, axis=1)[:, np.newaxis]
+
+
+def get_brute_force_nearest(points, point, k, max_distance):
+    """Return tuple of arrays (distances, indexes), checking every point."""
+
+    distances = np.linalg.norm(points - point, axis=1)
+    indexes = np.argsort(distances, kind='mergesort')[:k]
+    indexes = indexes[distances[indexes] <= max_distance]
+
+    return distances[indexes], indexes
+
+
+class KDTreeTests(MarginTestCase):
+    """Test KD-tree searches against checking every point."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.points = get_random_unit_vectors(NUM_POINTS)
+        cls.tree = kdtree.KDTree(cls.points)
+        cls.queries = get_random_unit_vectors(NUM_QUERIES, seed=1)
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(self.tree), str)
+
+    def test_leaf_sizes(self):
+        """Test that every point is in exactly one leaf, of at most LEAF_SIZE."""
+
+        leaf_points = []
+        for split_axis, _, _, _, start, end in self.tree.nodes:
+            if split_axis == kdtree.LEAF:
+                self.assertTrue(end - start <= kdtree.LEAF_SIZE)
+                leaf_points.extend(self.tree.order[start:end])
+
+        self.assertEqual(sorted(leaf_points), list(range(NUM_POINTS)))
+
+    def test_k_nearest(self):
+        """Test the k nearest points, with no distance limit."""
+
+        for point in self.queries:
+            distances, indexes = self.tree.query(point, k=5)
+            expected_distances, expected_indexes = get_brute_force_nearest(
+                self.points, point, 5, np.inf)
+
+            self.assertEqual(list(indexes), list(expected_indexes))
+            self.assertTrue(np.allclose(distances, expected_distances))
+
+    def test_max_distance(self):
+        """Test that points further than max_distance are left out."""
+
+        for point in self.queries:
+            distances, indexes = self.tree.query(point, k=50, max_distance=0.1)
+            _, expected_indexes = get_brute_force_nearest(self.points, point,
+                                                          50, 0.1)
+
+            self.assertEqual(list(indexes), list(expected_indexes))
+
+    def test_more_than_all(self):
+        """Test asking for more points than the tree has."""
+
+        tree = kdtree.KDTree(self.points[:3])
+        distances, indexes = tree.query(self.queries[0], k=10)
+
+        self.assertEqual(sorted(indexes), [0, 1, 2])
+        self.assertTrue((np.diff(distances) >= 0).all())
+
+    def test_empty(self):
+        """Test searching a tree with no points."""
+
+        tree = kdtree.KDTree(np.zeros((0, 3)))
+        distances, indexes = tree.query(self.queries[0], k=3)
+
+        self.assertEqual(len(indexes), 0)
+
+    def test_chord_round_trip(self):
+        """Test converting angles to chord lengths and back."""
+
+        for angle in [0, 0.5, 30, 90, 179]:
+            self.assertWithinMargin(
+                kdtree.chord_to_angle(kdtree.angle_to_chord(angle)), angle, 1e-9)
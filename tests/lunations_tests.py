@@ -0,0 +1,123 @@
+"""Tests for the lunation table and moon calendar."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+import lunations
+
+TABLE = lunations.get_lunation_table(ephem.Date('2017/3/1'))
+
+
+class LunationTableTests(TestCase):
+    """Test building and searching the lunation table."""
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(TABLE), str)
+
+    def test_decade_range(self):
+        """Test that tables cover a whole decade."""
+
+        self.assertEqual((TABLE.start_year, TABLE.end_year), (2010, 2019))
+        self.assertTrue(TABLE.covers(ephem.Date('2019/12/31')))
+        self.assertFalse(TABLE.covers(ephem.Date('2020/1/1')))
+
+    def test_table_shared(self):
+        """Test that dates in the same decade share one table."""
+
+        table = lunations.get_lunation_table(ephem.Date('2013/7/4'))
+        self.assertIs(table, TABLE)
+
+    def test_instants_sorted(self):
+        """Test that the principal phases are in order."""
+
+        self.assertEqual(TABLE.instants, sorted(TABLE.instants))
+        self.assertEqual(TABLE.phases[:4], [lunations.NEW_MOON,
+                                            lunations.FIRST_QUARTER,
+                                            lunations.FULL_MOON,
+                                            lunations.THIRD_QUARTER])
+
+    def test_previous_phase(self):
+        """Test the principal phase just before a date (new moon 2017/2/26)."""
+
+        phase, instant = TABLE.get_previous_phase(ephem.Date('2017/3/1'))
+        self.assertEqual(phase, lunations.NEW_MOON)
+        self.assertEqual(str(instant)[:9], '2017/2/26')
+
+    def test_growth_matches_search(self):
+        """Test that growth agrees with searching for the next new/full moon."""
+
+        for day in range(0, 3650, 7):
+            ephem_date = ephem.Date(ephem.Date('2010/1/1') + day + 0.3)
+
+            if ephem.next_new_moon(ephem_date) < ephem.next_full_moon(ephem_date):
+                expected = 'waning'
+            else:
+                expected = 'waxing'
+
+            self.assertEqual(TABLE.get_growth(ephem_date), expected)
+
+
+class MoonCalendarTests(TestCase):
+    """Test the moon phase calendar."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.march = lunations.get_moon_calendar(2017, 3)
+
+    def test_month_length(self):
+        """Test that there's one entry per day of the month."""
+
+        self.assertEqual(len(self.march), 31)
+        self.assertEqual(self.march[0]['date'], '2017-03-01')
+        self.assertEqual(self.march[-1]['date'], '2017-03-31')
+
+    def test_day_keys(self):
+        """Test the keys of a calendar day."""
+
+        self.assertEqual(set(self.march[0].keys()),
+                         set(['date', 'illumination', 'phase', 'event',
+                              'eventTime']))
+
+    def test_events(self):
+        """Test the principal phases in March 2017."""
+
+        events = dict((d['date'], d['event']) for d in self.march if d['event'])
+        self.assertEqual(events, {'2017-03-05': lunations.FIRST_QUARTER,
+                                  '2017-03-12': lunations.FULL_MOON,
+                                  '2017-03-20': lunations.THIRD_QUARTER,
+                                  '2017-03-28': lunations.NEW_MOON})
+
+    def test_phrase(self):
+        """Test the phase phrase for a day."""
+
+        self.assertTrue(self.march[1]['phase'].startswith('waxing crescent'))
+
+    def test_year(self):
+        """Test a calendar for a whole year."""
+
+        self.assertEqual(len(lunations.get_moon_calendar(2016)), 366)
@@ -0,0 +1,325 @@
+"""Tests for the minor body (asteroid and comet) engine."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import shutil
+import tempfile
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase, TESTDATA_DIR, SKYOBJECT_KEY_SET
+from starfield import StarField
+from constellations import precess
+from riseset import get_hour_angle_events, ALWAYS_UP, NEVER_UP
+import minor_bodies
+
+# san francisco, 9pm on March 1, 2017 (local time)
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# allowed differences from pyEphem, in arcsec. (pyEphem keeps elements and
+# positions in single precision, and its parabolic orbits are only good to
+# tens of arcsec.)
+POSITION_TOLERANCE = 10
+PARABOLIC_TOLERANCE = 60
+
+# allowed difference from pyEphem's rise and set times for asteroids, in
+# seconds, and pyEphem's horizon (refraction at its default pressure and
+# temperature), in degrees
+RISE_SET_TOLERANCE = 10
+PYEPHEM_HORIZON = -33.54 / 60
+
+# number of bodies for the many bodies test
+NUM_MANY_BODIES = 5000
+
+
+def get_separation(ra1, dec1, ra2, dec2):
+    """Return the angle between two positions (degrees), in arcsec."""
+
+    ra1, dec1, ra2, dec2 = [math.radians(angle) for angle in (ra1, dec1, ra2, dec2)]
+
+    cos_separation = math.sin(dec1) * math.sin(dec2) + \
+        math.cos(dec1) * math.cos(dec2) * math.cos(ra1 - ra2)
+
+    return math.degrees(math.acos(min(1, cos_separation))) * 3600
+
+
+class MinorBodyTests(MarginTestCase):
+    """Test parsing elements and positions against pyEphem."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        minor_bodies.CATALOG = None
+        cls.catalog = minor_bodies.get_catalog(TESTDATA_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stuff to do once after running all class test methods."""
+
+        minor_bodies.CATALOG = None
+
+    def get_index(self, name):
+        """Return the catalog index of the body whose name starts with name."""
+
+        return [i for i, body_name in enumerate(self.catalog.names)
+                if body_name.startswith(name)][0]
+
+    def assertMatchesPyEphem(self, index, ephem_date, tolerance):
+        """Test one body's position and magnitude against pyEphem's."""
+
+        positions = self.catalog.get_positions(ephem_date)
+
+        body = self.catalog.get_body(index)
+        body.compute(ephem_date)
+
+        separation = get_separation(positions['ra'][index],
+                                    positions['dec'][index],
+                                    math.degrees(body.a_ra),
+                                    math.degrees(body.a_dec))
+        self.assertTrue(separation < tolerance)
+
+        self.assertWithinMargin(positions['earth_distance'][index],
+                                body.earth_distance, 0.001)
+        self.assertWithinMargin(positions['mag'][index], body.mag, 0.02)
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(self.catalog), str)
+
+    def test_unpack_epoch(self):
+        """Test unpacking an MPC packed date."""
+
+        self.assertEqual(minor_bodies.unpack_epoch('K179S'),
+                         ephem.Date('2017/9/28'))
+
+    def test_parse_asteroid(self):
+        """Test parsing an MPCORB.DAT line."""
+
+        index = self.get_index('(1) Ceres')
+
+        self.assertEqual(self.catalog.kinds[index], 'asteroid')
+        self.assertWithinMargin(self.catalog.h[index], 3.34, 1e-9)
+        self.assertWithinMargin(self.catalog.e[index], 0.0766, 1e-9)
+
+    def test_parse_comet(self):
+        """Test parsing a CometEls.txt line."""
+
+        index = self.get_index('1P/Halley')
+
+        self.assertEqual(self.catalog.kinds[index], 'comet')
+        self.assertWithinMargin(self.catalog.perihelion[index],
+                                ephem.Date('1986/2/9') + 0.459, 1e-6)
+
+    def test_parse_bad_line(self):
+        """Test that header lines aren't taken for elements."""
+
+        self.assertIsNone(minor_bodies.parse_asteroid_line('Des\'n     H     G'))
+        self.assertIsNone(minor_bodies.parse_comet_line('-' * 40))
+
+    def test_load_skips_dim_bodies(self):
+        """Test that bodies that can never get bright aren't loaded."""
+
+        self.assertEqual(len(self.catalog), 8)
+        self.assertFalse(any('Dim' in name for name in self.catalog.names))
+
+    def test_no_elements_files(self):
+        """Test that there's no catalog without elements files."""
+
+        tempdir = tempfile.mkdtemp()
+        minor_bodies.CATALOG = None
+
+        try:
+            self.assertIsNone(minor_bodies.get_catalog(tempdir))
+        finally:
+            shutil.rmtree(tempdir)
+            minor_bodies.CATALOG = self.catalog
+
+    def test_asteroids(self):
+        """Test asteroid positions against pyEphem."""
+
+        for ephem_date in (ephem.Date('2017/3/2 05:00'), ephem.Date('1986/3/1'),
+                           ephem.Date('2030/1/1')):
+            for name in ('(1) Ceres', '(4) Vesta', '(433) Eros'):
+                self.assertMatchesPyEphem(self.get_index(name), ephem_date,
+                                          POSITION_TOLERANCE)
+
+    def test_elliptic_comet(self):
+        """Test a long period comet, near perihelion and near aphelion."""
+
+        index = self.get_index('1P/Halley')
+
+        for ephem_date in (ephem.Date('1986/3/1'), ephem.Date('2030/1/1')):
+            self.assertMatchesPyEphem(index, ephem_date, POSITION_TOLERANCE)
+
+    def test_hyperbolic_comet(self):
+        """Test a hyperbolic comet in the year around perihelion."""
+
+        index = self.get_index('C/2017 H1')
+
+        for days in (-150, 0, 150):
+            self.assertMatchesPyEphem(index, self.catalog.perihelion[index] + days,
+                                      POSITION_TOLERANCE)
+
+    def test_parabolic_comet(self):
+        """Test a parabolic comet against pyEphem and Barker's equation."""
+
+        index = self.get_index('C/2017 P1')
+        q = self.catalog.q[index]
+
+        for days in (-150, 0, 150):
+            ephem_date = self.catalog.perihelion[index] + days
+            self.assertMatchesPyEphem(index, ephem_date, PARABOLIC_TOLERANCE)
+
+            # r = q (1 + s^2), where s + s^3 / 3 = k t / sqrt(2 q^3)
+            r = np.linalg.norm(self.catalog.get_heliocentric(ephem_date)[:, index])
+            s = math.sqrt(r / q - 1) * (1 if days > 0 else -1)
+            self.assertWithinMargin(s + s ** 3 / 3,
+                                    minor_bodies.GAUSS_K * days / math.sqrt(2 * q ** 3),
+                                    1e-7)
+
+    def test_kepler_high_eccentricity(self):
+        """Test that Kepler's equation converges for nearly parabolic orbits."""
+
+        mean_anomalies = np.linspace(-math.pi, math.pi, 101)
+        e = np.full(101, 0.999)
+
+        anomalies = minor_bodies.solve_elliptic(mean_anomalies, e)
+        errors = anomalies - e * np.sin(anomalies) - mean_anomalies
+
+        self.assertTrue(np.abs(errors).max() < 1e-10)
+
+    def test_many_bodies(self):
+        """Test positions for thousands of bodies at once."""
+
+        rand = np.random.RandomState(0)
+        elements_list = [{'name': str(i), 'kind': 'asteroid', 'H': 8, 'G': 0.15,
+                          'epoch': ephem.Date('2017/9/4'),
+                          'M': rand.uniform(0, 360), 'peri': rand.uniform(0, 360),
+                          'node': rand.uniform(0, 360), 'incl': rand.uniform(0, 30),
+                          'e': rand.uniform(0, 0.9), 'a': rand.uniform(1.5, 5)}
+                         for i in range(NUM_MANY_BODIES)]
+        catalog = minor_bodies.MinorBodyCatalog(elements_list)
+
+        positions = catalog.get_positions(ephem.Date('2017/3/2'))
+
+        self.assertEqual(len(positions['ra']), NUM_MANY_BODIES)
+
+    def get_rise_set(self, ephem_date, lat, lng):
+        """Return get_hour_angle_events results for the catalog's bodies."""
+
+        indexes = np.arange(len(self.catalog))
+
+        def get_ra_decs(ephem_dates):
+            """Return the bodies' positions of date, each at its own date."""
+
+            return precess(*self.catalog.get_ra_decs(ephem_dates, indexes),
+                           from_epoch=ephem.J2000, to_epoch=ephem_date)
+
+        return get_hour_angle_events(get_ra_decs, float(ephem_date), lat, lng,
+                                     PYEPHEM_HORIZON)
+
+    def test_earth_positions(self):
+        """Test interpolated earth positions against exact ones."""
+
+        ephem_dates = ephem.Date('2017/3/1') + np.array([0.25, 0.5, 1.75])
+        earth = minor_bodies.get_earth_positions(ephem_dates)
+
+        for i, ephem_date in enumerate(ephem_dates):
+            difference = earth[:, i] - minor_bodies.get_earth_position(ephem_date)
+            self.assertTrue(np.linalg.norm(difference) < 1e-4)
+
+    def test_rise_set(self):
+        """Test asteroid rise and set times against pyEphem's searches."""
+
+        observer = ephem.Observer()
+
+        for lat, lng, date_string in ((TEST_LAT, TEST_LNG, '2017/3/2 05:00'),
+                                      (-33.87, 151.21, '2017/7/15 12:00'),
+                                      (51.48, 0.0, '2018/1/3 20:00')):
+            ephem_date = ephem.Date(date_string)
+            prev_rises, next_sets, statuses = self.get_rise_set(ephem_date,
+                                                                lat, lng)
+
+            observer.lat = str(lat)
+            observer.lon = str(lng)
+            observer.date = ephem_date
+
+            for name in ('(1) Ceres', '(2) Pallas', '(4) Vesta', '(433) Eros'):
+                index = self.get_index(name)
+                body = self.catalog.get_body(index)
+
+                self.assertIsNone(statuses[index])
+                self.assertWithinMargin(prev_rises[index],
+                                        observer.previous_rising(body),
+                                        RISE_SET_TOLERANCE / 86400.0)
+                self.assertWithinMargin(next_sets[index],
+                                        observer.next_setting(body),
+                                        RISE_SET_TOLERANCE / 86400.0)
+
+    def test_rise_set_status(self):
+        """Test bodies that don't rise or set near the pole."""
+
+        ephem_date = ephem.Date('2017/3/2 05:00')
+        _, _, statuses = self.get_rise_set(ephem_date, 89.9, 0)
+        decs = self.catalog.get_positions(ephem_date)['dec']
+
+        for dec, status in zip(decs, statuses):
+            if abs(dec) > 1:
+                self.assertEqual(status, ALWAYS_UP if dec > 0 else NEVER_UP)
+
+    def test_starfield_minor_bodies(self):
+        """Test the minor bodies bright enough for a starfield."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG, max_mag=9,
+                        localtime_string=TEST_DATETIME_STRING)
+        bodies = stf.get_minor_bodies()
+
+        positions = self.catalog.get_positions(stf.ephem.date)
+        expected_names = set(name for name, mag in zip(self.catalog.names,
+                                                       positions['mag'])
+                             if mag <= 9)
+
+        self.assertEqual(set(body['name'] for body in bodies), expected_names)
+
+        for body in bodies:
+            self.assertTrue(SKYOBJECT_KEY_SET <= set(body.keys()))
+            self.assertIn(body['celestialType'], ('asteroid', 'comet'))
+
+            # d3 positions are inverted, and for the equinox of date
+            pyephem_body = self.catalog.get_body(self.get_index(body['name']))
+            pyephem_body.compute(stf.ephem.date)
+            self.assertTrue(get_separation(360 - body['ra'], body['dec'],
+                                           math.degrees(pyephem_body.g_ra),
+                                           math.degrees(pyephem_body.g_dec)) < 60)
+
+    def test_starfield_max_mag(self):
+        """Test that no minor bodies are returned when all are too dim."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG, max_mag=0,
+                        localtime_string=TEST_DATETIME_STRING)
+
+        self.assertEqual(stf.get_minor_bodies(), [])
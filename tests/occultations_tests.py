@@ -0,0 +1,182 @@
+"""Tests for the lunar occultation finder."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+from coords import EquatorialCatalog, get_unit_vectors
+import occultations
+
+# san francisco, and the occultation of aldebaran on the evening of March 4,
+# 2017 (local time)
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+ALDEBARAN = EquatorialCatalog(ra=[68.98], dec=[16.509], ids=[87],
+                              magnitudes=[0.87])
+ALDEBARAN_DISAPPEARANCE = ephem.Date('2017/3/5 03:02')
+
+# random stars, about as many as the magnitude 7 catalog has
+NUM_RANDOM_STARS = 16000
+
+# days for the brute force test
+BRUTE_FORCE_DAYS = 2
+
+
+def get_random_catalog():
+    """Return an EquatorialCatalog of stars spread evenly over the sky."""
+
+    rand = np.random.RandomState(1)
+
+    return EquatorialCatalog(
+        ra=rand.uniform(0, 360, NUM_RANDOM_STARS),
+        dec=np.degrees(np.arcsin(rand.uniform(-1, 1, NUM_RANDOM_STARS))),
+        ids=np.arange(NUM_RANDOM_STARS),
+        magnitudes=rand.uniform(0, 7, NUM_RANDOM_STARS))
+
+
+def get_limb_distance(observer, body, ephem_date):
+    """Return how far body is outside the moon's limb at ephem_date (degrees)."""
+
+    moon = ephem.Moon()
+    observer.date = ephem_date
+    moon.compute(observer)
+    body.compute(observer)
+
+    return math.degrees(ephem.separation(moon, body) - moon.radius)
+
+
+class OccultationTests(MarginTestCase):
+    """Test finding stars and planets behind the moon."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.catalog = get_random_catalog()
+
+    def test_aldebaran(self):
+        """Test a published occultation of a bright star."""
+
+        found = occultations.find_occultations(
+            ALDEBARAN, TEST_LAT, TEST_LNG, ephem.Date('2017/3/1'),
+            ephem.Date('2017/3/31'), planets=False)
+
+        self.assertEqual(len(found), 1)
+        self.assertEqual(found[0]['id'], 87)
+        self.assertEqual(found[0]['celestialType'], occultations.STAR)
+        self.assertWithinMargin(found[0]['disappearance'], ALDEBARAN_DISAPPEARANCE,
+                                ephem.minute)
+
+    def test_contacts_at_limb(self):
+        """Test that the star is at the moon's limb at each contact."""
+
+        observer = occultations.get_observer(TEST_LAT, TEST_LNG)
+        found = occultations.find_occultations(
+            self.catalog, TEST_LAT, TEST_LNG, ephem.Date('2017/3/1'),
+            ephem.Date('2017/3/3'), planets=False)
+
+        self.assertTrue(found)
+
+        for occultation in found:
+            star = occultations.get_star_body(self.catalog.ra[occultation['id']],
+                                              self.catalog.dec[occultation['id']])
+
+            for key in ('disappearance', 'reappearance'):
+                self.assertWithinMargin(
+                    get_limb_distance(observer, star, occultation[key]), 0, 0.001)
+
+            middle = (occultation['disappearance'] + occultation['reappearance']) / 2
+            self.assertTrue(get_limb_distance(observer, star, middle) < 0)
+
+    def test_against_brute_force(self):
+        """Test the stars found against checking them all, minute by minute."""
+
+        start = ephem.Date('2017/3/1')
+        end = ephem.Date(start + BRUTE_FORCE_DAYS)
+        found = occultations.find_occultations(self.catalog, TEST_LAT, TEST_LNG,
+                                               start, end, planets=False)
+        found_ids = set(occultation['id'] for occultation in found)
+
+        observer = occultations.get_observer(TEST_LAT, TEST_LNG)
+        moon = ephem.Moon()
+
+        # stars well behind the moon while it's up, and stars near it at all
+        covered = set()
+        near = set()
+
+        for minute in range(int(BRUTE_FORCE_DAYS / ephem.minute)):
+            observer.date = start + minute * ephem.minute
+            moon.compute(observer)
+
+            vector = get_unit_vectors(*occultations.get_path_position(moon))
+            separations = np.degrees(np.arccos(np.clip(
+                vector.dot(self.catalog.vectors), -1, 1)))
+            radius = math.degrees(moon.radius)
+
+            if moon.alt > 0:
+                covered.update(np.flatnonzero(separations < radius - 0.01))
+            near.update(np.flatnonzero(separations < radius + 0.01))
+
+        self.assertTrue(covered)
+        self.assertTrue(covered <= found_ids)
+        self.assertTrue(found_ids <= near)
+
+    def test_planet(self):
+        """Test an occultation of Mercury."""
+
+        found = occultations.find_occultations(
+            EquatorialCatalog(ra=[], dec=[]), TEST_LAT, TEST_LNG,
+            ephem.Date('2018/9/1'), ephem.Date('2018/9/30'))
+
+        self.assertEqual([occultation['name'] for occultation in found],
+                         ['Mercury'])
+        self.assertEqual(found[0]['celestialType'], occultations.PLANET)
+
+        observer = occultations.get_observer(TEST_LAT, TEST_LNG)
+        self.assertWithinMargin(get_limb_distance(observer, ephem.Mercury(),
+                                                  found[0]['disappearance']),
+                                0, 0.001)
+
+    def test_month(self):
+        """Test a month over a full catalog."""
+
+        found = occultations.find_occultations(self.catalog, TEST_LAT, TEST_LNG,
+                                               ephem.Date('2017/3/1'),
+                                               ephem.Date('2017/3/31'))
+
+        disappearances = [occultation['disappearance'] for occultation in found]
+        self.assertEqual(disappearances, sorted(disappearances))
+
+    def test_starfield_occultations(self):
+        """Test that starfield occultations have local display times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        found = stf.get_occultations(ALDEBARAN)
+
+        self.assertEqual(found[0]['date'], 'March 4, 2017')
+        self.assertEqual(found[0]['disappearance'], '7:02 PM')
@@ -0,0 +1,154 @@
+"""Tests for the yearly visibility planner."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+from constellations import get_locator
+import planner
+
+# san francisco
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_YEAR = 2017
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# how far off (degrees) an altitude at a window's edge can be: how far the
+# sky turns in a sample, plus margin
+WINDOW_ALT_MARGIN = 3
+
+
+def get_altitude(body, lat, lng, ephem_date):
+    """Return body's altitude (degrees) seen from lat / lng, without refraction."""
+
+    observer = ephem.Observer()
+    observer.lat = math.radians(lat)
+    observer.lon = math.radians(lng)
+    observer.pressure = 0
+    observer.date = ephem_date
+    body.compute(observer)
+
+    return math.degrees(body.alt)
+
+
+def get_entry(entries, key, value):
+    """Return the plan entry whose key is value."""
+
+    return [entry for entry in entries if entry[key] == value][0]
+
+
+class PlannerTests(MarginTestCase):
+    """Test the visibility planner."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        # centroids are worked out once, on first use
+        get_locator().get_centroids()
+
+        planner.PLAN_CACHE.clear()
+        cls.plan = planner.get_plan(TEST_LAT, TEST_LNG, TEST_YEAR)
+
+    def test_centroids(self):
+        """Test that every constellation's centroid is inside it."""
+
+        locator = get_locator()
+        centroids = locator.get_centroids()
+
+        # serpens is in two pieces, with a centroid each
+        self.assertEqual(set(centroids), set(locator.names) - set(['SER']))
+        for code, (ra, dec) in centroids.items():
+            self.assertEqual(locator.find_one(ra, dec), code)
+
+    def test_all_constellations(self):
+        """Test that the plan has every constellation and planet."""
+
+        self.assertEqual(len(self.plan['constellations']),
+                         len(get_locator().get_centroids()))
+        self.assertEqual(len(self.plan['planets']), len(planner.PLANETS))
+
+    def test_seasons(self):
+        """Test that orion is a winter constellation and scorpius a summer one."""
+
+        orion = get_entry(self.plan['constellations'], 'code', 'ORI')
+        self.assertIn(orion['bestMonth'], (12, 1))
+        self.assertEqual(orion['hours'][5], 0)
+
+        scorpius = get_entry(self.plan['constellations'], 'code', 'SCO')
+        self.assertIn(scorpius['bestMonth'], (5, 6, 7))
+        self.assertEqual(scorpius['hours'][0], 0)
+
+    def test_never_seen(self):
+        """Test that the southern cross can't be seen from san francisco."""
+
+        crux = get_entry(self.plan['constellations'], 'code', 'CRU')
+
+        self.assertIsNone(crux['bestMonth'])
+        self.assertEqual(crux['windows'], [None] * 12)
+
+    def test_night_hours(self):
+        """Test that winter nights are longer than summer nights."""
+
+        self.assertTrue(self.plan['nightHours'][11] > self.plan['nightHours'][5])
+        self.assertTrue(self.plan['nightHours'][5] > 0)
+
+    def test_planet_window(self):
+        """Test jupiter's window in april 2017 against pyEphem."""
+
+        jupiter = get_entry(self.plan['planets'], 'name', 'Jupiter')
+        first, last = jupiter['windows'][3]
+
+        for ephem_date in (first, last):
+            self.assertTrue(get_altitude(ephem.Sun(), TEST_LAT, TEST_LNG,
+                                         ephem_date) <
+                            planner.TWILIGHT_ALT + WINDOW_ALT_MARGIN)
+            self.assertTrue(get_altitude(ephem.Jupiter(), TEST_LAT, TEST_LNG,
+                                         ephem_date) >
+                            planner.MIN_ALT - WINDOW_ALT_MARGIN)
+
+        # jupiter was at opposition on april 7: up most of the night
+        self.assertEqual(jupiter['bestMonth'], 4)
+
+    def test_cache(self):
+        """Test that places in the same cell share a plan."""
+
+        self.assertIs(planner.get_plan(TEST_LAT + 0.01, TEST_LNG, TEST_YEAR),
+                      self.plan)
+
+    def test_starfield_plan(self):
+        """Test a starfield's plan, in local times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        plan = stf.get_visibility_plan()
+
+        orion = get_entry(plan['constellations'], 'code', 'ORI')
+        self.assertEqual(orion['name'], 'Orion')
+        self.assertTrue(orion['windows'][0][0].endswith('PM'))
+
+        # the shared plan isn't changed
+        self.assertIsInstance(get_entry(self.plan['constellations'], 'code',
+                                        'ORI')['windows'][0][0], ephem.Date)
@@ -0,0 +1,155 @@
+"""Tests for the shared geocentric position cache."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField, PLANETS
+import positions
+
+# 9pm on March 1, 2017 (local time)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# san francisco, sydney, tromso
+TEST_LOCATIONS = [(37.7749, -122.4194), (-33.8688, 151.2093), (69.6492, 18.9553)]
+
+# between whole minutes, to test interpolation
+TEST_EPHEM_DATES = [ephem.Date('2017/3/2 05:00:00'),
+                    ephem.Date('2017/3/2 05:00:23.7'),
+                    ephem.Date('2021/7/14 17:41:51')]
+
+# one tenth of an arcsecond, in radians
+TENTH_ARCSEC = math.radians(0.1 / 3600)
+
+
+class PositionCacheTests(MarginTestCase):
+    """Test cached positions against pyEphem's topocentric positions."""
+
+    def assertAnglesWithinMargin(self, actual, expected, allowed_margin):
+        """Test whether two angles (radians) are within a margin, mod 2 pi."""
+
+        difference = (actual - expected + math.pi) % (2 * math.pi) - math.pi
+        self.assertWithinMargin(difference, 0, allowed_margin)
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        position = positions.get_body_position(ephem.Mars, TEST_EPHEM_DATES[0],
+                                               0, 0)
+        self.assertIsInstance(repr(position), str)
+
+    def test_matches_pyephem(self):
+        """Test positions for the sun, moon and planets against pyEphem."""
+
+        for lat, lng in TEST_LOCATIONS:
+            observer = ephem.Observer()
+            observer.lat = str(lat)
+            observer.lon = str(lng)
+
+            for ephem_date in TEST_EPHEM_DATES:
+                observer.date = ephem_date
+
+                for body_class in [ephem.Sun, ephem.Moon] + PLANETS:
+                    body = body_class(observer)
+                    position = positions.get_body_position(
+                        body_class, ephem_date, lat, observer.sidereal_time())
+
+                    for attribute in ['ra', 'dec', 'alt']:
+                        self.assertAnglesWithinMargin(getattr(position, attribute),
+                                                      getattr(body, attribute),
+                                                      TENTH_ARCSEC)
+
+                    # azimuth gets unstable near the zenith; scale by cos(alt)
+                    self.assertAnglesWithinMargin(position.az * math.cos(body.alt),
+                                                  body.az * math.cos(body.alt),
+                                                  TENTH_ARCSEC)
+
+                    self.assertWithinMargin(position.size, body.size, 0.01)
+                    self.assertWithinMargin(position.earth_distance,
+                                            body.earth_distance, 1e-5)
+                    self.assertWithinMargin(position.mag, body.mag, 0.01)
+                    self.assertWithinMargin(position.phase, body.phase, 0.01)
+                    self.assertEqual(position.constellation[1],
+                                     ephem.constellation(body)[1])
+
+    def test_moon_colong(self):
+        """Test the moon's colongitude, which doesn't depend on the observer."""
+
+        moon = ephem.Moon(TEST_EPHEM_DATES[1])
+        position = positions.get_body_position(ephem.Moon, TEST_EPHEM_DATES[1],
+                                               0, 0)
+        self.assertAnglesWithinMargin(position.colong, moon.colong, TENTH_ARCSEC)
+
+    def test_shared_between_observers(self):
+        """Test that a second observer at the same time computes nothing new."""
+
+        StarField(lat=37.7749, lng=-122.4194, max_mag=5,
+                  localtime_string=TEST_DATETIME_STRING).get_planets()
+        compute_count = positions.COMPUTE_COUNT
+
+        # johannesburg: also 5am utc
+        StarField(lat=-26.2041, lng=28.0473, max_mag=5,
+                  localtime_string='2017-03-02T07:00').get_planets()
+        self.assertEqual(positions.COMPUTE_COUNT, compute_count)
+
+    def test_whole_quantum_computes_once(self):
+        """Test that an instant on a quantum boundary needs one computation."""
+
+        positions.POSITION_CACHE.clear()
+        positions.get_body_position(ephem.Mars, TEST_EPHEM_DATES[0], 0, 0)
+
+        self.assertEqual(len(positions.POSITION_CACHE), 1)
+
+    def test_cache_limit(self):
+        """Test that the cache is emptied when it gets too big."""
+
+        old_limit = positions.MAX_CACHED_POSITIONS
+        positions.MAX_CACHED_POSITIONS = 2
+
+        try:
+            positions.POSITION_CACHE.clear()
+            for minutes in range(3):
+                ephem_date = ephem.Date(TEST_EPHEM_DATES[0] + minutes * ephem.minute)
+                positions.get_body_position(ephem.Sun, ephem_date, 0, 0)
+
+            self.assertEqual(len(positions.POSITION_CACHE), 1)
+
+        finally:
+            positions.MAX_CACHED_POSITIONS = old_limit
+
+    def test_refract_round_trip(self):
+        """Test that unrefracting a refracted altitude gives it back."""
+
+        for alt_deg in [-3, 0, 5, 14.9, 15, 45, 89]:
+            true_alt = math.radians(alt_deg)
+            apparent_alt = positions.refract(true_alt, 1010, 15)
+
+            self.assertTrue(apparent_alt >= true_alt)
+            self.assertWithinMargin(positions.unrefract(apparent_alt, 1010, 15),
+                                    true_alt, positions.MAX_REFRACTION_ERROR * 1.01)
+
+    def test_no_refraction_without_air(self):
+        """Test that zero pressure means no refraction."""
+
+        self.assertEqual(positions.refract(0.1, 0, 15), 0.1)
@@ -0,0 +1,168 @@
+"""Tests for the starfield precision tiers."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import time
+from datetime import datetime, timedelta
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField, FAST, EXACT, DEFAULT_PRECISION, \
+    BOOTSTRAP_DTIME_FORMAT, PLANETS
+import riseset
+from riseset import ALWAYS_UP, NEVER_UP
+from workers import PlaceTimeRequest
+
+# san francisco, johannesburg and tromso (midnight sun in june)
+TEST_PLACES = [(37.7749, -122.4194), (-26.2041, 28.0473), (69.65, 18.96)]
+TEST_DATETIME_STRINGS = ['2017-03-01T21:00', '2017-06-21T12:00']
+
+# most the fast tier's ra and dec can be off, in degrees (0.02 arcsec: the
+# moon's interpolated positions are a little further off than the planets')
+MAX_POSITION_ERROR = 0.02 / 3600
+
+# most the fast tier's rise and set times can be off, in days (two seconds)
+MAX_RISE_SET_ERROR = 2 * ephem.second
+
+# starfields to time for each tier
+NUM_TIMED_STARFIELDS = 20
+
+# most times as long as the exact tier the fast tier can take in cells no one
+# has asked for before (they search for their own place, like the exact tier)
+MAX_NEW_CELL_SLOWDOWN = 1.5
+
+
+def get_bodies(stf):
+    """Return list of stf's planet, sun and moon data dicts."""
+
+    return stf.get_planets() + [stf.get_sun(), stf.get_moon()]
+
+
+def get_seconds_per_starfield(precision, new_cells=False):
+    """Return the mean seconds to make a starfield's bodies at precision.
+
+    Each starfield is a minute after the last, so none repeats another's work.
+    They're all in one rise / set cell, unless new_cells, when each is in a
+    cell of its own. The rise / set cache starts out empty either way, so the
+    fast tier's times include finding the cell's events.
+    """
+
+    riseset.RISE_SET_CACHE.clear()
+    riseset.CELL_REQUESTS.clear()
+
+    start = datetime(2017, 3, 1, 21, 0)
+    start_time = time.time()
+
+    for minute in range(NUM_TIMED_STARFIELDS):
+        localtime_string = (start + timedelta(minutes=minute)).strftime(
+            BOOTSTRAP_DTIME_FORMAT)
+        lng = TEST_PLACES[0][1]
+        if new_cells:
+            lng += minute * riseset.CELL_SIZE
+
+        get_bodies(StarField(lat=TEST_PLACES[0][0], lng=lng,
+                             localtime_string=localtime_string,
+                             precision=precision))
+
+    return (time.time() - start_time) / NUM_TIMED_STARFIELDS
+
+
+class PrecisionTests(MarginTestCase):
+    """Test the fast and exact precision tiers against each other."""
+
+    def test_default_precision(self):
+        """Test that starfields are fast unless asked otherwise."""
+
+        stf = StarField(lat=0, lng=0)
+
+        self.assertEqual(stf.precision, FAST)
+        self.assertFalse(stf.exact)
+
+    def test_exact_flag(self):
+        """Test that exact=True is the same as the exact tier."""
+
+        stf = StarField(lat=0, lng=0, exact=True)
+
+        self.assertEqual(stf.precision, EXACT)
+        self.assertTrue(stf.exact)
+
+    def test_unknown_precision(self):
+        """Test that an unknown precision is refused."""
+
+        with self.assertRaises(ValueError):
+            StarField(lat=0, lng=0, precision='sloppy')
+
+    def test_place_time_request_default(self):
+        """Test that place-time requests are fast unless asked otherwise."""
+
+        request = PlaceTimeRequest(lat=0, lng=0, localtime_string=None,
+                                   max_mag=5)
+
+        self.assertEqual(request.precision, DEFAULT_PRECISION)
+
+    def test_fast_matches_exact(self):
+        """Test that the fast tier is within its error bounds of the exact."""
+
+        for lat, lng in TEST_PLACES:
+            for localtime_string in TEST_DATETIME_STRINGS:
+                fast = StarField(lat=lat, lng=lng, precision=FAST,
+                                 localtime_string=localtime_string)
+                exact = StarField(lat=lat, lng=lng, precision=EXACT,
+                                  localtime_string=localtime_string)
+
+                for fast_body, exact_body in zip(get_bodies(fast),
+                                                 get_bodies(exact)):
+                    self.assertEqual(fast_body['name'], exact_body['name'])
+
+                    for key in ('ra', 'dec'):
+                        self.assertWithinMargin(fast_body[key], exact_body[key],
+                                                MAX_POSITION_ERROR)
+
+                # rise and set times are compared as dates: the displayed
+                # minutes can differ when a time is right at a minute's end
+                for body_class in [ephem.Sun, ephem.Moon] + PLANETS:
+                    fast_events = fast.get_rise_set_dates(fast.get_body(body_class))
+                    exact_events = exact.get_rise_set_dates(
+                        exact.get_body(body_class))
+
+                    for fast_event, exact_event in zip(fast_events, exact_events):
+                        if exact_event in (ALWAYS_UP, NEVER_UP):
+                            self.assertEqual(fast_event, exact_event)
+                        else:
+                            self.assertWithinMargin(fast_event, exact_event,
+                                                    MAX_RISE_SET_ERROR)
+
+    def test_fast_is_faster(self):
+        """Test that the fast tier takes less time than the exact in a cell.
+
+        Cells that are asked for once aren't much slower than the exact tier.
+        """
+
+        # warm up the position cache and the catalogs
+        get_seconds_per_starfield(FAST)
+        get_seconds_per_starfield(EXACT)
+
+        self.assertLess(get_seconds_per_starfield(FAST),
+                        get_seconds_per_starfield(EXACT))
+        self.assertLess(get_seconds_per_starfield(FAST, new_cells=True),
+                        MAX_NEW_CELL_SLOWDOWN *
+                        get_seconds_per_starfield(EXACT, new_cells=True))
@@ -0,0 +1,253 @@
+"""Tests for the rise / set cache."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField, PLANETS
+import riseset
+
+# 9pm on March 1, 2017 (local time)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# san francisco
+SF_LAT = 37.7749
+SF_LNG = -122.4194
+
+# one second, in days
+ONE_SECOND = 1 / 86400.0
+
+
+class RiseSetCacheTests(MarginTestCase):
+    """Test the cached rise / set times against pyEphem's searches."""
+
+    def cached_vs_exact_test(self, lat, lng, interpolate, margin,
+                             localtime_string=TEST_DATETIME_STRING):
+        """Generic test comparing cached and searched rise / set times.
+
+        Bodies the cache can't answer for are skipped. The cell's events are
+        found first, since they're only filled in lazily.
+        """
+
+        stf = StarField(lat=lat, lng=lng, localtime_string=localtime_string,
+                        exact=True)
+        cell_lat, cell_lng = riseset.get_cell(lat, lng)
+
+        for body_class in [ephem.Sun, ephem.Moon] + PLANETS:
+            body = stf.get_body(body_class)
+
+            for half_cell_lat in range(2 * cell_lat, 2 * cell_lat + 3):
+                riseset.get_cell_events(body, stf.localtime.date(),
+                                        stf.timezone, half_cell_lat, cell_lng)
+
+            cached = riseset.get_cached_rise_set(body, stf.ephem.date, lat, lng,
+                                                 stf.localtime.date(),
+                                                 stf.timezone, interpolate)
+            if cached is None:
+                continue
+
+            prev_rise = stf.ephem.previous_rising(body.copy())
+            next_set = stf.ephem.next_setting(body.copy())
+
+            self.assertWithinMargin(cached[0], prev_rise, margin)
+            self.assertWithinMargin(cached[1], next_set, margin)
+
+    def test_get_cell(self):
+        """Test finding the cell for a lat / lng."""
+
+        self.assertEqual(riseset.get_cell(SF_LAT, SF_LNG), (377, -1225))
+
+    def test_interpolated_sf(self):
+        """Test interpolated times for San Francisco are within a second."""
+
+        self.cached_vs_exact_test(SF_LAT, SF_LNG, True, ONE_SECOND)
+
+    def test_interpolated_johannesburg(self):
+        """Test interpolated times for Johannesburg are within a second."""
+
+        self.cached_vs_exact_test(-26.2041, 28.0473, True, ONE_SECOND)
+
+    def test_interpolated_far_north(self):
+        """Test interpolated times near the arctic circle are within a second."""
+
+        self.cached_vs_exact_test(67.75, 20.2, True, ONE_SECOND,
+                                  '2017-05-10T21:00')
+        self.cached_vs_exact_test(66.25, 14.1, True, ONE_SECOND,
+                                  '2017-11-20T12:00')
+
+    def test_uneven_cell(self):
+        """Test that events that don't change evenly across a cell are refused."""
+
+        self.assertTrue(riseset.is_linear([1.0], [1.01], [1.02]))
+        self.assertFalse(riseset.is_linear([1.0], [1.01 + 2 * ONE_SECOND],
+                                           [1.02]))
+        self.assertFalse(riseset.is_linear([1.0], [], [1.02]))
+
+    def test_cache_limit(self):
+        """Test that the cache is emptied when it's full."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        mars = stf.get_body(ephem.Mars)
+        max_cached = riseset.MAX_CACHED_EVENTS
+
+        try:
+            riseset.MAX_CACHED_EVENTS = len(riseset.RISE_SET_CACHE) + 1
+            for half_cell_lat in (1001, 1003):
+                riseset.get_cell_events(mars, stf.localtime.date(), stf.timezone,
+                                        half_cell_lat, 0)
+        finally:
+            riseset.MAX_CACHED_EVENTS = max_cached
+
+        self.assertEqual(len(riseset.RISE_SET_CACHE), 1)
+
+    def test_cell_middle_sf(self):
+        """Test uninterpolated times for San Francisco are within 15 seconds."""
+
+        self.cached_vs_exact_test(SF_LAT, SF_LNG, False, 15 * ONE_SECOND)
+
+    def test_strings_match_exact(self):
+        """Test that cached and exact starfields give the same time strings."""
+
+        cached_stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                               localtime_string=TEST_DATETIME_STRING)
+        exact_stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                              localtime_string=TEST_DATETIME_STRING, exact=True)
+
+        for planet in PLANETS:
+            cached = cached_stf.get_rise_set_times(cached_stf.get_body(planet))
+            exact = exact_stf.get_rise_set_times(exact_stf.get_body(planet))
+            self.assertEqual(cached, exact)
+
+    def test_cell_filled_lazily(self):
+        """Test that a cell's first request doesn't search the cell."""
+
+        stf = StarField(lat=20.05, lng=20.05,
+                        localtime_string=TEST_DATETIME_STRING)
+        mars = stf.get_body(ephem.Mars)
+        search_count = riseset.SEARCH_COUNT
+
+        cached = riseset.get_cached_rise_set(mars, stf.ephem.date, 20.05, 20.05,
+                                             stf.localtime.date(), stf.timezone)
+
+        self.assertIsNone(cached)
+        self.assertEqual(riseset.SEARCH_COUNT, search_count)
+
+        # one more set of the cell's events per request, until they're all there
+        answers = [riseset.get_cached_rise_set(mars, stf.ephem.date, 20.05,
+                                               20.05, stf.localtime.date(),
+                                               stf.timezone)
+                   for _ in range(3)]
+        self.assertEqual(answers[:2], [None, None])
+        self.assertIsNotNone(answers[2])
+
+    def test_cache_shared_in_cell(self):
+        """Test that a nearby starfield later that day doesn't search again."""
+
+        # fill in the cell's events
+        for _ in range(4):
+            stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                            localtime_string=TEST_DATETIME_STRING)
+            stf.get_rise_set_times(stf.get_body(ephem.Mars))
+        search_count = riseset.SEARCH_COUNT
+
+        nearby_stf = StarField(lat=SF_LAT + 0.01, lng=SF_LNG + 0.01,
+                               localtime_string='2017-03-01T23:30')
+        nearby_stf.get_rise_set_times(nearby_stf.get_body(ephem.Mars))
+
+        self.assertEqual(riseset.SEARCH_COUNT, search_count)
+
+    def test_exact_bypasses_cache(self):
+        """Test that an exact starfield doesn't use the cache."""
+
+        stf = StarField(lat=10.05, lng=10.05,
+                        localtime_string=TEST_DATETIME_STRING, exact=True)
+        stf.get_rise_set_times(stf.get_body(ephem.Mars))
+
+        cell_keys = [key for key in riseset.RISE_SET_CACHE
+                     if key[3] == riseset.get_cell(10.05, 10.05)[1]]
+        self.assertEqual(cell_keys, [])
+
+
+class CircumpolarTests(MarginTestCase):
+    """Test the quick check for bodies that can't rise or set."""
+
+    def circumpolar_test(self, lat, localtime_string, body_class, expected):
+        """Generic test for the circumpolar status of a body."""
+
+        stf = StarField(lat=lat, lng=18.96, localtime_string=localtime_string)
+        status = riseset.get_circumpolar_status(stf.get_body(body_class), lat,
+                                                stf.ephem.date)
+        self.assertEqual(status, expected)
+
+    def test_midnight_sun(self):
+        """Test the summer sun in Tromso."""
+
+        self.circumpolar_test(69.65, '2017-06-21T12:00', ephem.Sun,
+                              riseset.ALWAYS_UP)
+
+    def test_polar_night(self):
+        """Test the winter sun in Tromso."""
+
+        self.circumpolar_test(69.65, '2017-12-21T12:00', ephem.Sun,
+                              riseset.NEVER_UP)
+
+    def test_antarctic_summer(self):
+        """Test the December sun at McMurdo Station."""
+
+        self.circumpolar_test(-77.85, '2017-12-21T12:00', ephem.Sun,
+                              riseset.ALWAYS_UP)
+
+    def test_rises_and_sets(self):
+        """Test the sun in San Francisco, which rises and sets."""
+
+        self.circumpolar_test(SF_LAT, TEST_DATETIME_STRING, ephem.Sun, None)
+
+    def test_agrees_with_search(self):
+        """Test that the quick check never disagrees with pyEphem's searches."""
+
+        for lat in range(-89, 90, 4):
+            stf = StarField(lat=lat, lng=18.96,
+                            localtime_string='2017-06-10T12:00', exact=True)
+
+            for body_class in [ephem.Sun, ephem.Moon] + PLANETS:
+                body = stf.get_body(body_class)
+                status = riseset.get_circumpolar_status(body, lat, stf.ephem.date)
+
+                if status:
+                    searched = stf.search_rise_or_set(stf.ephem.next_setting,
+                                                      body)
+                    self.assertEqual(searched, status)
+
+    def test_high_latitude_starfield(self):
+        """Test that a far north starfield gives statuses instead of errors."""
+
+        stf = StarField(lat=85, lng=18.96, localtime_string='2017-06-21T12:00')
+        sun = stf.get_sun()
+
+        self.assertEqual(sun['prevRise'], riseset.ALWAYS_UP)
+        self.assertEqual(sun['nextSet'], riseset.ALWAYS_UP)
+
+        # every planet gets strings, whether or not it rises and sets
+        for planet in stf.get_planets():
+            self.assertIsInstance(planet['prevRise'], str)
@@ -0,0 +1,190 @@
+"""Tests for the satellite layer."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import shutil
+import tempfile
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import TESTDATA_DIR, COORDS_KEY_SET
+from starfield import StarField
+import satellites
+
+# san francisco, on the evening the test elements are for
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_DATETIME_STRING = '2017-03-01T19:00'
+TEST_EPHEM_DATE = ephem.Date('2017/3/2 03:00')
+
+# number of random places and times to check against pyEphem
+NUM_RANDOM_OBSERVERS = 500
+
+
+def get_observer(lat, lng, ephem_date):
+    """Return a pyEphem observer for the place (degrees) and time."""
+
+    observer = ephem.Observer()
+    observer.lat = str(lat)
+    observer.lon = str(lng)
+    observer.date = ephem_date
+
+    return observer
+
+
+class SatelliteTests(TestCase):
+    """Test finding satellites in the sky, and their passes."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        satellites.CATALOG = None
+        cls.catalog = satellites.get_catalog(TESTDATA_DIR)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Stuff to do once after running all class test methods."""
+
+        satellites.CATALOG = None
+
+    def get_visible_names(self, observer):
+        """Return set of satellites up and sunlit for observer, from pyEphem."""
+
+        names = set()
+
+        for i in range(len(self.catalog)):
+            body = self.catalog.get_body(i)
+            body.compute(observer)
+
+            if body.alt > 0 and not body.eclipsed:
+                names.add(body.name)
+
+        return names
+
+    def test_repr(self):
+        """Test the repr method."""
+
+        self.assertIsInstance(repr(self.catalog), str)
+
+    def test_load_skips_bad_elements(self):
+        """Test that satellites with unreadable elements aren't loaded."""
+
+        self.assertEqual(self.catalog.names,
+                         ['ISS (ZARYA)', 'HST', 'SL-16 R/B', 'LANDSAT 7'])
+
+    def test_no_tle_file(self):
+        """Test that there's no catalog without a TLE file."""
+
+        tempdir = tempfile.mkdtemp()
+        satellites.CATALOG = None
+
+        try:
+            self.assertIsNone(satellites.get_catalog(tempdir))
+        finally:
+            shutil.rmtree(tempdir)
+            satellites.CATALOG = self.catalog
+
+    def test_subpoints_cached(self):
+        """Test that subpoints are computed once per instant."""
+
+        subpoints = self.catalog.get_subpoints(TEST_EPHEM_DATE)
+
+        self.assertIs(self.catalog.get_subpoints(TEST_EPHEM_DATE), subpoints)
+        self.assertEqual(len(subpoints['lat']), len(self.catalog))
+
+    def test_visible_against_pyephem(self):
+        """Test visible satellites at random places and times against pyEphem."""
+
+        rand = np.random.RandomState(0)
+        num_visible = 0
+
+        for _ in range(NUM_RANDOM_OBSERVERS):
+            observer = get_observer(rand.uniform(-80, 80), rand.uniform(-180, 180),
+                                    TEST_EPHEM_DATE + rand.uniform(0, 1))
+
+            names = set(body.name for body in self.catalog.get_visible(observer))
+            self.assertEqual(names, self.get_visible_names(observer))
+
+            num_visible += len(names)
+
+        # make sure the test tested something
+        self.assertTrue(num_visible > 0)
+
+    def test_passes(self):
+        """Test passes are in order, high enough, and really above the horizon."""
+
+        observer = get_observer(TEST_LAT, TEST_LNG, TEST_EPHEM_DATE)
+        passes = self.catalog.get_passes(observer, days=2)
+
+        self.assertTrue(passes)
+
+        rises = [satellite_pass['rise'] for satellite_pass in passes]
+        self.assertEqual(rises, sorted(rises))
+
+        for satellite_pass in passes:
+            self.assertTrue(satellite_pass['maxAlt'] >= satellites.MIN_PASS_ALT)
+            self.assertTrue(satellite_pass['rise'] < satellite_pass['culmination'] <
+                            satellite_pass['set'])
+
+            body = self.catalog.get_body(self.catalog.names.index(
+                satellite_pass['name']))
+            observer.date = satellite_pass['culmination']
+            body.compute(observer)
+            self.assertTrue(abs(np.degrees(body.alt) - satellite_pass['maxAlt']) < 0.1)
+
+    def test_passes_by_name(self):
+        """Test passes for only some satellites."""
+
+        observer = get_observer(TEST_LAT, TEST_LNG, TEST_EPHEM_DATE)
+        passes = self.catalog.get_passes(observer, days=2, names=['HST'])
+
+        self.assertTrue(passes)
+        self.assertEqual(set(satellite_pass['name'] for satellite_pass in passes),
+                         set(['HST']))
+
+    def test_starfield_satellites(self):
+        """Test the satellites for a starfield."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        sats = stf.get_satellites()
+
+        self.assertEqual(set(sat['name'] for sat in sats),
+                         self.get_visible_names(stf.ephem))
+
+        for sat in sats:
+            self.assertTrue(COORDS_KEY_SET <= set(sat.keys()))
+            self.assertTrue(sat['alt'] > 0)
+            self.assertEqual(sat['celestialType'], 'satellite')
+
+    def test_starfield_passes(self):
+        """Test that starfield passes have local display times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        passes = stf.get_satellite_passes()
+
+        self.assertTrue(passes)
+        self.assertTrue(passes[0]['rise'].endswith('M'))
+        self.assertEqual(passes[0]['date'], 'March 1, 2017')
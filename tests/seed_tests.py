@@ -117,6 +117,22 @@ class SeedTestsWithoutDb(TestCase):
         self.assertEqual(name, 'Del2Tel')
         self.assertEqual(const, 'TEL')
 
+    def test_get_proper_motion(self):
+        """Test reading proper motions from a line in the stars file."""
+
+        star_info = {'PMRA': '-1093.45', 'PMDec': ' -1999.40 '}
+
+        self.assertEqual(seed.get_proper_motion(star_info),
+                         ('-1093.45', '-1999.40'))
+
+    def test_get_proper_motion_missing(self):
+        """Test a stars file without proper motion columns."""
+
+        star_info = {'ProperName': 'Antares',
+                     'BayerFlamsteed': ' 21Alp Sco'}
+
+        self.assertEqual(seed.get_proper_motion(star_info), (None, None))
+
     def test_get_name_and_constellation_noname(self):
         """Test extracting the name and constellation for stars without an explicit name.""" 
 
@@ -0,0 +1,118 @@
+"""Tests for vectorized sidereal time."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import numpy as np
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+import sidereal_time
+
+# number of random instants / longitudes to check against pyEphem
+NUM_SWEEP_DATES = 1000
+
+# range of the sweep: several centuries either side of now
+SWEEP_START = ephem.Date('1600/1/1')
+SWEEP_END = ephem.Date('2400/1/1')
+
+# allowed difference from pyEphem, in degrees (a millisecond of time)
+SIDEREAL_MARGIN = 0.001 / 240
+
+
+def get_pyephem_lst(ephem_date, lng):
+    """Return pyEphem's local sidereal time in degrees."""
+
+    observer = ephem.Observer()
+    observer.date = ephem_date
+    observer.lon = str(lng)
+
+    return math.degrees(observer.sidereal_time())
+
+
+class SiderealTimeTests(MarginTestCase):
+    """Test sidereal times against pyEphem."""
+
+    def assertAnglesWithinMargin(self, actual, expected, allowed_margin):
+        """Test whether two angles (degrees) are within a margin, mod 360."""
+
+        difference = (actual - expected + 180) % 360 - 180
+        self.assertWithinMargin(difference, 0, allowed_margin)
+
+    def test_sweep_matches_pyephem(self):
+        """Test random instants and longitudes over several centuries."""
+
+        rand = np.random.RandomState(0)
+        dates = rand.uniform(SWEEP_START, SWEEP_END, NUM_SWEEP_DATES)
+        lngs = rand.uniform(-180, 180, NUM_SWEEP_DATES)
+
+        lsts = sidereal_time.get_local_sidereal_time(dates, lngs)
+
+        for ephem_date, lng, lst in zip(dates, lngs, lsts):
+            self.assertAnglesWithinMargin(lst, get_pyephem_lst(ephem_date, lng),
+                                          SIDEREAL_MARGIN)
+
+    def test_midnight(self):
+        """Test an instant at 0h UT, where pyEphem's day starts over."""
+
+        ephem_date = ephem.Date('2017/3/2 00:00')
+        lst = sidereal_time.get_local_sidereal_time(ephem_date, 0)
+
+        self.assertAnglesWithinMargin(float(lst), get_pyephem_lst(ephem_date, 0),
+                                      SIDEREAL_MARGIN)
+
+    def test_range(self):
+        """Test that sidereal times are between 0 and 360 degrees."""
+
+        dates = np.linspace(SWEEP_START, SWEEP_END, 500)
+        lsts = sidereal_time.get_local_sidereal_time(dates, 179.9)
+
+        self.assertTrue((lsts >= 0).all() and (lsts < 360).all())
+
+    def test_broadcast(self):
+        """Test a column of dates against a row of longitudes."""
+
+        dates = np.array([ephem.Date('2017/3/2 05:00'),
+                          ephem.Date('2017/3/2 06:00')])
+        lngs = np.array([-122.4194, 0, 151.2093])
+
+        lsts = sidereal_time.get_local_sidereal_time(dates[:, np.newaxis], lngs)
+        self.assertEqual(lsts.shape, (2, 3))
+
+        self.assertAnglesWithinMargin(lsts[1, 2],
+                                      get_pyephem_lst(dates[1], lngs[2]),
+                                      SIDEREAL_MARGIN)
+
+    def test_sky_rotations(self):
+        """Test the d3 rotations for several places at one instant."""
+
+        ephem_date = ephem.Date('2017/3/2 05:00')
+        lats = np.array([37.7749, -33.8688])
+        lngs = np.array([-122.4194, 151.2093])
+
+        rotations = sidereal_time.get_sky_rotations(ephem_date, lats, lngs)
+
+        self.assertEqual(set(rotations.keys()), set(['lambda', 'phi']))
+        self.assertEqual(list(rotations['phi']), [-37.7749, 33.8688])
+        self.assertAnglesWithinMargin(rotations['lambda'][1],
+                                      get_pyephem_lst(ephem_date, lngs[1]),
+                                      SIDEREAL_MARGIN)
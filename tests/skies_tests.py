@@ -0,0 +1,122 @@
+"""Tests for sky summaries of many places at once."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+import positions
+import skies
+
+# 9pm on March 1, 2017 in san francisco, between whole minutes
+TEST_EPHEM_DATE = ephem.Date('2017/3/2 05:00:23.7')
+
+# san francisco, sydney, tromso, johannesburg, quito
+TEST_LATS = [37.7749, -33.8688, 69.6492, -26.2041, -0.1807]
+TEST_LNGS = [-122.4194, 151.2093, 18.9553, 28.0473, -78.4678]
+
+# allowed difference from pyEphem, in degrees (a tenth of an arcsec)
+ANGLE_MARGIN = 0.1 / 3600
+
+
+class SkiesTests(MarginTestCase):
+    """Test sky summaries against pyEphem and StarFields."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.skies = skies.get_skies(TEST_LATS, TEST_LNGS, TEST_EPHEM_DATE)
+
+    def test_format(self):
+        """Test the keys and array lengths."""
+
+        self.assertEqual(set(self.skies.keys()),
+                         set(['rotation', 'sun', 'moon', 'planets']))
+        self.assertEqual(set(self.skies['planets'].keys()),
+                         set(planet.__name__ for planet in skies.PLANETS))
+
+        for planet_data in self.skies['planets'].values():
+            self.assertEqual(set(planet_data.keys()),
+                             set(['alt', 'az', 'visible']))
+            self.assertEqual(len(planet_data['visible']), len(TEST_LATS))
+
+    def test_matches_pyephem(self):
+        """Test altitudes and azimuths against pyEphem observers."""
+
+        for i, (lat, lng) in enumerate(zip(TEST_LATS, TEST_LNGS)):
+            observer = ephem.Observer()
+            observer.lat = str(lat)
+            observer.lon = str(lng)
+            observer.date = TEST_EPHEM_DATE
+
+            bodies = [('sun', ephem.Sun), ('moon', ephem.Moon)]
+            bodies.extend((planet.__name__, planet) for planet in skies.PLANETS)
+
+            for key, body_class in bodies:
+                body = body_class(observer)
+                data = self.skies.get(key) or self.skies['planets'][key]
+
+                self.assertWithinMargin(data['alt'][i], math.degrees(body.alt),
+                                        ANGLE_MARGIN)
+
+                # azimuth gets unstable near the zenith; scale by cos(alt)
+                az_difference = (data['az'][i] - math.degrees(body.az) + 180) % 360 - 180
+                self.assertWithinMargin(az_difference * math.cos(body.alt), 0,
+                                        ANGLE_MARGIN)
+
+    def test_matches_starfield(self):
+        """Test the sky rotation and planet visibility against a StarField."""
+
+        stf = StarField(lat=TEST_LATS[0], lng=TEST_LNGS[0], max_mag=5,
+                        localtime_string='2017-03-01T21:00')
+        summary = skies.get_skies(TEST_LATS[:1], TEST_LNGS[:1], stf.ephem.date)
+
+        rotation = stf.get_sky_rotation()
+        self.assertWithinMargin(summary['rotation']['lambda'][0],
+                                rotation['lambda'], ANGLE_MARGIN)
+        self.assertEqual(summary['rotation']['phi'][0], rotation['phi'])
+
+        visible_names = set(name for name, data in summary['planets'].items()
+                            if data['visible'][0])
+        expected_names = set(planet['name'] for planet in stf.get_planets()
+                             if stf.get_position(getattr(ephem, planet['name'])).alt > 0)
+        self.assertEqual(visible_names, expected_names)
+
+    def test_max_mag(self):
+        """Test that no planet is visible with a very low max_mag."""
+
+        summary = skies.get_skies(TEST_LATS, TEST_LNGS, TEST_EPHEM_DATE,
+                                  max_mag=-10)
+
+        for planet_data in summary['planets'].values():
+            self.assertFalse(planet_data['visible'].any())
+
+    def test_shared_positions(self):
+        """Test that a second batch at the same instant computes nothing new."""
+
+        compute_count = positions.COMPUTE_COUNT
+        skies.get_skies([10, 20], [30, 40], TEST_EPHEM_DATE)
+
+        self.assertEqual(positions.COMPUTE_COUNT, compute_count)
@@ -17,9 +17,12 @@
     # You should have received a copy of the GNU Affero General Public License
     # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
 
+from unittest import TestCase
+
 from run_tests import DbTestCase, MAX_MAG, COORDS_KEY_SET, SKYOBJECT_KEY_SET
 from stars import get_stars, get_const_line_groups, get_const_bound_verts, \
-    get_const_data, get_constellations
+    get_const_data, get_constellations, get_star_catalog, get_catalog_mag, \
+    MIN_CATALOG_MAG, MAX_CATALOG_MAG
 from model import Constellation
 
 # expected star dict keys
@@ -39,6 +42,24 @@ R_DEC = -0.143
 AT_RA = 4.851
 AT_DEC = -0.801
 
+class StarCatalogMagTests(TestCase):
+    """Test rounding the magnitudes star catalogs are built for."""
+
+    def test_rounded(self):
+        """Test that magnitudes round to the nearest half."""
+
+        self.assertEqual(get_catalog_mag(4.8), 5)
+        self.assertEqual(get_catalog_mag(4.7), 4.5)
+
+    def test_limits(self):
+        """Test that very bright, very dim and non-numbers are kept in range."""
+
+        self.assertEqual(get_catalog_mag(-30), MIN_CATALOG_MAG)
+        self.assertEqual(get_catalog_mag(float('-inf')), MIN_CATALOG_MAG)
+        self.assertEqual(get_catalog_mag(1e9), MAX_CATALOG_MAG)
+        self.assertEqual(get_catalog_mag(float('nan')), MAX_CATALOG_MAG)
+
+
 class StarDataTests(DbTestCase):
     """Test calculations for star data
 
@@ -80,6 +101,40 @@ class StarDataTests(DbTestCase):
 
         self.assertEqual(mags_over_max, [])
 
+    def test_every_star_has_constellation(self):
+        """Test that stars without designations get a constellation too."""
+
+        unplaced = [star for star in self.stars if not star['constellation']]
+        self.assertEqual(unplaced, [])
+
+    def test_star_catalog(self):
+        """Test the star catalog for fast coordinate transforms."""
+
+        catalog = get_star_catalog(MAX_MAG)
+        self.assertEqual(len(catalog), len(self.stars))
+
+        # the catalog has true ra, not the inverted ra for d3
+        star_ras = sorted(star['ra'] for star in self.stars)
+        catalog_ras = sorted(360 - ra for ra in catalog.ra)
+        self.assertWithinMargin(star_ras[0], catalog_ras[0], 1e-6)
+
+        # catalogs are shared, including for nearby magnitudes
+        self.assertIs(get_star_catalog(MAX_MAG), catalog)
+        self.assertIs(get_star_catalog(MAX_MAG + 0.1), catalog)
+
+    def test_stars_at_epoch(self):
+        """Test that stars move for a distant year, but not a near one."""
+
+        self.assertEqual(get_stars(MAX_MAG, 2010), self.stars)
+
+        ancient_stars = get_stars(MAX_MAG, 1000)
+        self.assertEqual(len(ancient_stars), len(self.stars))
+
+        # precession moves every star by degrees in a thousand years
+        for star, ancient_star in zip(self.stars, ancient_stars):
+            self.assertTrue(abs(star['ra'] - ancient_star['ra']) +
+                            abs(star['dec'] - ancient_star['dec']) > 1)
+
 
 class ConstellationDataTests(DbTestCase):
     """Test calculations of constellation data.
@@ -219,6 +274,26 @@ class ConstellationDataTests(DbTestCase):
         self.assertEqual(len(consts), 5)
         self.assertEqual(const_names, CONST_LIST_SET)
 
+    def test_consts_at_epoch(self):
+        """Test that lines and boundaries move with the stars for a distant year."""
+
+        consts = dict((const['code'], const) for const in get_constellations())
+        ancient_consts = dict((const['code'], const)
+                              for const in get_constellations(1000))
+
+        orion = consts['ORI']
+        ancient_orion = ancient_consts['ORI']
+
+        self.assertEqual(len(ancient_orion['line_groups']),
+                         len(orion['line_groups']))
+        self.assertNotEqual(ancient_orion['line_groups'][0][0],
+                            orion['line_groups'][0][0])
+
+        self.assertEqual(len(ancient_orion['bound_verts'][0]),
+                         len(orion['bound_verts'][0]))
+        self.assertNotEqual(ancient_orion['bound_verts'][0][0],
+                            orion['bound_verts'][0][0])
+
 class SerpensConstellationDataTests(DbTestCase):
     """Test calculations for the problem child constellation: Serpens.
 
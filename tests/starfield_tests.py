@@ -30,7 +30,8 @@ sys.path.append('..')
 
 from run_tests import MarginTestCase, DbTestCase, MAX_MAG, COORDS_KEY_SET, \
                         SKYOBJECT_KEY_SET
-from starfield import deg_to_rad, rad_to_deg, StarField, BOOTSTRAP_DTIME_FORMAT
+from starfield import deg_to_rad, rad_to_deg, StarField, BOOTSTRAP_DTIME_FORMAT, \
+                      MAX_TIMELINE_FRAMES
 
 # 9pm on March 1, 2017 (local time)
 TEST_DATETIME = datetime(2017, 3, 1, 21, 0, 0)
@@ -53,7 +54,8 @@ SF_STF = StarField(lat=SF_LAT, lng=SF_LNG, max_mag=MAX_MAG,
 MARGIN = 0.005
 
 # expected data sets
-PLANET_KEY_SET = SKYOBJECT_KEY_SET | set(['size', 'prevRise', 'phase', 'nextSet'])
+PLANET_KEY_SET = SKYOBJECT_KEY_SET | set(['size', 'prevRise', 'phase', 'nextSet',
+                                         'airmass', 'extinctedMagnitude'])
 SUN_KEY_SET = PLANET_KEY_SET
 MOON_KEY_SET = PLANET_KEY_SET | set(['colong', 'rotation'])
 
@@ -212,6 +214,18 @@ class StarFieldTestsWithoutDb(MarginTestCase):
         stf = StarField(lat=0, lng=0)
         self.timezone_test(stf, pytz.timezone('Etc/UTC'))
 
+    def test_far_north_timezone(self):
+        """Test getting time zone beyond tzwhere's data."""
+
+        stf = StarField(lat=85, lng=0)
+        self.timezone_test(stf, pytz.timezone('Etc/UTC'))
+
+    def test_antarctica_timezone(self):
+        """Test getting time zone where tzwhere says 'uninhabited'."""
+
+        stf = StarField(lat=-89.9, lng=18.96)
+        self.timezone_test(stf, pytz.timezone('Etc/UTC'))
+
 
     #########################################################
     # starfield with no time provided
@@ -281,6 +295,64 @@ class StarFieldTestsWithoutDb(MarginTestCase):
 
         self.make_ephem_test(J_STF)
 
+    #########################################################
+    # body cache
+    #########################################################
+
+    def test_body_cache(self):
+        """Test that the same body object comes back from the cache."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+
+        self.assertIs(stf.get_body(ephem.Mars), stf.get_body(ephem.Mars))
+        self.assertEqual(stf.body_computations, 1)
+
+    def test_each_body_computed_once(self):
+        """Test that a full exact place-time calculation computes each body once."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG, max_mag=MAX_MAG,
+                        localtime_string=TEST_DATETIME_STRING, exact=True)
+        stf.get_planets()
+        stf.get_sun()
+        stf.get_moon()
+
+        # seven planets, plus the sun and moon
+        self.assertEqual(stf.body_computations, 9)
+
+    def test_no_bodies_computed_with_position_cache(self):
+        """Test that positions for a non-exact starfield come from the cache."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG, max_mag=MAX_MAG,
+                        localtime_string=TEST_DATETIME_STRING)
+        stf.get_planets()
+        stf.get_sun()
+        stf.get_moon()
+
+        self.assertEqual(stf.body_computations, 0)
+
+    def test_rise_set_leaves_body_alone(self):
+        """Test that finding rise/set times doesn't move the cached body."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        moon = stf.get_body(ephem.Moon)
+        alt, az = moon.alt, moon.az
+
+        stf.get_rise_set_times(moon)
+        self.assertEqual((moon.alt, moon.az), (alt, az))
+
+    def test_make_ephem_resets_cache(self):
+        """Test that a new observer state starts with an empty body cache."""
+
+        stf = StarField(lat=SF_LAT, lng=SF_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        stf.get_body(ephem.Moon)
+        stf.make_ephem()
+
+        self.assertEqual(stf.bodies, {})
+        self.assertEqual(stf.body_computations, 0)
+
     #########################################################
     # get local time from ephem time
     #########################################################
@@ -466,8 +538,8 @@ class StarFieldTestsWithoutDb(MarginTestCase):
         # expected data
         ra = 332.8583815004972
         dec = 6.260453993509564
-        phase = 'waxing crescent: 16.1'
-        colong = 318.9918500407805
+        phase = 'waxing crescent: 15.8'
+        colong = 318.6221705816297
         rotation = 383.33266920101795
         trise = '8:40 AM'
         tset = '9:43 PM'
@@ -480,8 +552,8 @@ class StarFieldTestsWithoutDb(MarginTestCase):
         # expected data
         ra = 332.8583815004972
         dec = 6.260453993509564
-        phase = 'waxing crescent: 16.1'
-        colong = 318.9918500407805
+        phase = 'waxing crescent: 15.8'
+        colong = 318.6221705816297
         rotation = 383.33266920101795
         trise = '8:40 AM'
         tset = '9:43 PM'
@@ -574,7 +646,11 @@ class StarFieldTestsWithoutDb(MarginTestCase):
 
         wan_datetime = datetime(2017, 2, 15, 21, 0, 0)
         wan_timestring = datetime.strftime(wan_datetime, BOOTSTRAP_DTIME_FORMAT)
-        stf = StarField(lat=lat, lng=lng, localtime_string=wan_timestring)
+        # exact: the cached positions are only good to about 0.01 arcsec,
+        # which can move the rotation by slightly more than this test allows
+        # (see test_cached_moon_rotation)
+        stf = StarField(lat=lat, lng=lng, localtime_string=wan_timestring,
+                        exact=True)
         self.moon_rotation_test(stf, expected_rotation)
 
     def test_sf_waxing_moon_rotation(self):
@@ -597,6 +673,20 @@ class StarFieldTestsWithoutDb(MarginTestCase):
 
         self.waning_moon_rotation_test(J_LAT, J_LNG, 57.972361308833435)
 
+    def test_cached_moon_rotation(self):
+        """Test that moon rotation from cached positions matches exact."""
+
+        for exact_stf in [StarField(lat=SF_LAT, lng=SF_LNG, exact=True,
+                                    localtime_string=TEST_DATETIME_STRING),
+                          StarField(lat=J_LAT, lng=J_LNG, exact=True,
+                                    localtime_string=TEST_DATETIME_STRING)]:
+            stf = StarField(lat=exact_stf.lat, lng=exact_stf.lng,
+                            localtime_string=TEST_DATETIME_STRING)
+            growth, phase_phrase = stf.get_moon_phase_phrase()
+
+            self.assertWithinMargin(stf.calculate_moon_angle(growth),
+                                    exact_stf.calculate_moon_angle(growth), 0.0001)
+
     #########################################################
     # sky rotation tests
     #########################################################
@@ -626,4 +716,103 @@ class StarFieldTestsWithoutDb(MarginTestCase):
         """Test sky rotation for johannesburg starfield."""
 
         self.sky_rotation_test(J_STF, 112.81837654938823, 0 - J_LAT)
-   
\ No newline at end of file
+   
+
+    #########################################################
+    # nearest bodies tests
+    #########################################################
+
+    def test_nearest_bodies(self):
+        """Test finding the planet nearest a J2000 point just off its position."""
+
+        planet = SF_STF.get_planets()[0]
+
+        # pyEphem's astrometric (J2000) position, as for catalog stars
+        body = getattr(ephem, planet['name'])(SF_STF.ephem)
+        nearest = SF_STF.get_nearest_bodies(360 - rad_to_deg(body.a_ra),
+                                            rad_to_deg(body.a_dec) + 0.5,
+                                            k=1, radius=2)
+
+        self.assertEqual(len(nearest), 1)
+        self.assertEqual(nearest[0]['name'], planet['name'])
+
+        # geocentric, so off by the planet's parallax (seconds of arc)
+        self.assertWithinMargin(nearest[0]['separation'], 0.5, 0.001)
+
+    def test_nearest_bodies_radius(self):
+        """Test that there are no bodies within a tiny radius of a far point."""
+
+        sun = SF_STF.get_sun()
+        nearest = SF_STF.get_nearest_bodies((sun['ra'] + 180) % 360, -sun['dec'],
+                                            k=10, radius=0.001)
+
+        self.assertEqual(nearest, [])
+
+    #########################################################
+    # timeline tests
+    #########################################################
+
+    def test_timeline_format(self):
+        """Test the format of the timeline output."""
+
+        timeline = SF_STF.get_timeline('2017-03-01T22:00', 30)
+
+        self.assertEqual(set(timeline.keys()),
+                         set(['times', 'timeStrings', 'rotation', 'bodies']))
+        self.assertEqual(timeline['timeStrings'], ['9:00 PM', '9:30 PM', '10:00 PM'])
+        self.assertEqual(timeline['times'][0], '2017-03-02T05:00:00Z')
+        self.assertEqual(len(timeline['rotation']['lambda']), 3)
+        self.assertEqual(set(timeline['bodies'].keys()),
+                         BRIGHT_PLANET_NAMES_SET | set(['Uranus', 'Neptune',
+                                                        'Sun', 'Moon']))
+
+        for body_frames in timeline['bodies'].values():
+            self.assertEqual(set(body_frames.keys()),
+                             set(['ra', 'dec', 'alt', 'az', 'magnitude']))
+            self.assertEqual(len(body_frames['ra']), 3)
+
+    def test_timeline_matches_starfields(self):
+        """Test that the last frame matches a starfield made for that time."""
+
+        timeline = SF_STF.get_timeline('2017-03-02T21:00', 5)
+        stf = StarField(lat=SF_LAT, lng=SF_LNG, max_mag=MAX_MAG,
+                        localtime_string='2017-03-02T21:00')
+
+        # a day at five-minute steps, including both ends
+        self.assertEqual(len(timeline['times']), 289)
+
+        self.assertWithinMargin(timeline['rotation']['lambda'][-1],
+                                stf.get_sky_rotation()['lambda'], 0.001)
+
+        mars = stf.get_planet_data(ephem.Mars)
+        self.assertWithinMargin(timeline['bodies']['Mars']['ra'][-1],
+                                mars['ra'], 0.00001)
+        self.assertWithinMargin(timeline['bodies']['Mars']['dec'][-1],
+                                mars['dec'], 0.00001)
+
+    def test_timeline_between_nodes(self):
+        """Test that interpolated frames match pyEphem's positions."""
+
+        timeline = SF_STF.get_timeline('2017-03-01T23:00', 5)
+        observer = SF_STF.ephem.copy()
+
+        # 9:35 PM, between the hourly positions
+        observer.date = SF_STF.ephem.date + 35 * ephem.minute
+        moon = ephem.Moon(observer)
+        moon_frames = timeline['bodies']['Moon']
+
+        self.assertWithinMargin(moon_frames['alt'][7], rad_to_deg(moon.alt), 0.001)
+        self.assertWithinMargin(moon_frames['dec'][7], rad_to_deg(moon.dec), 0.001)
+        self.assertWithinMargin(moon_frames['magnitude'][7], moon.mag, 0.05)
+
+    def test_timeline_bad_step(self):
+        """Test that a timeline needs a positive step."""
+
+        with self.assertRaises(ValueError):
+            SF_STF.get_timeline('2017-03-01T22:00', 0)
+
+    def test_timeline_frame_limit(self):
+        """Test that a very long timeline is cut off."""
+
+        timeline = SF_STF.get_timeline('2018-03-01T21:00', 1)
+        self.assertEqual(len(timeline['times']), MAX_TIMELINE_FRAMES)
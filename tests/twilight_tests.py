@@ -0,0 +1,149 @@
+"""Tests for the twilight timeline."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import math
+from datetime import date
+import pytz
+import ephem
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+from run_tests import MarginTestCase
+from starfield import StarField
+import twilight
+
+# san francisco
+TEST_LAT = 37.7749
+TEST_LNG = -122.4194
+TEST_TIMEZONE = pytz.timezone('America/Los_Angeles')
+TEST_DATE = date(2017, 3, 1)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# tromso, norway: no night in midsummer
+TROMSO_LAT = 69.65
+TROMSO_LNG = 18.96
+TROMSO_TIMEZONE = pytz.timezone('Europe/Oslo')
+MIDSUMMER_DATE = date(2017, 6, 21)
+
+# how far (seconds) event times can be from pyEphem's
+MAX_EVENT_SECONDS = 5
+
+
+def get_pyephem_times(lat, lng, start, horizon):
+    """Return tuple of pyEphem's (setting, rising) of the sun's center."""
+
+    observer = ephem.Observer()
+    observer.lat = math.radians(lat)
+    observer.lon = math.radians(lng)
+    observer.pressure = 0
+    observer.horizon = math.radians(horizon)
+    observer.date = start
+
+    return (observer.next_setting(ephem.Sun(), use_center=True),
+            observer.next_rising(ephem.Sun(), use_center=True))
+
+
+class TwilightTests(MarginTestCase):
+    """Test the twilight timeline."""
+
+    def test_events_match_pyephem(self):
+        """Test sunset, sunrise and twilight times against pyEphem's searches."""
+
+        timeline = twilight.make_twilight(TEST_LAT, TEST_LNG, TEST_DATE,
+                                          TEST_TIMEZONE)
+        events = dict((event['event'], event['date'])
+                      for event in timeline['events'])
+
+        self.assertEqual(len(events), 2 * len(twilight.BOUNDARIES))
+
+        for boundary_alt, rising_event, setting_event in twilight.BOUNDARIES:
+            setting, rising = get_pyephem_times(TEST_LAT, TEST_LNG,
+                                                timeline['dates'][0],
+                                                boundary_alt)
+
+            self.assertWithinMargin(events[setting_event], setting,
+                                    MAX_EVENT_SECONDS * ephem.second)
+            self.assertWithinMargin(events[rising_event], rising,
+                                    MAX_EVENT_SECONDS * ephem.second)
+
+    def test_samples(self):
+        """Test that samples run noon to noon, darkest in the middle."""
+
+        timeline = twilight.make_twilight(TEST_LAT, TEST_LNG, TEST_DATE,
+                                          TEST_TIMEZONE, 10)
+
+        self.assertEqual(len(timeline['dates']), 24 * 6 + 1)
+        self.assertEqual(str(ephem.Date(timeline['dates'][0])),
+                         '2017/3/1 20:00:00')
+        self.assertEqual(timeline['phases'][0], 'day')
+        self.assertEqual(timeline['phases'][24 * 3], 'night')
+        self.assertTrue(timeline['alts'].min() < -18)
+
+    def test_daylight_saving(self):
+        """Test that the night daylight saving starts is an hour shorter."""
+
+        timeline = twilight.make_twilight(TEST_LAT, TEST_LNG, date(2017, 3, 11),
+                                          TEST_TIMEZONE, 10)
+
+        self.assertEqual(len(timeline['dates']), 23 * 6 + 1)
+
+    def test_midnight_sun(self):
+        """Test a night with no sunset or twilight."""
+
+        timeline = twilight.make_twilight(TROMSO_LAT, TROMSO_LNG,
+                                          MIDSUMMER_DATE, TROMSO_TIMEZONE)
+
+        self.assertEqual(timeline['events'], [])
+        self.assertEqual(set(timeline['phases']), set(['day']))
+
+    def test_cache(self):
+        """Test that places in the same cell share a timeline."""
+
+        twilight.TWILIGHT_CACHE.clear()
+
+        first = twilight.get_twilight(TEST_LAT, TEST_LNG, TEST_DATE,
+                                      TEST_TIMEZONE)
+        second = twilight.get_twilight(TEST_LAT + 0.01, TEST_LNG, TEST_DATE,
+                                       TEST_TIMEZONE)
+
+        self.assertIs(first, second)
+        self.assertEqual(len(twilight.TWILIGHT_CACHE), 1)
+
+    def test_starfield_timeline(self):
+        """Test a starfield's timeline holds its time, in local times."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string=TEST_DATETIME_STRING)
+        timeline = stf.get_twilight_timeline()
+
+        self.assertEqual(timeline['timeStrings'][0], '12:00 PM')
+        self.assertIn('9:00 PM', timeline['timeStrings'])
+        self.assertEqual(timeline['events'][0]['event'], 'sunset')
+        self.assertEqual(timeline['events'][0]['timeString'], '6:03 PM')
+
+    def test_starfield_timeline_before_noon(self):
+        """Test that a morning starfield's timeline starts the day before."""
+
+        stf = StarField(lat=TEST_LAT, lng=TEST_LNG,
+                        localtime_string='2017-03-02T05:00')
+        timeline = stf.get_twilight_timeline()
+
+        self.assertEqual(timeline['times'][0], '2017-03-01T20:00:00Z')
@@ -0,0 +1,108 @@
+"""Tests for the place-time worker pool."""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from unittest import TestCase
+import os
+import pickle
+from multiprocessing import TimeoutError
+
+# be able to import from parent dir
+import sys
+sys.path.append('..')
+
+import workers
+
+# 9pm on March 1, 2017 (local time)
+TEST_DATETIME_STRING = '2017-03-01T21:00'
+
+# san francisco
+TEST_REQUEST = workers.PlaceTimeRequest(lat=37.7749, lng=-122.4194,
+                                        localtime_string=TEST_DATETIME_STRING,
+                                        max_mag=5)
+
+
+class WorkerPoolTests(TestCase):
+    """Test place-time computations with and without the pool."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Stuff to do once before running all class test methods."""
+
+        cls.inline_response = workers.compute_place_time(TEST_REQUEST)
+
+    def tearDown(self):
+        """Stuff to do after every test."""
+
+        workers.stop_pool()
+
+    def test_pickle_request(self):
+        """Test that requests survive the trip to a worker."""
+
+        self.assertEqual(pickle.loads(pickle.dumps(TEST_REQUEST)), TEST_REQUEST)
+
+    def test_pickle_response(self):
+        """Test that responses survive the trip back from a worker."""
+
+        unpickled = pickle.loads(pickle.dumps(self.inline_response))
+        self.assertEqual(unpickled, self.inline_response)
+
+    def test_no_pool(self):
+        """Test that computations run in this process without a pool."""
+
+        self.assertIsNone(workers.POOL)
+        self.assertEqual(workers.get_place_time(TEST_REQUEST),
+                         self.inline_response)
+
+    def test_pool_size_from_env(self):
+        """Test that the pool size comes from the env var (none by default)."""
+
+        old_size = os.environ.pop(workers.POOL_SIZE_ENV_VAR, None)
+
+        try:
+            self.assertIsNone(workers.start_pool())
+
+            os.environ[workers.POOL_SIZE_ENV_VAR] = '2'
+            self.assertEqual(workers.get_pool_size(), 2)
+
+        finally:
+            os.environ.pop(workers.POOL_SIZE_ENV_VAR, None)
+            if old_size is not None:
+                os.environ[workers.POOL_SIZE_ENV_VAR] = old_size
+
+    def test_pool_matches_inline(self):
+        """Test that the pool gives the same data as computing in this process."""
+
+        workers.start_pool(2)
+
+        self.assertEqual(workers.get_place_time(TEST_REQUEST),
+                         self.inline_response)
+
+    def test_start_pool_once(self):
+        """Test that starting a running pool doesn't start another."""
+
+        pool = workers.start_pool(1)
+        self.assertIs(workers.start_pool(1), pool)
+
+    def test_timeout(self):
+        """Test that a computation that takes too long raises TimeoutError."""
+
+        workers.start_pool(1)
+
+        with self.assertRaises(TimeoutError):
+            workers.get_place_time(TEST_REQUEST, timeout=0.000001)
@@ -0,0 +1,180 @@
+"""The sun's altitude through a night, with sunset, sunrise and twilight times.
+
+The front end colors the sky from the sun's altitude. To animate that across
+a night in one request, the altitude is sampled every few minutes from local
+noon to the next local noon, all at once with numpy: zenith directions come
+from the vectorized sidereal time, and the sun's direction is interpolated
+from its daily positions (see planner.py).
+
+Sunset, sunrise and the twilight boundaries are where the sampled altitude
+crosses each boundary's altitude, found by linear interpolation between
+samples. They agree with pyEphem's searches to within a few seconds.
+
+Timelines are for the middle of the place's location cell (see
+riseset.get_cell), and cached by cell, local date and step: every request for
+the same night and cell shares the sun's positions.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+from datetime import datetime, time, timedelta
+import numpy as np
+import ephem
+
+from time_functions import to_utc
+from sidereal_time import get_local_sidereal_time
+from riseset import get_cell, CELL_SIZE
+from planner import get_zeniths, get_moving_vectors
+
+# default minutes between samples
+SAMPLE_MINUTES = 2
+
+# fewest minutes between samples (a day at one-minute steps, as
+# starfield.MAX_TIMELINE_FRAMES)
+MIN_SAMPLE_MINUTES = 1
+
+# the sun's altitude (degrees, without refraction) at sunrise and sunset: its
+# upper limb on the horizon, with the usual refraction there
+SUNRISE_ALT = -50 / 60.0
+
+# (altitude in degrees, rising event, setting event) for each boundary,
+# from the brightest sky to the darkest
+BOUNDARIES = [(SUNRISE_ALT, 'sunrise', 'sunset'),
+              (-6, 'civilDawn', 'civilDusk'),
+              (-12, 'nauticalDawn', 'nauticalDusk'),
+              (-18, 'astronomicalDawn', 'astronomicalDusk')]
+
+# the sky between each pair of boundaries (one more than there are boundaries)
+PHASES = ['day', 'civil', 'nautical', 'astronomical', 'night']
+
+# timelines already made, keyed by (cell, local date, step minutes)
+TWILIGHT_CACHE = {}
+
+# most timelines to keep; the cache is emptied when it gets bigger than this
+MAX_CACHED_TWILIGHTS = 10000
+
+
+def get_noon_dates(local_date, timezone, step_minutes):
+    """Return array of ephem dates from local noon on local_date to the next.
+
+    timezone is a pytz timezone. The last sample is the next noon itself;
+    days with a daylight saving change are an hour longer or shorter.
+    """
+
+    noons = [ephem.Date(to_utc(timezone, datetime.combine(day, time(12))))
+             for day in (local_date, local_date + timedelta(days=1))]
+
+    step = step_minutes * ephem.minute
+    num_samples = int(round((noons[1] - noons[0]) / step)) + 1
+
+    return noons[0] + np.arange(num_samples) * step
+
+
+def get_sun_altitudes(lat, lng, ephem_dates):
+    """Return array of the sun's altitudes (degrees) at an array of ephem dates.
+
+    Altitudes are geocentric and without refraction, as for twilight.
+    """
+
+    zeniths = get_zeniths(lat, get_local_sidereal_time(ephem_dates, lng))
+    sun_up = (get_moving_vectors(ephem.Sun, ephem_dates) * zeniths).sum(axis=0)
+
+    return np.degrees(np.arcsin(np.clip(sun_up, -1, 1)))
+
+
+def find_crossings(ephem_dates, alts, boundary_alt):
+    """Return list of (ephem date, rising) where alts cross boundary_alt.
+
+    rising is True where the sun goes up through boundary_alt. Crossing times
+    are interpolated between samples.
+    """
+
+    above = alts - boundary_alt
+    indexes = np.flatnonzero((above[:-1] < 0) != (above[1:] < 0))
+
+    crossings = []
+    for index in indexes:
+        fraction = above[index] / (above[index] - above[index + 1])
+        crossing = ephem_dates[index] + \
+            fraction * (ephem_dates[index + 1] - ephem_dates[index])
+        crossings.append((ephem.Date(crossing), bool(above[index] < 0)))
+
+    return crossings
+
+
+def make_twilight(lat, lng, local_date, timezone, step_minutes=SAMPLE_MINUTES):
+    """Return the sun's altitudes and twilight events from local_date's noon.
+
+    Returns a dict:
+
+    {'dates': array of ephem dates, every step_minutes from local noon on
+              local_date to the next local noon,
+     'alts': array of the sun's altitudes at each date, in degrees,
+     'phases': list of the sky's phase at each date (one of PHASES),
+     'events': [{'event': 'sunset', 'date': ephem date}, ...]}  # in order
+
+    Events are the boundaries of BOUNDARIES the sun crosses; near the poles
+    some (or all) don't happen.
+    """
+
+    step_minutes = max(step_minutes, MIN_SAMPLE_MINUTES)
+    ephem_dates = get_noon_dates(local_date, timezone, step_minutes)
+    alts = get_sun_altitudes(lat, lng, ephem_dates)
+
+    # boundary altitudes from darkest to brightest, for searchsorted
+    boundary_alts = [boundary[0] for boundary in reversed(BOUNDARIES)]
+    phase_indexes = len(BOUNDARIES) - np.searchsorted(boundary_alts, alts)
+
+    events = []
+    for boundary_alt, rising_event, setting_event in BOUNDARIES:
+        for crossing, rising in find_crossings(ephem_dates, alts, boundary_alt):
+            events.append({'event': rising_event if rising else setting_event,
+                           'date': crossing})
+
+    events.sort(key=lambda event: event['date'])
+
+    return {'dates': ephem_dates,
+            'alts': alts,
+            'phases': [PHASES[index] for index in phase_indexes],
+            'events': events}
+
+
+def get_twilight(lat, lng, local_date, timezone, step_minutes=SAMPLE_MINUTES,
+                 exact=False):
+    """Return the (cached) twilight timeline for the middle of lat / lng's cell.
+
+    If exact, the timeline is made for lat / lng itself, and not cached. See
+    make_twilight for the format. Cached timelines are shared: don't change
+    them.
+    """
+
+    if exact:
+        return make_twilight(lat, lng, local_date, timezone, step_minutes)
+
+    cell = get_cell(lat, lng)
+    key = (cell, local_date, step_minutes)
+
+    if key not in TWILIGHT_CACHE:
+        if len(TWILIGHT_CACHE) >= MAX_CACHED_TWILIGHTS:
+            TWILIGHT_CACHE.clear()
+
+        TWILIGHT_CACHE[key] = make_twilight((cell[0] + 0.5) * CELL_SIZE,
+                                            (cell[1] + 0.5) * CELL_SIZE,
+                                            local_date, timezone, step_minutes)
+
+    return TWILIGHT_CACHE[key]
@@ -0,0 +1,160 @@
+"""Pool of worker processes for place-time (StarField) computations.
+
+pyEphem holds the GIL while it computes, so in a threaded server, requests
+wait in line for each other's StarField work. Running the computations in a
+pool of worker processes lets one server use every core.
+
+Workers are forked from the server process after it has loaded the time zone
+index (see starfield.TZW), so they start warm and share its memory instead of
+each loading their own. Only small picklable objects go back and forth: a
+PlaceTimeRequest in, a PlaceTimeResponse out. The Flask app and db connection
+never leave the server process.
+
+The pool is off unless it's started (see start_pool); without it,
+computations run in the calling thread, as before.
+"""
+
+    # Copyright (c) 2017 Bonnie Schulkin
+
+    # This file is part of My Heavens.
+
+    # My Heavens is free software: you can redistribute it and/or modify it under
+    # the terms of the GNU Affero General Public License as published by the
+    # Free Software Foundation, either version 3 of the License, or (at your
+    # option) any later version.
+
+    # My Heavens is distributed in the hope that it will be useful, but WITHOUT
+    # ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+    # FITNESS FOR A PARTICULAR PURPOSE. See the GNU Affero General Public License
+    # for more details.
+
+    # You should have received a copy of the GNU Affero General Public License
+    # along with My Heavens. If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import multiprocessing
+from collections import namedtuple
+
+from starfield import StarField, DEFAULT_PRECISION
+
+# env vars for the number of worker processes (0 for no pool) and the number
+# of seconds to wait for a computation
+POOL_SIZE_ENV_VAR = 'STARFIELD_WORKERS'
+TIMEOUT_ENV_VAR = 'STARFIELD_TIMEOUT'
+
+DEFAULT_TIMEOUT = 10
+
+# workers are forked, so they share the server's already-loaded time zone index
+START_METHOD = 'fork'
+
+# a place and time to compute when a worker starts, to load pyEphem's data and
+# the shared caches before the first real request
+WARM_UP_LAT = 37.7749
+WARM_UP_LNG = -122.4194
+
+# the pool, once started (see start_pool)
+POOL = None
+
+# what a worker needs to know to compute a place-time (precision is one of
+# starfield.PRECISIONS, DEFAULT_PRECISION if not given)
+PlaceTimeRequest = namedtuple('PlaceTimeRequest',
+                              ['lat', 'lng', 'localtime_string', 'max_mag',
+                               'precision'],
+                              defaults=[DEFAULT_PRECISION])
+
+# what comes back: the place-time data, in the format of the
+# /place-time-data.json response
+PlaceTimeResponse = namedtuple('PlaceTimeResponse',
+                               ['dateloc', 'rotation', 'planets', 'sundata',
+                                'moon', 'minorBodies', 'satellites'])
+
+
+def compute_place_time(place_time_request):
+    """Return a PlaceTimeResponse for a PlaceTimeRequest.
+
+    This is the function that runs in the workers (or in the calling thread, if
+    there's no pool).
+    """
+
+    stf = StarField(lat=place_time_request.lat,
+                    lng=place_time_request.lng,
+                    max_mag=place_time_request.max_mag,
+                    localtime_string=place_time_request.localtime_string,
+                    precision=place_time_request.precision)
+
+    return PlaceTimeResponse(dateloc=stf.get_specs(),
+                             rotation=stf.get_sky_rotation(),
+                             planets=stf.get_planets(),
+                             sundata=stf.get_sun(),
+                             moon=stf.get_moon(),
+                             minorBodies=stf.get_minor_bodies(),
+                             satellites=stf.get_satellites())
+
+
+def warm_up_worker():
+    """Run one computation, so a new worker is ready for real requests."""
+
+    compute_place_time(PlaceTimeRequest(lat=WARM_UP_LAT, lng=WARM_UP_LNG,
+                                        localtime_string=None, max_mag=5))
+
+
+def get_pool_size():
+    """Return the number of worker processes from the env var (0 if not set)."""
+
+    return int(os.environ.get(POOL_SIZE_ENV_VAR, 0))
+
+
+def get_timeout():
+    """Return the seconds to wait for a computation, from the env var."""
+
+    return float(os.environ.get(TIMEOUT_ENV_VAR, DEFAULT_TIMEOUT))
+
+
+def start_pool(size=None):
+    """Start the pool of size worker processes (default from get_pool_size).
+
+    Does nothing if size is 0 or the pool is already running. Start the pool
+    before the server starts its threads: forking a process that has other
+    threads running can leave locks held in the workers.
+    """
+
+    global POOL
+
+    if size is None:
+        size = get_pool_size()
+
+    if POOL is None and size > 0:
+        context = multiprocessing.get_context(START_METHOD)
+        POOL = context.Pool(processes=size, initializer=warm_up_worker)
+
+    return POOL
+
+
+def stop_pool():
+    """Stop the worker processes, if there are any."""
+
+    global POOL
+
+    if POOL is not None:
+        POOL.terminate()
+        POOL.join()
+        POOL = None
+
+
+def get_place_time(place_time_request, timeout=None):
+    """Return a PlaceTimeResponse, computed in the pool if it's running.
+
+    timeout is in seconds (default from get_timeout). If a worker doesn't finish
+    in time, raises multiprocessing.TimeoutError; the worker carries on with the
+    computation, but the result is thrown away.
+    """
+
+    if POOL is None:
+        return compute_place_time(place_time_request)
+
+    if timeout is None:
+        timeout = get_timeout()
+
+    result = POOL.apply_async(compute_place_time, (place_time_request,))
+
+    return result.get(timeout)